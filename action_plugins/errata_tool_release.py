@@ -0,0 +1,5 @@
+from ansible_collections.ktdreyer.errata_tool_ansible.plugins.plugin_utils.errata_tool_action import ErrataToolAction  # noqa: E501
+
+
+class ActionModule(ErrataToolAction):
+    pass
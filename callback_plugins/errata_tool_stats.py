@@ -0,0 +1,134 @@
+import json
+import os
+from ansible.plugins.callback import CallbackBase
+
+
+DOCUMENTATION = '''
+---
+name: errata_tool_stats
+type: aggregate
+short_description: Summarize Errata Tool API usage for a playbook
+description:
+  - Each errata_tool_* module returns the number of Errata Tool requests it
+    sent, the time the ET took to respond, and its cache hits and misses in
+    an "errata_tool_stats" result. This callback plugin adds up these numbers
+    for every task in the playbook.
+  - At the end of the playbook, it shows the total number of ET requests,
+    the requests for each API endpoint, the slowest tasks, and the hit rate
+    for each cache. Use this to find tasks that read much more data from
+    the ET than you expect.
+  - Set the ERRATA_TOOL_STATS_REPORT environment variable to a file path to
+    also write a JSON report with every task's numbers.
+  - Set the ERRATA_TOOL_STATS_SLOWEST environment variable to change the
+    number of slowest tasks to show (default 10).
+requirements:
+  - enable in configuration, for example "callbacks_enabled =
+    errata_tool_stats" in the [defaults] section of ansible.cfg
+'''
+
+
+class CallbackModule(CallbackBase):
+    CALLBACK_VERSION = 2.0
+    CALLBACK_TYPE = 'aggregate'
+    CALLBACK_NAME = 'errata_tool_stats'
+    CALLBACK_NEEDS_ENABLED = True
+    # Ansible < 2.11:
+    CALLBACK_NEEDS_WHITELIST = True
+
+    def __init__(self, display=None):
+        super(CallbackModule, self).__init__(display)
+        self.tasks = []
+
+    def record(self, result):
+        """
+        Save the "errata_tool_stats" from one task result, including each
+        item in a loop.
+        """
+        results = [result._result] + result._result.get('results', [])
+        for task_result in results:
+            if not isinstance(task_result, dict):
+                continue
+            stats = task_result.get('errata_tool_stats')
+            if not stats:
+                continue
+            self.tasks.append({
+                'task': result._task.get_name(),
+                'host': result._host.get_name(),
+                'stats': stats,
+            })
+
+    def v2_runner_on_ok(self, result):
+        self.record(result)
+
+    def v2_runner_on_failed(self, result, ignore_errors=False):
+        self.record(result)
+
+    def summary(self):
+        """
+        Add up the numbers for every task.
+
+        :returns: a dict with "requests", "seconds", "endpoints", "caches"
+                  and "tasks" keys. Tasks are sorted slowest first.
+        """
+        endpoints = {}
+        caches = {}
+        for task in self.tasks:
+            stats = task['stats']
+            for key, endpoint in stats.get('endpoints', {}).items():
+                total = endpoints.setdefault(key, {'requests': 0,
+                                                   'seconds': 0.0})
+                total['requests'] += endpoint['requests']
+                total['seconds'] += endpoint['seconds']
+            for name, cache in stats.get('caches', {}).items():
+                total = caches.setdefault(name, {'hits': 0, 'misses': 0})
+                total['hits'] += cache['hits']
+                total['misses'] += cache['misses']
+        for cache in caches.values():
+            lookups = cache['hits'] + cache['misses']
+            cache['hit_rate'] = round(float(cache['hits']) / lookups, 3)
+        tasks = sorted(self.tasks,
+                       key=lambda task: task['stats']['seconds'],
+                       reverse=True)
+        return {
+            'requests': sum(task['stats']['requests'] for task in tasks),
+            'seconds': round(sum(task['stats']['seconds'] for task in tasks),
+                             3),
+            'endpoints': endpoints,
+            'caches': caches,
+            'tasks': tasks,
+        }
+
+    def v2_playbook_on_stats(self, stats):
+        if not self.tasks:
+            return
+        summary = self.summary()
+        display = self._display.display
+        self._display.banner('ERRATA TOOL API USAGE')
+        display('%d requests, %.1f seconds waiting for the ET'
+                % (summary['requests'], summary['seconds']))
+        display('')
+        display('Requests by endpoint:')
+        endpoints = sorted(summary['endpoints'].items(),
+                           key=lambda item: item[1]['requests'],
+                           reverse=True)
+        for key, endpoint in endpoints:
+            display('  %6d  %8.1fs  %s' % (endpoint['requests'],
+                                           endpoint['seconds'], key))
+        display('')
+        display('Slowest tasks:')
+        slowest = int(os.getenv('ERRATA_TOOL_STATS_SLOWEST', 10))
+        for task in summary['tasks'][:slowest]:
+            display('  %6d  %8.1fs  %s (%s)' % (task['stats']['requests'],
+                                                task['stats']['seconds'],
+                                                task['task'], task['host']))
+        if summary['caches']:
+            display('')
+            display('Cache hit rates:')
+            for name, cache in sorted(summary['caches'].items()):
+                display('  %5.1f%%  %s (%d hits, %d misses)'
+                        % (cache['hit_rate'] * 100, name, cache['hits'],
+                           cache['misses']))
+        path = os.getenv('ERRATA_TOOL_STATS_REPORT')
+        if path:
+            with open(path, 'w') as f:
+                json.dump(summary, f, indent=2, sort_keys=True)
@@ -0,0 +1,288 @@
+import glob
+import os
+import threading
+from ansible.module_utils.basic import AnsibleModule
+from ansible.module_utils import common_errata_tool
+from ansible.module_utils.common_errata_tool_cdn_repo import \
+    get_planned_package_tag_id
+from ansible.module_utils.common_errata_tool_release import IdResolver
+import requests
+
+
+ANSIBLE_METADATA = {
+    'metadata_version': '1.0',
+    'status': ['preview'],
+    'supported_by': 'community'
+}
+
+
+DOCUMENTATION = '''
+---
+module: errata_tool_apply
+
+short_description: Send a planned set of changes to the Errata Tool
+description:
+   - When you run the other errata_tool_* modules in check mode with the
+     ERRATA_TOOL_PLAN environment variable set to a directory, they record
+     the exact POST, PUT and DELETE requests that they would send into that
+     directory.
+   - This module sends those requests without reading anything from the ET
+     again. It sends independent requests in parallel, and it sends requests
+     for each type of resource in dependency order (for example, products
+     before their product versions, and CDN repos before their package
+     tags).
+   - When a planned request refers to a resource that the plan creates (for
+     example, a release for a new product), the plan has a placeholder for
+     that resource's ID. This module looks up the real ID after the ET
+     creates the resource.
+   - As the ET accepts each request, this module removes that request from
+     the plan's files, and it removes each file when it is empty. If a
+     request fails, you can fix the problem and run this module again, and
+     it will only send the requests that the ET has not accepted yet.
+options:
+   plan:
+     description:
+       - The plan directory (the value of ERRATA_TOOL_PLAN during the check
+         mode run).
+     required: true
+requirements:
+  - "python >= 2.7"
+  - "lxml"
+  - "requests-gssapi"
+'''
+
+EXAMPLES = '''
+# First, run your playbook in check mode with ERRATA_TOOL_PLAN set:
+#   ERRATA_TOOL_PLAN=/tmp/et-plan ansible-playbook --check my-et-playbook.yml
+# Then review the plan's files and apply them:
+- name: apply the reviewed ET changes
+  errata_tool_apply:
+    plan: /tmp/et-plan
+'''
+
+# Send writes for each level after all the writes for the levels before it.
+# For example, a product version requires its product, and a release or
+# variant requires its product version.
+LEVELS = {
+    'user': 0,
+    'rhel_releases': 0,
+    'products': 1,
+    'product_versions': 2,
+    'releases': 3,
+    'variants': 3,
+    'cdn_repos': 4,
+    'cdn_repo_package_tags': 5,
+}
+
+
+# How to find the real ID for each kind of planned ID placeholder (see
+# common_errata_tool.planned_id()), after the ET creates the resource.
+PLANNED_IDS = {
+    'products': lambda ids, name: ids.product_id(name),
+    'product_versions': lambda ids, name: ids.product_version_ids([name])[0],
+    'user': lambda ids, name: ids.program_manager_id(name),
+    'cdn_repo_package_tags':
+        lambda ids, name: get_planned_package_tag_id(ids.client, name),
+}
+
+
+def get_level(endpoint):
+    """
+    Find the dependency level for this API endpoint.
+
+    :param str endpoint: eg. "api/v1/products/RHCEPH/product_versions/123"
+    :returns: int from LEVELS
+    """
+    resource = common_errata_tool.endpoint_resource(endpoint)
+    try:
+        return LEVELS[resource]
+    except KeyError:
+        raise ValueError('unknown ET resource for %s' % endpoint)
+
+
+def resolve_planned_ids(ids, value):
+    """
+    Replace each planned ID placeholder in this JSON value with the real ID.
+
+    :param IdResolver ids: looks up the real IDs.
+    :param value: a planned write's JSON
+    :returns: a copy of value with the real IDs.
+    """
+    if isinstance(value, dict):
+        return {key: resolve_planned_ids(ids, item)
+                for key, item in value.items()}
+    if isinstance(value, list):
+        return [resolve_planned_ids(ids, item) for item in value]
+    planned = common_errata_tool.parse_planned_id(value)
+    if planned is None:
+        return value
+    resource, name = planned
+    return PLANNED_IDS[resource](ids, name)
+
+
+def resolve_endpoint(ids, endpoint):
+    """
+    Replace a planned ID placeholder at the end of this endpoint (for
+    example, a package tag that the ET creates with its CDN repo) with the
+    real ID.
+
+    :param IdResolver ids: looks up the real IDs.
+    :param str endpoint: eg. "api/v1/cdn_repo_package_tags/planned-id:..."
+    :returns: str
+    """
+    head, prefix, tail = endpoint.partition(
+        common_errata_tool.PLANNED_ID_PREFIX)
+    if not prefix:
+        return endpoint
+    return '%s%s' % (head, resolve_planned_ids(ids, prefix + tail))
+
+
+class PlanFiles(object):
+    """
+    All the operations in a plan directory.
+
+    Each module process wrote its own plan file (see
+    common_errata_tool.Plan). When the ET accepts an operation, done()
+    removes it from its file, so we never send it twice.
+    """
+    def __init__(self, path):
+        self.filenames = sorted(glob.glob(os.path.join(path, 'plan-*.json')))
+        self.files = {}
+        for filename in self.filenames:
+            self.files[filename] = common_errata_tool.read_json_file(filename)
+        # We send operations from many threads (see apply_plan()).
+        self.lock = threading.Lock()
+
+    @property
+    def operations(self):
+        """
+        :returns: a list of operation dicts, from every file in order.
+        """
+        operations = []
+        for filename in self.filenames:
+            operations.extend(self.files[filename])
+        return operations
+
+    def done(self, operation):
+        """
+        Remove this operation from its plan file, and remove the file if
+        this was its last operation.
+
+        :param dict operation: one of our operation dicts.
+        """
+        with self.lock:
+            for filename, operations in self.files.items():
+                # Two operations can be equal (eg. the same PUT twice), so we
+                # look for this exact dict.
+                for index, candidate in enumerate(operations):
+                    if candidate is operation:
+                        del operations[index]
+                        if operations:
+                            common_errata_tool.write_json_file(filename,
+                                                               operations)
+                        else:
+                            os.remove(filename)
+                        return
+
+
+def send_operation(client, operation, ids):
+    """
+    Send one planned write to the ET.
+
+    :param IdResolver ids: looks up the real IDs for planned ID placeholders.
+    :returns: None if the ET accepted this write, or an error message str.
+    """
+    try:
+        endpoint = resolve_endpoint(ids, operation['endpoint'])
+        data = resolve_planned_ids(ids, operation['json'])
+    except (requests.exceptions.HTTPError,
+            common_errata_tool.UserNotFoundError,
+            ValueError) as e:
+        return 'could not find an ID for %s %s: %s' % (
+            operation['method'], operation['endpoint'], e)
+    response = client.request(operation['method'], endpoint, json=data)
+    if response.status_code != operation['status_code']:
+        return str(common_errata_tool.ErrataToolError(response))
+    return None
+
+
+@common_errata_tool.traced('write')
+def apply_plan(client, operations, check_mode, done=None):
+    """
+    Send these planned writes to the ET, one dependency level at a time.
+
+    :param client: Errata Client
+    :param list operations: operation dicts from PlanFiles
+    :param bool check_mode: describe what would happen, but don't do it.
+    :param done: if set, call done(operation) for each operation that the
+                 ET accepts (see PlanFiles.done()).
+    :returns: a two-element tuple: a list of str descriptions, and a list of
+              error messages. If any write fails, we stop after its level.
+    """
+    levels = {}
+    for operation in operations:
+        level = get_level(operation['endpoint'])
+        levels.setdefault(level, []).append(operation)
+
+    ids = IdResolver(client)
+
+    def send(operation):
+        error = send_operation(client, operation, ids)
+        if error is None and done:
+            done(operation)
+        return error
+
+    changes = []
+    errors = []
+    for level in sorted(levels):
+        batch = levels[level]
+        for operation in batch:
+            changes.append('%s %s' % (operation['method'],
+                                      operation['endpoint']))
+        if check_mode:
+            continue
+        results = common_errata_tool.parallel_map(send, batch,
+                                                  client.concurrency)
+        errors.extend(error for error in results if error)
+        if errors:
+            break
+    return (changes, errors)
+
+
+def run_module():
+    module_args = dict(
+        plan=dict(required=True),
+    )
+    with common_errata_tool.span('parse arguments'):
+        module = AnsibleModule(
+            argument_spec=module_args,
+            supports_check_mode=True
+        )
+    params = module.params
+    identity = os.path.basename(params['plan'])
+
+    # We send the planned writes, so we must not plan them again.
+    client, check_mode = common_errata_tool.start_module(
+        module, 'errata_tool_apply', identity, plan=False)
+
+    plan = PlanFiles(params['plan'])
+
+    try:
+        changes, errors = apply_plan(client, plan.operations, check_mode,
+                                     plan.done)
+    except ValueError as e:
+        module.fail_json(msg=str(e), changed=False, rc=1)
+
+    if errors:
+        msg = 'could not apply the plan: %s' % '\n'.join(errors)
+        module.fail_json(msg=msg, changed=True, stdout_lines=changes)
+
+    module.exit_json(changed=bool(changes), stdout_lines=changes)
+
+
+def main():
+    run_module()
+
+
+if __name__ == '__main__':
+    main()
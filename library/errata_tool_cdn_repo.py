@@ -1,8 +1,13 @@
-from copy import deepcopy
+import os
 
 from ansible.module_utils.basic import AnsibleModule
 from ansible.module_utils import common_errata_tool
-from ansible.module_utils.six import string_types
+from ansible.module_utils.common_errata_tool_cdn_repo import (
+    PackageTagsCache,
+    argument_spec,
+    ensure_cdn_repo,
+    prepare_params,
+)
 
 
 ANSIBLE_METADATA = {
@@ -80,6 +85,18 @@ options:
          repositories that are not content_type: Docker."
      required: false
      default: "{} (no packages)"
+   packages_mode:
+     description:
+       - How to treat the packages that you do not list in "packages".
+       - With "replace", Ansible removes every package from this repository
+         that you do not list in "packages". Ansible must read all the tags
+         of every package in the repository.
+       - With "merge", Ansible only manages the tags of the packages that
+         you list in "packages", and it leaves all the other packages alone.
+         Ansible only reads the tags of the packages that you list, so this
+         is much faster for large repositories.
+     choices: [replace, merge]
+     default: replace
 requirements:
   - "python >= 2.7"
   - "lxml"
@@ -168,638 +185,50 @@ EXAMPLES = '''
         - latest
         - my-prerelease-tag:
             for_prerelease: True
-'''
-
-CDN_RELEASE_TYPES = [
-    'Primary',
-    'EUS',
-    'LongLife',
-]
-
-CDN_CONTENT_TYPES = [
-    'Binary',
-    'Debuginfo',
-    'Source',
-    'Docker',
-]
-
-# API Pagination
-PAGE_SIZE = 100
-
-
-def normalize_packages(packages):
-    """
-    Normalize the "packages" values from the Ansible task.
-
-    For each package, users pass in a list of tag templates. The list elements
-    can be strings or dicts.
-
-    Normalize this in the following ways:
-    1) Translate each tags list to a dict. This ensures that every
-       tag is unique.
-    2) Transform every tag value to individual dicts. This makes comparisons
-       easier with our live data in the ET.
-
-    :param dict packages: Each key is a package name, and each value is a
-                          (possibly empty) list of tags. Each tag is either a
-                          string or a dict.
-    :returns: A dict of packages. Each key is a package name. Each value is a
-              dict of tags. Each tag dictionary may have a "for_hotfix" key
-              (to indicate if it is for hotfix), a "for_prerelease" key
-              (to indicate if it is for prerelease). There is no "variant"
-              key (to indicate no variant restrictions), or It has a "variant"
-              key (to indicate a variant restriction).
-    """
-    normalized = {}
-    for package_name, tags in packages.items():
-        normalized[package_name] = {}
-        for tag in tags:
-            if isinstance(tag, string_types):
-                # No variant restrictions present
-                normalized[package_name][tag] = {}
-            elif isinstance(tag, dict):
-                # Variant restrictions present
-                tag_string = next(iter(tag))
-                variant_restriction = tag[tag_string]
-                normalized[package_name][tag_string] = variant_restriction
-            else:
-                raise ValueError('unexpected %s' % type(tag))
-    return normalized
-
-
-def get_package_tags_page(client, name, page_number):
-    """
-    Get api/v1/cdn_repo_package_tags for a named CDN repository.
-    """
-    params = {
-        'page[size]': PAGE_SIZE,
-        'page[number]': page_number,
-        'filter[cdn_repo_name]': name,
-    }
-    endpoint = 'api/v1/cdn_repo_package_tags'
-    response = client.get(endpoint, params=params)
-    response.raise_for_status()
-    data = response.json()
-    return data['data']
-
-
-def get_package_tags(client, name):
-    """
-    Look up the variant restrictions for all packages/tags for this repo.
-
-    Note it's possible that the ET team could consider other package/tag
-    restrictions in the future. See ERRATA-5644 for one example of
-    how this might possibly change in the future.
-
-    :param str name: CDN Repository name
-    :returns: dict of "packages: tag_templates". Each tag_template is a dict.
-              The tag_template dict has a "id" key, a "for_hotfix" key and
-              a "for_prerelease" key.
-              If it has a "variant" key, then it is restricted to a variant.
-              If it has no "variant" key, there are no restrictions for this
-              repo's package's tag_template. If a package in this repo has no
-              tags, you must discover it with get_cdn_repo(), because this API
-              will not return it.
-    """
-    # We will query all the packages' tags for this repo.
-    # Example for looking up one single package in one single repo:
-    # https://errata.devel.redhat.com/api/v1/cdn_repo_package_tags?filter[package_name]=ubi8-container&filter[cdn_repo_name]=ubi8
-    page_number = 0
-    elements = []
-    found = []
-    while (page_number == 0 or len(found) == PAGE_SIZE):
-        page_number += 1
-        found = get_package_tags_page(client, name, page_number)
-        elements += found
-    packages = {}
-    for element in elements:
-        attributes = element['attributes']
-        tag_template = attributes['tag_template']
-        package = packages.setdefault(
-            element['relationships']['package']['name'],
-            {}
-        )
-        package[tag_template] = {
-            'id': element['id'],
-            'for_hotfix': attributes['for_hotfix'],
-            'for_prerelease': attributes['for_prerelease']
-        }
-        if 'variant' in element['relationships']:
-            package[tag_template]['variant'] = (
-                element['relationships']['variant']['name']
-            )
-    return packages
-
-
-def get_cdn_repo(client, name, cdn_repo_data=None):
-    """
-    Get information about a CDN repo in the Errata Tool, and simplify it into
-    a format we can compare with our Ansible parameters.
-
-    :param client: Errata Client
-    :param str name: CDN Repository name
-    :param dict cdn_repo_data: data about this CDN repository (eg. from an
-                               earlier POST response).
-    :returns: dict of information about this CDN repository
-    """
-    if cdn_repo_data is None:
-        # CLOUDWF-316 to get cdn_repos directly by name.
-        response = client.get('api/v1/cdn_repos',
-                              params={'filter[name]': name})
-        response.raise_for_status()
-        json = response.json()
-        results = json['data']
-        if not results:
-            return None
-        if len(results) > 1:
-            raise ValueError('multiple %s cdn_repos found' % name)
-        cdn_repo_data = results[0]
-    cdn_repo = {}
-    cdn_repo['id'] = cdn_repo_data['id']
-    cdn_repo.update(cdn_repo_data['attributes'])
-    cdn_repo['arch'] = cdn_repo_data['relationships']['arch']['name']
-
-    # variants
-    variants = [variant['name'] for variant in
-                cdn_repo_data['relationships']['variants']]
-    cdn_repo['variants'] = variants
-
-    # packages (names only)
-    packages = cdn_repo_data['relationships'].get('packages', [])
-    package_names = [package['name'] for package in packages]
-    cdn_repo['package_names'] = package_names
-    return cdn_repo
-
-
-def cdn_repo_api_data(params):
-    """
-    Transform our Ansible params into JSON data for POST'ing or PUT'ing.
-    to /api/v1/cdn_repo.
-    """
-    cdn_repo = params.copy()
-    # Update the values for ones that the REST API will accept:
-    if 'arch' in cdn_repo:
-        cdn_repo['arch_name'] = cdn_repo.pop('arch')
-    if 'variants' in cdn_repo:
-        cdn_repo['variant_names'] = cdn_repo.pop('variants')
-    data = {'cdn_repo': cdn_repo}
-    return data
-
-
-def create_cdn_repo(client, params):
-    data = cdn_repo_api_data(params)
-    response = client.post('api/v1/cdn_repos', json=data)
-    if response.status_code != 201:
-        raise common_errata_tool.ErrataToolError(response)
-    name = params['name']
-    data = response.json()
-    cdn_repo_data = data['data']
-    return get_cdn_repo(client, name, cdn_repo_data=cdn_repo_data)
-
-
-def edit_cdn_repo(client, cdn_repo_id, differences):
-    # Create a Ansible params-like dict for the api_data() method.
-    params = {}
-    for difference in differences:
-        key, _, new = difference
-        params[key] = new
-    data = cdn_repo_api_data(params)
-    response = client.put('api/v1/cdn_repos/%d' % cdn_repo_id, json=data)
-    if response.status_code != 200:
-        raise common_errata_tool.ErrataToolError(response)
-
-
-def add_package_tag(client, repo_name, package_name, tag_template,
-                    variant, for_hotfix, for_prerelease):
-    """
-    Create a new package tag for this CDN repo.
-
-    :param client: Errata Client
-    :param str repo_name: CDN Repo name
-    :param str package_name: eg. "rhceph-container"
-    :param str tag_template: tag template, eg. "latest" or "{{version}}"
-    :param str variant: Restrict this tag to this variant. If this value is
-                        None, do not set a variant restriction on this tag.
-    :param bool for_hotfix: Indicates it is for hotfix.
-    :param bool for_prerelease: Indicates it is for prerelease.
-    """
-    endpoint = 'api/v1/cdn_repo_package_tags'
-    json_settings = {
-        'cdn_repo_name': repo_name,
-        'package_name': package_name,
-        'tag_template': tag_template,
-    }
-    if variant:
-        json_settings['variant_name'] = variant
-    if for_hotfix:
-        json_settings['for_hotfix'] = True
-    if for_prerelease:
-        json_settings['for_prerelease'] = True
-    json = {'cdn_repo_package_tag': json_settings}
-    response = client.post(endpoint, json=json)
-    if response.status_code != 201:
-        raise common_errata_tool.ErrataToolError(response)
-
-
-def edit_package_tag(client, tag_id, desired_tag):
-    """
-    Edit the settings for a package tag.
-
-    :param client: Errata Client
-    :param int tag_id: ID of the package tag to edit.
-    :param dict desired_tag: dict describing the desired tag. If this dict has
-                             a "variant" key, then we will set variant_name on
-                             the tag. If the dict does not have a "variant"
-                             key, then we will remove the variant for this
-                             tag.
-    """
-    settings = {
-        'for_hotfix': desired_tag.get('for_hotfix', False),
-        'for_prerelease': desired_tag.get('for_prerelease', False)
-    }
-    variant = desired_tag.get('variant')
-    if variant:
-        settings['variant_name'] = variant
-    else:
-        settings['variant_id'] = None
-    json = {'cdn_repo_package_tag': settings}
-    endpoint = 'api/v1/cdn_repo_package_tags/%d' % tag_id
-    response = client.put(endpoint, json=json)
-    if response.status_code != 200:
-        raise common_errata_tool.ErrataToolError(response)
-
-
-def delete_package_tag(client, tag_id):
-    """
-    Delete a tag for this package.
-
-    :param client: Errata Client
-    :param int tag_id: ID number of the tag to delete.
-    """
-    response = client.delete('api/v1/cdn_repo_package_tags/%d' % tag_id)
-    if response.status_code != 204:
-        raise common_errata_tool.ErrataToolError(response)
-
-
-def compare_package_tags(package_name, tag_template, current, desired):
-    """
-    Compare the settings for a tag_template.
-
-    Describe the changes from "current" to "desired".
-    If there are no differences, return an empty list.
-
-    :param str package_name: The package name, eg "rhceph-container"
-    :param str tag_template: The tag_template value, eg "latest".
-    :param dict current: The "current" tag template settings stored in the ET.
-    :param dict desired: The tag template settings that the user wants to
-                         have in the ET.
-    :returns: list of human-readable changes.
-    """
-    variant_changes = compare_package_tags_key(
-        'variant',
-        package_name,
-        tag_template,
-        current,
-        desired
-    )
-    for_hotfix_changes = compare_package_tags_key(
-        'for_hotfix',
-        package_name,
-        tag_template,
-        current,
-        desired,
-        False
-    )
-    for_prerelease_changes = compare_package_tags_key(
-        'for_prerelease',
-        package_name,
-        tag_template,
-        current,
-        desired,
-        False
-    )
-    return variant_changes + for_hotfix_changes + for_prerelease_changes
-
-
-def compare_package_tags_key(key, package_name, tag_template, current,
-                             desired, default=None):
-    """
-    Compare the settings of specific key for a tag_template.
-
-    Describe the changes from "current" to "desired".
-    If there are no differences, return an empty list.
-
-    :param str key: The key of a specific setting
-    :param str package_name: The package name, eg "rhceph-container"
-    :param str tag_template: The tag_template value, eg "latest".
-    :param dict current: The "current" tag template settings stored in the ET.
-    :param dict desired: The tag template settings that the user wants to
-                         have in the ET.
-    :param any default: The default value for the key
-    :returns: list of human-readable changes.
-    """
-    # This is not a generalized dict diff tool, because we only look at one
-    # single key here for now.
-    current_value = current.get(key, default)
-    desired_value = desired.get(key, default)
-    if current_value is not None and desired_value is None:
-        return ['removing "%s" %s from %s "%s" tag template' %
-                (current_value, key, package_name, tag_template)]
-    if current_value is None and desired_value is not None:
-        return ['adding "%s" %s to %s "%s" tag template' %
-                (desired_value, key, package_name, tag_template)]
-    if current_value != desired_value:
-        return ['changing %s "%s" %s from "%s" to "%s"' %
-                (package_name,
-                 tag_template,
-                 key,
-                 current_value,
-                 desired_value)]
-    return []
-
-
-def ensure_package_tags(client, repo_name, package_name, check_mode,
-                        current_tags, desired_tags):
-    """
-    Ensure all tags are set for one package in this CDN repo.
 
-    This method makes the "current_tags" match "desired_tags", and returns a
-    human-readable list of the changes performed.
-
-    :param client: Errata Client
-    :param str repo_name: CDN Repo name
-    :param str package_name: The package name, eg "rhceph-container"
-    :param bool check_mode: describe what would happen, but don't do it.
-    :param dict current_tags: Each key is a tag template, and each value is
-                              a dict (the settings for those tag templates).
-                              Each value dict has an "id" key that provides
-                              the current ID number of this tag template,
-                              a "for_hotfix" key and a "for_prerelease" key.
-                              They also may have a "variant" key.
-    :param dict desired_tags: Each key is a tag template, and each value is
-                              a dict (the settings for those tag templates).
-                              The value dicts may have a "variant" key if the
-                              user wants to restrict thist tag to a single
-                              variant, a "for_hotfix" key to indicate it is
-                              for hotfix, or a "for_prerelease" key
-                              to indicate it is for prerelease.
-    :returns: a (possibly-empty) list of human-readable changes.
-    """
-    changes = []
-    # Find tags to remove.
-    tag_templates_to_delete = set(current_tags) - set(desired_tags)
-    for tag_template in tag_templates_to_delete:
-        change = 'removing "%s" tag template from "%s"' \
-                 % (tag_template, package_name)
-        changes.append(change)
-        if check_mode:
-            continue
-        id_to_delete = current_tags[tag_template]['id']
-        delete_package_tag(client, id_to_delete)
-
-    # Find tags to modify (ie change the variant).
-    tag_templates_to_modify = set(current_tags) & set(desired_tags)
-    for tag_template in tag_templates_to_modify:
-        current_tag = current_tags[tag_template].copy()
-        desired_tag = desired_tags[tag_template].copy()
-        tag_template_id = current_tag.pop('id')
-        differences = compare_package_tags(package_name,
-                                           tag_template,
-                                           current_tag,
-                                           desired_tag)
-        if differences:
-            changes.extend(differences)
-            if check_mode:
-                continue
-            edit_package_tag(client, tag_template_id, desired_tag)
-
-    # Find tags to add.
-    tag_templates_to_add = set(desired_tags) - set(current_tags)
-    for tag_template in tag_templates_to_add:
-        changes.append('adding "%s" tag template to "%s"' %
-                       (tag_template, package_name))
-        if check_mode:
-            continue
-        tag = desired_tags[tag_template]
-        variant = tag.get('variant')
-        for_hotfix = tag.get('for_hotfix', False)
-        for_prerelease = tag.get('for_prerelease', False)
-        add_package_tag(
-            client,
-            repo_name,
-            package_name,
-            tag_template,
-            variant,
-            for_hotfix,
-            for_prerelease
-        )
-    return changes
-
-
-def ensure_packages_tags(client, name, check_mode, packages):
-    """
-    Create:
-    POST /api/v1/cdn_repo_package_tags POST
-    DELETE /api/v1/cdn_repo_package_tags/{id} DELETE
-    GET /api/v1/cdn_repo_package_tags/{id} GET
-    PUT /api/v1/cdn_repo_package_tags/{id} PUT
-
-    :param client: Errata Client
-    :param str name: CDN Repo name
-    :param bool check_mode: describe what would happen, but don't do it.
-    :param dict packages: Normalized Ansible "packages" paramater (see
-                          normalize_packages())
-    :returns: a (possibly-empty) list of human-readable changes.
-    """
-    changes = []
-    current = get_package_tags(client, name)
-
-    for package_name in packages:
-        current_tags = current.get(package_name, [])
-        desired_tags = packages[package_name]
-
-        package_changes = ensure_package_tags(client,
-                                              name,
-                                              package_name,
-                                              check_mode,
-                                              current_tags,
-                                              desired_tags)
-
-        changes.extend(package_changes)
-
-    # The caller needs to know the list of changes and the
-    # current state in order to support diff mode
-    return (changes, current)
-
-
-# If the variant, for_hotfix or for_prerelease key is present
-# in tag_info then the list item is a dict with the keys,
-# otherwise it's just a string with the tag name.
-# The end result should match the format of the module
-# params, so refer to the examples in the module docs above.
-def tag_name_or_dict(tag_name, tag_info):
-    tag_dict = {}
-
-    variant = tag_info.get('variant')
-    if variant:
-        tag_dict['variant'] = variant
-    for_hotfix = tag_info.get('for_hotfix', False)
-    if for_hotfix:
-        tag_dict['for_hotfix'] = for_hotfix
-    for_prerelease = tag_info.get('for_prerelease', False)
-    if for_prerelease:
-        tag_dict['for_prerelease'] = for_prerelease
-
-    if tag_dict:
-        return {tag_name: tag_dict}
-    else:
-        return tag_name
-
-
-# The normalized desired packages dict and the current packages
-# dict are not quite the same format, but this works for both of them
-def package_list_for_diff(all_packages):
-    return {
-        package_name: [
-            tag_name_or_dict(tag_name, tag_info)
-            for (tag_name, tag_info)
-            # Without sorting the order is different in py2 vs py3 causing
-            # a test failure in py27. So sort here to make sure the tests
-            # pass. There's probably no need to sort it otherwise.
-            in sorted(package_tags.items(), key=lambda kv: kv[0])
-        ]
-        for (package_name, package_tags)
-        in all_packages.items()
-    }
-
-
-# Some extra work is needed here to handle the packages and tags
-def prepare_diff_data(before, after, before_packages, after_packages):
-    # Make sure we don't modify the param
-    after = deepcopy(after)
-    # Add a packages key with the massaged packages info
-    after['packages'] = package_list_for_diff(after_packages)
-    # Remove the package_names key since it's redundant
-    del after['package_names']
-
-    # Same thing for before if it's present
-    if before is not None:
-        before = deepcopy(before)
-        before['packages'] = package_list_for_diff(before_packages)
-        del before['package_names']
-
-    # Now create the diff as per usual
-    return common_errata_tool.task_diff_data(
-        before=before,
-        after=after,
-        item_name=after['name'],
-        item_type='cdn repo',
-        keys_to_copy=[
-            # This is derived from the product version, and hence
-            # readonly, but let's show it anyway
-            'quay_enabled',
-
-            # This is readonly now but probably won't be in future
-            # when docker-pulp no longer exists
-            'external_name',
-        ],
-    )
-
-
-def ensure_cdn_repo(client, check_mode, params):
-    """
-    Ensure that this CDN repo exists in the Errata Tool.
-
-    :param client: Errata Client
-    :param bool check_mode: describe what would happen, but don't do it.
-    :param dict params: Parameters from ansible
-    """
-    result = {'changed': False, 'stdout_lines': []}
-    params = {param: val for param, val in params.items() if val is not None}
-    name = params['name']
-
-    # Special handling for packages parameter:
-    params = params.copy()
-    packages = params.pop('packages')
-    package_names = list(packages.keys())
-    params['package_names'] = package_names
-    packages = normalize_packages(packages)
-
-    # main cdn_repo
-    cdn_repo = get_cdn_repo(client, name)
-    if not cdn_repo:
-        result['changed'] = True
-        result['stdout_lines'] = ['created %s' % name]
-        result['diff'] = prepare_diff_data(cdn_repo, params, {}, packages)
-        if check_mode:
-            return result
-        cdn_repo = create_cdn_repo(client, params)
-
-    differences = common_errata_tool.diff_settings(cdn_repo, params)
-    if differences:
-        result['changed'] = True
-        changes = common_errata_tool.describe_changes(differences)
-        result['stdout_lines'].extend(changes)
-        if not check_mode:
-            # CLOUDWF-316 to access cdn_repos directly by name.
-            edit_cdn_repo(client, cdn_repo['id'], differences)
-
-    # packages (from /api/v1/cdn_repo_package_tags):
-    package_tag_changes, current_packages = \
-        ensure_packages_tags(client, name, check_mode, packages)
-
-    if package_tag_changes:
-        result['changed'] = True
-        result['stdout_lines'].extend(package_tag_changes)
-
-    # (Don't redo the diff if the repo was just created)
-    if result['changed'] and 'diff' not in result:
-        result['diff'] = prepare_diff_data(cdn_repo, params,
-                                           current_packages, packages)
-
-    return result
+  - name: Add one tag to one package in a large shared repo
+    errata_tool_cdn_repo:
+      name: fooproduct/foo-1-rhel8
+      release_type: Primary
+      content_type: Docker
+      variants:
+      - 8Base-FOO-1.0-Tools
+      - 8Base-FOO-1.1-Tools
+      packages_mode: merge
+      packages:
+        foo-container:
+        - latest
+'''
 
 
 def run_module():
-    module_args = dict(
-        name=dict(required=True),
-        external_name=dict(required=False),
-        release_type=dict(choices=CDN_RELEASE_TYPES, required=True),
-        content_type=dict(choices=CDN_CONTENT_TYPES, required=True),
-        arch=dict(),
-        use_for_tps=dict(type='bool', default=False),
-        variants=dict(type='list', required=True),
-        packages=dict(type='dict', default={}),
-    )
-    module = AnsibleModule(
-        argument_spec=module_args,
-        supports_check_mode=True
-    )
-
-    check_mode = module.check_mode
+    module_args = argument_spec()
+    with common_errata_tool.span('parse arguments'):
+        module = AnsibleModule(
+            argument_spec=module_args,
+            supports_check_mode=True
+        )
     params = module.params
 
-    # The arch default value depends on content_type.
-    # The reason we hard-code this here is to match the ET's behavior so that
-    # we preserve idempotency on subsequent runs.
-    if params['arch'] is None:
-        if params['content_type'] == 'Docker':
-            params['arch'] = 'multi'
-        else:
-            params['arch'] = 'x86_64'
+    try:
+        prepare_params(params)
+    except ValueError as e:
+        module.fail_json(msg=str(e))
+
+    client, check_mode = common_errata_tool.start_module(
+        module, 'errata_tool_cdn_repo', params['name'], params)
 
-    # The ET server does not stop users from modifying Docker repos in ways
-    # that are invalid and impossible to fix with the web UI (CLOUDWF-271).
-    # We will guard that here for now.
-    if params['content_type'] == 'Docker':
-        if params['arch'] != 'multi':
-            module.fail_json(msg='arch must be "multi" for Docker repos')
-        if params['use_for_tps']:
-            module.fail_json(msg='do not set "use_for_tps" for Docker repos')
+    package_tags_cache = None
+    cache_path = os.getenv('ERRATA_TOOL_PACKAGE_TAGS_CACHE')
+    if cache_path:
+        package_tags_cache = PackageTagsCache(cache_path)
 
-    client = common_errata_tool.Client()
+    result = ensure_cdn_repo(client, check_mode, params,
+                             package_tags_cache=package_tags_cache,
+                             diff_mode=module._diff)
 
-    result = ensure_cdn_repo(client, check_mode, params)
+    if client.fingerprints:
+        client.fingerprints.update(check_mode, result)
 
     module.exit_json(**result)
 
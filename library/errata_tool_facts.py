@@ -0,0 +1,231 @@
+from ansible.module_utils.basic import AnsibleModule
+from ansible.module_utils import common_errata_tool
+from ansible.module_utils import common_errata_tool_cdn_repo
+from ansible.module_utils import common_errata_tool_product
+from ansible.module_utils import common_errata_tool_product_version
+
+
+ANSIBLE_METADATA = {
+    'metadata_version': '1.0',
+    'status': ['preview'],
+    'supported_by': 'community'
+}
+
+
+DOCUMENTATION = '''
+---
+module: errata_tool_facts
+
+short_description: Read a whole product's configuration from the Errata Tool
+description:
+   - Read a product, its product versions, variants, CDN repos (with their
+     package tags) and releases from Red Hat's Errata Tool in one task.
+   - Each resource is in the same format that the other errata_tool_*
+     modules use to compare the ET's data with your Ansible parameters.
+   - This module returns the data as the "errata_tool" Ansible fact. If you
+     read several products, use "register" to keep each product's data.
+options:
+   product:
+     description:
+       - "Product short name. Example: RHCEPH"
+     required: true
+   package_tags:
+     description:
+       - Read the package tags for each CDN repo. This requires at least one
+         request for each CDN repo, so set this to false if you do not need
+         the tags.
+     choices: [true, false]
+     default: true
+requirements:
+  - "python >= 2.7"
+  - "lxml"
+  - "requests-gssapi"
+'''
+
+EXAMPLES = '''
+- name: read the RHCEPH configuration
+  errata_tool_facts:
+    product: RHCEPH
+
+- name: show the RHCEPH-4.0-RHEL-8 variants
+  debug:
+    msg: "{{ errata_tool.variants | dict2items
+             | selectattr('value.product_version', 'eq', 'RHCEPH-4.0-RHEL-8')
+             | map(attribute='key') | list }}"
+'''
+
+RETURN = '''
+ansible_facts:
+  description: The "errata_tool" fact.
+  returned: success
+  type: complex
+  contains:
+    errata_tool:
+      description: >
+        Dict with "product", "product_versions", "variants", "cdn_repos" and
+        "releases" keys. Except for "product", each value is a dict keyed by
+        name. Each CDN repo has a "packages" dict of package tags.
+      type: dict
+'''
+
+
+class ProductNotFoundError(Exception):
+    """ This product does not exist """
+    pass
+
+
+def get_product(client, product):
+    """
+    :returns: the product, in the common_errata_tool_product.get_product()
+              format.
+    :raises: ProductNotFoundError if the product does not exist.
+    """
+    found = common_errata_tool_product.get_product(client, product)
+    if found is None:
+        raise ProductNotFoundError(product)
+    return found
+
+
+def get_variants(client, product):
+    # The variants API has no filter for products, so we read every variant.
+    # Other products' variants may have a different shape (for example, old
+    # variants have no push_targets), so we check the raw product before we
+    # normalize each variant.
+    elements = common_errata_tool.get_all_pages(client, 'api/v1/variants')
+    variants = {}
+    for element in elements:
+        relationships = element['attributes']['relationships']
+        if relationships['product']['short_name'] != product:
+            continue
+        variant = common_errata_tool.normalize_variant(element)
+        variants[variant['name']] = variant
+    return variants
+
+
+def filter_cdn_repos(elements, variants):
+    """
+    Find the CDN repos for any of these variants.
+
+    The CDN repos API has no filter for products or variants, so we read
+    every CDN repo and filter them here.
+
+    :param list elements: CDN repo data from the ET's API
+    :param dict variants: our product's variants, keyed by name.
+    """
+    cdn_repos = {}
+    for element in elements:
+        cdn_repo = common_errata_tool.normalize_cdn_repo(element)
+        if any(variant in variants for variant in cdn_repo['variants']):
+            cdn_repos[cdn_repo['name']] = cdn_repo
+    return cdn_repos
+
+
+def filter_releases(elements, product, product_versions):
+    """
+    Find the releases for this product.
+
+    Async releases may not have a product, so we also find any release that
+    has one of our product versions.
+
+    :param list elements: release data from the ET's API
+    :param str product: Product short name
+    :param dict product_versions: our product's product versions, keyed by
+                                  name.
+    """
+    releases = {}
+    for element in elements:
+        release = common_errata_tool.normalize_release(element)
+        if release['product'] == product or \
+           any(pv in product_versions for pv in release['product_versions']):
+            releases[release['name']] = release
+    return releases
+
+
+def add_package_tags(client, cdn_repos):
+    """
+    Add a "packages" key to each CDN repo. We read the tags with
+    errata_tool_cdn_repo's get_package_tags(), and we return each tag as a
+    dict (see PackageTag.as_dict()).
+    """
+    def get_packages(name):
+        packages = common_errata_tool_cdn_repo.get_package_tags(client, name)
+        return {package_name: {tag_template: tag.as_dict()
+                               for tag_template, tag in tags.items()}
+                for package_name, tags in packages.items()}
+
+    names = sorted(cdn_repos)
+    results = common_errata_tool.parallel_map(get_packages, names,
+                                              client.concurrency)
+    for name, packages in zip(names, results):
+        cdn_repos[name]['packages'] = packages
+
+
+@common_errata_tool.traced('read')
+def get_product_tree(client, product, package_tags=True):
+    """
+    Read the configuration for an entire product.
+
+    We read the product first, so we fail quickly if it does not exist.
+    Then we read each list endpoint concurrently, and then we read the
+    package tags for each of the product's CDN repos concurrently.
+
+    :param client: Errata Client
+    :param str product: Product short name
+    :param bool package_tags: read the package tags for each CDN repo.
+    :returns: dict (see RETURN)
+    :raises: ProductNotFoundError if the product does not exist.
+    """
+    tree = {'product': get_product(client, product)}
+    fetchers = [
+        lambda: common_errata_tool_product_version.prefetch_product_versions(
+            client, product, False),
+        lambda: get_variants(client, product),
+        lambda: common_errata_tool.get_all_pages(client, 'api/v1/cdn_repos'),
+        lambda: common_errata_tool.get_all_pages(client, 'api/v1/releases'),
+    ]
+    results = common_errata_tool.parallel_map(lambda fetch: fetch(),
+                                              fetchers,
+                                              client.concurrency)
+    tree['product_versions'] = results[0]
+    tree['variants'] = results[1]
+    # These depend on the product versions and variants we just found:
+    tree['cdn_repos'] = filter_cdn_repos(results[2], tree['variants'])
+    tree['releases'] = filter_releases(results[3], product,
+                                       tree['product_versions'])
+    if package_tags:
+        add_package_tags(client, tree['cdn_repos'])
+    return tree
+
+
+def run_module():
+    module_args = dict(
+        product=dict(required=True),
+        package_tags=dict(type='bool', default=True),
+    )
+    with common_errata_tool.span('parse arguments'):
+        module = AnsibleModule(
+            argument_spec=module_args,
+            supports_check_mode=True
+        )
+    params = module.params
+
+    # We only read from the ET, so we have no writes to plan.
+    client, _ = common_errata_tool.start_module(
+        module, 'errata_tool_facts', params['product'], plan=False)
+
+    try:
+        tree = get_product_tree(client, params['product'],
+                                params['package_tags'])
+    except ProductNotFoundError as e:
+        msg = 'product %s not found' % e
+        module.fail_json(msg=msg, changed=False, rc=1)
+
+    module.exit_json(changed=False, ansible_facts={'errata_tool': tree})
+
+
+def main():
+    run_module()
+
+
+if __name__ == '__main__':
+    main()
@@ -1,5 +1,10 @@
 from ansible.module_utils.basic import AnsibleModule
 from ansible.module_utils import common_errata_tool
+from ansible.module_utils.common_errata_tool_product_version import (
+    argument_spec,
+    ensure_product_version,
+    prepare_params,
+)
 
 
 ANSIBLE_METADATA = {
@@ -146,197 +151,28 @@ requirements:
   - "requests-gssapi"
 '''
 
-# The REST API requires that clients know the product name before querying the
-# product version, so we have pass the "product" variable through to the
-# get/create/edit methods. SPMM-6319 tracks improving that so that we could
-# get/create/edit without the product name.
-
-
-def get_product_version(client, product, name, check_mode):
-    # We cannot query directly by name yet if the name has a "." character.
-    # See CLOUDWF-3.
-    # url = 'api/v1/products/%s/product_versions/%s' % (product, name)
-    # ... this would also change the returned data structure slightly (the
-    # results would not be in a list.)
-    url = 'api/v1/products/%s/product_versions/' % product
-    r = client.get(url, params={'filter[name]': name})
-    # If the product does not exist but we're running in check mode it could
-    # be that the product is going to be setup in the subsequent run mode
-    # run. In this case the query will return 404 but that would be expected
-    # and this task should not fail as a result.
-    if r.status_code == 404 and check_mode:
-        return None
-    # If the product does not exist yet, we'll get a 404 error for this GET
-    # request. It's nice that raise_for_status() gives us the full URL that we
-    # tried because then users can verify they are using the proper ET
-    # environment. Maybe we could log a more specific error message for that
-    # condition so that it's easier for the user to understand the problem,
-    # like "does https://errata.devel.redhat.com/products/RHCEPH exist yet?"
-    r.raise_for_status()
-    data = r.json()
-    product_versions = data['data']
-    if not product_versions:
-        return None
-    if len(product_versions) > 1:
-        raise ValueError('multiple PVs named %s' % name)
-    # Reformat the data into something we can compare with Ansible params
-    data = product_versions[0]
-    product_version = data['attributes']
-    product_version['brew_tags'] = data['brew_tags']
-    rhel_release = data['relationships']['rhel_release']['name']
-    product_version['rhel_release_name'] = rhel_release
-    product_version['sig_key_name'] = data['relationships']['sig_key']['name']
-    product_version['container_sig_key_name'] = \
-        data['relationships']['container_sig_key']['name']
-    product_version['ima_sig_key_name'] = \
-        data['relationships'].get('ima_sig_key', {'name': None})['name']
-    # push_targets
-    push_targets = [t['name'] for t in data['relationships']['push_targets']]
-    product_version['push_targets'] = push_targets
-    # Add in our product name, to simplify diff_settings().
-    product_version['product'] = product
-    # Add in our product_version id, to support edit_product_version()
-    product_version['id'] = data['id']
-    return product_version
-
-
-def handle_form_errors(response):
-    # If there are incorrect or missing fields, we will receive a HTTP 200
-    # with a list of the wrong fields, or just an HTTP 500 error.
-    if response.status_code == 500:
-        raise RuntimeError(
-            'The request to %s had a status code of %d and failed with: %s'
-            % (response.url, response.status_code, response.text)
-        )
-    if 'errorExplanation' in response.text:
-        raise RuntimeError(response.text)
-    response.raise_for_status()
-
-
-def create_product_version(client, product, params):
-    # TODO: test this without casting the bools to ints. Since we're passing
-    # JSON and that has real "true"/"false" values, it should be ok.
-    pv = {}
-    pv['name'] = params['name']
-    pv['description'] = params['description']
-    pv['allow_rhn_debuginfo'] = int(params['allow_rhn_debuginfo'])
-    pv['default_brew_tag'] = params['default_brew_tag']
-    pv['enabled'] = int(params['enabled'])
-    pv['is_oval_product'] = int(params['is_oval_product'])
-    pv['is_rhel_addon'] = int(params['is_rhel_addon'])
-    pv['is_server_only'] = int(params['is_server_only'])
-    pv['brew_tags'] = params['brew_tags']
-    pv['rhel_release_name'] = params['rhel_release_name']
-    pv['sig_key_name'] = params['sig_key_name']
-    pv['container_sig_key_name'] = params['container_sig_key_name']
-    if 'ima_sig_key_name' in params:
-        pv['ima_sig_key_name'] = params['ima_sig_key_name']
-    pv['allow_buildroot_push'] = params['allow_buildroot_push']
-    pv['push_targets'] = params['push_targets']
-    data = {'product_version': pv}
-    endpoint = 'api/v1/products/%s/product_versions' % product
-    response = client.post(endpoint, json=data)
-    if response.status_code != 201:
-        raise common_errata_tool.ErrataToolError(response)
-
-
-def edit_product_version(client, product_version, differences):
-    """
-    Edit an existing product.
-
-    :param client: Errata Client
-    :param dict product_version: Product Version to change
-    :param list differences: Settings to change for this Product Version. This
-                             is a list of three-element tuples from
-                             diff_settings().
-    """
-    pv = {}
-    for difference in differences:
-        key, _, new = difference
-        pv[key] = new
-    if not pv:
-        return
-    data = {'product_version': pv}
-    pv_id = product_version['id']
-    product = product_version['product']
-    endpoint = 'api/v1/products/%s/product_versions/%d' % (product, pv_id)
-    response = client.put(endpoint, json=data)
-    if response.status_code != 200:
-        raise common_errata_tool.ErrataToolError(response)
-
-
-def prepare_diff_data(before, after):
-    return common_errata_tool.task_diff_data(
-        before=before,
-        after=after,
-        item_name=after['name'],
-        item_type='product version',
-    )
-
-
-def ensure_product_version(client, params, check_mode):
-    result = {'changed': False, 'stdout_lines': []}
-    params = {param: val for param, val in params.items() if val is not None}
-    product = params['product']
-    name = params['name']
-    product_version = get_product_version(client, product, name, check_mode)
-    if not product_version:
-        result['changed'] = True
-        result['stdout_lines'] = ['created %s product version' % name]
-        result['diff'] = prepare_diff_data(product_version, params)
-        if not check_mode:
-            create_product_version(client, product, params)
-        return result
-    differences = common_errata_tool.diff_settings(product_version, params)
-    if differences:
-        result['changed'] = True
-        changes = common_errata_tool.describe_changes(differences)
-        result['stdout_lines'].extend(changes)
-        result['diff'] = prepare_diff_data(product_version, params)
-        if not check_mode:
-            edit_product_version(client, product_version, differences)
-    return result
-
 
 def run_module():
-    module_args = dict(
-        product=dict(required=True),
-        name=dict(required=True),
-        description=dict(required=True),
-        rhel_release_name=dict(required=True),
-        sig_key_name=dict(default='redhatrelease2'),
-        container_sig_key_name=dict(default='redhatrelease2'),
-        ima_sig_key_name=dict(),
-        default_brew_tag=dict(required=True),
-        is_server_only=dict(type='bool', required=True),
-        enabled=dict(type='bool', default=True),
-        allow_rhn_debuginfo=dict(type='bool', required=True),
-        allow_buildroot_push=dict(type='bool', required=True),
-        is_oval_product=dict(type='bool', required=True),
-        is_rhel_addon=dict(type='bool', required=True),
-        push_targets=dict(type='list', required=True),
-        brew_tags=dict(type='list', required=True),
-        use_quay_for_containers=dict(type='bool'),
-        use_quay_for_containers_stage=dict(type='bool'),
-        suppress_push_request_jira=dict(type='bool'),
-        allow_unreleased_rpms=dict(type='bool')
-    )
-    module = AnsibleModule(
-        argument_spec=module_args,
-        supports_check_mode=True
-    )
-
-    check_mode = module.check_mode
+    module_args = argument_spec()
+    with common_errata_tool.span('parse arguments'):
+        module = AnsibleModule(
+            argument_spec=module_args,
+            supports_check_mode=True
+        )
+    identity = '%s/%s' % (module.params['product'],
+                          module.params['name'])
     params = module.params
 
-    client = common_errata_tool.Client()
+    prepare_params(params)
+
+    client, check_mode = common_errata_tool.start_module(
+        module, 'errata_tool_product_version', identity, params)
 
-    # 'use_quay_for_containers' and 'use_quay_for_containers_stage' are
-    # deprecated.
-    params.pop('use_quay_for_containers')
-    params.pop('use_quay_for_containers_stage')
+    result = ensure_product_version(client, params, check_mode,
+                                    diff_mode=module._diff)
 
-    result = ensure_product_version(client, params, check_mode)
+    if client.fingerprints:
+        client.fingerprints.update(check_mode, result)
 
     module.exit_json(**result)
 
@@ -0,0 +1,181 @@
+from ansible.module_utils.basic import AnsibleModule
+from ansible.module_utils import common_errata_tool
+from ansible.module_utils import common_errata_tool_product_version
+
+
+ANSIBLE_METADATA = {
+    'metadata_version': '1.0',
+    'status': ['preview'],
+    'supported_by': 'community'
+}
+
+
+DOCUMENTATION = '''
+---
+module: errata_tool_product_versions
+
+short_description: Create and manage many product versions in the Errata Tool
+description:
+   - Create and update many product versions within Red Hat's Errata Tool in
+     one task.
+   - Each product version takes the same options as the
+     errata_tool_product_version module.
+   - This module reads each product's product versions from the ET in one
+     paginated sweep, compares them with your product versions, and sends up
+     to ERRATA_TOOL_CONCURRENCY creates and edits in parallel.
+options:
+   product_versions:
+     description:
+       - List of product versions. See the errata_tool_product_version
+         module's options.
+     required: true
+requirements:
+  - "python >= 2.7"
+  - "lxml"
+  - "requests-gssapi"
+'''
+
+EXAMPLES = '''
+- name: ensure the RHCEPH 5 product versions
+  errata_tool_product_versions:
+    product_versions:
+    - product: RHCEPH
+      name: RHCEPH-5.0-RHEL-8
+      description: Red Hat Ceph Storage 5.0
+      rhel_release_name: RHEL-8
+      default_brew_tag: ceph-5.0-rhel-8-candidate
+      is_server_only: false
+      allow_rhn_debuginfo: false
+      allow_buildroot_push: false
+      is_oval_product: true
+      is_rhel_addon: false
+      push_targets: [cdn, cdn_stage]
+      brew_tags: [ceph-5.0-rhel-8-candidate]
+    - product: RHCEPH
+      name: RHCEPH-5.0-RHEL-9
+      description: Red Hat Ceph Storage 5.0
+      rhel_release_name: RHEL-9
+      default_brew_tag: ceph-5.0-rhel-9-candidate
+      is_server_only: false
+      allow_rhn_debuginfo: false
+      allow_buildroot_push: false
+      is_oval_product: true
+      is_rhel_addon: false
+      push_targets: [cdn, cdn_stage]
+      brew_tags: [ceph-5.0-rhel-9-candidate]
+'''
+
+RETURN = '''
+summary:
+  description: >
+    The number of product versions that we created or edited, left
+    unchanged, or could not ensure.
+  returned: always
+  type: dict
+  sample: {"changed": 1, "unchanged": 11, "failed": 0}
+stdout_lines:
+  description: >
+    The changes for each product version that we created or edited,
+    prefixed with its name. To keep the result small, this does not include
+    unchanged product versions. If any product version fails, "msg" lists
+    the error for each failed product version.
+  returned: always
+  type: list
+  sample:
+  - "RHCEPH-5.0-RHEL-9: created RHCEPH-5.0-RHEL-9 product version"
+'''
+
+
+@common_errata_tool.traced('ensure')
+def ensure_product_versions(client, product_versions, check_mode,
+                            diff_mode=True):
+    """
+    Ensure many product versions, in parallel.
+
+    :param client: Errata Client
+    :param list product_versions: product version params dicts
+    :param bool check_mode: describe what would happen, but don't do it.
+    :param bool diff_mode: return a "diff" list for the changed product
+                           versions.
+    :returns: a result dict. If any product version fails, set "failed" and
+              "msg".
+    """
+    names = [params['name'] for params in product_versions]
+    common_errata_tool.check_unique_names('product version', names)
+    # When we plan the writes (see ERRATA_TOOL_PLAN), the plan may create the
+    # products before these product versions.
+    planning = client.plan is not None
+    # If we cannot read a product's list (for example, the product does not
+    # exist), each of its product versions fails with that error.
+    existing = {}
+    for params in product_versions:
+        product = params['product']
+        if product in existing:
+            continue
+        try:
+            existing[product] = \
+                common_errata_tool_product_version.prefetch_product_versions(
+                    client, product, check_mode or planning)
+        except Exception as e:
+            existing[product] = e
+
+    def ensure(params):
+        found = existing[params['product']]
+        if isinstance(found, Exception):
+            raise found
+        return common_errata_tool_product_version.ensure_product_version(
+            client, params, check_mode, diff_mode=diff_mode,
+            product_versions=found)
+
+    return common_errata_tool.ensure_many(client, 'product versions', names,
+                                          ensure, product_versions)
+
+
+def argument_spec():
+    """
+    :returns: dict of this module's Ansible argument spec.
+    """
+    options = common_errata_tool_product_version.argument_spec()
+    return dict(
+        product_versions=dict(type='list', elements='dict', required=True,
+                              options=options),
+    )
+
+
+def run_module():
+    module_args = argument_spec()
+    with common_errata_tool.span('parse arguments'):
+        module = AnsibleModule(
+            argument_spec=module_args,
+            supports_check_mode=True
+        )
+    identity = ','.join(sorted(set(
+        product_version['product']
+        for product_version in module.params['product_versions'])))
+
+    params = module.params
+
+    for product_version in params['product_versions']:
+        common_errata_tool_product_version.prepare_params(product_version)
+
+    client, check_mode = common_errata_tool.start_module(
+        module, 'errata_tool_product_versions', identity)
+
+    try:
+        result = ensure_product_versions(client, params['product_versions'],
+                                         check_mode, diff_mode=module._diff)
+    except ValueError as e:
+        module.fail_json(msg=str(e), changed=False, rc=1)
+
+    if result.pop('failed', False):
+        module.fail_json(**result)
+
+    module.exit_json(**result)
+
+
+def main():
+    run_module()
+
+
+if __name__ == '__main__':
+    main()
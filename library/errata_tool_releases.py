@@ -0,0 +1,174 @@
+from ansible.module_utils.basic import AnsibleModule
+from ansible.module_utils import common_errata_tool
+from ansible.module_utils import common_errata_tool_release
+from ansible.module_utils.parsing.convert_bool import boolean
+import os
+
+
+ANSIBLE_METADATA = {
+    'metadata_version': '1.0',
+    'status': ['preview'],
+    'supported_by': 'community'
+}
+
+
+DOCUMENTATION = '''
+---
+module: errata_tool_releases
+
+short_description: Create and manage many releases in the Errata Tool
+description:
+   - Create and update many releases within Red Hat's Errata Tool in one
+     task.
+   - Each release takes the same options as the errata_tool_release module.
+   - This module searches the ET for each of your releases in parallel, or
+     for 20 or more releases, reads every release in one paginated sweep. It
+     compares them with your releases, and sends up to
+     ERRATA_TOOL_CONCURRENCY creates and edits in parallel.
+   - The releases API requires ID numbers for products, product versions,
+     program managers, and workflow rule sets. This module looks up each
+     distinct name only once for all the releases.
+options:
+   releases:
+     description:
+       - List of releases. See the errata_tool_release module's options.
+     required: true
+requirements:
+  - "python >= 2.7"
+  - "lxml"
+  - "requests-gssapi"
+'''
+
+EXAMPLES = '''
+- name: ensure the RHCEPH 5 releases
+  errata_tool_releases:
+    releases:
+    - product: RHCEPH
+      name: RHCEPH-5.0
+      type: QuarterlyUpdate
+      description: Red Hat Ceph Storage 5.0
+      product_versions: [RHCEPH-5.0-RHEL-8]
+      program_manager: coolmanager@redhat.com
+      blocker_flags: [ceph-5.0]
+    - product: RHCEPH
+      name: RHCEPH-5.0.z1
+      type: Zstream
+      description: Red Hat Ceph Storage 5.0 z1
+      product_versions: [RHCEPH-5.0-RHEL-8]
+      program_manager: coolmanager@redhat.com
+      blocker_flags: [ceph-5.0]
+'''
+
+RETURN = '''
+summary:
+  description: >
+    The number of releases that we created or edited, left unchanged, or
+    could not ensure.
+  returned: always
+  type: dict
+  sample: {"changed": 2, "unchanged": 48, "failed": 0}
+stdout_lines:
+  description: >
+    The changes for each release that we created or edited, prefixed with
+    its name. To keep the result small, this does not include unchanged
+    releases. If any release fails, "msg" lists the error for each failed
+    release.
+  returned: always
+  type: list
+  sample:
+  - "RHCEPH-5.0: created RHCEPH-5.0"
+'''
+
+
+@common_errata_tool.traced('ensure')
+def ensure_releases(client, releases, check_mode, diff_mode=True,
+                    check_users=False):
+    """
+    Ensure many releases, in parallel.
+
+    :param client: Errata Client
+    :param list releases: release params dicts
+    :param bool check_mode: describe what would happen, but don't do it.
+    :param bool diff_mode: return a "diff" list for the changed releases.
+    :param bool check_users: fail each changed release if its
+                             program_manager does not exist or is not
+                             enabled (see ANSIBLE_STRICT_USER_CHECK_MODE).
+    :returns: a result dict. If any release fails, set "failed" and "msg".
+    """
+    names = [params['name'] for params in releases]
+    common_errata_tool.check_unique_names('release', names)
+    existing = common_errata_tool_release.prefetch_releases(client, names)
+    ids = common_errata_tool_release.IdResolver(client)
+
+    def ensure(params):
+        try:
+            result = common_errata_tool_release.ensure_release(
+                client, params, check_mode, diff_mode=diff_mode,
+                releases=existing, ids=ids)
+            program_manager = params['program_manager']
+            if check_users and result['changed'] and program_manager:
+                # See errata_tool_release's ANSIBLE_STRICT_USER_CHECK_MODE.
+                user = ids.program_manager(program_manager)
+                if not user.get('enabled'):
+                    msg = 'program_manager %s is not enabled' % \
+                        program_manager
+                    return {'changed': False, 'stdout_lines': [],
+                            'failed': True, 'msg': msg}
+            return result
+        except common_errata_tool_release.ProgramManagerNotFoundError as e:
+            msg = 'program_manager %s account not found' % e
+            return {'changed': False, 'stdout_lines': [], 'failed': True,
+                    'msg': msg}
+
+    return common_errata_tool.ensure_many(client, 'releases', names, ensure,
+                                          releases)
+
+
+def argument_spec():
+    """
+    :returns: dict of this module's Ansible argument spec.
+    """
+    return dict(
+        releases=dict(type='list', elements='dict', required=True,
+                      options=common_errata_tool_release.argument_spec()),
+    )
+
+
+def run_module():
+    module_args = argument_spec()
+    with common_errata_tool.span('parse arguments'):
+        module = AnsibleModule(
+            argument_spec=module_args,
+            supports_check_mode=True
+        )
+    identity = ','.join(sorted(set(
+        release['product'] or release['name']
+        for release in module.params['releases'])))
+
+    params = module.params
+
+    client, check_mode = common_errata_tool.start_module(
+        module, 'errata_tool_releases', identity)
+
+    check_users = module.check_mode and \
+        boolean(os.getenv('ANSIBLE_STRICT_USER_CHECK_MODE', False))
+
+    try:
+        result = ensure_releases(client, params['releases'], check_mode,
+                                 diff_mode=module._diff,
+                                 check_users=check_users)
+    except ValueError as e:
+        module.fail_json(msg=str(e), changed=False, rc=1)
+
+    if result.pop('failed', False):
+        module.fail_json(**result)
+
+    module.exit_json(**result)
+
+
+def main():
+    run_module()
+
+
+if __name__ == '__main__':
+    main()
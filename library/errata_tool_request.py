@@ -1,5 +1,7 @@
 from ansible.module_utils.basic import AnsibleModule
-from ansible.module_utils.common_errata_tool import Client
+from ansible.module_utils.common_errata_tool import parallel_map
+from ansible.module_utils.common_errata_tool import span
+from ansible.module_utils.common_errata_tool import start_module
 
 
 ANSIBLE_METADATA = {
@@ -32,16 +34,35 @@ description:
   - 2. You want to write some tests that verify ET's data at a very low level.
     For example, you may want to write an integration test to verify that
     you've set up your ET configuration in the way you expect.
+  - To send many requests in one task, use the "requests" option instead of
+    "path". This module sends up to "concurrency" requests at a time on one
+    HTTP session, which is much faster than a loop of tasks.
 options:
    path:
      description:
        - The path to request, eg. /api/v1/user/kdreyer
-     required: true
+       - Set either "path" or "requests".
+     required: false
    method:
      description:
        - The HTTP method to use.
      required: false
      default: GET
+   json:
+     description:
+       - Data to send as the JSON body of the request.
+     required: false
+   requests:
+     description:
+       - List of requests to send. Each request is a dict with "path",
+         "method" (default GET) and "json" keys, like the options above.
+       - Set either "path" or "requests".
+     required: false
+   concurrency:
+     description:
+       - The maximum number of "requests" to send at a time. The default is
+         the ERRATA_TOOL_CONCURRENCY environment variable, or 4.
+     required: false
    return_content:
      description:
        - If true, this module will return a "content" key with the body of the
@@ -56,41 +77,119 @@ requirements:
   - "requests-gssapi"
 '''
 
+EXAMPLES = '''
+- name: verify our ET users
+  errata_tool_request:
+    requests:
+    - path: /api/v1/user/kdreyer@redhat.com
+    - path: /api/v1/user/cooldeveloper@redhat.com
+    concurrency: 8
+  register: users
+
+- assert:
+    that:
+    - users.responses | map(attribute='status') | unique == [200]
+'''
 
-def run_module():
-    module_args = dict(
-        path=dict(required=True),
-        method=dict(default='GET'),
-        return_content=dict(type='bool', default=False),
-    )
-    module = AnsibleModule(
-        argument_spec=module_args,
-        supports_check_mode=False
-    )
+RETURN = '''
+responses:
+  description: >
+    With "requests", one dict for each request, in the same order. Each
+    dict has the "status", "url", "json" and "content" keys that this
+    module returns for a single "path".
+  returned: when "requests" is set
+  type: list
+'''
 
-    params = module.params
 
-    client = Client()
+def send_request(client, method, path, return_content, json=None):
+    """
+    Send one HTTP request to the ET.
 
-    path = params['path'].lstrip('/')
-    response = client.request(params['method'], path)
-    json = None
+    :param client: Errata Client
+    :param str method: HTTP method, eg "GET"
+    :param str path: request path, eg "/api/v1/user/kdreyer"
+    :param bool return_content: add a "content" key with the response body.
+    :param json: optional data to send as the JSON request body.
+    :returns: a result dict with "status" and "url" keys, plus "json" if the
+              response body is JSON.
+    """
+    kwargs = {}
+    if json is not None:
+        kwargs['json'] = json
+    response = client.request(method, path.lstrip('/'), **kwargs)
+    data = None
     try:
-        json = response.json()
+        data = response.json()
     except ValueError:
         pass
 
     result = {
-        'changed': True,
         'status': response.status_code,
         'url': response.url,
     }
 
-    if params['return_content']:
+    if return_content:
         result['content'] = response.text
 
-    if json is not None:
-        result['json'] = json
+    if data is not None:
+        result['json'] = data
+
+    return result
+
+
+def send_requests(client, requests, return_content, concurrency):
+    """
+    Send many HTTP requests to the ET, "concurrency" at a time.
+
+    :param client: Errata Client
+    :param list requests: dicts with "path", "method" and "json" keys.
+    :param bool return_content: add a "content" key to each result.
+    :param int concurrency: maximum number of requests in flight.
+    :returns: list of send_request() results, in the same order as requests.
+    """
+    def send(request):
+        return send_request(client, request['method'], request['path'],
+                            return_content, request['json'])
+
+    return parallel_map(send, requests, concurrency)
+
+
+def run_module():
+    module_args = dict(
+        path=dict(),
+        method=dict(default='GET'),
+        json=dict(type='raw'),
+        return_content=dict(type='bool', default=False),
+        requests=dict(type='list', elements='dict', options=dict(
+            path=dict(required=True),
+            method=dict(default='GET'),
+            json=dict(type='raw'),
+        )),
+        concurrency=dict(type='int'),
+    )
+    with span('parse arguments'):
+        module = AnsibleModule(
+            argument_spec=module_args,
+            mutually_exclusive=[('path', 'requests')],
+            required_one_of=[('path', 'requests')],
+            supports_check_mode=False
+        )
+    identity = module.params['path'] or 'requests'
+    params = module.params
+
+    # This module does not support check mode, so it never plans.
+    client, _ = start_module(module, 'errata_tool_request', identity)
+
+    if params['requests'] is not None:
+        concurrency = params['concurrency'] or client.concurrency
+        responses = send_requests(client, params['requests'],
+                                  params['return_content'], concurrency)
+        module.exit_json(changed=True, responses=responses)
+
+    result = send_request(client, params['method'], params['path'],
+                          params['return_content'], params['json'])
+    result['changed'] = True
 
     module.exit_json(**result)
 
@@ -0,0 +1,339 @@
+import os
+from ansible.module_utils.basic import AnsibleModule
+from ansible.module_utils import common_errata_tool
+from ansible.module_utils import common_errata_tool_cdn_repo
+from ansible.module_utils import common_errata_tool_product
+from ansible.module_utils import common_errata_tool_product_version
+from ansible.module_utils import common_errata_tool_release
+from ansible.module_utils import common_errata_tool_variant
+
+
+ANSIBLE_METADATA = {
+    'metadata_version': '1.0',
+    'status': ['preview'],
+    'supported_by': 'community'
+}
+
+
+DOCUMENTATION = '''
+---
+module: errata_tool_tree
+
+short_description: Ensure a whole product tree in the Errata Tool
+description:
+   - Ensure products, product versions, variants, CDN repos and releases in
+     Red Hat's Errata Tool in one task.
+   - Each resource takes the same options as its own errata_tool_* module
+     (for example, each item in "product_versions" takes the
+     errata_tool_product_version options).
+   - This module finds the dependencies between the resources from their
+     references (a product version's "product", a variant's
+     "product_version", a CDN repo's "variants", and a release's "product"
+     and "product_versions"). It ensures each resource after the resources
+     it depends on, and it ensures independent resources in parallel.
+   - In check mode, resources that depend on new resources can fail,
+     because their dependencies do not exist yet.
+options:
+   products:
+     description:
+       - List of products. See the errata_tool_product module's options.
+     default: []
+   product_versions:
+     description:
+       - List of product versions. See the errata_tool_product_version
+         module's options.
+     default: []
+   variants:
+     description:
+       - List of variants. See the errata_tool_variant module's options.
+     default: []
+   cdn_repos:
+     description:
+       - List of CDN repos. See the errata_tool_cdn_repo module's options.
+     default: []
+   releases:
+     description:
+       - List of releases. See the errata_tool_release module's options.
+     default: []
+requirements:
+  - "python >= 2.7"
+  - "lxml"
+  - "requests-gssapi"
+'''
+
+EXAMPLES = '''
+- name: onboard RHCEPH 5
+  errata_tool_tree:
+    product_versions:
+    - product: RHCEPH
+      name: RHCEPH-5.0-RHEL-8
+      description: Red Hat Ceph Storage 5.0
+      rhel_release_name: RHEL-8
+      default_brew_tag: ceph-5.0-rhel-8-candidate
+      is_server_only: false
+      allow_rhn_debuginfo: false
+      allow_buildroot_push: false
+      is_oval_product: true
+      is_rhel_addon: false
+      push_targets: [cdn, cdn_stage]
+      brew_tags: [ceph-5.0-rhel-8-candidate]
+    variants:
+    - name: 8Base-RHCEPH-5.0-Tools
+      description: Red Hat Ceph Storage 5.0 Tools
+      product_version: RHCEPH-5.0-RHEL-8
+      push_targets: [cdn, cdn_stage]
+    cdn_repos:
+    - name: rhceph-5-tools-for-rhel-8-x86_64-rpms
+      release_type: Primary
+      content_type: Binary
+      variants: [8Base-RHCEPH-5.0-Tools]
+    releases:
+    - product: RHCEPH
+      name: RHCEPH-5.0
+      type: QuarterlyUpdate
+      description: Red Hat Ceph Storage 5.0
+      product_versions: [RHCEPH-5.0-RHEL-8]
+'''
+
+RETURN = '''
+levels:
+  description: >
+    The resources that we ensured in parallel at each step, in order.
+    Each resource is "kind/name", for example
+    "variants/8Base-RHCEPH-5.0-Tools".
+  returned: always
+  type: list
+results:
+  description: >
+    One dict for each resource, with "kind", "name", "changed" and
+    "stdout_lines" keys, plus "msg" if we could not ensure it.
+  returned: always
+  type: list
+'''
+
+# The order of the resources within each dependency level.
+KINDS = ['products', 'product_versions', 'variants', 'cdn_repos', 'releases']
+
+
+def argument_spec():
+    """
+    :returns: dict of this module's Ansible argument spec, with each
+              resource's options from its own module.
+    """
+    modules = {
+        'products': common_errata_tool_product,
+        'product_versions': common_errata_tool_product_version,
+        'variants': common_errata_tool_variant,
+        'cdn_repos': common_errata_tool_cdn_repo,
+        'releases': common_errata_tool_release,
+    }
+    spec = {}
+    for kind in KINDS:
+        spec[kind] = dict(type='list', elements='dict', default=[],
+                          options=modules[kind].argument_spec())
+    return spec
+
+
+def get_name(kind, params):
+    if kind == 'products':
+        return params['short_name']
+    return params['name']
+
+
+def get_dependencies(kind, params):
+    """
+    Find the resources that this resource refers to.
+
+    :param str kind: eg. "variants"
+    :param dict params: this resource's parameters
+    :returns: list of (kind, name) tuples.
+    """
+    if kind == 'product_versions':
+        return [('products', params['product'])]
+    if kind == 'variants':
+        return [('product_versions', params['product_version'])]
+    if kind == 'cdn_repos':
+        return [('variants', variant) for variant in params['variants']]
+    if kind == 'releases':
+        dependencies = [('product_versions', product_version)
+                        for product_version in params['product_versions']]
+        if params['product']:
+            dependencies.append(('products', params['product']))
+        return dependencies
+    return []
+
+
+def get_levels(tree):
+    """
+    Sort the resources in this tree into dependency levels.
+
+    Each resource's level is one more than the highest level of the
+    resources it depends on. References to resources that are not in this
+    tree (because they already exist in the ET) do not count.
+
+    :param dict tree: lists of resource params, keyed by kind.
+    :returns: list of levels. Each level is a list of (kind, params) tuples.
+    """
+    resources = {}
+    for kind in KINDS:
+        for params in tree[kind]:
+            key = (kind, get_name(kind, params))
+            if key in resources:
+                raise ValueError('duplicate %s "%s"' % key)
+            resources[key] = params
+    levels = {}
+
+    def get_level(key):
+        if key not in levels:
+            dependencies = [dependency for dependency
+                            in get_dependencies(key[0], resources[key])
+                            if dependency in resources]
+            levels[key] = max([get_level(dependency) + 1
+                               for dependency in dependencies] or [0])
+        return levels[key]
+
+    results = []
+    for kind in KINDS:
+        for params in tree[kind]:
+            level = get_level((kind, get_name(kind, params)))
+            while len(results) <= level:
+                results.append([])
+            results[level].append((kind, params))
+    return results
+
+
+def ensure_resource(client, kind, params, check_mode, diff_mode,
+                    package_tags_cache=None):
+    """
+    Ensure one resource with its module's ensure_* function.
+
+    :returns: a result dict
+    """
+    if kind == 'products':
+        return common_errata_tool_product.ensure_product(
+            client, params, check_mode, diff_mode=diff_mode)
+    if kind == 'product_versions':
+        return common_errata_tool_product_version.ensure_product_version(
+            client, params, check_mode, diff_mode=diff_mode)
+    if kind == 'variants':
+        return common_errata_tool_variant.ensure_variant(
+            client, params, check_mode, diff_mode=diff_mode)
+    if kind == 'cdn_repos':
+        return common_errata_tool_cdn_repo.ensure_cdn_repo(
+            client, check_mode, params,
+            package_tags_cache=package_tags_cache, diff_mode=diff_mode)
+    if kind == 'releases':
+        return common_errata_tool_release.ensure_release(
+            client, params, check_mode, diff_mode=diff_mode)
+    raise ValueError('unknown resource kind %s' % kind)
+
+
+@common_errata_tool.traced('ensure')
+def ensure_tree(client, levels, check_mode, diff_mode=True,
+                package_tags_cache=None):
+    """
+    Ensure every resource, one dependency level at a time.
+
+    :param client: Errata Client
+    :param list levels: from get_levels()
+    :param bool check_mode: describe what would happen, but don't do it.
+    :param bool diff_mode: return a "diff" for each changed resource.
+    :returns: a result dict. If any resource fails, we stop after its level
+              and set "failed" and "msg".
+    """
+    result = {'changed': False, 'stdout_lines': [], 'results': [],
+              'levels': []}
+    diffs = []
+
+    def ensure(item):
+        kind, params = item
+        name = get_name(kind, params)
+        try:
+            resource_result = ensure_resource(
+                client, kind, params, check_mode, diff_mode,
+                package_tags_cache)
+        except Exception as e:
+            msg = '%s %s: %s: %s' % (kind, name, type(e).__name__, e)
+            return {'kind': kind, 'name': name, 'changed': False,
+                    'stdout_lines': [], 'failed': True, 'msg': msg}
+        resource_result['kind'] = kind
+        resource_result['name'] = name
+        return resource_result
+
+    errors = []
+    for level in levels:
+        result['levels'].append(['%s/%s' % (kind, get_name(kind, params))
+                                 for kind, params in level])
+        resource_results = common_errata_tool.parallel_map(
+            ensure, level, client.concurrency)
+        for resource_result in resource_results:
+            if resource_result.get('failed'):
+                errors.append(resource_result['msg'])
+            if resource_result['changed']:
+                result['changed'] = True
+            for line in resource_result['stdout_lines']:
+                result['stdout_lines'].append('%s %s: %s' % (
+                    resource_result['kind'], resource_result['name'], line))
+            if 'diff' in resource_result:
+                diffs.append(resource_result.pop('diff'))
+            result['results'].append(resource_result)
+        if errors:
+            result['failed'] = True
+            result['msg'] = '\n'.join(errors)
+            break
+    if diffs:
+        result['diff'] = diffs
+    return result
+
+
+def run_module():
+    module_args = argument_spec()
+    with common_errata_tool.span('parse arguments'):
+        module = AnsibleModule(
+            argument_spec=module_args,
+            supports_check_mode=True
+        )
+    identity = ','.join(product['short_name']
+                        for product in module.params['products']) or 'tree'
+    params = module.params
+
+    try:
+        for product in params['products']:
+            common_errata_tool_product.prepare_params(product)
+        for product_version in params['product_versions']:
+            common_errata_tool_product_version.prepare_params(product_version)
+        for variant in params['variants']:
+            common_errata_tool_variant.prepare_params(variant)
+        for cdn_repo in params['cdn_repos']:
+            common_errata_tool_cdn_repo.prepare_params(cdn_repo)
+        levels = get_levels(params)
+    except common_errata_tool_product.InvalidInputError as e:
+        msg = 'invalid %s value "%s"' % (e.param, e.value)
+        module.fail_json(msg=msg, changed=False, rc=1)
+    except ValueError as e:
+        module.fail_json(msg=str(e), changed=False, rc=1)
+
+    client, check_mode = common_errata_tool.start_module(
+        module, 'errata_tool_tree', identity)
+
+    package_tags_cache = None
+    cache_path = os.getenv('ERRATA_TOOL_PACKAGE_TAGS_CACHE')
+    if cache_path:
+        package_tags_cache = common_errata_tool_cdn_repo.PackageTagsCache(
+            cache_path)
+
+    result = ensure_tree(client, levels, check_mode, diff_mode=module._diff,
+                         package_tags_cache=package_tags_cache)
+
+    if result.pop('failed', False):
+        module.fail_json(**result)
+
+    module.exit_json(**result)
+
+
+def main():
+    run_module()
+
+
+if __name__ == '__main__':
+    main()
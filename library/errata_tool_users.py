@@ -0,0 +1,213 @@
+import csv
+import json
+import os
+from ansible.module_utils.basic import AnsibleModule
+from ansible.module_utils.common.arg_spec import ArgumentSpecValidator
+from ansible.module_utils import common_errata_tool
+from ansible.module_utils import common_errata_tool_user
+try:
+    import yaml
+    HAS_YAML = True
+except ImportError:
+    HAS_YAML = False
+
+
+ANSIBLE_METADATA = {
+    'metadata_version': '1.0',
+    'status': ['preview'],
+    'supported_by': 'community'
+}
+
+
+DOCUMENTATION = '''
+---
+module: errata_tool_users
+
+short_description: Create and manage many Users in the Errata Tool
+description:
+   - Create and update many Users within Red Hat's Errata Tool in one task.
+   - Each user takes the same options as the errata_tool_user module.
+   - This module reads and writes up to ERRATA_TOOL_CONCURRENCY users in
+     parallel.
+options:
+   users:
+     description:
+       - List of users. See the errata_tool_user module's options.
+       - Set either "users" or "src".
+     required: false
+   src:
+     description:
+       - Path to a file of users on the Ansible controller. The file
+         extension selects the format.
+       - ".yml" or ".yaml" - a YAML list of users.
+       - ".json" - a JSON list of users.
+       - ".csv" - a CSV file with one user per row. The first row has the
+         option names. Leave a cell empty to skip that option. Separate
+         roles with commas (and quote the cell).
+       - Set either "users" or "src".
+     required: false
+requirements:
+  - "python >= 2.7"
+  - "lxml"
+  - "requests-gssapi"
+'''
+
+EXAMPLES = '''
+- name: add the RHCEPH team
+  errata_tool_users:
+    users:
+    - login_name: kdreyer@redhat.com
+      realname: Ken Dreyer
+      roles: [devel, pm]
+    - login_name: cooldeveloper@redhat.com
+      realname: Cool Developer
+      roles: [devel]
+
+- name: sync the accounts from a CSV file
+  errata_tool_users:
+    src: files/et-users.csv
+'''
+
+RETURN = '''
+summary:
+  description: >
+    The number of users that we created or edited, left unchanged, or
+    could not ensure.
+  returned: always
+  type: dict
+  sample: {"changed": 3, "unchanged": 997, "failed": 0}
+stdout_lines:
+  description: >
+    The changes for each user that we created or edited, prefixed with its
+    login_name. To keep the result small, this does not include unchanged
+    users. If any user fails, "msg" lists the error for each failed user.
+  returned: always
+  type: list
+  sample:
+  - "kdreyer@redhat.com: created kdreyer@redhat.com user"
+'''
+
+
+class InvalidUserError(Exception):
+    """ A user in the list or file has invalid options """
+    pass
+
+
+def read_users(path):
+    """
+    Read users from a YAML, JSON or CSV file.
+
+    :param str path: file path. The extension selects the format.
+    :returns: iterable of user dicts. We read CSV files one row at a time.
+    """
+    _, extension = os.path.splitext(path)
+    if extension in ('.yml', '.yaml'):
+        if not HAS_YAML:
+            raise InvalidUserError('PyYAML is required to read %s' % path)
+        with open(path) as f:
+            try:
+                return yaml.safe_load(f) or []
+            except yaml.YAMLError as e:
+                raise InvalidUserError('could not parse %s: %s' % (path, e))
+    if extension == '.json':
+        with open(path) as f:
+            return json.load(f)
+    if extension == '.csv':
+        return read_csv_users(path)
+    raise InvalidUserError('unknown file format for %s' % path)
+
+
+def read_csv_users(path):
+    with open(path) as f:
+        for row in csv.DictReader(f):
+            yield {key: value for key, value in row.items() if value != ''}
+
+
+def validate_users(users):
+    """
+    Apply the errata_tool_user module's argument spec to each user.
+
+    :param users: iterable of user dicts
+    :returns: list of user params dicts, with defaults.
+    :raises: InvalidUserError if any user has invalid options, or if we see
+             a login_name twice.
+    """
+    validator = ArgumentSpecValidator(
+        common_errata_tool_user.argument_spec())
+    results = []
+    login_names = set()
+    for number, user in enumerate(users, 1):
+        if not isinstance(user, dict):
+            raise InvalidUserError('user %d is not a dict' % number)
+        result = validator.validate(user)
+        if result.error_messages:
+            raise InvalidUserError('user %d: %s' % (
+                number, ', '.join(result.error_messages)))
+        params = result.validated_parameters
+        if params['login_name'] in login_names:
+            raise InvalidUserError('duplicate user %s' % params['login_name'])
+        login_names.add(params['login_name'])
+        results.append(params)
+    return results
+
+
+@common_errata_tool.traced('ensure')
+def ensure_users(client, users, check_mode):
+    """
+    Ensure many users, in parallel.
+
+    :param client: Errata Client
+    :param list users: user params dicts from validate_users()
+    :param bool check_mode: describe what would happen, but don't do it.
+    :returns: a result dict. If any user fails, set "failed" and "msg".
+    """
+    def ensure(params):
+        return common_errata_tool_user.ensure_user(client, params,
+                                                   check_mode)
+
+    login_names = [params['login_name'] for params in users]
+    return common_errata_tool.ensure_many(client, 'users', login_names,
+                                          ensure, users)
+
+
+def run_module():
+    module_args = dict(
+        users=dict(type='list', elements='dict'),
+        src=dict(type='path'),
+    )
+    with common_errata_tool.span('parse arguments'):
+        module = AnsibleModule(
+            argument_spec=module_args,
+            mutually_exclusive=[('users', 'src')],
+            required_one_of=[('users', 'src')],
+            supports_check_mode=True
+        )
+    identity = os.path.basename(module.params['src'] or 'users')
+
+    params = module.params
+
+    try:
+        if params['src']:
+            users = validate_users(read_users(params['src']))
+        else:
+            users = validate_users(params['users'])
+    except (InvalidUserError, IOError, ValueError, csv.Error) as e:
+        module.fail_json(msg=str(e), changed=False, rc=1)
+
+    client, check_mode = common_errata_tool.start_module(
+        module, 'errata_tool_users', identity)
+
+    result = ensure_users(client, users, check_mode)
+
+    if result.pop('failed', False):
+        module.fail_json(**result)
+
+    module.exit_json(**result)
+
+
+def main():
+    run_module()
+
+
+if __name__ == '__main__':
+    main()
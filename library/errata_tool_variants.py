@@ -0,0 +1,141 @@
+from ansible.module_utils.basic import AnsibleModule
+from ansible.module_utils import common_errata_tool
+from ansible.module_utils import common_errata_tool_variant
+
+
+ANSIBLE_METADATA = {
+    'metadata_version': '1.0',
+    'status': ['preview'],
+    'supported_by': 'community'
+}
+
+
+DOCUMENTATION = '''
+---
+module: errata_tool_variants
+
+short_description: Create and manage many variants in the Errata Tool
+description:
+   - Create and update many variants within Red Hat's Errata Tool in one
+     task.
+   - Each variant takes the same options as the errata_tool_variant module.
+   - This module searches the ET for each of your variants in parallel, or
+     for 20 or more variants, reads every variant in one paginated sweep. It
+     compares them with your variants, and sends up to
+     ERRATA_TOOL_CONCURRENCY creates and edits in parallel.
+options:
+   variants:
+     description:
+       - List of variants. See the errata_tool_variant module's options.
+     required: true
+requirements:
+  - "python >= 2.7"
+  - "lxml"
+  - "requests-gssapi"
+'''
+
+EXAMPLES = '''
+- name: ensure the RHCEPH 5 variants
+  errata_tool_variants:
+    variants:
+    - name: 8Base-RHCEPH-5.0-Tools
+      description: Red Hat Ceph Storage 5.0 Tools
+      product_version: RHCEPH-5.0-RHEL-8
+      push_targets: [cdn, cdn_stage]
+    - name: 8Base-RHCEPH-5.0-MON
+      description: Red Hat Ceph Storage 5.0 MON
+      product_version: RHCEPH-5.0-RHEL-8
+      push_targets: [cdn, cdn_stage]
+'''
+
+RETURN = '''
+summary:
+  description: >
+    The number of variants that we created or edited, left unchanged, or
+    could not ensure.
+  returned: always
+  type: dict
+  sample: {"changed": 2, "unchanged": 98, "failed": 0}
+stdout_lines:
+  description: >
+    The changes for each variant that we created or edited, prefixed with
+    its name. To keep the result small, this does not include unchanged
+    variants. If any variant fails, "msg" lists the error for each failed
+    variant.
+  returned: always
+  type: list
+  sample:
+  - "8Base-RHCEPH-5.0-Tools: created 8Base-RHCEPH-5.0-Tools variant"
+'''
+
+
+@common_errata_tool.traced('ensure')
+def ensure_variants(client, variants, check_mode, diff_mode=True):
+    """
+    Ensure many variants, in parallel.
+
+    :param client: Errata Client
+    :param list variants: variant params dicts
+    :param bool check_mode: describe what would happen, but don't do it.
+    :param bool diff_mode: return a "diff" list for the changed variants.
+    :returns: a result dict. If any variant fails, set "failed" and "msg".
+    """
+    names = [params['name'] for params in variants]
+    common_errata_tool.check_unique_names('variant', names)
+    existing = common_errata_tool_variant.prefetch_variants(client, names)
+
+    def ensure(params):
+        return common_errata_tool_variant.ensure_variant(
+            client, params, check_mode, diff_mode=diff_mode,
+            variants=existing)
+
+    return common_errata_tool.ensure_many(client, 'variants', names, ensure,
+                                          variants)
+
+
+def argument_spec():
+    """
+    :returns: dict of this module's Ansible argument spec.
+    """
+    return dict(
+        variants=dict(type='list', elements='dict', required=True,
+                      options=common_errata_tool_variant.argument_spec()),
+    )
+
+
+def run_module():
+    module_args = argument_spec()
+    with common_errata_tool.span('parse arguments'):
+        module = AnsibleModule(
+            argument_spec=module_args,
+            supports_check_mode=True
+        )
+    identity = ','.join(sorted(set(
+        variant['product_version'] for variant in module.params['variants'])))
+
+    params = module.params
+
+    for variant in params['variants']:
+        common_errata_tool_variant.prepare_params(variant)
+
+    client, check_mode = common_errata_tool.start_module(
+        module, 'errata_tool_variants', identity)
+
+    try:
+        result = ensure_variants(client, params['variants'], check_mode,
+                                 diff_mode=module._diff)
+    except ValueError as e:
+        module.fail_json(msg=str(e), changed=False, rc=1)
+
+    if result.pop('failed', False):
+        module.fail_json(**result)
+
+    module.exit_json(**result)
+
+
+def main():
+    run_module()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,170 @@
+import os
+from ansible.errors import AnsibleError
+from ansible.module_utils.six import string_types
+from ansible.plugins.lookup import LookupBase
+try:
+    from ansible_collections.ktdreyer.errata_tool_ansible.plugins.module_utils import common_errata_tool  # noqa: E501
+    from ansible_collections.ktdreyer.errata_tool_ansible.plugins.module_utils import common_errata_tool_cdn_repo  # noqa: E501
+    from ansible_collections.ktdreyer.errata_tool_ansible.plugins.module_utils import common_errata_tool_product  # noqa: E501
+    from ansible_collections.ktdreyer.errata_tool_ansible.plugins.module_utils import common_errata_tool_product_version  # noqa: E501
+    from ansible_collections.ktdreyer.errata_tool_ansible.plugins.module_utils import common_errata_tool_release  # noqa: E501
+    from ansible_collections.ktdreyer.errata_tool_ansible.plugins.module_utils import common_errata_tool_rhel_release  # noqa: E501
+    from ansible_collections.ktdreyer.errata_tool_ansible.plugins.module_utils import common_errata_tool_variant  # noqa: E501
+except ImportError:
+    # Running from a Git checkout, with "library" on sys.path.
+    from ansible.module_utils import common_errata_tool
+    from ansible.module_utils import common_errata_tool_cdn_repo
+    from ansible.module_utils import common_errata_tool_product
+    from ansible.module_utils import common_errata_tool_product_version
+    from ansible.module_utils import common_errata_tool_release
+    from ansible.module_utils import common_errata_tool_rhel_release
+    from ansible.module_utils import common_errata_tool_variant
+
+
+DOCUMENTATION = '''
+---
+name: errata_tool
+short_description: Read resources from the Errata Tool
+description:
+  - Look up products, product versions, variants, CDN repos, releases, RHEL
+    releases, or users in the Errata Tool, in the same format that the
+    errata_tool_* modules use to compare the ET's data with your Ansible
+    parameters.
+  - Each lookup returns a dict for each resource, or null if the resource
+    does not exist.
+  - This respects the ERRATA_TOOL_URL and ERRATA_TOOL_AUTH environment
+    variables on the Ansible controller.
+  - We remember every result for the rest of this Ansible worker process.
+    Set the ERRATA_TOOL_LOOKUP_CACHE environment variable to a file path to
+    remember results for the rest of the play (remove the file to discard
+    them). Note that cached results will not show any changes that your
+    tasks make later in the play.
+options:
+  _terms:
+    description:
+      - The type of resource, one of products, product_versions, variants,
+        cdn_repos, releases, rhel_releases, users.
+    required: true
+  name:
+    description:
+      - The name of the resource, or a list of names. For products, this is
+        the short_name. For users, this is the login_name.
+      - When you list several names, we look them up concurrently.
+    required: true
+  product:
+    description:
+      - The product short_name. Required for product_versions.
+    required: false
+'''
+
+EXAMPLES = '''
+- name: Skip a task if a variant does not exist yet
+  debug:
+    msg: the variant exists
+  when: lookup('errata_tool', 'variants', name='8Base-RHCEPH-4.0-Tools')
+
+- name: Show a release's product versions
+  debug:
+    msg: "{{ lookup('errata_tool', 'releases', name='rhceph-4.0')
+             .product_versions }}"
+
+- name: Look up several product versions at once
+  debug:
+    msg: "{{ query('errata_tool', 'product_versions', product='RHCEPH',
+                   name=['RHCEPH-4.0-RHEL-8', 'RHEL-7-RHCEPH-4.0']) }}"
+'''
+
+RETURN = '''
+_raw:
+  description:
+    - One dict (or null) for each name.
+  type: list
+'''
+
+
+def get_product_version(client, name, product):
+    if not product:
+        raise AnsibleError('product_versions lookups require a "product"')
+    return common_errata_tool_product_version.get_product_version(
+        client, product, name, check_mode=False)
+
+
+# Each function takes (client, name, product)
+GETTERS = {
+    'products':
+        lambda client, name, _: common_errata_tool_product.get_product(
+            client, name),
+    'product_versions': get_product_version,
+    'variants':
+        lambda client, name, _: common_errata_tool_variant.get_variant(
+            client, name),
+    'cdn_repos':
+        lambda client, name, _: common_errata_tool_cdn_repo.get_cdn_repo(
+            client, name),
+    'releases':
+        lambda client, name, _: common_errata_tool_release.get_release(
+            client, name),
+    'rhel_releases':
+        lambda client, name, _:
+            common_errata_tool_rhel_release.get_rhel_release(client, name),
+    'users':
+        lambda client, name, _: common_errata_tool.get_user(client, name),
+}
+
+
+class LookupModule(LookupBase):
+
+    # Results for this process, keyed by cache_key().
+    _results = {}
+
+    # Reuse one Client (and its HTTP connections) for this process.
+    _client = None
+
+    @classmethod
+    def client(cls):
+        if cls._client is None:
+            cls._client = common_errata_tool.Client()
+        return cls._client
+
+    @staticmethod
+    def cache_key(client, resource, product, name):
+        return '|'.join([client.baseurl, resource, product or '', name])
+
+    def run(self, terms, variables=None, **kwargs):
+        names = kwargs.get('name')
+        if not names:
+            raise AnsibleError('errata_tool lookups require a "name"')
+        if isinstance(names, string_types):
+            names = [names]
+        product = kwargs.get('product')
+        for resource in terms:
+            if resource not in GETTERS:
+                raise AnsibleError('unknown errata_tool resource "%s"'
+                                   % resource)
+
+        client = self.client()
+        cache_path = os.getenv('ERRATA_TOOL_LOOKUP_CACHE')
+        if cache_path:
+            cached = common_errata_tool.read_json_file(cache_path) or {}
+            self._results.update(cached)
+
+        wanted = [(resource, name) for resource in terms for name in names]
+        keys = [self.cache_key(client, resource, product, name)
+                for (resource, name) in wanted]
+        missing = [item for (item, key) in zip(wanted, keys)
+                   if key not in self._results]
+
+        def get(item):
+            resource, name = item
+            return GETTERS[resource](client, name, product)
+
+        found = common_errata_tool.parallel_map(get, missing,
+                                                client.concurrency)
+        for (resource, name), result in zip(missing, found):
+            key = self.cache_key(client, resource, product, name)
+            self._results[key] = result
+
+        if cache_path and missing:
+            common_errata_tool.write_json_file(cache_path, self._results)
+
+        return [self._results[key] for key in keys]
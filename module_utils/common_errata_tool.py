@@ -1,10 +1,30 @@
 from lxml import html
+import binascii
+import cProfile
+from contextlib import contextmanager
+import errno
+import fcntl
+import functools
+import glob
+import hashlib
+import json
 import os
 import re
 from enum import IntEnum
+from multiprocessing.pool import ThreadPool
 import posixpath
+import tempfile
+import threading
+import time
 import requests
 from requests_gssapi import HTTPSPNEGOAuth, DISABLED
+from ansible.module_utils.six import string_types
+from ansible.module_utils.six.moves.urllib.parse import urlencode
+try:
+    import tracemalloc
+except ImportError:
+    # Python 2
+    tracemalloc = None
 
 
 class ErrataToolError(ValueError):
@@ -105,7 +125,440 @@ RELEASE_TYPES = frozenset([
     'Async',
 ])
 
+# API Pagination
+PAGE_SIZE = 100
 
+# For fewer names than this, get_named() sends one filtered search for each
+# name instead of reading every page of a list.
+SEARCH_EACH_NAME_LIMIT = 20
+
+# OpenTelemetry span kinds and status codes
+SPAN_KIND_INTERNAL = 1
+SPAN_KIND_CLIENT = 3
+STATUS_CODE_ERROR = 2
+
+
+def random_id(size):
+    """ Return a random hex string for trace and span IDs """
+    return binascii.hexlify(os.urandom(size)).decode('ascii')
+
+
+def otlp_attributes(attributes):
+    """ Convert a dict into a list of OpenTelemetry (OTLP JSON) attributes """
+    results = []
+    for key, value in sorted(attributes.items()):
+        if isinstance(value, bool):
+            value = {'boolValue': value}
+        elif isinstance(value, int):
+            # OTLP JSON encodes 64-bit ints as strings.
+            value = {'intValue': str(value)}
+        else:
+            value = {'stringValue': str(value)}
+        results.append({'key': key, 'value': value})
+    return results
+
+
+class Span(object):
+    """ One timed operation in a Tracer's trace """
+    def __init__(self, trace_id, name, parent=None, kind=SPAN_KIND_INTERNAL,
+                 attributes=None):
+        self.trace_id = trace_id
+        self.span_id = random_id(8)
+        self.parent = parent
+        self.name = name
+        self.kind = kind
+        self.attributes = attributes or {}
+        self.error = None
+        self.start = time.time()
+        self.end = None
+
+    def otlp(self):
+        """ Return this span in the OTLP JSON format """
+        data = {
+            'traceId': self.trace_id,
+            'spanId': self.span_id,
+            'name': self.name,
+            'kind': self.kind,
+            'startTimeUnixNano': str(int(self.start * 1e9)),
+            'endTimeUnixNano': str(int(self.end * 1e9)),
+            'attributes': otlp_attributes(self.attributes),
+        }
+        if self.parent:
+            data['parentSpanId'] = self.parent.span_id
+        if self.error:
+            data['status'] = {'code': STATUS_CODE_ERROR,
+                              'message': self.error}
+        return data
+
+
+class Tracer(object):
+    """
+    Record spans for one module run, and export them in the OpenTelemetry
+    (OTLP JSON) format.
+
+    The destination is either a file path or an OTLP/HTTP collector URL
+    (eg. http://localhost:4318/v1/traces). For a file, we append one line
+    per module run, in the same format as the OpenTelemetry Collector's
+    "file" exporter. Many forks can append to the same file.
+
+    Each thread has its own stack of open spans. Use wrap() to run a
+    function in another thread as a child of the current span.
+    """
+    def __init__(self, destination):
+        self.destination = destination
+        self.trace_id = random_id(16)
+        self.root = Span(self.trace_id, 'errata_tool')
+        self.spans = []
+        self.lock = threading.Lock()
+        self.local = threading.local()
+
+    def current(self):
+        stack = getattr(self.local, 'stack', None)
+        if stack:
+            return stack[-1]
+        return self.root
+
+    @contextmanager
+    def span(self, name, kind=SPAN_KIND_INTERNAL, attributes=None):
+        span = Span(self.trace_id, name, self.current(), kind, attributes)
+        if not getattr(self.local, 'stack', None):
+            self.local.stack = []
+        self.local.stack.append(span)
+        try:
+            yield span
+        except Exception as e:
+            span.error = '%s: %s' % (type(e).__name__, e)
+            raise
+        finally:
+            self.local.stack.pop()
+            span.end = time.time()
+            with self.lock:
+                self.spans.append(span)
+
+    def wrap(self, func):
+        """ Make func's spans children of the current span in any thread """
+        parent = self.current()
+
+        def wrapper(*args, **kwargs):
+            self.local.stack = [parent]
+            try:
+                return func(*args, **kwargs)
+            finally:
+                self.local.stack = []
+        return wrapper
+
+    def export(self, warn=None):
+        """
+        End the root span and send every span to our destination.
+
+        Tracing must never fail a task, so if we cannot send the spans, we
+        only warn.
+
+        :param warn: callable that takes a warning message str, eg.
+                     AnsibleModule.warn, or None to ignore errors silently.
+        """
+        self.root.end = time.time()
+        payload = {'resourceSpans': [{
+            'resource': {'attributes': otlp_attributes({
+                'service.name': 'errata-tool-ansible',
+            })},
+            'scopeSpans': [{
+                'scope': {'name': 'common_errata_tool'},
+                'spans': [span.otlp() for span in [self.root] + self.spans],
+            }],
+        }]}
+        if self.destination.startswith(('http://', 'https://')):
+            try:
+                requests.post(self.destination, json=payload, timeout=10)
+            except requests.exceptions.RequestException as e:
+                if warn:
+                    warn('could not send trace to %s: %s'
+                         % (self.destination, e))
+            return
+        line = json.dumps(payload, sort_keys=True) + '\n'
+        try:
+            append_line(self.destination, line)
+        except (IOError, OSError) as e:
+            if warn:
+                warn('could not write %s: %s' % (self.destination, e))
+
+
+_tracer = None
+
+
+def get_tracer():
+    """
+    Return the Tracer for this process, or None if the user did not enable
+    tracing with ERRATA_TOOL_TRACE=/some/file.jsonl or
+    ERRATA_TOOL_TRACE=http://collector:4318/v1/traces
+    """
+    global _tracer
+    if _tracer is None and os.getenv('ERRATA_TOOL_TRACE'):
+        _tracer = Tracer(os.environ['ERRATA_TOOL_TRACE'])
+    return _tracer
+
+
+@contextmanager
+def span(name, kind=SPAN_KIND_INTERNAL, **attributes):
+    """
+    Time a block of code as a tracing span, if the user enabled tracing.
+
+    :yields: the Span, or None if tracing is disabled.
+    """
+    tracer = get_tracer()
+    if tracer is None:
+        yield None
+        return
+    with tracer.span(name, kind, attributes) as new_span:
+        yield new_span
+
+
+def traced(phase):
+    """
+    Decorate a function to run in a tracing span named after the function.
+
+    :param str phase: the kind of work this function does, eg. "read",
+                      "resolve", "diff", "write" or "render".
+    """
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if get_tracer() is None:
+                return func(*args, **kwargs)
+            with span(func.__name__, phase=phase):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def on_exit(module, callback):
+    """
+    Call a function just before this module exits.
+
+    :param module: AnsibleModule
+    :param callback: callable that takes two arguments: the dict of results
+                     that the module will return (the callback may add
+                     keys), and a bool that is True if the module failed.
+    """
+    exit_json = module.exit_json
+    fail_json = module.fail_json
+
+    def callback_and_exit(**kwargs):
+        callback(kwargs, False)
+        exit_json(**kwargs)
+
+    def callback_and_fail(**kwargs):
+        callback(kwargs, True)
+        fail_json(**kwargs)
+
+    module.exit_json = callback_and_exit
+    module.fail_json = callback_and_fail
+
+
+def start_trace(module, module_name, identity):
+    """
+    Name this module run's trace, if the user enabled tracing.
+
+    When the module exits, we export the trace and return its ID in the
+    "trace_id" key of the module's result.
+
+    :param module: AnsibleModule
+    :param str module_name: eg. "errata_tool_product"
+    :param str identity: the resource name, eg. "RHCEPH"
+    :returns: a Tracer, or None if the user did not enable tracing.
+    """
+    tracer = get_tracer()
+    if tracer is None:
+        return None
+    tracer.root.name = module_name
+    tracer.root.attributes['errata_tool.identity'] = identity
+
+    def finish(result, failed):
+        global _tracer
+        if failed:
+            tracer.root.error = result.get('msg')
+        result['trace_id'] = tracer.trace_id
+        tracer.export(module.warn)
+        _tracer = None
+
+    on_exit(module, finish)
+    return tracer
+
+
+def parallel_map(func, items, concurrency):
+    """
+    Call func on each item with a bounded pool of threads.
+
+    The Errata Tool's latency dominates our runtime, so it is much faster to
+    have several independent HTTP requests in flight at once.
+
+    :param func: callable that takes one item.
+    :param list items: the items to process.
+    :param int concurrency: maximum number of threads. If this is 1 (or we
+                            only have one item), we call func serially in
+                            this thread.
+    :returns: list of func's return values, in the same order as items.
+    :raises: the first exception that any func call raised.
+    """
+    items = list(items)
+    workers = min(concurrency, len(items))
+    if workers <= 1:
+        return [func(item) for item in items]
+    tracer = get_tracer()
+    if tracer:
+        func = tracer.wrap(func)
+    # ThreadPool is not a context manager on py2.
+    pool = ThreadPool(workers)
+    try:
+        return pool.map(func, items)
+    finally:
+        pool.close()
+        pool.join()
+
+
+def check_unique_names(kind, names):
+    """
+    :param str kind: the kind of resource, eg. "variant"
+    :param list names: resource names from the Ansible task
+    :raises: ValueError if a name appears more than once.
+    """
+    seen = set()
+    for name in names:
+        if name in seen:
+            raise ValueError('duplicate %s %s' % (kind, name))
+        seen.add(name)
+
+
+def ensure_many(client, kind, names, ensure, items):
+    """
+    Ensure many resources in parallel, and combine their results into one
+    result for a module like errata_tool_variants.
+
+    :param client: Errata Client
+    :param str kind: the kind of resource, plural, eg. "product versions".
+                     We use this for the error message.
+    :param list names: the name of each item.
+    :param ensure: callable that takes one item and returns its ensure_*()
+                   result. If it raises an exception or returns a result
+                   with "failed" set, we count that item as failed and
+                   ensure the others anyway.
+    :param list items: params dicts, in the same order as names.
+    :returns: a result dict with "changed", "stdout_lines" (prefixed with
+              each name), "summary", and "diff" if any result had a diff.
+              If any item failed, we also set "failed" and "msg" (with the
+              error for each failed name).
+    """
+    def ensure_one(item):
+        try:
+            return ensure(item)
+        except Exception as e:
+            msg = '%s: %s' % (type(e).__name__, e)
+            return {'changed': False, 'stdout_lines': [], 'failed': True,
+                    'msg': msg}
+
+    results = parallel_map(ensure_one, items, client.concurrency)
+    combined = {'changed': False, 'stdout_lines': []}
+    summary = {'changed': 0, 'unchanged': 0, 'failed': 0}
+    diffs = []
+    errors = []
+    for name, result in zip(names, results):
+        if result.get('failed'):
+            summary['failed'] += 1
+            errors.append('%s: %s' % (name, result['msg']))
+            continue
+        if not result['changed']:
+            summary['unchanged'] += 1
+            continue
+        combined['changed'] = True
+        summary['changed'] += 1
+        for change in result['stdout_lines']:
+            combined['stdout_lines'].append('%s: %s' % (name, change))
+        if 'diff' in result:
+            diffs.append(result['diff'])
+    combined['summary'] = summary
+    if diffs:
+        combined['diff'] = diffs
+    if errors:
+        combined['failed'] = True
+        combined['msg'] = 'could not ensure %d %s:\n%s' % (
+            len(errors), kind, '\n'.join(errors))
+    return combined
+
+
+def get_all_pages(client, endpoint, params=None):
+    """
+    GET every page of a paginated list endpoint, like api/v1/variants.
+
+    We cannot know the number of pages until we reach a short page, so after
+    the first full page, we fetch the following pages in windows of
+    "client.concurrency" pages at a time. At worst we waste a few requests
+    for empty pages past the end of the list.
+
+    :param client: Errata Client
+    :param str endpoint: API endpoint, eg "api/v1/cdn_repo_package_tags"
+    :param dict params: extra query parameters, eg. filters.
+    :returns: a list of all the "data" elements from every page, in order.
+    :raises: requests.exceptions.HTTPError if the ET replies with an
+             unexpected HTTP response.
+    """
+    params = params or {}
+
+    def get_page(page_number):
+        page_params = params.copy()
+        page_params['page[size]'] = PAGE_SIZE
+        page_params['page[number]'] = page_number
+        response = client.get(endpoint, params=page_params)
+        response.raise_for_status()
+        return response.json()['data']
+
+    found = get_page(1)
+    elements = list(found)
+    page_number = 1
+    while len(found) == PAGE_SIZE:
+        page_numbers = range(page_number + 1,
+                             page_number + 1 + client.concurrency)
+        pages = parallel_map(get_page, page_numbers, client.concurrency)
+        for found in pages:
+            elements += found
+            if len(found) < PAGE_SIZE:
+                break
+        page_number += len(page_numbers)
+    return elements
+
+
+def get_named(client, endpoint, names):
+    """
+    GET the elements with these names from a paginated list endpoint that
+    supports "filter[name]", like api/v1/variants.
+
+    For a few names, we send one filtered search for each name, in
+    parallel. For SEARCH_EACH_NAME_LIMIT names or more, that would cost more
+    requests than the whole list, so we read every page instead (see
+    get_all_pages()).
+
+    :param client: Errata Client
+    :param str endpoint: API endpoint, eg "api/v1/variants"
+    :param names: the names to find
+    :returns: a list of the "data" elements with these names. Names that
+              do not exist are not in this list.
+    """
+    names = set(names)
+    if len(names) >= SEARCH_EACH_NAME_LIMIT:
+        elements = get_all_pages(client, endpoint)
+        return [element for element in elements
+                if element['attributes']['name'] in names]
+
+    def get_one_name(name):
+        return get_all_pages(client, endpoint, {'filter[name]': name})
+
+    elements = []
+    for found in parallel_map(get_one_name, sorted(names),
+                              client.concurrency):
+        elements += found
+    return elements
+
+
+@traced('diff')
 def diff_settings(settings, params):
     """
     Diff the "live" settings against our Ansible parameters.
@@ -141,6 +594,7 @@ def describe_changes(changes):
     return [tmpl % change for change in changes]
 
 
+@traced('render')
 def task_diff_data(before, after, item_name, item_type,
                    keys_to_copy=[], keys_to_omit=[]):
     """
@@ -195,11 +649,1033 @@ def task_diff_data(before, after, item_name, item_type,
     }
 
 
+def read_json_file(path):
+    """
+    Read a JSON cache file.
+
+    :param str path: file path
+    :returns: the parsed JSON data, or None if the file does not exist.
+    """
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except (IOError, OSError):
+        return None
+
+
+def makedirs(path):
+    """
+    Create a directory and its parents, if they do not exist yet.
+
+    Tasks in parallel forks may create the same directory at the same time,
+    so we ignore the error if another process created it first.
+
+    :param str path: directory path
+    """
+    try:
+        os.makedirs(path)
+    except OSError as e:
+        if e.errno != errno.EEXIST:
+            raise
+
+
+def append_line(path, line):
+    """
+    Append one line to a log file.
+
+    We write the whole line with one write() call in O_APPEND mode, so lines
+    from parallel forks do not interleave.
+
+    :param str path: file path
+    :param str line: text to append, including its newline.
+    """
+    fd = os.open(path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+    try:
+        os.write(fd, line.encode('utf-8'))
+    finally:
+        os.close(fd)
+
+
+def write_json_file(path, data):
+    """
+    Write a JSON cache file atomically.
+
+    We write to a temporary file and rename it, so that other tasks (running
+    in parallel) never read a partially-written file.
+
+    :param str path: file path
+    :param data: JSON-serializable data
+    """
+    directory = os.path.dirname(os.path.abspath(path))
+    fd, tmp_path = tempfile.mkstemp(dir=directory)
+    with os.fdopen(fd, 'w') as f:
+        json.dump(data, f)
+    os.rename(tmp_path, path)
+
+
+def normalize_product(data):
+    """
+    Simplify a product from the REST API into a format we can compare with
+    our Ansible parameters.
+
+    :param dict data: one "data" element from api/v1/products
+    :returns: a dict of information about this product
+    """
+    product = data['attributes']
+    product['id'] = data['id']
+
+    # The current REST API returns some inconsistent names for booleans.
+    # Some booleans have no "is" verb, and some have "is", and some have
+    # "is_". Rather than exposing this ugly API detail to users, we'll paper
+    # over it here by renaming the keys to drop "is" and "is_".
+    product['active'] = product.pop('isactive')
+    product['internal'] = product.pop('is_internal')
+
+    # Simplify the "relationships" data to simple names.
+
+    relationships = data['relationships']
+
+    # default_docs_reviewer
+    default_docs_reviewer = relationships['default_docs_reviewer']
+    if default_docs_reviewer:
+        product['default_docs_reviewer'] = default_docs_reviewer['login_name']
+    else:
+        product['default_docs_reviewer'] = None
+
+    # default_solution
+    product['default_solution'] = relationships['default_solution']['title']
+
+    # push_targets
+    product['push_targets'] = [pt['name'] for pt in
+                               relationships['push_targets']]
+
+    # state_machine_rule_set
+    state_machine_rule_set = relationships['state_machine_rule_set']
+    if state_machine_rule_set:
+        product['state_machine_rule_set'] = state_machine_rule_set['name']
+    else:
+        product['state_machine_rule_set'] = None
+
+    # exd_org_group
+    product['exd_org_group'] = relationships['exd_org_group']['name']
+
+    return product
+
+
+def normalize_product_version(data, product):
+    """
+    Simplify a product version from the REST API into a format we can
+    compare with our Ansible parameters.
+
+    :param dict data: one "data" element from
+                      api/v1/products/<product>/product_versions
+    :param str product: the product short_name, eg. "RHCEPH"
+    :returns: a dict of information about this product version
+    """
+    product_version = data['attributes']
+    product_version['brew_tags'] = data['brew_tags']
+    rhel_release = data['relationships']['rhel_release']['name']
+    product_version['rhel_release_name'] = rhel_release
+    product_version['sig_key_name'] = data['relationships']['sig_key']['name']
+    product_version['container_sig_key_name'] = \
+        data['relationships']['container_sig_key']['name']
+    product_version['ima_sig_key_name'] = \
+        data['relationships'].get('ima_sig_key', {'name': None})['name']
+    # push_targets
+    push_targets = [t['name'] for t in data['relationships']['push_targets']]
+    product_version['push_targets'] = push_targets
+    # Add in our product name, to simplify diff_settings().
+    product_version['product'] = product
+    # Add in our product_version id, to support edit_product_version()
+    product_version['id'] = data['id']
+    return product_version
+
+
+def normalize_variant(variant_data):
+    """
+    Simplify a variant from the REST API into a format we can compare with
+    our Ansible parameters.
+
+    :param dict variant_data: one "data" element from api/v1/variants
+    :returns: a dict of information about this variant
+    """
+    variant = {}
+    variant['id'] = variant_data['id']
+    # Unique to this variants API endpoint:
+    # "relationships" are nested inside "attributes".
+    # API Doc fix at CLOUDWF-308
+    attributes = variant_data['attributes']
+    variant.update(attributes)
+    relationships = variant.pop('relationships')
+    variant['product'] = relationships['product']['short_name']
+    variant['product_version'] = relationships['product_version']['name']
+    variant['rhel_variant'] = relationships['rhel_variant']['name']
+    push_targets = [pt['name'] for pt in relationships['push_targets']]
+    variant['push_targets'] = push_targets
+    return variant
+
+
+def normalize_cdn_repo(cdn_repo_data):
+    """
+    Simplify a CDN repo from the REST API into a format we can compare with
+    our Ansible parameters.
+
+    :param dict cdn_repo_data: one "data" element from api/v1/cdn_repos
+    :returns: dict of information about this CDN repository
+    """
+    cdn_repo = {}
+    cdn_repo['id'] = cdn_repo_data['id']
+    cdn_repo.update(cdn_repo_data['attributes'])
+    cdn_repo['arch'] = cdn_repo_data['relationships']['arch']['name']
+
+    # variants
+    variants = [variant['name'] for variant in
+                cdn_repo_data['relationships']['variants']]
+    cdn_repo['variants'] = variants
+
+    # packages (names only)
+    packages = cdn_repo_data['relationships'].get('packages', [])
+    package_names = [package['name'] for package in packages]
+    cdn_repo['package_names'] = package_names
+    return cdn_repo
+
+
+def normalize_release(release_data):
+    """
+    Simplify a release from the REST API into a format we can compare with
+    our Ansible parameters.
+
+    :param dict release_data: one "data" element from api/v1/releases
+    :returns: a dict of information about this release
+    """
+    release = {}
+    release['id'] = release_data['id']
+    release.update(release_data['attributes'])
+
+    # product
+    product = release_data['relationships']['product']
+    if product:
+        release['product'] = product['short_name']
+    else:
+        release['product'] = None
+
+    # program_manager
+    program_manager = release_data['relationships']['program_manager']
+    if program_manager:
+        release['program_manager'] = program_manager['login_name']
+    else:
+        release['program_manager'] = None
+
+    # state_machine_rule_set
+    rule_set = release_data['relationships']['state_machine_rule_set']
+    if rule_set:
+        release['state_machine_rule_set'] = rule_set['name']
+    else:
+        release['state_machine_rule_set'] = None
+
+    # brew_tags
+    brew_tags = release_data['relationships']['brew_tags']
+    release['brew_tags'] = [tag['name'] for tag in brew_tags]
+
+    # product_versions
+    product_version_data = release_data['relationships']['product_versions']
+    product_versions = [pv['name'] for pv in product_version_data]
+    release['product_versions'] = product_versions
+
+    # The current REST API returns some inconsistent names for booleans.
+    # "enabled" has no verb, but "is_active" has a verb.
+    # Rather than exposing this ugly API detail to users, we will paper
+    # over it here by renaming the keys to drop "is_".
+    release['active'] = release.pop('is_active')
+
+    # The API returns a full timestamp "ship_date", but we only accept
+    # "YYYY-MM-DD" in Ansible. "dateutil" would be more robust, but I'm trying
+    # to keep the dependencies light for this initial implementation.
+    if release['ship_date'] is not None:
+        release['ship_date'] = release['ship_date'][:10]
+
+    return release
+
+
+class SnapshotError(Exception):
+    """ We cannot answer a request from our snapshot """
+    pass
+
+
+class Snapshot(object):
+    """
+    A directory of recorded ET GET responses.
+
+    Each response is a JSON file named after a hash of the request's URL and
+    query parameters. One file per response means that many tasks (in
+    parallel forks) can record into the same snapshot safely.
+
+    We may replay a snapshot with a larger ERRATA_TOOL_CONCURRENCY than we
+    recorded it with. get_all_pages() then asks for more pages after the end
+    of a list than it did during the recording. We answer those pages with
+    an empty list, like the ET does.
+    """
+    def __init__(self, path):
+        self.path = path
+
+    def key(self, url, params=None):
+        """ Return a stable string for this GET request. """
+        if params:
+            url += '?' + urlencode(sorted(params.items()))
+        return url
+
+    def filename(self, key):
+        digest = hashlib.sha1(key.encode('utf-8')).hexdigest()
+        return os.path.join(self.path, digest + '.json')
+
+    def load(self, url, params=None):
+        """
+        Answer a GET request from this snapshot.
+
+        :returns: a requests.Response
+        :raises: SnapshotError if we never recorded this request.
+        """
+        key = self.key(url, params)
+        data = read_json_file(self.filename(key))
+        if data is None and self.past_last_page(url, params):
+            data = {
+                'status_code': 200,
+                'content_type': 'application/json',
+                'text': '{"data": []}',
+            }
+        if data is None:
+            raise SnapshotError('GET %s is not in snapshot %s'
+                                % (key, self.path))
+        response = requests.Response()
+        response.url = key
+        response.request = requests.Request('GET', key).prepare()
+        response.status_code = data['status_code']
+        response.headers['Content-Type'] = data['content_type']
+        response.encoding = 'utf-8'
+        response._content = data['text'].encode('utf-8')
+        return response
+
+    def past_last_page(self, url, params=None):
+        """
+        Find out if this GET request is for a page after the last recorded
+        page of a list (see get_all_pages()).
+
+        :returns: True if the last page that we recorded before this one
+                  was a short page, otherwise False.
+        """
+        if not params or 'page[number]' not in params:
+            return False
+        page_params = params.copy()
+        page_number = int(params['page[number]'])
+        while page_number > 1:
+            page_number -= 1
+            page_params['page[number]'] = page_number
+            data = read_json_file(self.filename(self.key(url, page_params)))
+            if data is None:
+                continue
+            if data['status_code'] != 200:
+                return False
+            found = json.loads(data['text'])['data']
+            return len(found) < int(params['page[size]'])
+        return False
+
+    def save(self, url, response, params=None):
+        """ Record this GET response in the snapshot. """
+        key = self.key(url, params)
+        data = {
+            'url': key,
+            'status_code': response.status_code,
+            'content_type': response.headers.get('Content-Type'),
+            'text': response.text,
+        }
+        makedirs(self.path)
+        write_json_file(self.filename(key), data)
+
+
+def endpoint_resource(endpoint):
+    """
+    Find the kind of resource for an API endpoint.
+
+    :param str endpoint: eg. "api/v1/products/RHCEPH/product_versions/123"
+    :returns: str, eg. "product_versions"
+    """
+    parts = endpoint.strip('/').split('/')
+    # Product versions are nested under their products:
+    if len(parts) > 4 and parts[2] == 'products':
+        return parts[4]
+    return parts[2]
+
+
+# Placeholder IDs for the resources that a Plan creates look like
+# "planned-id:products:RHCEPH". errata_tool_apply replaces each one with the
+# real ID after the ET creates the resource.
+PLANNED_ID_PREFIX = 'planned-id:'
+
+
+def planned_id(resource, name):
+    """
+    :param str resource: eg. "products" (see endpoint_resource())
+    :param str name: eg. "RHCEPH"
+    :returns: a placeholder ID str for this planned resource.
+    """
+    return '%s%s:%s' % (PLANNED_ID_PREFIX, resource, name)
+
+
+def parse_planned_id(value):
+    """
+    :param value: any value from a planned write's JSON
+    :returns: a (resource, name) tuple if this value is a planned_id()
+              placeholder, or None.
+    """
+    if not isinstance(value, string_types):
+        return None
+    if not value.startswith(PLANNED_ID_PREFIX):
+        return None
+    resource, name = value[len(PLANNED_ID_PREFIX):].split(':', 1)
+    return (resource, name)
+
+
+def planned_name(data):
+    """
+    Find the name of the resource that a planned POST creates.
+
+    :param dict data: the POST's JSON, eg. {"product": {"short_name": ...}}
+    :returns: the name, or None if this resource has no name (like a package
+              tag).
+    """
+    if not isinstance(data, dict):
+        return None
+    # Most endpoints wrap the settings in a key like "product".
+    if len(data) == 1:
+        wrapped = list(data.values())[0]
+        if isinstance(wrapped, dict):
+            data = wrapped
+    # The API finds products by short_name and users by login_name.
+    for key in ('short_name', 'login_name', 'name'):
+        if key in data:
+            return data[key]
+    return None
+
+
+def planned_response(status_code, data):
+    """
+    :returns: a requests.Response that looks like the ET accepted a write
+              and replied with this "data".
+    """
+    response = requests.Response()
+    response.status_code = status_code
+    response.headers['Content-Type'] = 'application/json'
+    response.encoding = 'utf-8'
+    response._content = json.dumps({'data': data}).encode('utf-8')
+    return response
+
+
+class Plan(object):
+    """
+    A list of ET writes to send later with the errata_tool_apply module.
+
+    Each module process writes its own JSON file in the plan directory, so
+    many tasks (in parallel forks) can plan into the same directory safely.
+    """
+    # The status code that each write's caller expects from the ET:
+    STATUS_CODES = {'POST': 201, 'PUT': 200, 'DELETE': 204}
+
+    def __init__(self, path):
+        self.path = path
+        self.operations = []
+        self.filename = None
+
+    def add(self, method, endpoint, json=None):
+        """
+        Record this write in the plan.
+
+        :returns: a requests.Response that looks like the ET accepted it.
+                  For a POST that creates a named resource, the response's
+                  data has a planned_id() placeholder "id".
+        """
+        method = method.upper()
+        status_code = self.STATUS_CODES.get(method, 200)
+        self.operations.append({
+            'method': method,
+            'endpoint': endpoint,
+            'json': json,
+            'status_code': status_code,
+        })
+        self.save()
+        # We have not created anything yet, so there is no data to return,
+        # except a placeholder ID for a new resource.
+        data = None
+        name = planned_name(json)
+        if method == 'POST' and name is not None:
+            data = {'id': planned_id(endpoint_resource(endpoint), name)}
+        return planned_response(status_code, data)
+
+    def save(self):
+        if self.filename is None:
+            makedirs(self.path)
+            fd, self.filename = tempfile.mkstemp(dir=self.path,
+                                                 prefix='plan-',
+                                                 suffix='.json')
+            os.close(fd)
+        write_json_file(self.filename, self.operations)
+
+    def created(self, resource, name):
+        """
+        Find a resource that this plan creates, in this task or in any other
+        task that planned into the same directory.
+
+        :param str resource: eg. "products" (see endpoint_resource())
+        :param str name: eg. "RHCEPH"
+        :returns: the planned_id() placeholder for this resource, or None if
+                  no task plans to create it.
+        """
+        operations = list(self.operations)
+        for filename in glob.glob(os.path.join(self.path, 'plan-*.json')):
+            if filename != self.filename:
+                operations.extend(read_json_file(filename) or [])
+        for operation in operations:
+            if (operation['method'] == 'POST'
+                    and endpoint_resource(operation['endpoint']) == resource
+                    and planned_name(operation['json']) == name):
+                return planned_id(resource, name)
+        return None
+
+
+def start_plan(client, check_mode):
+    """
+    Start recording this task's writes into a plan, if the user asked.
+
+    In check mode with ERRATA_TOOL_PLAN=/some/dir, we do not skip the writes.
+    Instead the client records them into a Plan.
+
+    :param client: Errata Client
+    :param bool check_mode: the module's check_mode
+    :returns: the check_mode value for our ensure_*() functions.
+    """
+    if check_mode and os.getenv('ERRATA_TOOL_PLAN'):
+        client.plan = Plan(os.environ['ERRATA_TOOL_PLAN'])
+        return False
+    return check_mode
+
+
+class FingerprintCache(object):
+    """
+    Remember the parameters of a task that recently matched the ET.
+
+    Within the TTL, a task with the same parameters can skip all its
+    requests and report no changes. The ET's API does not tell us when an
+    object last changed, so the TTL is our only way to notice changes that
+    someone made outside of Ansible.
+
+    Each entry is a JSON file named after a hash of the ET URL, module name
+    and resource name, so many tasks (in parallel forks) can share the same
+    cache directory safely.
+    """
+    def __init__(self, path, ttl, client, module_name, identity, params):
+        key = '%s %s %s' % (client.baseurl, module_name, identity)
+        digest = hashlib.sha1(key.encode('utf-8')).hexdigest()
+        self.filename = os.path.join(path, digest + '.json')
+        self.ttl = ttl
+        self.client = client
+        data = json.dumps(params, sort_keys=True, default=str)
+        self.fingerprint = hashlib.sha256(data.encode('utf-8')).hexdigest()
+
+    def fresh(self):
+        """ Did these same parameters match the ET within our TTL? """
+        entry = read_json_file(self.filename)
+        fresh = (entry is not None
+                 and entry['fingerprint'] == self.fingerprint
+                 and time.time() - entry['time'] < self.ttl)
+        self.client.stats.add_cache_lookup('fingerprint', fresh)
+        return fresh
+
+    def update(self, check_mode, result):
+        """
+        Remember these parameters if the ET matches them now.
+
+        :param bool check_mode: the check_mode value for ensure_*()
+        :param dict result: the ensure_*() result
+        """
+        # Planned writes and snapshots do not tell us about the live ET.
+        if self.client.plan or self.client.snapshot:
+            return
+        if check_mode and result['changed']:
+            return
+        makedirs(os.path.dirname(self.filename))
+        entry = {'fingerprint': self.fingerprint, 'time': time.time()}
+        write_json_file(self.filename, entry)
+
+
+def get_fingerprint_cache(client, module_name, identity, params):
+    """
+    Find the FingerprintCache for this task, if the user enabled it.
+
+    ERRATA_TOOL_FINGERPRINT_CACHE=/some/dir enables the cache, and
+    ERRATA_TOOL_FINGERPRINT_TTL sets how many seconds we trust each entry
+    (default: one day).
+
+    :param client: Errata Client
+    :param str module_name: eg. "errata_tool_product"
+    :param str identity: the resource name, eg. "RHCEPH"
+    :param dict params: the parameters for ensure_*()
+    :returns: a FingerprintCache, or None if the user did not enable it.
+    :raises ValueError: if ERRATA_TOOL_FINGERPRINT_TTL is not an integer.
+    """
+    path = os.getenv('ERRATA_TOOL_FINGERPRINT_CACHE')
+    if not path:
+        return None
+    value = os.getenv('ERRATA_TOOL_FINGERPRINT_TTL', '86400')
+    try:
+        ttl = int(value)
+    except ValueError:
+        raise ValueError('ERRATA_TOOL_FINGERPRINT_TTL must be an integer, '
+                         'not "%s"' % value)
+    return FingerprintCache(path, ttl, client, module_name, identity, params)
+
+
+class Profiler(object):
+    """
+    Profile one module run with cProfile ("cpu") or tracemalloc ("mem").
+
+    We name each profile file after the module and the resource name, so
+    you can find the profile for a slow task in a large playbook.
+
+    cProfile only profiles the thread that started it, so a "cpu" profile
+    does not include the work in parallel_map()'s worker threads.
+    ("mem" profiles include every thread.)
+    """
+    # Number of allocation sites to write for a "mem" profile.
+    TOP_ALLOCATIONS = 50
+
+    def __init__(self, kind, directory, module_name, identity):
+        if kind not in ('cpu', 'mem'):
+            raise ValueError('ERRATA_TOOL_PROFILE must be "cpu" or "mem", '
+                             'not "%s"' % kind)
+        if kind == 'mem' and not tracemalloc:
+            raise ValueError('ERRATA_TOOL_PROFILE=mem requires Python 3')
+        self.kind = kind
+        # Resource names can have "/" characters, eg. CDN repos.
+        safe_identity = re.sub(r'[^\w.@-]', '_', identity)
+        extension = '.pstats' if kind == 'cpu' else '.txt'
+        filename = '%s-%s-%s%s' % (module_name, safe_identity, kind,
+                                   extension)
+        self.path = os.path.join(directory, filename)
+        self.profile = None
+
+    def start(self):
+        if self.kind == 'cpu':
+            self.profile = cProfile.Profile()
+            self.profile.enable()
+        else:
+            tracemalloc.start()
+
+    def stop(self):
+        """
+        Stop profiling and write the profile file.
+
+        :returns: the path to the profile file.
+        """
+        makedirs(os.path.dirname(self.path))
+        if self.kind == 'cpu':
+            self.profile.disable()
+            self.profile.dump_stats(self.path)
+            return self.path
+        snapshot = tracemalloc.take_snapshot()
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        stats = snapshot.statistics('lineno')
+        with open(self.path, 'w') as f:
+            f.write('peak: %d KiB\n' % (peak // 1024))
+            for stat in stats[:self.TOP_ALLOCATIONS]:
+                f.write('%s\n' % stat)
+        return self.path
+
+
+def start_profile(module, module_name, identity):
+    """
+    Profile this module run, if the user enabled profiling.
+
+    ERRATA_TOOL_PROFILE=cpu|mem enables profiling, and
+    ERRATA_TOOL_PROFILE_DIR sets the directory for the profile files
+    (default: the system's temporary directory).
+
+    When the module exits, we write the profile file and return its path in
+    the "profile" key of the module's result.
+
+    :param module: AnsibleModule
+    :param str module_name: eg. "errata_tool_product"
+    :param str identity: the resource name, eg. "RHCEPH"
+    :returns: a Profiler, or None if the user did not enable profiling.
+    """
+    kind = os.getenv('ERRATA_TOOL_PROFILE')
+    if not kind:
+        return None
+    directory = os.getenv('ERRATA_TOOL_PROFILE_DIR', tempfile.gettempdir())
+    try:
+        profiler = Profiler(kind, directory, module_name, identity)
+    except ValueError as e:
+        module.fail_json(msg=str(e), changed=False, rc=1)
+
+    def stop(result, failed):
+        result['profile'] = profiler.stop()
+
+    on_exit(module, stop)
+    profiler.start()
+    return profiler
+
+
+def endpoint_template(endpoint):
+    """
+    Replace the IDs and names in an API endpoint with ":id", so we can count
+    requests for the same endpoint together.
+
+    For example, "api/v1/products/RHCEPH/product_versions/1234" becomes
+    "api/v1/products/:id/product_versions/:id".
+
+    :param str endpoint: eg. "api/v1/cdn_repo_package_tags/1234"
+    :returns: str
+    """
+    segments = endpoint.split('?')[0].strip('/').split('/')
+    if segments[:2] == ['api', 'v1']:
+        # REST API paths alternate between collections and identifiers.
+        for index in range(3, len(segments), 2):
+            segments[index] = ':id'
+        return '/'.join(segments)
+    path = re.sub(r'/\d+(?=/|$)', '/:id', '/'.join(segments))
+    # Older endpoints like product_versions/RHEL-8.json
+    return re.sub(r'/[^/]+\.json$', '/:id.json', path)
+
+
+class RequestStats(object):
+    """
+    Count the ET requests and cache lookups for one module run.
+
+    Modules return these numbers in their "errata_tool_stats" result (see
+    report_stats()), so the errata_tool_stats callback plugin can summarize
+    the ET API usage for a whole playbook.
+    """
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.requests = []
+        self.caches = {}
+
+    def add_request(self, method, endpoint, seconds, status_code=None,
+                    size=0):
+        """
+        :param str method: eg. "GET"
+        :param str endpoint: eg. "api/v1/cdn_repo_package_tags/1234". See
+                             endpoint_template().
+        :param float seconds: how long the ET took to respond.
+        :param int status_code: HTTP status code of the response.
+        :param int size: number of bytes in the response body.
+        """
+        request = {
+            'method': method,
+            'endpoint': endpoint_template(endpoint),
+            'seconds': seconds,
+            'status_code': status_code,
+            'size': size,
+        }
+        with self.lock:
+            self.requests.append(request)
+
+    def add_cache_lookup(self, name, hit):
+        """
+        :param str name: eg. "fingerprint"
+        :param bool hit: True if the cache had the data we needed.
+        """
+        with self.lock:
+            stats = self.caches.setdefault(name, {'hits': 0, 'misses': 0})
+            stats['hits' if hit else 'misses'] += 1
+
+    def report(self):
+        """ Return these numbers as a dict for a module's result """
+        endpoints = {}
+        for request in self.requests:
+            key = '%s %s' % (request['method'], request['endpoint'])
+            stats = endpoints.setdefault(key, {'requests': 0,
+                                               'seconds': 0.0})
+            stats['requests'] += 1
+            stats['seconds'] += request['seconds']
+        for stats in endpoints.values():
+            stats['seconds'] = round(stats['seconds'], 3)
+        seconds = sum(request['seconds'] for request in self.requests)
+        return {
+            'requests': len(self.requests),
+            'seconds': round(seconds, 3),
+            'endpoints': endpoints,
+            'caches': dict(self.caches),
+        }
+
+
+class PrometheusTextfile(object):
+    """
+    Add a module run's RequestStats to a node_exporter "textfile collector"
+    file.
+
+    Every module run adds its numbers to the counters that are already in
+    the file. We hold a lock file while we read and rewrite the file, so
+    tasks in parallel forks do not lose each other's numbers, and we rewrite
+    the file atomically, so node_exporter never reads a partial file.
+
+    We have no retry counter, because the Client never retries a request.
+    """
+    # Histogram buckets for request durations, in seconds.
+    BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+
+    METRICS = [
+        ('errata_tool_requests_total', 'counter',
+         'Errata Tool HTTP requests'),
+        ('errata_tool_request_duration_seconds', 'histogram',
+         'Errata Tool HTTP response times'),
+        ('errata_tool_response_bytes_total', 'counter',
+         'Errata Tool HTTP response body bytes'),
+        ('errata_tool_cache_lookups_total', 'counter',
+         'errata-tool-ansible cache lookups'),
+    ]
+
+    SAMPLE = re.compile(r'^(\w+)(\{.*\})? (\S+)$')
+
+    def __init__(self, path):
+        self.path = path
+
+    @staticmethod
+    def labels(**labels):
+        pairs = []
+        for key, value in sorted(labels.items()):
+            value = str(value).replace('\\', '\\\\').replace('"', '\\"')
+            pairs.append('%s="%s"' % (key, value))
+        return '{%s}' % ','.join(pairs)
+
+    def samples(self, stats):
+        """
+        Convert RequestStats into Prometheus samples.
+
+        :returns: dict of (metric name, labels str) tuples to numbers.
+        """
+        samples = {}
+
+        def add(name, labels, value):
+            key = (name, labels)
+            samples[key] = samples.get(key, 0) + value
+
+        for request in stats.requests:
+            method = request['method']
+            endpoint = request['endpoint']
+            add('errata_tool_requests_total',
+                self.labels(method=method, endpoint=endpoint,
+                            status=request['status_code']), 1)
+            add('errata_tool_response_bytes_total',
+                self.labels(method=method, endpoint=endpoint),
+                request['size'])
+            name = 'errata_tool_request_duration_seconds'
+            for le in self.BUCKETS + ('+Inf',):
+                # Histogram buckets are cumulative.
+                count = int(le == '+Inf' or request['seconds'] <= le)
+                add(name + '_bucket',
+                    self.labels(method=method, endpoint=endpoint, le=le),
+                    count)
+            labels = self.labels(method=method, endpoint=endpoint)
+            add(name + '_sum', labels, request['seconds'])
+            add(name + '_count', labels, 1)
+        for cache, lookups in stats.caches.items():
+            for key, result in (('hits', 'hit'), ('misses', 'miss')):
+                add('errata_tool_cache_lookups_total',
+                    self.labels(cache=cache, result=result), lookups[key])
+        return samples
+
+    def read(self):
+        """ Read the samples that are already in our file """
+        samples = {}
+        try:
+            with open(self.path) as f:
+                lines = f.readlines()
+        except (IOError, OSError):
+            return samples
+        for line in lines:
+            match = self.SAMPLE.match(line.strip())
+            if not match or line.startswith('#'):
+                continue
+            name, labels, value = match.groups()
+            samples[(name, labels or '')] = float(value)
+        return samples
+
+    def render(self, samples):
+        def sort_key(key):
+            name, labels = key
+            match = re.search(r'le="([^"]+)"', labels)
+            le = float(match.group(1)) if match else 0
+            return (re.sub(r',?le="[^"]+"', '', labels), name, le)
+
+        lines = []
+        for family, kind, description in self.METRICS:
+            keys = [key for key in samples if key[0] == family
+                    or key[0].startswith(family + '_')]
+            if not keys:
+                continue
+            lines.append('# HELP %s %s' % (family, description))
+            lines.append('# TYPE %s %s' % (family, kind))
+            for key in sorted(keys, key=sort_key):
+                value = samples[key]
+                if value == int(value):
+                    value = int(value)
+                lines.append('%s%s %s' % (key[0], key[1], value))
+        return '\n'.join(lines) + '\n'
+
+    def write(self, stats):
+        """ Add these RequestStats to our file """
+        directory = os.path.dirname(os.path.abspath(self.path))
+        with open(self.path + '.lock', 'w') as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            samples = self.read()
+            for key, value in self.samples(stats).items():
+                samples[key] = samples.get(key, 0) + value
+            fd, tmp_path = tempfile.mkstemp(dir=directory)
+            with os.fdopen(fd, 'w') as f:
+                f.write(self.render(samples))
+            # node_exporter needs to read this file.
+            os.chmod(tmp_path, 0o644)
+            os.rename(tmp_path, self.path)
+
+
+def report_stats(module, client):
+    """
+    Return this client's RequestStats in the module's "errata_tool_stats"
+    result when the module exits.
+
+    If ERRATA_TOOL_PROMETHEUS_TEXTFILE is set to a file path, we also add
+    the RequestStats to that file (see PrometheusTextfile).
+
+    :param module: AnsibleModule
+    :param client: Errata Client
+    """
+    def add_stats(result, failed):
+        result['errata_tool_stats'] = client.stats.report()
+        path = os.getenv('ERRATA_TOOL_PROMETHEUS_TEXTFILE')
+        if not path:
+            return
+        try:
+            PrometheusTextfile(path).write(client.stats)
+        except (IOError, OSError) as e:
+            # Monitoring must not fail a task.
+            module.warn('could not write %s: %s' % (path, e))
+
+    on_exit(module, add_stats)
+
+
+class SlowRequestLog(object):
+    """
+    Log ET requests that take longer than a threshold, as JSON lines.
+
+    Each line records one slow request, with the module and resource (eg.
+    "errata_tool_cdn_repo" and "rhceph/rhceph-4-rhel8") that sent it. We
+    append each line as soon as the request finishes, so many forks can log
+    to the same file.
+    """
+    def __init__(self, path, threshold_ms, module_name, identity,
+                 warn=None):
+        """
+        :param str path: log file path
+        :param float threshold_ms: log requests slower than this.
+        :param str module_name: eg. "errata_tool_product"
+        :param str identity: the resource name, eg. "RHCEPH"
+        :param warn: callable that takes a warning message str, eg.
+                     AnsibleModule.warn. If we cannot write the log, we warn
+                     once and stop logging, so the log never fails a task.
+        """
+        self.path = path
+        self.threshold_ms = threshold_ms
+        self.module_name = module_name
+        self.identity = identity
+        self.warn = warn
+        self.broken = False
+
+    def add(self, method, endpoint, params, status_code, seconds):
+        """
+        Log this request if it was slow.
+
+        :param str method: eg. "GET"
+        :param str endpoint: eg. "api/v1/cdn_repo_package_tags"
+        :param dict params: the request's query parameters, or None.
+        :param int status_code: HTTP status code of the response.
+        :param float seconds: how long the ET took to respond.
+        """
+        elapsed_ms = seconds * 1000
+        if elapsed_ms < self.threshold_ms or self.broken:
+            return
+        entry = {
+            'time': time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime()),
+            'method': method,
+            'endpoint': endpoint_template(endpoint),
+            'path': endpoint,
+            'params': params or {},
+            'status_code': status_code,
+            'elapsed_ms': round(elapsed_ms, 1),
+            'module': self.module_name,
+            'resource': self.identity,
+        }
+        line = json.dumps(entry, sort_keys=True) + '\n'
+        try:
+            append_line(self.path, line)
+        except (IOError, OSError) as e:
+            self.broken = True
+            if self.warn:
+                self.warn('could not write %s: %s' % (self.path, e))
+
+
+def start_slow_log(module, client, module_name, identity):
+    """
+    Log this client's slow requests, if the user set a threshold.
+
+    ERRATA_TOOL_SLOW_MS sets the threshold in milliseconds, and
+    ERRATA_TOOL_SLOW_LOG sets the log file path (default:
+    "errata_tool_slow.log" in the system's temporary directory).
+
+    :param module: AnsibleModule
+    :param client: Errata Client
+    :param str module_name: eg. "errata_tool_product"
+    :param str identity: the resource name, eg. "RHCEPH"
+    :returns: a SlowRequestLog, or None if the user did not set a threshold.
+    """
+    threshold = os.getenv('ERRATA_TOOL_SLOW_MS')
+    if not threshold:
+        return None
+    try:
+        threshold_ms = float(threshold)
+    except ValueError:
+        msg = 'ERRATA_TOOL_SLOW_MS must be a number, not "%s"' % threshold
+        module.fail_json(msg=msg, changed=False, rc=1)
+    default = os.path.join(tempfile.gettempdir(), 'errata_tool_slow.log')
+    path = os.getenv('ERRATA_TOOL_SLOW_LOG', default)
+    client.slow_log = SlowRequestLog(path, threshold_ms, module_name,
+                                     identity, module.warn)
+    return client.slow_log
+
+
+def get_concurrency():
+    """
+    Read the ERRATA_TOOL_CONCURRENCY environment variable.
+
+    :returns: int, the maximum number of requests to send in parallel. This
+              is always at least 1, because get_all_pages() would never
+              advance with 0 requests in flight.
+    :raises ValueError: if the setting is not an integer.
+    """
+    value = os.getenv('ERRATA_TOOL_CONCURRENCY', '4')
+    try:
+        concurrency = int(value)
+    except ValueError:
+        raise ValueError('ERRATA_TOOL_CONCURRENCY must be an integer, '
+                         'not "%s"' % value)
+    return max(concurrency, 1)
+
+
 class UserNotFoundError(Exception):
     """ This user does not exist """
     pass
 
 
+@traced('read')
 def get_user(client, login_name, fatal=False):
     """
     Look up data for a user by login_name
@@ -231,6 +1707,7 @@ def get_user(client, login_name, fatal=False):
     return data
 
 
+@traced('resolve')
 def user_id(client, login_name):
     """
     Convert a user login_name to an id
@@ -258,32 +1735,147 @@ class Client(object):
 
       ERRATA_TOOL_URL=https://my.errata.dev.host/
       ERRATA_TOOL_AUTH="notkerberos"
+
+    ERRATA_TOOL_CONCURRENCY sets the maximum number of requests that we
+    will send in parallel (for example, when reading many pages of a list).
+
+    ERRATA_TOOL_SNAPSHOT_RECORD=/some/dir records every GET response into a
+    snapshot directory, and ERRATA_TOOL_SNAPSHOT=/some/dir answers every GET
+    from that snapshot instead of the network (see Snapshot).
+
+    If we have a "plan" (see start_plan()), we record every write into it
+    instead of sending it.
+
+    start_module() creates the Client for each module run, and it sets our
+    "fingerprints" (see get_fingerprint_cache()) for the modules that use
+    them.
+
+    If the user enabled tracing (see get_tracer()), each HTTP request is a
+    tracing span. We count every request in our RequestStats, and log slow
+    requests to our SlowRequestLog (see start_slow_log()).
     """
     def __init__(self):
         self.baseurl = os.getenv('ERRATA_TOOL_URL',
                                  'https://errata.devel.redhat.com')
+        self.concurrency = get_concurrency()
+        self.snapshot = None
+        self.recorder = None
+        self.plan = None
+        self.stats = RequestStats()
+        self.slow_log = None
+        self.fingerprints = None
+        if os.getenv('ERRATA_TOOL_SNAPSHOT'):
+            self.snapshot = Snapshot(os.environ['ERRATA_TOOL_SNAPSHOT'])
+        elif os.getenv('ERRATA_TOOL_SNAPSHOT_RECORD'):
+            self.recorder = Snapshot(os.environ['ERRATA_TOOL_SNAPSHOT_RECORD'])
         self.session = requests.Session()
         auth = os.getenv('ERRATA_TOOL_AUTH', 'kerberos')
         if auth == 'kerberos':
             self.session.auth = HTTPSPNEGOAuth(opportunistic_auth=True,
                                                mutual_authentication=DISABLED)
 
-    def delete(self, endpoint, **kwargs):
+    def _send(self, method, endpoint, **kwargs):
         url = posixpath.join(self.baseurl, endpoint)
-        return self.session.delete(url, **kwargs)
+        attributes = {'http.method': method, 'http.url': url}
+        with span('HTTP %s' % method, SPAN_KIND_CLIENT,
+                  **attributes) as http_span:
+            start = time.time()
+            response = self.session.request(method, url, **kwargs)
+            seconds = time.time() - start
+            self.stats.add_request(method, endpoint, seconds,
+                                   response.status_code,
+                                   len(response.content))
+            if self.slow_log:
+                self.slow_log.add(method, endpoint, kwargs.get('params'),
+                                  response.status_code, seconds)
+            if http_span:
+                http_span.attributes['http.status_code'] = \
+                    response.status_code
+            return response
+
+    def _check_writable(self, method, endpoint):
+        if self.snapshot:
+            raise SnapshotError('cannot %s %s with ERRATA_TOOL_SNAPSHOT'
+                                % (method, endpoint))
+
+    def delete(self, endpoint, **kwargs):
+        if self.plan:
+            return self.plan.add('DELETE', endpoint, kwargs.get('json'))
+        self._check_writable('DELETE', endpoint)
+        return self._send('DELETE', endpoint, **kwargs)
 
     def get(self, endpoint, **kwargs):
         url = posixpath.join(self.baseurl, endpoint)
-        return self.session.get(url, **kwargs)
+        params = kwargs.get('params')
+        if self.snapshot:
+            return self.snapshot.load(url, params)
+        response = self._send('GET', endpoint, **kwargs)
+        if self.recorder:
+            self.recorder.save(url, response, params)
+        return response
 
     def post(self, endpoint, **kwargs):
-        url = posixpath.join(self.baseurl, endpoint)
-        return self.session.post(url, **kwargs)
+        if self.plan:
+            return self.plan.add('POST', endpoint, kwargs.get('json'))
+        self._check_writable('POST', endpoint)
+        return self._send('POST', endpoint, **kwargs)
 
     def put(self, endpoint, **kwargs):
-        url = posixpath.join(self.baseurl, endpoint)
-        return self.session.put(url, **kwargs)
+        if self.plan:
+            return self.plan.add('PUT', endpoint, kwargs.get('json'))
+        self._check_writable('PUT', endpoint)
+        return self._send('PUT', endpoint, **kwargs)
 
     def request(self, method, endpoint, **kwargs):
-        url = posixpath.join(self.baseurl, endpoint)
-        return self.session.request(method, url, **kwargs)
+        if method.upper() == 'GET':
+            return self.get(endpoint, **kwargs)
+        if self.plan:
+            return self.plan.add(method, endpoint, kwargs.get('json'))
+        self._check_writable(method, endpoint)
+        return self._send(method, endpoint, **kwargs)
+
+
+def start_module(module, module_name, identity, params=None, plan=True):
+    """
+    Set up this module run and create its Client.
+
+    We start profiling (see start_profile()) and tracing (see start_trace()),
+    we report the Client's RequestStats (see report_stats()), and we log the
+    Client's slow requests (see start_slow_log()). In check mode, we record
+    the writes into a plan if the user asked (see start_plan()).
+
+    If the module passes its "params", we also find its FingerprintCache (see
+    get_fingerprint_cache()) and set it as the client's "fingerprints". If
+    these params recently matched the ET, the module exits here with no
+    changes.
+
+    :param module: AnsibleModule
+    :param str module_name: eg. "errata_tool_product"
+    :param str identity: the resource name, eg. "RHCEPH"
+    :param dict params: the parameters for ensure_*(), or None if this
+                        module does not use the fingerprint cache.
+    :param bool plan: set this to False for modules that must never record
+                      their writes into a plan (eg. errata_tool_apply).
+    :returns: a two-element tuple: the Client, and the check_mode value for
+              our ensure_*() functions.
+    """
+    start_profile(module, module_name, identity)
+    start_trace(module, module_name, identity)
+    try:
+        client = Client()
+    except ValueError as e:
+        module.fail_json(msg=str(e), changed=False, rc=1)
+    report_stats(module, client)
+    start_slow_log(module, client, module_name, identity)
+    check_mode = module.check_mode
+    if plan:
+        check_mode = start_plan(client, check_mode)
+    if params is not None:
+        try:
+            client.fingerprints = get_fingerprint_cache(client, module_name,
+                                                        identity, params)
+        except ValueError as e:
+            module.fail_json(msg=str(e), changed=False, rc=1)
+        if client.fingerprints and client.fingerprints.fresh():
+            module.exit_json(changed=False, stdout_lines=[])
+    return (client, check_mode)
@@ -0,0 +1,876 @@
+"""
+Shared code for the errata_tool_cdn_repo and errata_tool_tree modules.
+"""
+from collections import namedtuple
+from contextlib import contextmanager
+import fcntl
+import threading
+from ansible.module_utils import common_errata_tool
+from ansible.module_utils.six import string_types
+
+
+CDN_RELEASE_TYPES = [
+    'Primary',
+    'EUS',
+    'LongLife',
+]
+
+CDN_CONTENT_TYPES = [
+    'Binary',
+    'Debuginfo',
+    'Source',
+    'Docker',
+]
+
+PACKAGES_MODES = [
+    'replace',
+    'merge',
+]
+
+
+class PackageTag(namedtuple('PackageTag', ['id', 'variant', 'for_hotfix',
+                                           'for_prerelease'])):
+    """
+    The settings for one tag template of one package in a CDN repo.
+
+    The package tags cache holds every tag of every CDN repo in memory, so we
+    store each tag as a small tuple instead of a dict.
+
+    "id" is the ID number of this tag in the ET, or None for a tag that the
+    user wants (see normalize_packages()). "variant" is the name of the
+    variant that restricts this tag, or None if there is no restriction.
+    """
+    __slots__ = ()
+
+    def as_dict(self):
+        """
+        :returns: a dict with "id", "for_hotfix" and "for_prerelease" keys.
+                  If a variant restricts this tag, the dict also has a
+                  "variant" key. The errata_tool_facts module returns each
+                  tag in this format.
+        """
+        tag = {
+            'id': self.id,
+            'for_hotfix': self.for_hotfix,
+            'for_prerelease': self.for_prerelease,
+        }
+        if self.variant is not None:
+            tag['variant'] = self.variant
+        return tag
+
+
+# The ET creates these tags when we add a package to a Docker CDN repo:
+DEFAULT_DOCKER_TAGS = {
+    '{{version}}-{{release}}': PackageTag(None, None, False, False),
+    '{{version}}-prerelease-{{advisory}}': PackageTag(None, None, False, True),
+    '{{version}}-{{hotfix}}-{{advisory}}': PackageTag(None, None, True, False),
+}
+
+
+def normalize_packages(packages):
+    """
+    Normalize the "packages" values from the Ansible task.
+
+    For each package, users pass in a list of tag templates. The list elements
+    can be strings or dicts.
+
+    Normalize this in the following ways:
+    1) Translate each tags list to a dict. This ensures that every
+       tag is unique.
+    2) Transform every tag value to a PackageTag. This makes comparisons
+       easier with our live data in the ET.
+
+    :param dict packages: Each key is a package name, and each value is a
+                          (possibly empty) list of tags. Each tag is either a
+                          string or a dict.
+    :returns: A dict of packages. Each key is a package name. Each value is a
+              dict of tags. Each key is a tag template, and each value is a
+              PackageTag with no "id".
+    """
+    normalized = {}
+    for package_name, tags in packages.items():
+        normalized[package_name] = {}
+        for tag in tags:
+            if isinstance(tag, string_types):
+                # No variant restrictions present
+                normalized[package_name][tag] = PackageTag(None, None, False,
+                                                           False)
+            elif isinstance(tag, dict):
+                # Variant restrictions present
+                tag_string = next(iter(tag))
+                settings = tag[tag_string]
+                normalized[package_name][tag_string] = PackageTag(
+                    None,
+                    settings.get('variant'),
+                    settings.get('for_hotfix', False),
+                    settings.get('for_prerelease', False))
+            else:
+                raise ValueError('unexpected %s' % type(tag))
+    return normalized
+
+
+def package_tag_records(elements):
+    """
+    Simplify a list of cdn_repo_package_tags API elements into PackageTags.
+
+    Large repos have many thousands of tags, so we save memory here: each
+    tag is a PackageTag instead of a dict, and all the tags with the same
+    variant share one variant name string.
+
+    :param list elements: "data" elements from api/v1/cdn_repo_package_tags
+                          for a single CDN repository.
+    :returns: dict of "packages: tag_templates" (see get_package_tags()).
+    """
+    packages = {}
+    variants = {}
+    for element in elements:
+        attributes = element['attributes']
+        relationships = element['relationships']
+        package = packages.setdefault(relationships['package']['name'], {})
+        variant = None
+        if 'variant' in relationships:
+            variant = relationships['variant']['name']
+            variant = variants.setdefault(variant, variant)
+        package[attributes['tag_template']] = PackageTag(
+            element['id'],
+            variant,
+            attributes['for_hotfix'],
+            attributes['for_prerelease'])
+    return packages
+
+
+@common_errata_tool.traced('read')
+def get_package_tags(client, name, package_names=None):
+    """
+    Look up the variant restrictions for all packages/tags for this repo.
+
+    Note it's possible that the ET team could consider other package/tag
+    restrictions in the future. See ERRATA-5644 for one example of
+    how this might possibly change in the future.
+
+    :param str name: CDN Repository name
+    :param list package_names: If set, only look up the tags for these
+                               packages, rather than every package in this
+                               repo.
+    :returns: dict of "packages: tag_templates". Each key is a package
+              name, and each value is a dict of tag templates to PackageTags.
+              If a package in this repo has no tags, you must discover it
+              with get_cdn_repo(), because this API will not return it.
+    """
+    # We will query all the packages' tags for this repo.
+    # Example for looking up one single package in one single repo:
+    # https://errata.devel.redhat.com/api/v1/cdn_repo_package_tags?filter[package_name]=ubi8-container&filter[cdn_repo_name]=ubi8
+    endpoint = 'api/v1/cdn_repo_package_tags'
+    params = {'filter[cdn_repo_name]': name}
+    if package_names is None:
+        elements = common_errata_tool.get_all_pages(client, endpoint, params)
+        return package_tag_records(elements)
+
+    def get_one_package(package_name):
+        package_params = params.copy()
+        package_params['filter[package_name]'] = package_name
+        return common_errata_tool.get_all_pages(client, endpoint,
+                                                package_params)
+
+    elements = []
+    pages = common_errata_tool.parallel_map(get_one_package,
+                                            package_names,
+                                            client.concurrency)
+    for found in pages:
+        elements += found
+    return package_tag_records(elements)
+
+
+@common_errata_tool.traced('read')
+def prefetch_package_tags(client):
+    """
+    Look up all the packages/tags for every CDN repo in one sweep.
+
+    This is much faster than calling get_package_tags() for hundreds of
+    repos one at a time, because we read every page of
+    api/v1/cdn_repo_package_tags concurrently (see get_all_pages()).
+
+    :param client: Errata Client
+    :returns: dict of "repo name: packages". Each value is in the
+              get_package_tags() format. CDN repos with no tags at all are
+              not in this dict.
+    """
+    endpoint = 'api/v1/cdn_repo_package_tags'
+    elements = common_errata_tool.get_all_pages(client, endpoint)
+    repos = {}
+    for element in elements:
+        repo_name = element['relationships']['cdn_repo']['name']
+        repos.setdefault(repo_name, []).append(element)
+    return {repo_name: package_tag_records(repo_elements)
+            for repo_name, repo_elements in repos.items()}
+
+
+class PackageTagsCache(object):
+    """
+    Share one prefetch_package_tags() sweep across many tasks.
+
+    Ansible runs every task in a new process, so we store the index in a
+    JSON file. Set ERRATA_TOOL_PACKAGE_TAGS_CACHE to the path of this file.
+    The first task that needs package tags creates the file, and every
+    following task reads from it. Delete the file at the start of your play
+    (or whenever you want to discard the cached data).
+
+    JSON has no tuples, so the file stores each PackageTag as a list.
+    """
+    def __init__(self, path):
+        self.path = path
+        self._repos = None
+        # Tasks in other processes (Ansible forks) and other threads in this
+        # process (errata_tool_tree's workers) share the file. We hold both
+        # locks whenever we read-modify-write it, so that we never lose
+        # another task's update.
+        self._lock = threading.Lock()
+
+    def read(self):
+        """
+        Read every repo's packages/tags from the cache file.
+
+        :returns: dict of "repo name: packages" (see prefetch_package_tags()),
+                  or None if the file does not exist.
+        """
+        repos = common_errata_tool.read_json_file(self.path)
+        if repos is None:
+            return None
+        return {repo_name: {package_name: {tag_template: PackageTag(*tag)
+                                           for tag_template, tag
+                                           in tags.items()}
+                            for package_name, tags in packages.items()}
+                for repo_name, packages in repos.items()}
+
+    @contextmanager
+    def locked(self):
+        """
+        Hold the lock file and this object's thread lock.
+        """
+        with self._lock:
+            with open(self.path + '.lock', 'w') as lock:
+                fcntl.flock(lock, fcntl.LOCK_EX)
+                yield
+
+    def get(self, client, name):
+        """
+        Look up the packages/tags for this repo from the cache.
+
+        :param client: Errata Client
+        :param str name: CDN Repository name
+        :returns: dict in the get_package_tags() format.
+        """
+        repos = self._repos
+        hit = repos is not None
+        if not hit:
+            with self.locked():
+                # Another task may have written the file while we waited for
+                # the lock.
+                repos = self.read()
+                hit = repos is not None
+                if not hit:
+                    repos = prefetch_package_tags(client)
+                    common_errata_tool.write_json_file(self.path, repos)
+                self._repos = repos
+        client.stats.add_cache_lookup('package_tags', hit)
+        return repos.get(name, {})
+
+    def refresh(self, client, name):
+        """
+        Re-read this repo's packages/tags after we have changed them.
+
+        :param client: Errata Client
+        :param str name: CDN Repository name
+        """
+        packages = get_package_tags(client, name)
+        with self.locked():
+            # Other tasks may have updated the file since we read it, so we
+            # re-read it under the lock and only change this repo.
+            repos = self.read()
+            if repos is not None:
+                repos[name] = packages
+                common_errata_tool.write_json_file(self.path, repos)
+            self._repos = repos
+
+
+@common_errata_tool.traced('read')
+def get_cdn_repo(client, name, cdn_repo_data=None):
+    """
+    Get information about a CDN repo in the Errata Tool, and simplify it into
+    a format we can compare with our Ansible parameters.
+
+    :param client: Errata Client
+    :param str name: CDN Repository name
+    :param dict cdn_repo_data: data about this CDN repository (eg. from an
+                               earlier POST response).
+    :returns: dict of information about this CDN repository
+    """
+    if cdn_repo_data is None:
+        # CLOUDWF-316 to get cdn_repos directly by name.
+        response = client.get('api/v1/cdn_repos',
+                              params={'filter[name]': name})
+        response.raise_for_status()
+        json = response.json()
+        results = json['data']
+        if not results:
+            return None
+        if len(results) > 1:
+            raise ValueError('multiple %s cdn_repos found' % name)
+        cdn_repo_data = results[0]
+    return common_errata_tool.normalize_cdn_repo(cdn_repo_data)
+
+
+def cdn_repo_api_data(params):
+    """
+    Transform our Ansible params into JSON data for POST'ing or PUT'ing.
+    to /api/v1/cdn_repo.
+    """
+    cdn_repo = params.copy()
+    # Update the values for ones that the REST API will accept:
+    if 'arch' in cdn_repo:
+        cdn_repo['arch_name'] = cdn_repo.pop('arch')
+    if 'variants' in cdn_repo:
+        cdn_repo['variant_names'] = cdn_repo.pop('variants')
+    data = {'cdn_repo': cdn_repo}
+    return data
+
+
+@common_errata_tool.traced('write')
+def create_cdn_repo(client, params):
+    data = cdn_repo_api_data(params)
+    response = client.post('api/v1/cdn_repos', json=data)
+    if response.status_code != 201:
+        raise common_errata_tool.ErrataToolError(response)
+    name = params['name']
+    data = response.json()
+    cdn_repo_data = data['data']
+    if common_errata_tool.parse_planned_id(cdn_repo_data['id']):
+        # We only planned to create this repo (see ERRATA_TOOL_PLAN).
+        return None
+    return get_cdn_repo(client, name, cdn_repo_data=cdn_repo_data)
+
+
+@common_errata_tool.traced('write')
+def edit_cdn_repo(client, cdn_repo_id, differences):
+    # Create a Ansible params-like dict for the api_data() method.
+    params = {}
+    for difference in differences:
+        key, _, new = difference
+        params[key] = new
+    data = cdn_repo_api_data(params)
+    response = client.put('api/v1/cdn_repos/%d' % cdn_repo_id, json=data)
+    if response.status_code != 200:
+        raise common_errata_tool.ErrataToolError(response)
+
+
+@common_errata_tool.traced('write')
+def add_package_tag(client, repo_name, package_name, tag_template,
+                    variant, for_hotfix, for_prerelease):
+    """
+    Create a new package tag for this CDN repo.
+
+    :param client: Errata Client
+    :param str repo_name: CDN Repo name
+    :param str package_name: eg. "rhceph-container"
+    :param str tag_template: tag template, eg. "latest" or "{{version}}"
+    :param str variant: Restrict this tag to this variant. If this value is
+                        None, do not set a variant restriction on this tag.
+    :param bool for_hotfix: Indicates it is for hotfix.
+    :param bool for_prerelease: Indicates it is for prerelease.
+    """
+    endpoint = 'api/v1/cdn_repo_package_tags'
+    json_settings = {
+        'cdn_repo_name': repo_name,
+        'package_name': package_name,
+        'tag_template': tag_template,
+    }
+    if variant:
+        json_settings['variant_name'] = variant
+    if for_hotfix:
+        json_settings['for_hotfix'] = True
+    if for_prerelease:
+        json_settings['for_prerelease'] = True
+    json = {'cdn_repo_package_tag': json_settings}
+    response = client.post(endpoint, json=json)
+    if response.status_code != 201:
+        raise common_errata_tool.ErrataToolError(response)
+
+
+@common_errata_tool.traced('write')
+def edit_package_tag(client, tag_id, desired_tag):
+    """
+    Edit the settings for a package tag.
+
+    :param client: Errata Client
+    :param int tag_id: ID of the package tag to edit.
+    :param PackageTag desired_tag: the desired tag. If this tag has a
+                                   variant, then we will set variant_name on
+                                   the tag. If the tag has no variant, then we
+                                   will remove the variant for this tag.
+    """
+    settings = {
+        'for_hotfix': desired_tag.for_hotfix,
+        'for_prerelease': desired_tag.for_prerelease
+    }
+    variant = desired_tag.variant
+    if variant:
+        settings['variant_name'] = variant
+    else:
+        settings['variant_id'] = None
+    json = {'cdn_repo_package_tag': settings}
+    endpoint = 'api/v1/cdn_repo_package_tags/%s' % tag_id
+    response = client.put(endpoint, json=json)
+    if response.status_code != 200:
+        raise common_errata_tool.ErrataToolError(response)
+
+
+@common_errata_tool.traced('write')
+def delete_package_tag(client, tag_id):
+    """
+    Delete a tag for this package.
+
+    :param client: Errata Client
+    :param int tag_id: ID number of the tag to delete.
+    """
+    response = client.delete('api/v1/cdn_repo_package_tags/%s' % tag_id)
+    if response.status_code != 204:
+        raise common_errata_tool.ErrataToolError(response)
+
+
+def compare_package_tags(package_name, tag_template, current, desired):
+    """
+    Compare the settings for a tag_template.
+
+    Describe the changes from "current" to "desired".
+    If there are no differences, return an empty list.
+
+    :param str package_name: The package name, eg "rhceph-container"
+    :param str tag_template: The tag_template value, eg "latest".
+    :param PackageTag current: The "current" tag template settings stored in
+                               the ET.
+    :param PackageTag desired: The tag template settings that the user wants
+                               to have in the ET.
+    :returns: list of human-readable changes.
+    """
+    variant_changes = compare_package_tags_key(
+        'variant',
+        package_name,
+        tag_template,
+        current,
+        desired
+    )
+    for_hotfix_changes = compare_package_tags_key(
+        'for_hotfix',
+        package_name,
+        tag_template,
+        current,
+        desired
+    )
+    for_prerelease_changes = compare_package_tags_key(
+        'for_prerelease',
+        package_name,
+        tag_template,
+        current,
+        desired
+    )
+    return variant_changes + for_hotfix_changes + for_prerelease_changes
+
+
+def compare_package_tags_key(key, package_name, tag_template, current,
+                             desired):
+    """
+    Compare the settings of specific key for a tag_template.
+
+    Describe the changes from "current" to "desired".
+    If there are no differences, return an empty list.
+
+    :param str key: The key of a specific setting
+    :param str package_name: The package name, eg "rhceph-container"
+    :param str tag_template: The tag_template value, eg "latest".
+    :param PackageTag current: The "current" tag template settings stored in
+                               the ET.
+    :param PackageTag desired: The tag template settings that the user wants
+                               to have in the ET.
+    :returns: list of human-readable changes.
+    """
+    current_value = getattr(current, key)
+    desired_value = getattr(desired, key)
+    if current_value is not None and desired_value is None:
+        return ['removing "%s" %s from %s "%s" tag template' %
+                (current_value, key, package_name, tag_template)]
+    if current_value is None and desired_value is not None:
+        return ['adding "%s" %s to %s "%s" tag template' %
+                (desired_value, key, package_name, tag_template)]
+    if current_value != desired_value:
+        return ['changing %s "%s" %s from "%s" to "%s"' %
+                (package_name,
+                 tag_template,
+                 key,
+                 current_value,
+                 desired_value)]
+    return []
+
+
+def planned_package_tags(params, package_name):
+    """
+    Find the tags that the ET will create for a package when it creates a
+    CDN repo that we only planned (see ERRATA_TOOL_PLAN).
+
+    :param dict params: the planned CDN repo's params
+    :param str package_name: eg. "rhceph-container"
+    :returns: dict of tag templates to PackageTags. Each PackageTag's "id" is
+              a planned ID placeholder (see get_planned_package_tag_id()).
+    """
+    if params['content_type'] != 'Docker':
+        return {}
+    tags = {}
+    for tag_template, tag in DEFAULT_DOCKER_TAGS.items():
+        name = '%s:%s:%s' % (params['name'], package_name, tag_template)
+        tag_id = common_errata_tool.planned_id('cdn_repo_package_tags', name)
+        tags[tag_template] = tag._replace(id=tag_id)
+    return tags
+
+
+def get_planned_package_tag_id(client, name):
+    """
+    Find the real ID of a planned_package_tags() tag, after the ET creates
+    its CDN repo.
+
+    :param client: Errata Client
+    :param str name: the name in the planned ID placeholder.
+    :returns: int, the ID of this tag.
+    :raises: ValueError if the ET did not create this tag.
+    """
+    repo_name, package_name, tag_template = name.split(':', 2)
+    packages = get_package_tags(client, repo_name, [package_name])
+    tag = packages.get(package_name, {}).get(tag_template)
+    if tag is None:
+        raise ValueError('%s has no "%s" tag template for %s'
+                         % (repo_name, tag_template, package_name))
+    return tag.id
+
+
+def ensure_package_tags(client, repo_name, package_name, check_mode,
+                        current_tags, desired_tags):
+    """
+    Ensure all tags are set for one package in this CDN repo.
+
+    This method makes the "current_tags" match "desired_tags", and returns a
+    human-readable list of the changes performed.
+
+    :param client: Errata Client
+    :param str repo_name: CDN Repo name
+    :param str package_name: The package name, eg "rhceph-container"
+    :param bool check_mode: describe what would happen, but don't do it.
+    :param dict current_tags: Each key is a tag template, and each value is
+                              a PackageTag (the settings for that tag
+                              template in the ET).
+    :param dict desired_tags: Each key is a tag template, and each value is
+                              a PackageTag (the settings that the user
+                              wants). These PackageTags have no "id".
+    :returns: a (possibly-empty) list of human-readable changes.
+    """
+    changes = []
+    current_templates = set(current_tags)
+    desired_templates = set(desired_tags)
+
+    # Find tags to remove.
+    for tag_template in current_templates - desired_templates:
+        change = 'removing "%s" tag template from "%s"' \
+                 % (tag_template, package_name)
+        changes.append(change)
+        if check_mode:
+            continue
+        id_to_delete = current_tags[tag_template].id
+        delete_package_tag(client, id_to_delete)
+
+    # Find tags to modify (ie change the variant).
+    # PackageTags are immutable, so we can pass them directly without copying
+    # each tag.
+    for tag_template in current_templates & desired_templates:
+        current_tag = current_tags[tag_template]
+        desired_tag = desired_tags[tag_template]
+        differences = compare_package_tags(package_name,
+                                           tag_template,
+                                           current_tag,
+                                           desired_tag)
+        if differences:
+            changes.extend(differences)
+            if check_mode:
+                continue
+            edit_package_tag(client, current_tag.id, desired_tag)
+
+    # Find tags to add.
+    for tag_template in desired_templates - current_templates:
+        changes.append('adding "%s" tag template to "%s"' %
+                       (tag_template, package_name))
+        if check_mode:
+            continue
+        tag = desired_tags[tag_template]
+        add_package_tag(
+            client,
+            repo_name,
+            package_name,
+            tag_template,
+            tag.variant,
+            tag.for_hotfix,
+            tag.for_prerelease
+        )
+    return changes
+
+
+@common_errata_tool.traced('ensure')
+def ensure_packages_tags(client, name, check_mode, packages, cache=None,
+                         merge=False):
+    """
+    Create:
+    POST /api/v1/cdn_repo_package_tags POST
+    DELETE /api/v1/cdn_repo_package_tags/{id} DELETE
+    GET /api/v1/cdn_repo_package_tags/{id} GET
+    PUT /api/v1/cdn_repo_package_tags/{id} PUT
+
+    :param client: Errata Client
+    :param str name: CDN Repo name
+    :param bool check_mode: describe what would happen, but don't do it.
+    :param dict packages: Normalized Ansible "packages" paramater (see
+                          normalize_packages())
+    :param PackageTagsCache cache: read the current packages/tags from this
+                                   cache instead of querying the ET.
+    :param bool merge: only read the current tags for the packages in
+                       "packages". The returned "current" dict will not
+                       describe any other packages in this repo.
+    :returns: a (possibly-empty) list of human-readable changes.
+    """
+    changes = []
+    if cache:
+        current = cache.get(client, name)
+        if merge:
+            current = {package_name: current[package_name]
+                       for package_name in packages
+                       if package_name in current}
+    elif merge:
+        current = get_package_tags(client, name, list(packages))
+    else:
+        current = get_package_tags(client, name)
+
+    for package_name in packages:
+        current_tags = current.get(package_name, [])
+        desired_tags = packages[package_name]
+
+        package_changes = ensure_package_tags(client,
+                                              name,
+                                              package_name,
+                                              check_mode,
+                                              current_tags,
+                                              desired_tags)
+
+        changes.extend(package_changes)
+
+    if cache and changes and not check_mode:
+        cache.refresh(client, name)
+
+    # The caller needs to know the list of changes and the
+    # current state in order to support diff mode
+    return (changes, current)
+
+
+# If the variant, for_hotfix or for_prerelease setting is set
+# in tag_info then the list item is a dict with the keys,
+# otherwise it's just a string with the tag name.
+# The end result should match the format of the module
+# params, so refer to the examples in the module docs above.
+def tag_name_or_dict(tag_name, tag_info):
+    tag_dict = {}
+
+    if tag_info.variant:
+        tag_dict['variant'] = tag_info.variant
+    if tag_info.for_hotfix:
+        tag_dict['for_hotfix'] = tag_info.for_hotfix
+    if tag_info.for_prerelease:
+        tag_dict['for_prerelease'] = tag_info.for_prerelease
+
+    if tag_dict:
+        return {tag_name: tag_dict}
+    else:
+        return tag_name
+
+
+# The normalized desired packages dict and the current packages
+# dict are not quite the same format, but this works for both of them
+def package_list_for_diff(all_packages):
+    return {
+        package_name: [
+            tag_name_or_dict(tag_name, tag_info)
+            for (tag_name, tag_info)
+            # Without sorting the order is different in py2 vs py3 causing
+            # a test failure in py27. So sort here to make sure the tests
+            # pass. There's probably no need to sort it otherwise.
+            in sorted(package_tags.items(), key=lambda kv: kv[0])
+        ]
+        for (package_name, package_tags)
+        in all_packages.items()
+    }
+
+
+# Some extra work is needed here to handle the packages and tags
+@common_errata_tool.traced('render')
+def prepare_diff_data(before, after, before_packages, after_packages):
+    # Make sure we don't modify the param. We only replace top-level keys,
+    # and task_diff_data() never modifies values in place, so a shallow copy
+    # is enough. (Deep-copying a large repo is expensive.)
+    after = after.copy()
+    # Add a packages key with the massaged packages info
+    after['packages'] = package_list_for_diff(after_packages)
+    # Remove the package_names key since it's redundant
+    del after['package_names']
+
+    # Same thing for before if it's present
+    if before is not None:
+        before = before.copy()
+        before['packages'] = package_list_for_diff(before_packages)
+        del before['package_names']
+
+    # Now create the diff as per usual
+    return common_errata_tool.task_diff_data(
+        before=before,
+        after=after,
+        item_name=after['name'],
+        item_type='cdn repo',
+        keys_to_copy=[
+            # This is derived from the product version, and hence
+            # readonly, but let's show it anyway
+            'quay_enabled',
+
+            # This is readonly now but probably won't be in future
+            # when docker-pulp no longer exists
+            'external_name',
+        ],
+    )
+
+
+@common_errata_tool.traced('ensure')
+def ensure_cdn_repo(client, check_mode, params, package_tags_cache=None,
+                    diff_mode=True):
+    """
+    Ensure that this CDN repo exists in the Errata Tool.
+
+    :param client: Errata Client
+    :param bool check_mode: describe what would happen, but don't do it.
+    :param dict params: Parameters from ansible
+    :param PackageTagsCache package_tags_cache: optional cache of every
+                                                repo's packages/tags.
+    :param bool diff_mode: return a "diff" key when we change something.
+                           Set this to False to skip the (expensive) diff
+                           for large repos when Ansible will not show it.
+    """
+    result = {'changed': False, 'stdout_lines': []}
+    params = {param: val for param, val in params.items() if val is not None}
+    name = params['name']
+
+    # Special handling for packages parameter:
+    params = params.copy()
+    merge = params.pop('packages_mode', 'replace') == 'merge'
+    packages = params.pop('packages')
+    package_names = list(packages.keys())
+    params['package_names'] = package_names
+    packages = normalize_packages(packages)
+
+    # main cdn_repo
+    cdn_repo = get_cdn_repo(client, name)
+    if not cdn_repo:
+        result['changed'] = True
+        result['stdout_lines'] = ['created %s' % name]
+        if diff_mode:
+            result['diff'] = prepare_diff_data(cdn_repo, params, {},
+                                               packages)
+        if check_mode:
+            return result
+        cdn_repo = create_cdn_repo(client, params)
+        if cdn_repo is None:
+            # We only planned to create this repo (see ERRATA_TOOL_PLAN).
+            # Plan its tags against the tags that the ET will create.
+            for package_name, desired_tags in packages.items():
+                current_tags = planned_package_tags(params, package_name)
+                result['stdout_lines'].extend(ensure_package_tags(
+                    client, name, package_name, check_mode, current_tags,
+                    desired_tags))
+            return result
+        # The ET creates some tags for a new repo's packages. They are not
+        # in our cache yet.
+        if package_tags_cache:
+            package_tags_cache.refresh(client, name)
+
+    if merge:
+        # Keep all the packages that the user did not list.
+        for package_name in cdn_repo['package_names']:
+            if package_name not in packages:
+                params['package_names'].append(package_name)
+
+    differences = common_errata_tool.diff_settings(cdn_repo, params)
+    if differences:
+        result['changed'] = True
+        changes = common_errata_tool.describe_changes(differences)
+        result['stdout_lines'].extend(changes)
+        if not check_mode:
+            # CLOUDWF-316 to access cdn_repos directly by name.
+            edit_cdn_repo(client, cdn_repo['id'], differences)
+
+    # packages (from /api/v1/cdn_repo_package_tags):
+    package_tag_changes, current_packages = \
+        ensure_packages_tags(client, name, check_mode, packages,
+                             package_tags_cache, merge)
+
+    if package_tag_changes:
+        result['changed'] = True
+        result['stdout_lines'].extend(package_tag_changes)
+
+    # (Don't redo the diff if the repo was just created)
+    if diff_mode and result['changed'] and 'diff' not in result:
+        result['diff'] = prepare_diff_data(cdn_repo, params,
+                                           current_packages, packages)
+
+    return result
+
+
+def argument_spec():
+    """
+    :returns: dict of this module's Ansible argument spec.
+    """
+    return dict(
+        name=dict(required=True),
+        external_name=dict(required=False),
+        release_type=dict(choices=CDN_RELEASE_TYPES, required=True),
+        content_type=dict(choices=CDN_CONTENT_TYPES, required=True),
+        arch=dict(),
+        use_for_tps=dict(type='bool', default=False),
+        variants=dict(type='list', required=True),
+        packages=dict(type='dict', default={}),
+        packages_mode=dict(choices=PACKAGES_MODES, default='replace'),
+    )
+
+
+def prepare_params(params):
+    """
+    Set the default arch for this content_type, and validate the
+    parameters.
+
+    Raises ValueError if the user specified an invalid combination of
+    parameters.
+    """
+    # The arch default value depends on content_type.
+    # The reason we hard-code this here is to match the ET's behavior so that
+    # we preserve idempotency on subsequent runs.
+    if params['arch'] is None:
+        if params['content_type'] == 'Docker':
+            params['arch'] = 'multi'
+        else:
+            params['arch'] = 'x86_64'
+
+    # The ET server does not stop users from modifying Docker repos in ways
+    # that are invalid and impossible to fix with the web UI (CLOUDWF-271).
+    # We will guard that here for now.
+    if params['content_type'] == 'Docker':
+        if params['arch'] != 'multi':
+            raise ValueError('arch must be "multi" for Docker repos')
+        if params['use_for_tps']:
+            raise ValueError('do not set "use_for_tps" for Docker repos')
@@ -0,0 +1,196 @@
+"""
+Shared code for the errata_tool_product and errata_tool_tree modules.
+"""
+from ansible.module_utils import common_errata_tool
+
+
+BUGZILLA_STATES = set([
+    'ASSIGNED',
+    'CLOSED',
+    'MODIFIED',
+    'NEW',
+    'ON_DEV',
+    'ON_QA',
+    'POST',
+    'RELEASE_PENDING',
+    'VERIFIED',
+])
+
+
+# See https://errata.devel.redhat.com/api/v1/exd_org_groups
+# In theory these could change, but it seems unlikely.
+EXD_ORG_GROUPS = {
+    'RHEL': 1,
+    'Cloud': 2,
+    'Middleware & Management': 3,
+    'Pipeline Value': 4,
+}
+
+
+class InvalidInputError(Exception):
+    """ Invalid user input for a parameter """
+    def __init__(self, param, value):
+        self.param = param
+        self.value = value
+
+
+def validate_params(params):
+    """
+    Sanity-check user input for some parameters.
+
+    Raises InvalidInputError if the user specified an invalid value for a
+    parameter.
+    """
+    for state in params['valid_bug_states']:
+        if state not in BUGZILLA_STATES:
+            raise InvalidInputError('valid_bug_states', state)
+    solution = params['default_solution'].upper()
+    try:
+        common_errata_tool.DefaultSolutions[solution]
+    except KeyError:
+        raise InvalidInputError('default_solution', solution)
+
+
+@common_errata_tool.traced('read')
+def get_product(client, short_name):
+    """
+    Get a single product by name.
+
+    :param Client: common_errata_tool.Client instance
+    :param str short_name: Product short name, eg RHCEPH
+    :returns: a dict of information about this product, or None if the Errata
+              Tool has no product with this short_name
+    """
+    endpoint = 'api/v1/products/%s' % short_name
+    response = client.get(endpoint)
+    if response.status_code != 200:
+        return None
+    result = response.json()
+    return common_errata_tool.normalize_product(result['data'])
+
+
+@common_errata_tool.traced('write')
+def create_product(client, params):
+    """
+    Create a new ET product
+
+    :param client: Errata Client
+    :param dict params: ansible module params
+    """
+    # Send the server's name for these parameters
+    # (see comment in get_product())
+    product = params.copy()
+    if 'active' in product:
+        product['isactive'] = product.pop('active')
+    if 'internal' in product:
+        product['is_internal'] = product.pop('internal')
+    data = {'product': product}
+    response = client.post('api/v1/products', json=data)
+    if response.status_code != 201:
+        raise common_errata_tool.ErrataToolError(response)
+
+
+@common_errata_tool.traced('write')
+def edit_product(client, product_id, differences):
+    """
+    Edit an existing product.
+
+    :param client: Errata Client
+    :param int product_id: ID of the product we will edit
+    :param list differences: changes to make
+    """
+    # Create a Ansible params-like dict for the API.
+    params = {}
+    for difference in differences:
+        key, _, new = difference
+        params[key] = new
+    # Send the server's name for these parameters
+    # (see comment in get_product())
+    if 'active' in params:
+        params['isactive'] = params.pop('active')
+    if 'internal' in params:
+        params['is_internal'] = params.pop('internal')
+    endpoint = 'api/v1/products/%d' % product_id
+    data = {'product': params}
+    response = client.put(endpoint, json=data)
+    # TODO: verify 200 is the right code to expect here?
+    if response.status_code != 200:
+        raise common_errata_tool.ErrataToolError(response)
+
+
+@common_errata_tool.traced('render')
+def prepare_diff_data(before, after):
+    return common_errata_tool.task_diff_data(
+        before=before,
+        after=after,
+        item_name=after['short_name'],
+        item_type='product',
+        keys_to_copy=[
+            # Any field listed here exists in ET but is not
+            # yet supported by this ansible module
+        ],
+    )
+
+
+@common_errata_tool.traced('ensure')
+def ensure_product(client, params, check_mode, diff_mode=True):
+    result = {'changed': False, 'stdout_lines': []}
+    params = {param: val for param, val in params.items() if val is not None}
+    short_name = params['short_name']
+    product = get_product(client, short_name)
+    if not product:
+        result['changed'] = True
+        result['stdout_lines'] = ['created %s product' % short_name]
+        if diff_mode:
+            result['diff'] = prepare_diff_data(product, params)
+        if not check_mode:
+            create_product(client, params)
+        return result
+    differences = common_errata_tool.diff_settings(product, params)
+    if differences:
+        result['changed'] = True
+        changes = common_errata_tool.describe_changes(differences)
+        result['stdout_lines'].extend(changes)
+        if diff_mode:
+            result['diff'] = prepare_diff_data(product, params)
+        if not check_mode:
+            edit_product(client, product['id'], differences)
+    return result
+
+
+def argument_spec():
+    """
+    :returns: dict of this module's Ansible argument spec.
+    """
+    return dict(
+        short_name=dict(required=True),
+        name=dict(required=True),
+        description=dict(required=True),
+        bugzilla_product_name=dict(default=''),
+        valid_bug_states=dict(type='list', default=['MODIFIED', 'VERIFIED']),
+        active=dict(type='bool', default=True),
+        ftp_path=dict(default=""),
+        ftp_subdir=dict(),
+        internal=dict(type='bool', default=False),
+        default_docs_reviewer=dict(),
+        push_targets=dict(type='list', required=True),
+        default_solution=dict(required=True),
+        state_machine_rule_set=dict(required=True),
+        move_bugs_on_qe=dict(type='bool', default=False),
+        text_only_advisories_require_dists=dict(type='bool', default=True),
+        exd_org_group=dict(choices=list(EXD_ORG_GROUPS.keys())),
+        show_bug_package_mismatch_warning=dict(type='bool'),
+        suppress_push_request_jira=dict(type='bool')
+    )
+
+
+def prepare_params(params):
+    """
+    Drop deprecated parameters and validate the rest.
+
+    Raises InvalidInputError if the user specified an invalid value for a
+    parameter.
+    """
+    # Ignore this attribute since it doesn't exist any more in ET
+    params.pop('text_only_advisories_require_dists', None)
+    validate_params(params)
@@ -0,0 +1,238 @@
+"""
+Shared code for the errata_tool_product_version,
+errata_tool_product_versions and errata_tool_tree modules.
+"""
+import requests
+from ansible.module_utils import common_errata_tool
+
+
+# The REST API requires that clients know the product name before querying the
+# product version, so we have pass the "product" variable through to the
+# get/create/edit methods. SPMM-6319 tracks improving that so that we could
+# get/create/edit without the product name.
+
+
+@common_errata_tool.traced('read')
+def get_product_version(client, product, name, check_mode):
+    # We cannot query directly by name yet if the name has a "." character.
+    # See CLOUDWF-3.
+    # url = 'api/v1/products/%s/product_versions/%s' % (product, name)
+    # ... this would also change the returned data structure slightly (the
+    # results would not be in a list.)
+    url = 'api/v1/products/%s/product_versions/' % product
+    r = client.get(url, params={'filter[name]': name})
+    # If the product does not exist but we're running in check mode it could
+    # be that the product is going to be setup in the subsequent run mode
+    # run. In this case the query will return 404 but that would be expected
+    # and this task should not fail as a result.
+    if r.status_code == 404 and check_mode:
+        return None
+    # If the product does not exist yet, we'll get a 404 error for this GET
+    # request. It's nice that raise_for_status() gives us the full URL that we
+    # tried because then users can verify they are using the proper ET
+    # environment. Maybe we could log a more specific error message for that
+    # condition so that it's easier for the user to understand the problem,
+    # like "does https://errata.devel.redhat.com/products/RHCEPH exist yet?"
+    r.raise_for_status()
+    data = r.json()
+    product_versions = data['data']
+    if not product_versions:
+        return None
+    if len(product_versions) > 1:
+        raise ValueError('multiple PVs named %s' % name)
+    # Reformat the data into something we can compare with Ansible params
+    return common_errata_tool.normalize_product_version(product_versions[0],
+                                                        product)
+
+
+@common_errata_tool.traced('read')
+def prefetch_product_versions(client, product, check_mode):
+    """
+    Look up all of a product's product versions in one sweep.
+
+    This reads every page of the product's product_versions list (see
+    get_all_pages()), instead of one filtered search for each product
+    version like get_product_version().
+
+    :param client: Errata Client
+    :param str product: product short name, eg. "RHCEPH"
+    :param bool check_mode: if the product does not exist yet, return an
+                            empty dict instead of raising.
+    :returns: dict of "product version name: product version". Each value is
+              in the get_product_version() format.
+    """
+    endpoint = 'api/v1/products/%s/product_versions' % product
+    try:
+        elements = common_errata_tool.get_all_pages(client, endpoint)
+    except requests.exceptions.HTTPError as e:
+        # See get_product_version() for check mode and missing products.
+        if e.response.status_code == 404 and check_mode:
+            return {}
+        raise
+    product_versions = {}
+    for element in elements:
+        product_version = common_errata_tool.normalize_product_version(
+            element, product)
+        product_versions[product_version['name']] = product_version
+    return product_versions
+
+
+def handle_form_errors(response):
+    # If there are incorrect or missing fields, we will receive a HTTP 200
+    # with a list of the wrong fields, or just an HTTP 500 error.
+    if response.status_code == 500:
+        raise RuntimeError(
+            'The request to %s had a status code of %d and failed with: %s'
+            % (response.url, response.status_code, response.text)
+        )
+    if 'errorExplanation' in response.text:
+        raise RuntimeError(response.text)
+    response.raise_for_status()
+
+
+@common_errata_tool.traced('write')
+def create_product_version(client, product, params):
+    # TODO: test this without casting the bools to ints. Since we're passing
+    # JSON and that has real "true"/"false" values, it should be ok.
+    pv = {}
+    pv['name'] = params['name']
+    pv['description'] = params['description']
+    pv['allow_rhn_debuginfo'] = int(params['allow_rhn_debuginfo'])
+    pv['default_brew_tag'] = params['default_brew_tag']
+    pv['enabled'] = int(params['enabled'])
+    pv['is_oval_product'] = int(params['is_oval_product'])
+    pv['is_rhel_addon'] = int(params['is_rhel_addon'])
+    pv['is_server_only'] = int(params['is_server_only'])
+    pv['brew_tags'] = params['brew_tags']
+    pv['rhel_release_name'] = params['rhel_release_name']
+    pv['sig_key_name'] = params['sig_key_name']
+    pv['container_sig_key_name'] = params['container_sig_key_name']
+    if 'ima_sig_key_name' in params:
+        pv['ima_sig_key_name'] = params['ima_sig_key_name']
+    pv['allow_buildroot_push'] = params['allow_buildroot_push']
+    pv['push_targets'] = params['push_targets']
+    data = {'product_version': pv}
+    endpoint = 'api/v1/products/%s/product_versions' % product
+    response = client.post(endpoint, json=data)
+    if response.status_code != 201:
+        raise common_errata_tool.ErrataToolError(response)
+
+
+@common_errata_tool.traced('write')
+def edit_product_version(client, product_version, differences):
+    """
+    Edit an existing product.
+
+    :param client: Errata Client
+    :param dict product_version: Product Version to change
+    :param list differences: Settings to change for this Product Version. This
+                             is a list of three-element tuples from
+                             diff_settings().
+    """
+    pv = {}
+    for difference in differences:
+        key, _, new = difference
+        pv[key] = new
+    if not pv:
+        return
+    data = {'product_version': pv}
+    pv_id = product_version['id']
+    product = product_version['product']
+    endpoint = 'api/v1/products/%s/product_versions/%d' % (product, pv_id)
+    response = client.put(endpoint, json=data)
+    if response.status_code != 200:
+        raise common_errata_tool.ErrataToolError(response)
+
+
+@common_errata_tool.traced('render')
+def prepare_diff_data(before, after):
+    return common_errata_tool.task_diff_data(
+        before=before,
+        after=after,
+        item_name=after['name'],
+        item_type='product version',
+    )
+
+
+@common_errata_tool.traced('ensure')
+def ensure_product_version(client, params, check_mode, diff_mode=True,
+                           product_versions=None):
+    """
+    Ensure that this product version exists in the Errata Tool.
+
+    :param client: Errata Client
+    :param dict params: Parameters from ansible
+    :param bool check_mode: describe what would happen, but don't do it.
+    :param bool diff_mode: return a "diff" key when we change something.
+    :param dict product_versions: optional prefetch_product_versions()
+                                  results for this product. If we have this,
+                                  we do not read the product version again.
+    """
+    result = {'changed': False, 'stdout_lines': []}
+    params = {param: val for param, val in params.items() if val is not None}
+    product = params['product']
+    name = params['name']
+    if product_versions is None:
+        # When we plan the writes (see ERRATA_TOOL_PLAN), the plan may create
+        # the product before this product version.
+        planning = client.plan is not None
+        product_version = get_product_version(client, product, name,
+                                              check_mode or planning)
+    else:
+        product_version = product_versions.get(name)
+    if not product_version:
+        result['changed'] = True
+        result['stdout_lines'] = ['created %s product version' % name]
+        if diff_mode:
+            result['diff'] = prepare_diff_data(product_version, params)
+        if not check_mode:
+            create_product_version(client, product, params)
+        return result
+    differences = common_errata_tool.diff_settings(product_version, params)
+    if differences:
+        result['changed'] = True
+        changes = common_errata_tool.describe_changes(differences)
+        result['stdout_lines'].extend(changes)
+        if diff_mode:
+            result['diff'] = prepare_diff_data(product_version, params)
+        if not check_mode:
+            edit_product_version(client, product_version, differences)
+    return result
+
+
+def argument_spec():
+    """
+    :returns: dict of this module's Ansible argument spec.
+    """
+    return dict(
+        product=dict(required=True),
+        name=dict(required=True),
+        description=dict(required=True),
+        rhel_release_name=dict(required=True),
+        sig_key_name=dict(default='redhatrelease2'),
+        container_sig_key_name=dict(default='redhatrelease2'),
+        ima_sig_key_name=dict(),
+        default_brew_tag=dict(required=True),
+        is_server_only=dict(type='bool', required=True),
+        enabled=dict(type='bool', default=True),
+        allow_rhn_debuginfo=dict(type='bool', required=True),
+        allow_buildroot_push=dict(type='bool', required=True),
+        is_oval_product=dict(type='bool', required=True),
+        is_rhel_addon=dict(type='bool', required=True),
+        push_targets=dict(type='list', required=True),
+        brew_tags=dict(type='list', required=True),
+        use_quay_for_containers=dict(type='bool'),
+        use_quay_for_containers_stage=dict(type='bool'),
+        suppress_push_request_jira=dict(type='bool'),
+        allow_unreleased_rpms=dict(type='bool')
+    )
+
+
+def prepare_params(params):
+    """
+    Drop deprecated parameters.
+    """
+    # 'use_quay_for_containers' and 'use_quay_for_containers_stage' are
+    # deprecated.
+    params.pop('use_quay_for_containers', None)
+    params.pop('use_quay_for_containers_stage', None)
@@ -0,0 +1,343 @@
+"""
+Shared code for the errata_tool_release, errata_tool_releases and
+errata_tool_tree modules.
+"""
+from ansible.module_utils import common_errata_tool
+from ansible.module_utils.common_errata_tool import UserNotFoundError
+from ansible.module_utils.six import raise_from
+import requests
+import threading
+
+
+class ProgramManagerNotFoundError(UserNotFoundError):
+    pass
+
+
+@common_errata_tool.traced('read')
+def get_release(client, name):
+    # cannot get releases directly by name, CLOUDWF-1
+    r = client.get('api/v1/releases', params={'filter[name]': name})
+    r.raise_for_status()
+    data = r.json()
+    results = data['data']
+    if not results:
+        return None
+    if len(results) > 1:
+        raise ValueError('multiple %s releases found' % name)
+    return common_errata_tool.normalize_release(results[0])
+
+
+@common_errata_tool.traced('resolve')
+def get_product_id(client, name):
+    response = client.get('api/v1/products/%s' % name)
+    response.raise_for_status()
+    data = response.json()
+    return data['data']['id']
+
+
+@common_errata_tool.traced('resolve')
+def get_product_version_ids(client, names):
+    # We have to use the "older" JSON API here since this release may not have
+    # a product at all.
+    ids = []
+    for name in names:
+        response = client.get('product_versions/%s.json' % name)
+        response.raise_for_status()
+        data = response.json()
+        ids.append(data['id'])
+    return ids
+
+
+class IdResolver(object):
+    """
+    Convert product, product version, program manager, and workflow rule set
+    names into the ID numbers that the releases API requires (CLOUDWF-298).
+
+    We look up each distinct name only once, so many releases that share a
+    product or program manager can share one IdResolver. It is safe to use
+    from several threads.
+    """
+    def __init__(self, client):
+        self.client = client
+        self.lock = threading.Lock()
+        self.locks = {}
+        self.cache = {}
+        self.rules_scraper = common_errata_tool.WorkflowRulesScraper(client)
+
+    def _get(self, key, func):
+        with self.lock:
+            lock = self.locks.setdefault(key, threading.Lock())
+        with lock:
+            if key not in self.cache:
+                self.cache[key] = func()
+            return self.cache[key]
+
+    def _get_id(self, resource, name, func):
+        """
+        Call func() once to look up the ID for this name. If the ET does not
+        have this resource, but the plan creates it (see ERRATA_TOOL_PLAN),
+        return a placeholder ID that errata_tool_apply will resolve later.
+
+        :param str resource: eg. "products" (see
+                             common_errata_tool.endpoint_resource())
+        """
+        def get_id():
+            try:
+                return func()
+            except (requests.exceptions.HTTPError, UserNotFoundError) as e:
+                response = getattr(e, 'response', None)
+                if response is not None and response.status_code != 404:
+                    raise
+                plan = self.client.plan
+                placeholder = plan.created(resource, name) if plan else None
+                if placeholder is None:
+                    raise
+                return placeholder
+        return self._get((resource, name), get_id)
+
+    def product_id(self, name):
+        return self._get_id('products', name,
+                            lambda: get_product_id(self.client, name))
+
+    def product_version_ids(self, names):
+        return [self._get_id('product_versions', name,
+                             lambda: get_product_version_ids(self.client,
+                                                             [name])[0])
+                for name in names]
+
+    def program_manager_id(self, login_name):
+        try:
+            return self._get_id('user', login_name,
+                                lambda: common_errata_tool.user_id(
+                                    self.client, login_name))
+        except UserNotFoundError as e:
+            raise_from(ProgramManagerNotFoundError(str(e)), e)
+
+    def program_manager(self, login_name):
+        """ :returns: the get_user() data for this login name """
+        def get_user():
+            try:
+                return common_errata_tool.get_user(self.client, login_name,
+                                                   True)
+            except UserNotFoundError as e:
+                raise_from(ProgramManagerNotFoundError(str(e)), e)
+        return self._get(('user data', login_name), get_user)
+
+    def rule_set_id(self, name):
+        rules = self._get(('workflow_rules',),
+                          lambda: self.rules_scraper.enum)
+        return int(rules[name])
+
+
+@common_errata_tool.traced('resolve')
+def api_data(client, params, ids=None):
+    """ Transform our Ansible params into JSON data for POST'ing or PUT'ing.
+
+    :param client: Errata Client
+    :param dict params: ansible module params
+    :param IdResolver ids: optional IdResolver to share between releases.
+    """
+    if ids is None:
+        ids = IdResolver(client)
+    # XXX The docs at /developer-guide/api-http-api.html#api-apis
+    # mention a few settings I have not seen before:
+    # - "allow_beta"
+    # - "is_deferred"
+    # - "url_name" - this one is actually listed twice!
+    # Are those really a valid settings? grep errata-rails.git for more
+    # references to find out. That whole POST /api/v1/releases section of the
+    # docs could probably use a review.
+    # CLOUDWF-298 is an RFE for specifying all values by name instead of ID.
+    release = params.copy()
+    # Update the values for ones that the REST API will accept:
+    if 'product' in release:
+        product_name = release.pop('product')
+        if product_name is not None:
+            release['product_id'] = ids.product_id(product_name)
+    if 'program_manager' in release:
+        pm_login_name = release.pop('program_manager')
+        release['program_manager_id'] = ids.program_manager_id(pm_login_name)
+    # "active" -> "isactive"
+    if 'active' in release:
+        active = release.pop('active')
+        release['isactive'] = active
+    # "supports_component_acl" -> "disable_acl"
+    if 'supports_component_acl' in release:
+        supports_component_acl = release.pop('supports_component_acl')
+        release['disable_acl'] = not supports_component_acl
+    # "product_versions" -> "product_version_ids"
+    if 'product_versions' in release:
+        product_versions = release.pop('product_versions')
+        product_version_ids = ids.product_version_ids(product_versions)
+        release['product_version_ids'] = product_version_ids
+    # "state_machine_rule_set" -> "state_machine_rule_set_id"
+    if 'state_machine_rule_set' in release:
+        state_machine_rule_set = release.pop('state_machine_rule_set')
+        if state_machine_rule_set:
+            rule_set_id = ids.rule_set_id(state_machine_rule_set)
+            release['state_machine_rule_set_id'] = rule_set_id
+        else:
+            release['state_machine_rule_set_id'] = None
+    # "blocker_flags" list -> str
+    if 'blocker_flags' in release:
+        release['blocker_flags'] = ",".join(release['blocker_flags'])
+    data = {'release': release}
+    if 'type' in params:
+        data['type'] = params['type']
+    return data
+
+
+@common_errata_tool.traced('read')
+def prefetch_releases(client, names):
+    """
+    Look up many releases at once.
+
+    This is much faster than calling get_release() for dozens of releases
+    one at a time. For many names, we read every page of api/v1/releases
+    concurrently (see get_named()).
+
+    :param client: Errata Client
+    :param names: release names to find
+    :returns: dict of "release name: release" for the releases that exist.
+              Each value is in the get_release() format.
+    """
+    elements = common_errata_tool.get_named(client, 'api/v1/releases', names)
+    releases = {}
+    for element in elements:
+        release = common_errata_tool.normalize_release(element)
+        releases[release['name']] = release
+    return releases
+
+
+@common_errata_tool.traced('write')
+def create_release(client, params, ids=None):
+    data = api_data(client, params, ids)
+    response = client.post('api/v1/releases', json=data)
+    if response.status_code != 201:
+        raise common_errata_tool.ErrataToolError(response)
+
+
+@common_errata_tool.traced('write')
+def edit_release(client, release_id, differences, ids=None):
+    # Create a Ansible params-like dict for the api_data() method.
+    params = {}
+    for difference in differences:
+        key, _, new = difference
+        params[key] = new
+    data = api_data(client, params, ids)
+    response = client.put('api/v1/releases/%d' % release_id, json=data)
+    if response.status_code != 200:
+        raise common_errata_tool.ErrataToolError(response)
+
+
+@common_errata_tool.traced('render')
+def prepare_diff_data(before, after):
+    return common_errata_tool.task_diff_data(
+        before=before,
+        after=after,
+        item_name=after['name'],
+        item_type='release',
+        keys_to_copy=[
+            # Avoid a diff if these are null to begin with
+            'pelc_product_version_name',
+            'state_machine_rule_set',
+            'zstream_target_release',
+            # https://github.com/ktdreyer/errata-tool-ansible/issues/114
+            'notify_bugzilla_about_release_status',
+            # https://github.com/ktdreyer/errata-tool-ansible/issues/265
+            'is_silent',
+        ],
+        keys_to_omit=[
+            # I think these two are old dead schema that
+            # should be removed. Let's hide them from the
+            # diff output.
+            'is_async',
+            'is_deferred',
+        ],
+    )
+
+
+@common_errata_tool.traced('ensure')
+def ensure_release(client, params, check_mode, diff_mode=True,
+                   releases=None, ids=None):
+    """
+    Ensure that this release exists in the Errata Tool.
+
+    :param client: Errata Client
+    :param dict params: Parameters from ansible
+    :param bool check_mode: describe what would happen, but don't do it.
+    :param bool diff_mode: return a "diff" key when we change something.
+    :param dict releases: optional prefetch_releases() results. If we have
+                          this, we do not read the release again.
+    :param IdResolver ids: optional IdResolver to share between releases.
+    """
+    # Note: this looks identical to the diff_product() method.
+    # Maybe we can generalize this.
+    result = {'changed': False, 'stdout_lines': []}
+    params = {param: val for param, val in params.items() if val is not None}
+
+    # Special-case state_machine_rule_set, because it's an enum, and it's
+    # important to be able to set this back to "null" if desired:
+    if params.get('state_machine_rule_set') == '':
+        params['state_machine_rule_set'] = None
+
+    name = params['name']
+    if releases is None:
+        release = get_release(client, name)
+    else:
+        release = releases.get(name)
+    if not release:
+        result['changed'] = True
+        result['stdout_lines'] = ['created %s' % name]
+        if diff_mode:
+            result['diff'] = prepare_diff_data(release, params)
+        if not check_mode:
+            create_release(client, params, ids)
+        return result
+    differences = common_errata_tool.diff_settings(release, params)
+    if differences:
+        result['changed'] = True
+        changes = common_errata_tool.describe_changes(differences)
+        result['stdout_lines'].extend(changes)
+        if diff_mode:
+            result['diff'] = prepare_diff_data(release, params)
+        if not check_mode:
+            # CLOUDWF-6: we must send product_version_ids in every request,
+            # or the server will reset the product versions to an empty list.
+            keys = [difference[0] for difference in differences]
+            if 'product_versions' not in keys:
+                differences.append(('product_versions',
+                                    params['product_versions'],
+                                    params['product_versions']))
+            edit_release(client, release['id'], differences, ids)
+    return result
+
+
+def argument_spec():
+    """
+    :returns: dict of this module's Ansible argument spec.
+    """
+    return dict(
+        product=dict(),
+        name=dict(required=True),
+        description=dict(required=True),
+        type=dict(required=True, choices=common_errata_tool.RELEASE_TYPES),
+        product_versions=dict(type='list', required=True),
+        enabled=dict(type='bool', default=True),
+        active=dict(type='bool', default=True),
+        enable_batching=dict(type='bool', default=True),
+        program_manager=dict(),
+        blocker_flags=dict(type='list'),
+        internal_target_release=dict(),
+        zstream_target_release=dict(),
+        ship_date=dict(),
+        allow_shadow=dict(type='bool', default=False),
+        allow_blocker=dict(type='bool', default=False),
+        allow_exception=dict(type='bool', default=False),
+        allow_pkg_dupes=dict(type='bool', default=False),
+        supports_component_acl=dict(type='bool', default=False),
+        limit_bugs_by_product=dict(type='bool', default=False),
+        state_machine_rule_set=dict(),
+        pelc_product_version_name=dict(),
+        brew_tags=dict(type='list', default=[]),
+    )
@@ -0,0 +1,87 @@
+"""
+Shared code for the errata_tool_user and errata_tool_users modules.
+"""
+from ansible.module_utils import common_errata_tool
+
+
+@common_errata_tool.traced('write')
+def create_user(client, params):
+    endpoint = 'api/v1/user'
+
+    # Hack for CLOUDWF-2817 - If the user's receives_mail attribute is true,
+    # we must always send the intended email_address as well.
+    if params['receives_mail'] and params.get('email_address') is None:
+        # The user wanted the ET to choose a default email address, so we
+        # approximate that here:
+        account_name, _ = params['login_name'].split('@', 1)
+        params['email_address'] = '%s@redhat.com' % account_name
+
+    response = client.post(endpoint, json=params)
+    if response.status_code != 201:
+        raise common_errata_tool.ErrataToolError(response)
+
+
+@common_errata_tool.traced('write')
+def edit_user(client, user_id, differences):
+    """
+    Edit an existing user.
+
+    :param client: Errata Client
+    :param int user_id: User to change
+    :param list differences: Settings to change for this User. This is a list
+                             of three-element tuples from diff_settings().
+    """
+    user = {}
+    for difference in differences:
+        key, _, new = difference
+        user[key] = new
+    endpoint = 'api/v1/user/%d' % user_id
+    response = client.put(endpoint, json=user)
+    if response.status_code != 200:
+        raise common_errata_tool.ErrataToolError(response)
+
+
+@common_errata_tool.traced('ensure')
+def ensure_user(client, params, check_mode):
+    result = {'changed': False, 'stdout_lines': []}
+    params = {param: val for param, val in params.items() if val is not None}
+    login_name = params['login_name']
+    user = common_errata_tool.get_user(client, login_name)
+    if not user:
+        result['changed'] = True
+        result['stdout_lines'] = ['created %s user' % login_name]
+        if not check_mode:
+            create_user(client, params)
+        return result
+    user_id = user.pop('id')
+
+    differences = common_errata_tool.diff_settings(user, params)
+    if differences:
+        result['changed'] = True
+        changes = common_errata_tool.describe_changes(differences)
+        result['stdout_lines'].extend(changes)
+        if not check_mode:
+            # Hack for CLOUDWF-2817 - If the user's receives_mail attribute is
+            # true, we must always send the intended email_address as well.
+            if params['receives_mail']:
+                keys = [difference[0] for difference in differences]
+                if 'email_address' not in keys:
+                    differences.append(('email_address', '',
+                                        user['email_address']))
+            edit_user(client, user_id, differences)
+    return result
+
+
+def argument_spec():
+    """
+    :returns: dict of this module's Ansible argument spec.
+    """
+    return dict(
+        login_name=dict(required=True),
+        realname=dict(required=True),
+        organization=dict(),
+        receives_mail=dict(type='bool', default=True),
+        roles=dict(type='list'),
+        enabled=dict(type='bool', default=True),
+        email_address=dict(),
+    )
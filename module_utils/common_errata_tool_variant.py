@@ -0,0 +1,178 @@
+"""
+Shared code for the errata_tool_variant, errata_tool_variants and
+errata_tool_tree modules.
+"""
+from ansible.module_utils import common_errata_tool
+
+
+@common_errata_tool.traced('read')
+def get_variant(client, name):
+    """
+    Get information about a variant in the Errata Tool, and simplify it into
+    a format we can compare with our Ansible parameters.
+
+    :param client: Errata Client
+    :param str name: Variant name to search
+    :returns: dict of information about this variant, or None
+    """
+    # We cannot get the name directly yet, CLOUDWF-4
+    # r = client.get('api/v1/variants/%s' % name)
+    r = client.get('api/v1/variants', params={'filter[name]': name})
+    r.raise_for_status()
+    data = r.json()
+    results = data['data']
+    if not results:
+        return None
+    if len(results) > 1:
+        raise ValueError('multiple %s variants found' % name)
+    return common_errata_tool.normalize_variant(results[0])
+
+
+@common_errata_tool.traced('read')
+def prefetch_variants(client, names):
+    """
+    Look up many variants at once.
+
+    This is much faster than calling get_variant() for hundreds of variants
+    one at a time. The variants API cannot filter by product or product
+    version, so for many names we read every page of api/v1/variants
+    concurrently (see get_named()).
+
+    :param client: Errata Client
+    :param names: variant names to find
+    :returns: dict of "variant name: variant" for the variants that exist.
+              Each value is in the get_variant() format.
+    """
+    elements = common_errata_tool.get_named(client, 'api/v1/variants', names)
+    variants = {}
+    for element in elements:
+        variant = common_errata_tool.normalize_variant(element)
+        variants[variant['name']] = variant
+    return variants
+
+
+@common_errata_tool.traced('write')
+def create_variant(client, params):
+    """
+    Create a new ET variant
+
+    :param client: Errata Client
+    :param dict params: ansible module params
+    """
+    data = {'variant': params}
+    response = client.post('api/v1/variants', json=data)
+    if response.status_code != 201:
+        raise common_errata_tool.ErrataToolError(response)
+
+
+@common_errata_tool.traced('write')
+def edit_variant(client, variant_id, differences):
+    """
+    Edit an existing variant.
+
+    :param client: Errata Client
+    :param int variant_id: ID number for the variant
+    :param list differences: changes to make
+    """
+    # Create a Ansible params-like dict for the API.
+    params = {}
+    for difference in differences:
+        key, _, new = difference
+        params[key] = new
+    endpoint = 'api/v1/variants/%d' % variant_id
+    data = {'variant': params}
+    response = client.put(endpoint, json=data)
+    # TODO: verify 200 is the right code to expect here?
+    if response.status_code != 200:
+        raise common_errata_tool.ErrataToolError(response)
+
+
+@common_errata_tool.traced('render')
+def prepare_diff_data(before, after):
+    return common_errata_tool.task_diff_data(
+        before=before,
+        after=after,
+        item_name=after['name'],
+        item_type='variant',
+        keys_to_copy=[
+            # The params may contain one or other of these
+            # but both are present in the before data
+            'tps_stream',
+            'rhel_variant',
+        ],
+        keys_to_omit=[
+            # The before data will include product even though it's
+            # redundant and readonly. Let's leave it out of the diff.
+            'product',
+        ],
+    )
+
+
+@common_errata_tool.traced('ensure')
+def ensure_variant(client, params, check_mode, diff_mode=True,
+                   variants=None):
+    """
+    Ensure that this variant exists in the Errata Tool.
+
+    :param client: Errata Client
+    :param dict params: Parameters from ansible
+    :param bool check_mode: describe what would happen, but don't do it.
+    :param bool diff_mode: return a "diff" key when we change something.
+    :param dict variants: optional prefetch_variants() results. If we have
+                          this, we do not read the variant again.
+    """
+    result = {'changed': False, 'stdout_lines': []}
+    params = {param: val for param, val in params.items() if val is not None}
+    name = params['name']
+    if variants is None:
+        variant = get_variant(client, name)
+    else:
+        variant = variants.get(name)
+
+    if not variant:
+        result['changed'] = True
+        result['stdout_lines'] = ['created %s variant' % name]
+        if diff_mode:
+            result['diff'] = prepare_diff_data(variant, params)
+        if not check_mode:
+            create_variant(client, params)
+        return result
+    differences = common_errata_tool.diff_settings(variant, params)
+    if differences:
+        result['changed'] = True
+        changes = common_errata_tool.describe_changes(differences)
+        result['stdout_lines'].extend(changes)
+        if diff_mode:
+            result['diff'] = prepare_diff_data(variant, params)
+        if not check_mode:
+            edit_variant(client, variant['id'], differences)
+    return result
+
+
+def argument_spec():
+    """
+    :returns: dict of this module's Ansible argument spec.
+    """
+    return dict(
+        name=dict(required=True),
+        description=dict(required=True),
+        cpe=dict(),
+        enabled=dict(type='bool', default=True),
+        buildroot=dict(type='bool', default=False),
+        product_version=dict(required=True),
+        rhel_variant=dict(),
+        tps_stream=dict(),
+        push_targets=dict(type='list', required=True),
+        override_ftp_base_folder=dict(),
+    )
+
+
+def prepare_params(params):
+    """
+    Drop unset and deprecated parameters.
+    """
+    if params.get('rhel_variant') is None:
+        params.pop('rhel_variant', None)
+    # Drop the deprecated tps_stream field for Variant, it is now ignored by
+    # Errata Tool
+    params.pop('tps_stream', None)
@@ -0,0 +1,145 @@
+"""
+Run errata-tool-ansible modules inside the Ansible controller.
+
+Normally Ansible packages every task's module into an "AnsiballZ" zip file,
+copies it to the target host, and runs it with a brand new Python
+interpreter. Our modules only talk to the Errata Tool's HTTP API, and we
+almost always run them on localhost, so that overhead is larger than the
+time we spend doing real work for a no-op run.
+
+The action plugins in this collection use ErrataToolAction to import the
+module and call its main() directly in the Ansible worker process. If we
+cannot do that safely (for example, the task runs on a remote host or uses
+"become" or "async"), we fall back to Ansible's normal module execution.
+"""
+import importlib
+import json
+import os
+import sys
+import traceback
+
+from ansible.module_utils import basic
+from ansible.module_utils._text import to_bytes
+from ansible.module_utils._text import to_native
+from ansible.module_utils.parsing.convert_bool import boolean
+from ansible.module_utils.six import StringIO
+from ansible.plugins.action.normal import ActionModule as NormalActionModule
+
+
+def run_module_in_process(module, module_args):
+    """
+    Run an Ansible module's main() in this Python process.
+
+    :param module: Python module object for an Ansible module, for example
+                   errata_tool_user.
+    :param dict module_args: module arguments, including Ansible's internal
+                             "_ansible_*" arguments.
+    :returns: dict of the module's results, exactly as it would return them
+              with exit_json() or fail_json().
+    """
+    args = json.dumps({'ANSIBLE_MODULE_ARGS': module_args})
+    basic._ANSIBLE_ARGS = to_bytes(args)
+    if hasattr(basic, '_ANSIBLE_PROFILE'):
+        # ansible-core 2.19+
+        basic._ANSIBLE_PROFILE = 'legacy'
+    stdout = sys.stdout
+    sys.stdout = output = StringIO()
+    try:
+        module.main()
+    except SystemExit:
+        pass
+    except Exception as e:
+        return {
+            'failed': True,
+            'msg': 'MODULE FAILURE: %s' % e,
+            'exception': traceback.format_exc(),
+        }
+    finally:
+        sys.stdout = stdout
+        basic._ANSIBLE_ARGS = None
+    lines = output.getvalue().strip().splitlines()
+    try:
+        return json.loads(lines[-1])
+    except (IndexError, ValueError):
+        return {
+            'failed': True,
+            'msg': 'MODULE FAILURE: no JSON result',
+            'module_stdout': output.getvalue(),
+        }
+
+
+class ErrataToolAction(NormalActionModule):
+    """
+    Action plugin base class for our errata_tool_* modules.
+
+    Set ERRATA_TOOL_IN_PROCESS=false in the task's environment to always use
+    Ansible's normal module execution.
+    """
+
+    def _import_module(self):
+        """
+        Import the Ansible module that matches this action plugin.
+
+        :returns: Python module object, or None if we cannot import it (for
+                  example, if the Python on the controller lacks
+                  requests-gssapi).
+        """
+        # eg. "...plugins.action.errata_tool_user" ->
+        #     "...plugins.modules.errata_tool_user"
+        name = self.__module__.replace('.plugins.action.',
+                                       '.plugins.modules.')
+        if name == self.__module__:
+            return None
+        try:
+            return importlib.import_module(name)
+        except ImportError:
+            return None
+
+    def _task_environment(self):
+        """
+        :returns: dict of the task's "environment" settings.
+        """
+        environment = {}
+        self._compute_environment_string(environment)
+        return {to_native(key): to_native(value)
+                for key, value in environment.items()}
+
+    def _can_run_in_process(self, environment, wrap_async):
+        if self._connection.transport != 'local':
+            return False
+        if self._play_context.become or wrap_async:
+            return False
+        setting = environment.get('ERRATA_TOOL_IN_PROCESS',
+                                  os.getenv('ERRATA_TOOL_IN_PROCESS', True))
+        return boolean(setting, strict=False)
+
+    def _execute_module(self, module_name=None, module_args=None,
+                        task_vars=None, wrap_async=False, **kwargs):
+        environment = self._task_environment()
+        module = None
+        if self._can_run_in_process(environment, wrap_async):
+            module = self._import_module()
+        if module is None:
+            return super(ErrataToolAction, self)._execute_module(
+                module_name=module_name,
+                module_args=module_args,
+                task_vars=task_vars,
+                wrap_async=wrap_async,
+                **kwargs)
+
+        if task_vars is None:
+            task_vars = {}
+        if module_name is None:
+            module_name = self._task.action
+        if module_args is None:
+            module_args = self._task.args.copy()
+        self._update_module_args(module_name, module_args, task_vars)
+
+        # Modules read ERRATA_TOOL_URL etc. from the environment.
+        original = os.environ.copy()
+        os.environ.update(environment)
+        try:
+            return run_module_in_process(module, module_args)
+        finally:
+            os.environ.clear()
+            os.environ.update(original)
@@ -1,4 +1,5 @@
 import pytest
+import os
 import sys
 from os.path import abspath, dirname, join
 from ansible.module_utils.six import PY2, PY3
@@ -22,22 +23,50 @@ def pytest_sessionstart(session):
     if library_path not in sys.path:
         sys.path.insert(0, library_path)
 
+    # Our controller-side helpers for action plugins:
+    plugin_utils_path = join(dirname(working_directory), 'plugin_utils')
+    if plugin_utils_path not in sys.path:
+        sys.path.insert(0, plugin_utils_path)
+
+    # Our lookup plugins:
+    lookup_plugins_path = join(dirname(working_directory), 'lookup_plugins')
+    if lookup_plugins_path not in sys.path:
+        sys.path.insert(0, lookup_plugins_path)
+
+    # Our callback plugins:
+    callback_plugins_path = join(dirname(working_directory),
+                                 'callback_plugins')
+    if callback_plugins_path not in sys.path:
+        sys.path.insert(0, callback_plugins_path)
+
     module_utils_path = join(dirname(working_directory), 'module_utils')
 
-    location = join(module_utils_path, 'common_errata_tool.py')
-    module_name = "ansible.module_utils.common_errata_tool"
+    # common_errata_tool first, because the other module_utils import it.
+    names = sorted(name[:-3] for name in os.listdir(module_utils_path)
+                   if name.endswith('.py'))
+    for name in names:
+        load_module_utils(module_utils_path, name)
+
+
+def load_module_utils(module_utils_path, name):
+    """
+    Import module_utils/<name>.py as ansible.module_utils.<name>.
+    """
+    location = join(module_utils_path, name + '.py')
+    module_name = "ansible.module_utils.%s" % name
     if PY3:
         # Python 3.5+
         import importlib.util
         spec = importlib.util.spec_from_file_location(module_name, location)
         module = importlib.util.module_from_spec(spec)
+        sys.modules[module_name] = module
         spec.loader.exec_module(module)
     if PY2:
         import imp
         module = imp.load_source(module_name, location)
     sys.modules[module_name] = module
     import ansible.module_utils
-    ansible.module_utils.common_errata_tool = module
+    setattr(ansible.module_utils, name, module)
 
 
 @pytest.fixture()
@@ -56,6 +85,25 @@ def client(monkeypatch, requests_mock):
     return c
 
 
+@pytest.fixture()
+def fake_server():
+    """ Run a fake ET server (see fake_errata_tool.py) in a thread. """
+    from fake_errata_tool import start_server
+    server = start_server()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.fixture()
+def fake_client(fake_server, monkeypatch):
+    """ Return a real common_errata_tool.Client for our fake ET server. """
+    from ansible.module_utils.common_errata_tool import Client
+    monkeypatch.setenv('ERRATA_TOOL_URL', fake_server.url)
+    monkeypatch.setenv('ERRATA_TOOL_AUTH', 'notkerberos')
+    return Client()
+
+
 @pytest.fixture()
 def user():
     return {
@@ -0,0 +1,1212 @@
+"""
+A fake Errata Tool server for offline integration tests and benchmarks.
+
+This server implements the parts of the ET's REST API that our modules use,
+with in-memory state. It is not a complete or exact copy of the ET, but it
+returns the same JSON structures, so the modules cannot tell the difference.
+
+Run it on the port that tests/integration/run.sh expects:
+
+  python tests/fake_errata_tool.py --port 3000
+
+Use --latency to simulate a slow server, and --error-rate to make a fraction
+of the requests fail with HTTP 500 errors. Use --scale to start with a large
+generated data set (see generate_et_data.py).
+
+In Python code (for example, in a benchmark), use start_server() to run the
+server in a background thread.
+"""
+import argparse
+import json
+import random
+import re
+import threading
+import time
+import generate_et_data
+from ansible.module_utils.six import string_types
+from ansible.module_utils.six.moves import BaseHTTPServer
+from ansible.module_utils.six.moves import socketserver
+from ansible.module_utils.six.moves.urllib.parse import parse_qs
+from ansible.module_utils.six.moves.urllib.parse import unquote
+from ansible.module_utils.six.moves.urllib.parse import urlparse
+
+
+# The ET uses this page size when a client does not set page[size].
+DEFAULT_PAGE_SIZE = 100
+
+PUSH_TARGETS = {
+    'rhn_live': 1,
+    'rhn_stage': 2,
+    'ftp': 3,
+    'cdn': 4,
+    'altsrc': 5,
+    'cdn_stage': 7,
+    'cdn_docker': 9,
+    'cdn_docker_stage': 10,
+}
+
+WORKFLOW_RULES = {
+    'Default': 1,
+    'Unrestricted': 2,
+    'CDN Push Only': 3,
+    'Covscan': 4,
+    'Non-blocking TPS': 7,
+    'Optional BugsGuard': 21,
+}
+
+SOLUTIONS = {
+    'default': 1,
+    'enterprise': 2,
+    'rhn_tools': 3,
+}
+
+EXD_ORG_GROUPS = {
+    'RHEL': 1,
+    'Cloud': 2,
+    'Middleware & Management': 3,
+    'Pipeline Value': 4,
+}
+
+SIG_KEYS = {
+    'redhatrelease2': 8,
+    'redhatimarelease': 15,
+}
+
+ARCHES = {
+    'i386': 1,
+    'x86_64': 3,
+    'ppc64le': 21,
+    's390x': 22,
+    'aarch64': 23,
+    'multi': 28,
+    'noarch': 29,
+}
+
+# The ET creates these tags when we add a package to a Docker CDN repo:
+DEFAULT_DOCKER_TAGS = [
+    ('{{version}}-{{release}}', False, False),
+    ('{{version}}-prerelease-{{advisory}}', False, True),
+    ('{{version}}-{{hotfix}}-{{advisory}}', True, False),
+]
+
+PRODUCT_ATTRIBUTES = [
+    'name',
+    'description',
+    'short_name',
+    'bugzilla_product_name',
+    'valid_bug_states',
+    'ftp_path',
+    'ftp_subdir',
+    'is_internal',
+    'suppress_push_request_jira',
+    'isactive',
+    'move_bugs_on_qe',
+    'show_bug_package_mismatch_warning',
+]
+
+PRODUCT_VERSION_ATTRIBUTES = [
+    'name',
+    'description',
+    'default_brew_tag',
+    'allow_rhn_debuginfo',
+    'allow_buildroot_push',
+    'is_oval_product',
+    'is_rhel_addon',
+    'is_server_only',
+    'enabled',
+    'suppress_push_request_jira',
+    'allow_unreleased_rpms',
+]
+
+VARIANT_ATTRIBUTES = [
+    'name',
+    'description',
+    'cpe',
+    'enabled',
+    'buildroot',
+    'tps_stream',
+    'override_ftp_base_folder',
+]
+
+CDN_REPO_ATTRIBUTES = [
+    'name',
+    'external_name',
+    'release_type',
+    'use_for_tps',
+    'content_type',
+]
+
+RELEASE_ATTRIBUTES = [
+    'name',
+    'description',
+    'type',
+    'allow_pkg_dupes',
+    'ship_date',
+    'pelc_product_version_name',
+    'is_active',
+    'enabled',
+    'enable_batching',
+    'is_deferred',
+    'allow_shadow',
+    'allow_blocker',
+    'allow_exception',
+    'limit_bugs_by_product',
+    'supports_component_acl',
+    'blocker_flags',
+    'internal_target_release',
+    'zstream_target_release',
+]
+
+RHEL_RELEASE_ATTRIBUTES = [
+    'name',
+    'description',
+    'version_number',
+    'exclude_ftp_debuginfo',
+    'is_zstream',
+]
+
+USER_ATTRIBUTES = [
+    'login_name',
+    'realname',
+    'organization',
+    'enabled',
+    'receives_mail',
+    'email_address',
+    'roles',
+]
+
+
+class NotFound(Exception):
+    """ The client asked for a resource that does not exist """
+    pass
+
+
+class Invalid(Exception):
+    """ The client sent invalid data """
+    pass
+
+
+class UserNotFound(Exception):
+    """ The ET's user API has its own way of reporting missing users """
+    pass
+
+
+def ref(table, name, key='name'):
+    """ Return a {"id": ..., "name": ...} relationship for a lookup table """
+    if name is None:
+        return None
+    try:
+        return {'id': table[name], key: name}
+    except KeyError:
+        raise Invalid('unknown %s "%s"' % (key, name))
+
+
+def first(query, key):
+    """ Return the first value for this query string key, or None """
+    values = query.get(key)
+    if not values:
+        return None
+    return values[0]
+
+
+class FakeErrataTool(object):
+    """
+    In-memory state and request handling for a fake ET.
+
+    :param float latency: sleep this many seconds before each response.
+    :param float error_rate: fail this fraction (0.0 - 1.0) of requests with
+                             an HTTP 500 error.
+    :param int seed: random seed for error_rate, for repeatable tests.
+    """
+    def __init__(self, latency=0, error_rate=0, seed=None):
+        self.latency = latency
+        self.error_rate = error_rate
+        self.random = random.Random(seed)
+        self.lock = threading.RLock()
+        self.requests = 0
+        self.reset()
+
+    def reset(self):
+        """ Drop all state and load the initial data again. """
+        with self.lock:
+            self.next_id = 1000
+            self.products = {}
+            self.product_versions = {}
+            self.variants = {}
+            self.cdn_repos = {}
+            self.package_tags = {}
+            self.packages = {}
+            self.releases = {}
+            self.rhel_releases = {}
+            self.users = {}
+            self.rule_sets = dict(WORKFLOW_RULES)
+            self.load_initial_data()
+
+    def new_id(self):
+        self.next_id += 1
+        return self.next_id
+
+    def load_initial_data(self):
+        """
+        Create the resources that the integration tests expect.
+
+        The ET's test/fixtures/*.yml files create these in a real ET dev
+        server.
+        """
+        for login_name, roles in (('docs-errata-list@redhat.com', ['docs']),
+                                  ('coolmanager@redhat.com', ['pm'])):
+            self.create_user(body={
+                'login_name': login_name,
+                'realname': login_name.split('@')[0],
+                'roles': roles,
+            })
+        for name, version in (('RHEL-8', 8), ('RHEL-8.0.0', 8)):
+            self.create_rhel_release(body={
+                'name': name,
+                'description': name,
+                'version_number': version,
+            })
+        self.create_product(body={'product': {
+            'short_name': 'RHEL',
+            'name': 'Red Hat Enterprise Linux',
+            'description': 'Red Hat Enterprise Linux',
+            'default_solution': 'enterprise',
+            'state_machine_rule_set': 'Default',
+            'push_targets': ['cdn', 'cdn_stage'],
+        }})
+        self.create_product_version(product='RHEL', body={'product_version': {
+            'name': 'RHEL-8.0.0',
+            'description': 'RHEL-8.0.0',
+            'default_brew_tag': 'rhel-8.0.0-candidate',
+            'brew_tags': ['rhel-8.0.0-candidate'],
+            'rhel_release_name': 'RHEL-8.0.0',
+            'push_targets': ['cdn', 'cdn_stage'],
+        }})
+        self.create_variant(body={'variant': {
+            'name': 'AppStream-8.0.0',
+            'description': 'Red Hat Enterprise Linux AppStream (v. 8)',
+            'product_version': 'RHEL-8.0.0',
+            'push_targets': ['cdn', 'cdn_stage'],
+        }})
+
+    # Request dispatching:
+
+    ROUTES = [
+        ('GET', r'api/v1/products/(?P<product>[^/]+)/product_versions/?',
+         'list_product_versions'),
+        ('POST', r'api/v1/products/(?P<product>[^/]+)/product_versions/?',
+         'create_product_version'),
+        ('PUT',
+         r'api/v1/products/(?P<product>[^/]+)/product_versions/(?P<id>\d+)',
+         'edit_product_version'),
+        ('GET', r'api/v1/products/?', 'list_products'),
+        ('GET', r'api/v1/products/(?P<name>[^/]+)', 'get_product'),
+        ('POST', r'api/v1/products/?', 'create_product'),
+        ('PUT', r'api/v1/products/(?P<id>\d+)', 'edit_product'),
+        ('GET', r'product_versions/(?P<name>.+)\.json',
+         'get_product_version_legacy'),
+        ('GET', r'api/v1/variants/?', 'list_variants'),
+        ('POST', r'api/v1/variants/?', 'create_variant'),
+        ('PUT', r'api/v1/variants/(?P<id>\d+)', 'edit_variant'),
+        ('GET', r'api/v1/cdn_repos/?', 'list_cdn_repos'),
+        ('GET', r'api/v1/cdn_repos/(?P<name>.+)', 'get_cdn_repo'),
+        ('POST', r'api/v1/cdn_repos/?', 'create_cdn_repo'),
+        ('PUT', r'api/v1/cdn_repos/(?P<id>\d+)', 'edit_cdn_repo'),
+        ('GET', r'api/v1/cdn_repo_package_tags/?', 'list_package_tags'),
+        ('POST', r'api/v1/cdn_repo_package_tags/?', 'create_package_tag'),
+        ('PUT', r'api/v1/cdn_repo_package_tags/(?P<id>\d+)',
+         'edit_package_tag'),
+        ('DELETE', r'api/v1/cdn_repo_package_tags/(?P<id>\d+)',
+         'delete_package_tag'),
+        ('GET', r'api/v1/releases/?', 'list_releases'),
+        ('POST', r'api/v1/releases/?', 'create_release'),
+        ('PUT', r'api/v1/releases/(?P<id>\d+)', 'edit_release'),
+        ('GET', r'api/v1/rhel_releases/?', 'list_rhel_releases'),
+        ('POST', r'api/v1/rhel_releases/?', 'create_rhel_release'),
+        ('PUT', r'api/v1/rhel_releases/(?P<id>\d+)', 'edit_rhel_release'),
+        ('GET', r'api/v1/user/(?P<name>[^/]+)', 'get_user'),
+        ('POST', r'api/v1/user/?', 'create_user'),
+        ('PUT', r'api/v1/user/(?P<id>\d+)', 'edit_user'),
+        ('GET', r'workflow_rules/?', 'workflow_rules'),
+    ]
+
+    def handle(self, method, path, query=None, body=None):
+        """
+        Handle one HTTP request.
+
+        :param str method: eg. "GET"
+        :param str path: eg. "/api/v1/products/RHCEPH"
+        :param dict query: parsed query string (see parse_qs())
+        :param body: parsed JSON request body, or None
+        :returns: a two-element tuple: HTTP status code (int), and the
+                  response (a dict for JSON, a str for HTML, or None for no
+                  content).
+        """
+        if self.latency:
+            time.sleep(self.latency)
+        with self.lock:
+            self.requests += 1
+            if self.error_rate and self.random.random() < self.error_rate:
+                return (500, {'error': 'fake ET injected an error'})
+        path = unquote(path).lstrip('/')
+        for route_method, pattern, name in self.ROUTES:
+            if route_method != method:
+                continue
+            match = re.match('^%s$' % pattern, path)
+            if not match:
+                continue
+            handler = getattr(self, name)
+            kwargs = match.groupdict()
+            with self.lock:
+                try:
+                    return handler(query=query or {}, body=body, **kwargs)
+                except NotFound as e:
+                    return (404, {'error': str(e)})
+                except Invalid as e:
+                    return (422, {'error': str(e)})
+                except UserNotFound as e:
+                    errors = {'login_name': ['%s not found.' % e]}
+                    return (400, {'errors': errors})
+        return (404, {'error': 'fake ET has no %s %s' % (method, path)})
+
+    def paginate(self, records, query, serialize):
+        """ Return one page of JSON:API data """
+        size = int(first(query, 'page[size]') or DEFAULT_PAGE_SIZE)
+        number = int(first(query, 'page[number]') or 1)
+        start = (number - 1) * size
+        page = records[start:start + size]
+        return (200, {'data': [serialize(record) for record in page]})
+
+    def find(self, table, value, key='name'):
+        """ Find a record by id (int string) or by name """
+        if isinstance(value, int) or value.isdigit():
+            record = table.get(int(value))
+            if record:
+                return record
+        for record in table.values():
+            if record[key] == value:
+                return record
+        raise NotFound('%s not found' % value)
+
+    def filtered(self, table, query, filters):
+        """
+        Filter records by query string values.
+
+        :param dict filters: map of query string key to a function that
+                             returns the value to compare for a record.
+        """
+        records = sorted(table.values(), key=lambda record: record['id'])
+        for key, getter in filters.items():
+            value = first(query, key)
+            if value is not None:
+                records = [r for r in records if getter(r) == value]
+        return records
+
+    def update(self, record, data, allowed):
+        """ Copy the allowed keys from data into record """
+        for key, value in data.items():
+            if key not in allowed:
+                raise Invalid('unknown attribute "%s"' % key)
+            record[key] = value
+
+    def require_unique(self, table, name, key='name', record_id=None):
+        for record in table.values():
+            if record[key] == name and record['id'] != record_id:
+                raise Invalid('%s "%s" has already been taken' % (key, name))
+
+    def user_ref(self, login_name):
+        if login_name is None:
+            return None
+        user = self.find(self.users, login_name, 'login_name')
+        return {'id': user['id'], 'login_name': login_name}
+
+    def push_target_refs(self, names):
+        return [ref(PUSH_TARGETS, name) for name in names]
+
+    # Products:
+
+    def serialize_product(self, product):
+        product_versions = [
+            {'id': pv['id'], 'name': pv['name']}
+            for pv in sorted(self.product_versions.values(),
+                             key=lambda pv: pv['id'])
+            if pv['product_id'] == product['id']
+        ]
+        exd_org_group = ref(EXD_ORG_GROUPS, product['exd_org_group'])
+        exd_org_group['short_name'] = product['exd_org_group']
+        return {
+            'id': product['id'],
+            'type': 'products',
+            'attributes': {key: product[key] for key in PRODUCT_ATTRIBUTES},
+            'relationships': {
+                'default_docs_reviewer':
+                    self.user_ref(product['default_docs_reviewer']),
+                'default_solution': ref(SOLUTIONS,
+                                        product['default_solution'],
+                                        'title'),
+                'product_versions': product_versions,
+                'push_targets':
+                    self.push_target_refs(product['push_targets']),
+                'state_machine_rule_set':
+                    ref(self.rule_sets, product['state_machine_rule_set']),
+                'exd_org_group': exd_org_group,
+            },
+        }
+
+    def validate_product(self, product):
+        self.user_ref(product['default_docs_reviewer'])
+        ref(SOLUTIONS, product['default_solution'], 'title')
+        self.push_target_refs(product['push_targets'])
+        ref(self.rule_sets, product['state_machine_rule_set'])
+        ref(EXD_ORG_GROUPS, product['exd_org_group'])
+
+    def list_products(self, query, body):
+        records = self.filtered(self.products, query, {
+            'filter[short_name]': lambda product: product['short_name'],
+        })
+        return self.paginate(records, query, self.serialize_product)
+
+    def get_product(self, query, body, name):
+        product = self.find(self.products, name, 'short_name')
+        return (200, {'data': self.serialize_product(product)})
+
+    def create_product(self, body, query=None):
+        data = body['product']
+        product = {
+            'id': self.new_id(),
+            'bugzilla_product_name': '',
+            'valid_bug_states': ['MODIFIED', 'VERIFIED'],
+            'ftp_path': '',
+            'ftp_subdir': None,
+            'is_internal': False,
+            'suppress_push_request_jira': False,
+            'isactive': True,
+            'move_bugs_on_qe': False,
+            'show_bug_package_mismatch_warning': False,
+            'default_docs_reviewer': None,
+            'push_targets': [],
+            'state_machine_rule_set': None,
+            'exd_org_group': 'RHEL',
+        }
+        allowed = PRODUCT_ATTRIBUTES + [
+            'default_docs_reviewer',
+            'default_solution',
+            'push_targets',
+            'state_machine_rule_set',
+            'exd_org_group',
+        ]
+        self.update(product, data, allowed)
+        if product.get('exd_org_group') is None:
+            product['exd_org_group'] = 'RHEL'
+        for key in ('short_name', 'name', 'description', 'default_solution'):
+            if not product.get(key):
+                raise Invalid('%s can\'t be blank' % key)
+        self.require_unique(self.products, product['short_name'],
+                            'short_name')
+        self.validate_product(product)
+        self.products[product['id']] = product
+        return (201, {'data': self.serialize_product(product)})
+
+    def edit_product(self, query, body, id):
+        product = self.find(self.products, id)
+        changed = product.copy()
+        allowed = PRODUCT_ATTRIBUTES + [
+            'default_docs_reviewer',
+            'default_solution',
+            'push_targets',
+            'state_machine_rule_set',
+            'exd_org_group',
+        ]
+        self.update(changed, body['product'], allowed)
+        if changed.get('exd_org_group') is None:
+            changed['exd_org_group'] = product['exd_org_group']
+        self.validate_product(changed)
+        product.update(changed)
+        return (200, {'data': self.serialize_product(product)})
+
+    # Product versions:
+
+    def serialize_product_version(self, pv):
+        relationships = {
+            'push_targets': self.push_target_refs(pv['push_targets']),
+            'rhel_release': self.rhel_release_ref(pv['rhel_release_name']),
+            'sig_key': ref(SIG_KEYS, pv['sig_key_name']),
+            'container_sig_key': ref(SIG_KEYS, pv['container_sig_key_name']),
+        }
+        if pv['ima_sig_key_name']:
+            relationships['ima_sig_key'] = ref(SIG_KEYS,
+                                               pv['ima_sig_key_name'])
+        return {
+            'id': pv['id'],
+            'type': 'product_versions',
+            'attributes': {key: pv[key]
+                           for key in PRODUCT_VERSION_ATTRIBUTES},
+            'brew_tags': pv['brew_tags'],
+            'relationships': relationships,
+        }
+
+    def validate_product_version(self, pv):
+        self.push_target_refs(pv['push_targets'])
+        self.rhel_release_ref(pv['rhel_release_name'])
+        ref(SIG_KEYS, pv['sig_key_name'])
+        ref(SIG_KEYS, pv['container_sig_key_name'])
+        ref(SIG_KEYS, pv['ima_sig_key_name'])
+        # The ET's API accepts 0/1 for booleans.
+        for key in PRODUCT_VERSION_ATTRIBUTES:
+            if isinstance(pv[key], int):
+                pv[key] = bool(pv[key])
+
+    def list_product_versions(self, query, body, product):
+        product = self.find(self.products, product, 'short_name')
+        records = [pv for pv in self.filtered(self.product_versions, query, {
+            'filter[name]': lambda pv: pv['name'],
+        }) if pv['product_id'] == product['id']]
+        return self.paginate(records, query, self.serialize_product_version)
+
+    def get_product_version_legacy(self, query, body, name):
+        pv = self.find(self.product_versions, name)
+        return (200, {'id': pv['id'], 'name': pv['name']})
+
+    def create_product_version(self, body, product, query=None):
+        product = self.find(self.products, product, 'short_name')
+        pv = {
+            'id': self.new_id(),
+            'product_id': product['id'],
+            'default_brew_tag': None,
+            'allow_rhn_debuginfo': False,
+            'allow_buildroot_push': False,
+            'is_oval_product': False,
+            'is_rhel_addon': False,
+            'is_server_only': False,
+            'enabled': True,
+            'suppress_push_request_jira': False,
+            'allow_unreleased_rpms': False,
+            'brew_tags': [],
+            'push_targets': [],
+            'rhel_release_name': None,
+            'sig_key_name': 'redhatrelease2',
+            'container_sig_key_name': 'redhatrelease2',
+            'ima_sig_key_name': None,
+        }
+        allowed = PRODUCT_VERSION_ATTRIBUTES + [
+            'brew_tags',
+            'push_targets',
+            'rhel_release_name',
+            'sig_key_name',
+            'container_sig_key_name',
+            'ima_sig_key_name',
+        ]
+        self.update(pv, body['product_version'], allowed)
+        if not pv.get('name'):
+            raise Invalid('name can\'t be blank')
+        self.require_unique(self.product_versions, pv['name'])
+        self.validate_product_version(pv)
+        self.product_versions[pv['id']] = pv
+        return (201, {'data': self.serialize_product_version(pv)})
+
+    def edit_product_version(self, query, body, product, id):
+        pv = self.find(self.product_versions, id)
+        changed = pv.copy()
+        allowed = PRODUCT_VERSION_ATTRIBUTES + [
+            'brew_tags',
+            'push_targets',
+            'rhel_release_name',
+            'sig_key_name',
+            'container_sig_key_name',
+            'ima_sig_key_name',
+        ]
+        self.update(changed, body['product_version'], allowed)
+        self.validate_product_version(changed)
+        pv.update(changed)
+        return (200, {'data': self.serialize_product_version(pv)})
+
+    # Variants:
+
+    def serialize_variant(self, variant):
+        pv = self.find(self.product_versions, variant['product_version'])
+        product = self.products[pv['product_id']]
+        rhel_variant = self.find(self.variants, variant['rhel_variant']) \
+            if variant['rhel_variant'] != variant['name'] else variant
+        attributes = {key: variant[key] for key in VARIANT_ATTRIBUTES}
+        # The ET nests the relationships inside the attributes here.
+        attributes['relationships'] = {
+            'product': {
+                'id': product['id'],
+                'name': product['name'],
+                'short_name': product['short_name'],
+            },
+            'product_version': {'id': pv['id'], 'name': pv['name']},
+            'rhel_release': self.rhel_release_ref(pv['rhel_release_name']),
+            'rhel_variant': {'id': rhel_variant['id'],
+                             'name': rhel_variant['name']},
+            'push_targets': self.push_target_refs(variant['push_targets']),
+        }
+        return {
+            'id': variant['id'],
+            'type': 'variants',
+            'attributes': attributes,
+        }
+
+    def validate_variant(self, variant):
+        self.find(self.product_versions, variant['product_version'])
+        if variant['rhel_variant'] != variant['name']:
+            self.find(self.variants, variant['rhel_variant'])
+        self.push_target_refs(variant['push_targets'])
+
+    def list_variants(self, query, body):
+        records = self.filtered(self.variants, query, {
+            'filter[name]': lambda variant: variant['name'],
+        })
+        return self.paginate(records, query, self.serialize_variant)
+
+    def create_variant(self, body, query=None):
+        variant = {
+            'id': self.new_id(),
+            'cpe': None,
+            'enabled': True,
+            'buildroot': False,
+            'tps_stream': None,
+            'override_ftp_base_folder': None,
+            'rhel_variant': None,
+            'push_targets': [],
+        }
+        allowed = VARIANT_ATTRIBUTES + [
+            'product_version',
+            'rhel_variant',
+            'push_targets',
+        ]
+        self.update(variant, body['variant'], allowed)
+        for key in ('name', 'description', 'product_version'):
+            if not variant.get(key):
+                raise Invalid('%s can\'t be blank' % key)
+        # A variant with no rhel_variant is its own RHEL variant.
+        if not variant['rhel_variant']:
+            variant['rhel_variant'] = variant['name']
+        self.require_unique(self.variants, variant['name'])
+        self.validate_variant(variant)
+        self.variants[variant['id']] = variant
+        return (201, {'data': self.serialize_variant(variant)})
+
+    def edit_variant(self, query, body, id):
+        variant = self.find(self.variants, id)
+        changed = variant.copy()
+        allowed = VARIANT_ATTRIBUTES + [
+            'product_version',
+            'rhel_variant',
+            'push_targets',
+        ]
+        self.update(changed, body['variant'], allowed)
+        self.validate_variant(changed)
+        variant.update(changed)
+        return (200, {'data': self.serialize_variant(variant)})
+
+    # CDN repos:
+
+    def serialize_cdn_repo(self, cdn_repo):
+        variants = [self.find(self.variants, name)
+                    for name in cdn_repo['variants']]
+        packages = [{'id': self.packages[name], 'name': name}
+                    for name in cdn_repo['package_names']]
+        return {
+            'id': cdn_repo['id'],
+            'type': 'cdn_repos',
+            'attributes': {key: cdn_repo[key]
+                           for key in CDN_REPO_ATTRIBUTES},
+            'relationships': {
+                'arch': ref(ARCHES, cdn_repo['arch']),
+                'variants': [{'id': variant['id'], 'name': variant['name']}
+                             for variant in variants],
+                'packages': packages,
+            },
+        }
+
+    def list_cdn_repos(self, query, body):
+        records = self.filtered(self.cdn_repos, query, {
+            'filter[name]': lambda cdn_repo: cdn_repo['name'],
+        })
+        return self.paginate(records, query, self.serialize_cdn_repo)
+
+    def get_cdn_repo(self, query, body, name):
+        cdn_repo = self.find(self.cdn_repos, name)
+        return (200, {'data': self.serialize_cdn_repo(cdn_repo)})
+
+    def cdn_repo_data(self, cdn_repo, data):
+        """ Copy the API's names for settings into this cdn_repo record """
+        data = data.copy()
+        if 'arch_name' in data:
+            data['arch'] = data.pop('arch_name')
+        if 'variant_names' in data:
+            data['variants'] = data.pop('variant_names')
+        allowed = CDN_REPO_ATTRIBUTES + ['arch', 'variants', 'package_names']
+        self.update(cdn_repo, data, allowed)
+        if cdn_repo['content_type'] == 'Docker' and not cdn_repo['arch']:
+            cdn_repo['arch'] = 'multi'
+        ref(ARCHES, cdn_repo['arch'])
+        for name in cdn_repo['variants']:
+            self.find(self.variants, name)
+
+    def set_packages(self, cdn_repo, package_names):
+        """
+        Add or remove packages for this CDN repo.
+
+        Like the ET, we create some default tags for new packages in Docker
+        repos, and we delete the tags for removed packages.
+        """
+        old_names = cdn_repo['package_names']
+        for name in package_names:
+            self.packages.setdefault(name, self.new_id())
+        cdn_repo['package_names'] = list(package_names)
+        for tag in list(self.package_tags.values()):
+            if tag['cdn_repo_id'] == cdn_repo['id'] and \
+               tag['package'] not in package_names:
+                del self.package_tags[tag['id']]
+        if cdn_repo['content_type'] != 'Docker':
+            return
+        for name in package_names:
+            if name in old_names:
+                continue
+            for tag_template, for_hotfix, for_prerelease in \
+                    DEFAULT_DOCKER_TAGS:
+                tag = {
+                    'id': self.new_id(),
+                    'cdn_repo_id': cdn_repo['id'],
+                    'package': name,
+                    'tag_template': tag_template,
+                    'variant': None,
+                    'for_hotfix': for_hotfix,
+                    'for_prerelease': for_prerelease,
+                }
+                self.package_tags[tag['id']] = tag
+
+    def create_cdn_repo(self, body, query=None):
+        data = body['cdn_repo'].copy()
+        package_names = data.pop('package_names', [])
+        cdn_repo = {
+            'id': self.new_id(),
+            'external_name': None,
+            'use_for_tps': False,
+            'arch': None,
+            'variants': [],
+            'package_names': [],
+        }
+        self.cdn_repo_data(cdn_repo, data)
+        for key in ('name', 'release_type', 'content_type'):
+            if not cdn_repo.get(key):
+                raise Invalid('%s can\'t be blank' % key)
+        if not cdn_repo['external_name']:
+            cdn_repo['external_name'] = cdn_repo['name']
+        self.require_unique(self.cdn_repos, cdn_repo['name'])
+        self.cdn_repos[cdn_repo['id']] = cdn_repo
+        self.set_packages(cdn_repo, package_names)
+        return (201, {'data': self.serialize_cdn_repo(cdn_repo)})
+
+    def edit_cdn_repo(self, query, body, id):
+        cdn_repo = self.find(self.cdn_repos, id)
+        data = body['cdn_repo'].copy()
+        package_names = data.pop('package_names', None)
+        changed = cdn_repo.copy()
+        self.cdn_repo_data(changed, data)
+        cdn_repo.update(changed)
+        if package_names is not None:
+            self.set_packages(cdn_repo, package_names)
+        return (200, {'data': self.serialize_cdn_repo(cdn_repo)})
+
+    # CDN repo package tags:
+
+    def serialize_package_tag(self, tag):
+        cdn_repo = self.cdn_repos[tag['cdn_repo_id']]
+        relationships = {
+            'cdn_repo': {'id': cdn_repo['id'], 'name': cdn_repo['name']},
+            'package': {'id': self.packages[tag['package']],
+                        'name': tag['package']},
+        }
+        if tag['variant']:
+            variant = self.find(self.variants, tag['variant'])
+            relationships['variant'] = {'id': variant['id'],
+                                        'name': variant['name']}
+        return {
+            'id': tag['id'],
+            'type': 'cdn_repo_package_tags',
+            'attributes': {
+                'tag_template': tag['tag_template'],
+                'for_hotfix': tag['for_hotfix'],
+                'for_prerelease': tag['for_prerelease'],
+            },
+            'relationships': relationships,
+        }
+
+    def list_package_tags(self, query, body):
+        records = self.filtered(self.package_tags, query, {
+            'filter[cdn_repo_name]':
+                lambda tag: self.cdn_repos[tag['cdn_repo_id']]['name'],
+            'filter[package_name]': lambda tag: tag['package'],
+        })
+        return self.paginate(records, query, self.serialize_package_tag)
+
+    def package_tag_data(self, tag, data):
+        data = data.copy()
+        if 'variant_name' in data:
+            tag['variant'] = data.pop('variant_name')
+            self.find(self.variants, tag['variant'])
+        if 'variant_id' in data:
+            variant_id = data.pop('variant_id')
+            tag['variant'] = None
+            if variant_id is not None:
+                tag['variant'] = self.find(self.variants, variant_id)['name']
+        self.update(tag, data, ['tag_template', 'for_hotfix',
+                                'for_prerelease'])
+
+    def create_package_tag(self, body, query=None):
+        data = body['cdn_repo_package_tag'].copy()
+        cdn_repo = self.find(self.cdn_repos, data.pop('cdn_repo_name'))
+        package = data.pop('package_name')
+        if package not in cdn_repo['package_names']:
+            raise Invalid('package %s is not in %s'
+                          % (package, cdn_repo['name']))
+        tag = {
+            'id': self.new_id(),
+            'cdn_repo_id': cdn_repo['id'],
+            'package': package,
+            'variant': None,
+            'for_hotfix': False,
+            'for_prerelease': False,
+        }
+        self.package_tag_data(tag, data)
+        for other in self.package_tags.values():
+            if other['cdn_repo_id'] == tag['cdn_repo_id'] and \
+               other['package'] == tag['package'] and \
+               other['tag_template'] == tag['tag_template']:
+                raise Invalid('tag_template has already been taken')
+        self.package_tags[tag['id']] = tag
+        return (201, {'data': self.serialize_package_tag(tag)})
+
+    def edit_package_tag(self, query, body, id):
+        tag = self.find(self.package_tags, id, 'tag_template')
+        self.package_tag_data(tag, body['cdn_repo_package_tag'])
+        return (200, {'data': self.serialize_package_tag(tag)})
+
+    def delete_package_tag(self, query, body, id):
+        tag = self.find(self.package_tags, id, 'tag_template')
+        del self.package_tags[tag['id']]
+        return (204, None)
+
+    # Releases:
+
+    def serialize_release(self, release):
+        product = None
+        if release['product_id']:
+            product = self.products[release['product_id']]
+            product = {'id': product['id'],
+                       'short_name': product['short_name']}
+        product_versions = [self.product_versions[pv_id]
+                            for pv_id in release['product_version_ids']]
+        program_manager = None
+        if release['program_manager_id']:
+            user = self.users[release['program_manager_id']]
+            program_manager = {'id': user['id'],
+                               'login_name': user['login_name']}
+        rule_set = None
+        for name, rule_set_id in self.rule_sets.items():
+            if rule_set_id == release['state_machine_rule_set_id']:
+                rule_set = {'id': rule_set_id, 'name': name}
+        attributes = {key: release[key] for key in RELEASE_ATTRIBUTES}
+        attributes['is_async'] = release['type'] == 'Async'
+        return {
+            'id': release['id'],
+            'type': 'releases',
+            'attributes': attributes,
+            'relationships': {
+                'brew_tags': [{'id': index + 1, 'name': name}
+                              for index, name
+                              in enumerate(release['brew_tags'])],
+                'product': product,
+                'product_versions': [{'id': pv['id'], 'name': pv['name']}
+                                     for pv in product_versions],
+                'state_machine_rule_set': rule_set,
+                'program_manager': program_manager,
+            },
+        }
+
+    def release_data(self, release, data):
+        """ Copy the API's names for settings into this release record """
+        data = data.copy()
+        if 'isactive' in data:
+            data['is_active'] = data.pop('isactive')
+        if 'disable_acl' in data:
+            data['supports_component_acl'] = not data.pop('disable_acl')
+        if isinstance(data.get('blocker_flags'), string_types):
+            flags = data['blocker_flags']
+            data['blocker_flags'] = flags.split(',') if flags else []
+        if data.get('ship_date'):
+            data['ship_date'] = data['ship_date'][:10] + 'T00:00:00Z'
+        allowed = RELEASE_ATTRIBUTES + [
+            'product_id',
+            'program_manager_id',
+            'product_version_ids',
+            'state_machine_rule_set_id',
+            'brew_tags',
+        ]
+        self.update(release, data, allowed)
+        if release['product_id']:
+            self.find(self.products, release['product_id'])
+        if release['program_manager_id']:
+            self.find(self.users, release['program_manager_id'],
+                      'login_name')
+        for pv_id in release['product_version_ids']:
+            self.find(self.product_versions, pv_id)
+
+    def list_releases(self, query, body):
+        records = self.filtered(self.releases, query, {
+            'filter[name]': lambda release: release['name'],
+        })
+        return self.paginate(records, query, self.serialize_release)
+
+    def create_release(self, body, query=None):
+        release = {
+            'id': self.new_id(),
+            'allow_pkg_dupes': False,
+            'ship_date': None,
+            'pelc_product_version_name': None,
+            'is_active': True,
+            'enabled': True,
+            'enable_batching': True,
+            'is_deferred': False,
+            'allow_shadow': False,
+            'allow_blocker': False,
+            'allow_exception': False,
+            'limit_bugs_by_product': False,
+            'supports_component_acl': False,
+            'blocker_flags': [],
+            'internal_target_release': None,
+            'zstream_target_release': None,
+            'product_id': None,
+            'program_manager_id': None,
+            'product_version_ids': [],
+            'state_machine_rule_set_id': None,
+            'brew_tags': [],
+        }
+        release['type'] = body.get('type')
+        self.release_data(release, body['release'])
+        for key in ('name', 'description', 'type'):
+            if not release.get(key):
+                raise Invalid('%s can\'t be blank' % key)
+        self.require_unique(self.releases, release['name'])
+        self.releases[release['id']] = release
+        return (201, {'data': self.serialize_release(release)})
+
+    def edit_release(self, query, body, id):
+        release = self.find(self.releases, id)
+        changed = release.copy()
+        if body.get('type'):
+            changed['type'] = body['type']
+        self.release_data(changed, body['release'])
+        release.update(changed)
+        return (200, {'data': self.serialize_release(release)})
+
+    # RHEL releases:
+
+    def rhel_release_ref(self, name):
+        if name is None:
+            return None
+        rhel_release = self.find(self.rhel_releases, name)
+        return {'id': rhel_release['id'], 'name': name}
+
+    def serialize_rhel_release(self, rhel_release):
+        return {
+            'id': rhel_release['id'],
+            'type': 'rhel_releases',
+            'attributes': {key: rhel_release[key]
+                           for key in RHEL_RELEASE_ATTRIBUTES},
+        }
+
+    def list_rhel_releases(self, query, body):
+        records = self.filtered(self.rhel_releases, query, {
+            'filter[name]': lambda rhel_release: rhel_release['name'],
+        })
+        return self.paginate(records, query, self.serialize_rhel_release)
+
+    def create_rhel_release(self, body, query=None):
+        # Unlike the PUT, the ET's POST has no "rhel_release" wrapper.
+        rhel_release = {
+            'id': self.new_id(),
+            'version_number': None,
+            'exclude_ftp_debuginfo': False,
+            'is_zstream': False,
+        }
+        self.update(rhel_release, body, RHEL_RELEASE_ATTRIBUTES)
+        if rhel_release['exclude_ftp_debuginfo'] is None:
+            rhel_release['exclude_ftp_debuginfo'] = False
+        for key in ('name', 'description'):
+            if not rhel_release.get(key):
+                raise Invalid('%s can\'t be blank' % key)
+        self.require_unique(self.rhel_releases, rhel_release['name'])
+        self.rhel_releases[rhel_release['id']] = rhel_release
+        return (201, {'data': self.serialize_rhel_release(rhel_release)})
+
+    def edit_rhel_release(self, query, body, id):
+        rhel_release = self.find(self.rhel_releases, id)
+        self.update(rhel_release, body['rhel_release'],
+                    RHEL_RELEASE_ATTRIBUTES)
+        return (200, {'data': self.serialize_rhel_release(rhel_release)})
+
+    # Users:
+
+    def serialize_user(self, user):
+        data = {key: user[key] for key in USER_ATTRIBUTES}
+        data['id'] = user['id']
+        return data
+
+    def get_user(self, query, body, name):
+        try:
+            user = self.find(self.users, name, 'login_name')
+        except NotFound:
+            raise UserNotFound(name)
+        return (200, self.serialize_user(user))
+
+    def create_user(self, body, query=None):
+        user = {
+            'id': self.new_id(),
+            'organization': None,
+            'enabled': True,
+            'receives_mail': True,
+            'email_address': None,
+            'roles': [],
+        }
+        self.update(user, body, USER_ATTRIBUTES)
+        for key in ('login_name', 'realname'):
+            if not user.get(key):
+                raise Invalid('%s can\'t be blank' % key)
+        if user['roles'] is None:
+            user['roles'] = []
+        self.require_unique(self.users, user['login_name'], 'login_name')
+        self.users[user['id']] = user
+        return (201, self.serialize_user(user))
+
+    def edit_user(self, query, body, id):
+        user = self.find(self.users, id, 'login_name')
+        self.update(user, body, USER_ATTRIBUTES)
+        return (200, self.serialize_user(user))
+
+    # Workflow rules (an HTML page, not an API):
+
+    def workflow_rules(self, query, body):
+        rows = []
+        for name, rule_set_id in sorted(self.rule_sets.items(),
+                                        key=lambda item: item[1]):
+            rows.append('<tr id="state_machine_rule_set_%d">'
+                        '<td><a href="/workflow_rules/%d">%s</a></td></tr>'
+                        % (rule_set_id, rule_set_id, name))
+        page = ('<!DOCTYPE html><html><body><h1>Workflow Rule Sets</h1>'
+                '<table>%s</table></body></html>' % ''.join(rows))
+        return (200, page)
+
+
+class RequestHandler(BaseHTTPServer.BaseHTTPRequestHandler):
+    """ Translate HTTP requests into FakeErrataTool.handle() calls """
+
+    def do_GET(self):
+        self.handle_method('GET')
+
+    def do_POST(self):
+        self.handle_method('POST')
+
+    def do_PUT(self):
+        self.handle_method('PUT')
+
+    def do_DELETE(self):
+        self.handle_method('DELETE')
+
+    def handle_method(self, method):
+        url = urlparse(self.path)
+        query = parse_qs(url.query)
+        body = None
+        length = int(self.headers.get('Content-Length') or 0)
+        if length:
+            body = json.loads(self.rfile.read(length).decode('utf-8'))
+        status, data = self.server.fake.handle(method, url.path, query, body)
+        if data is None:
+            content = b''
+            content_type = 'application/json'
+        elif isinstance(data, dict):
+            content = json.dumps(data).encode('utf-8')
+            content_type = 'application/json'
+        else:
+            content = data.encode('utf-8')
+            content_type = 'text/html'
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(content)))
+        self.end_headers()
+        self.wfile.write(content)
+
+    def log_message(self, format, *args):
+        if self.server.verbose:
+            BaseHTTPServer.BaseHTTPRequestHandler.log_message(self, format,
+                                                              *args)
+
+
+class FakeServer(socketserver.ThreadingMixIn, BaseHTTPServer.HTTPServer):
+    """ Serve one FakeErrataTool over HTTP, with a thread per request """
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self, address, fake, verbose=False):
+        BaseHTTPServer.HTTPServer.__init__(self, address, RequestHandler)
+        self.fake = fake
+        self.verbose = verbose
+
+    @property
+    def url(self):
+        host, port = self.server_address[:2]
+        return 'http://%s:%d' % (host, port)
+
+
+def start_server(host='127.0.0.1', port=0, **kwargs):
+    """
+    Start a fake ET server in a background thread.
+
+    :param str host: address to listen on
+    :param int port: port to listen on. The default (0) chooses a free port.
+    :param kwargs: passed to FakeErrataTool
+    :returns: a FakeServer. Use its "url" for ERRATA_TOOL_URL, its "fake"
+              attribute to inspect or reset the state, and shutdown() to
+              stop it.
+    """
+    server = FakeServer((host, port), FakeErrataTool(**kwargs))
+    thread = threading.Thread(target=server.serve_forever)
+    thread.daemon = True
+    thread.start()
+    return server
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Run a fake Errata Tool.')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=3000)
+    parser.add_argument('--latency', type=float, default=0,
+                        help='seconds to sleep before each response')
+    parser.add_argument('--error-rate', type=float, default=0,
+                        help='fraction of requests that fail with HTTP 500')
+    parser.add_argument('--seed', type=int,
+                        help='random seed for --error-rate')
+    parser.add_argument('--verbose', action='store_true',
+                        help='log every request')
+    parser.add_argument('--scale', type=int, default=0,
+                        help='generate this many products of data '
+                             '(see generate_et_data.py)')
+    args = parser.parse_args()
+    fake = FakeErrataTool(latency=args.latency,
+                          error_rate=args.error_rate,
+                          seed=args.seed)
+    if args.scale:
+        generate_et_data.generate(fake, args.scale)
+    server = FakeServer((args.host, args.port), fake, verbose=args.verbose)
+    print('fake Errata Tool listening at %s' % server.url)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,299 @@
+"""
+Generate large, realistic Errata Tool data sets for performance tests.
+
+Our JSON fixtures in tests/fixtures are single, small objects. This module
+fills a FakeErrataTool (see fake_errata_tool.py) with many products,
+product versions, variants, CDN repos, package tags, releases and workflow
+rule sets. The fake ET serializes this data in the same JSON:API shapes that
+the ET returns, so the modules parse it exactly like production data.
+
+The data is deterministic: the same scale and seed always produce the same
+data, with the same IDs.
+
+For each unit of "scale", we generate one product with:
+
+* 10 product versions
+* 100 variants (10 per product version)
+* 100 RPM CDN repos (one per variant)
+* 50 Docker CDN repos (5 per product version), with 10 packages each, and
+  about 2,000 package tags
+* 5 releases, with 12 to 36 product versions each
+* 20 workflow rule sets
+
+So "--scale 20" generates 2,000 variants and about 40,000 package tags.
+
+Serve the data with the fake ET:
+
+  python tests/fake_errata_tool.py --scale 20
+
+Or write every list endpoint's response to JSON files:
+
+  python tests/generate_et_data.py --scale 20 /tmp/et-data
+"""
+import argparse
+import json
+import os
+import random
+
+
+PRODUCT_NAMES = [
+    'RHCEPH',
+    'RHOSE',
+    'RHSSO',
+    'RHACM',
+    'RHODF',
+    'RHGS',
+    'RHEV',
+    'RHDS',
+]
+
+VARIANT_NAMES = [
+    'Tools',
+    'MON',
+    'OSD',
+    'Client',
+    'Server',
+    'Agent',
+    'Installer',
+    'Dashboard',
+    'Grafana',
+    'Extras',
+]
+
+ARCHES = ['x86_64', 'ppc64le', 's390x', 'aarch64']
+
+TAG_TEMPLATES = [
+    'latest',
+    '{{version}}',
+    '{{version}}-{{release}}',
+    '{{version}}-{{release}}.{{arch}}',
+]
+
+PRODUCT_VERSIONS_PER_PRODUCT = 10
+VARIANTS_PER_PRODUCT_VERSION = 10
+DOCKER_REPOS_PER_PRODUCT_VERSION = 5
+PACKAGES_PER_DOCKER_REPO = 10
+RELEASES_PER_PRODUCT = 5
+RULE_SETS_PER_PRODUCT = 20
+
+# Write these list endpoints in write_data():
+ENDPOINTS = [
+    'api/v1/products',
+    'api/v1/variants',
+    'api/v1/cdn_repos',
+    'api/v1/cdn_repo_package_tags',
+    'api/v1/releases',
+    'api/v1/rhel_releases',
+]
+
+
+def product_name(number):
+    """ Return a unique product short name, eg. "RHCEPH" or "RHCEPH2". """
+    name = PRODUCT_NAMES[number % len(PRODUCT_NAMES)]
+    generation = number // len(PRODUCT_NAMES)
+    if generation:
+        name += str(generation + 1)
+    return name
+
+
+def generate(fake, scale=1, seed=0):
+    """
+    Add a large data set to a FakeErrataTool.
+
+    :param FakeErrataTool fake: add data to this fake ET.
+    :param int scale: number of products to generate. See the top of this
+                      file for the number of resources per product.
+    :param int seed: random seed, for the relationships between resources.
+    """
+    rng = random.Random(seed)
+    with fake.lock:
+        generate_rule_sets(fake, scale)
+        all_pvs = []
+        for number in range(scale):
+            short_name = product_name(number)
+            pvs = generate_product(fake, short_name, rng)
+            all_pvs.extend(pvs)
+        for number in range(scale):
+            short_name = product_name(number)
+            generate_releases(fake, short_name, all_pvs, rng)
+
+
+def generate_rule_sets(fake, scale):
+    first_id = max(fake.rule_sets.values()) + 1
+    for number in range(scale * RULE_SETS_PER_PRODUCT):
+        name = 'Generated Rule Set %d' % (number + 1)
+        fake.rule_sets[name] = first_id + number
+
+
+def generate_product(fake, short_name, rng):
+    """
+    Generate a product with its product versions, variants and CDN repos.
+
+    :returns: a list of product version names.
+    """
+    fake.create_product(body={'product': {
+        'short_name': short_name,
+        'name': 'Red Hat %s' % short_name,
+        'description': 'Red Hat %s' % short_name,
+        'bugzilla_product_name': 'Red Hat %s' % short_name,
+        'default_docs_reviewer': 'docs-errata-list@redhat.com',
+        'default_solution': 'enterprise',
+        'state_machine_rule_set': 'Default',
+        'push_targets': ['cdn', 'cdn_stage', 'cdn_docker',
+                         'cdn_docker_stage'],
+    }})
+    pvs = []
+    for version in range(1, PRODUCT_VERSIONS_PER_PRODUCT + 1):
+        pv_name = '%s-%d.0-RHEL-8' % (short_name, version)
+        brew_tag = '%s-%d.0-rhel-8-candidate' % (short_name.lower(), version)
+        fake.create_product_version(product=short_name, body={
+            'product_version': {
+                'name': pv_name,
+                'description': 'Red Hat %s %d.0' % (short_name, version),
+                'default_brew_tag': brew_tag,
+                'brew_tags': [brew_tag],
+                'rhel_release_name': 'RHEL-8',
+                'push_targets': ['cdn', 'cdn_stage', 'cdn_docker',
+                                 'cdn_docker_stage'],
+                'is_server_only': rng.random() < 0.2,
+                'allow_rhn_debuginfo': False,
+                'is_oval_product': rng.random() < 0.5,
+            }})
+        pvs.append(pv_name)
+        variants = generate_variants(fake, short_name, version, pv_name)
+        generate_rpm_repos(fake, variants, rng)
+        generate_docker_repos(fake, short_name, version, variants, rng)
+    return pvs
+
+
+def generate_variants(fake, short_name, version, pv_name):
+    """
+    :returns: a list of variant names.
+    """
+    variants = []
+    for suffix in VARIANT_NAMES[:VARIANTS_PER_PRODUCT_VERSION]:
+        name = '8Base-%s-%d.0-%s' % (short_name, version, suffix)
+        fake.create_variant(body={'variant': {
+            'name': name,
+            'description': 'Red Hat %s %d.0 %s' % (short_name, version,
+                                                   suffix),
+            'cpe': 'cpe:/a:redhat:%s:%d.0::el8' % (short_name.lower(),
+                                                   version),
+            'product_version': pv_name,
+            'push_targets': ['cdn', 'cdn_stage'],
+        }})
+        variants.append(name)
+    return variants
+
+
+def generate_rpm_repos(fake, variants, rng):
+    for variant in variants:
+        arch = rng.choice(ARCHES)
+        name = '%s-for-rhel-8-%s-rpms' % (variant.lower(), arch)
+        fake.create_cdn_repo(body={'cdn_repo': {
+            'name': name,
+            'release_type': 'Primary',
+            'content_type': 'Binary',
+            'arch_name': arch,
+            'use_for_tps': True,
+            'variant_names': [variant],
+        }})
+
+
+def generate_docker_repos(fake, short_name, version, variants, rng):
+    for number in range(DOCKER_REPOS_PER_PRODUCT_VERSION):
+        name = '%s/%s-%d-container-%d' % (short_name.lower(),
+                                          short_name.lower(), version, number)
+        package_names = [
+            '%s-%d-%d-container' % (short_name.lower(), version, package)
+            for package in range(number * PACKAGES_PER_DOCKER_REPO,
+                                 (number + 1) * PACKAGES_PER_DOCKER_REPO)
+        ]
+        # This creates the ET's default tags for each new package.
+        fake.create_cdn_repo(body={'cdn_repo': {
+            'name': name,
+            'release_type': 'Primary',
+            'content_type': 'Docker',
+            'variant_names': variants,
+            'package_names': package_names,
+        }})
+        cdn_repo = fake.find(fake.cdn_repos, name)
+        # fake.create_package_tag() checks every tag for duplicates, which
+        # is too slow for tens of thousands of tags. Insert the records
+        # directly instead.
+        for package in package_names:
+            for template in rng.sample(TAG_TEMPLATES, rng.randint(0, 2)):
+                tag = {
+                    'id': fake.new_id(),
+                    'cdn_repo_id': cdn_repo['id'],
+                    'package': package,
+                    'tag_template': template,
+                    'variant': rng.choice([None, rng.choice(variants)]),
+                    'for_hotfix': False,
+                    'for_prerelease': False,
+                }
+                fake.package_tags[tag['id']] = tag
+
+
+def generate_releases(fake, short_name, all_pvs, rng):
+    product = fake.find(fake.products, short_name, 'short_name')
+    manager = fake.find(fake.users, 'coolmanager@redhat.com', 'login_name')
+    for number in range(1, RELEASES_PER_PRODUCT + 1):
+        count = min(rng.randint(12, 36), len(all_pvs))
+        pv_ids = [fake.find(fake.product_versions, name)['id']
+                  for name in sorted(rng.sample(all_pvs, count))]
+        fake.create_release(body={
+            'type': rng.choice(['QuarterlyUpdate', 'Zstream', 'Async']),
+            'release': {
+                'name': '%s-%d.0.GA' % (short_name, number),
+                'description': 'Red Hat %s %d.0 GA' % (short_name, number),
+                'product_id': product['id'],
+                'product_version_ids': pv_ids,
+                'program_manager_id': manager['id'],
+                'state_machine_rule_set_id': rng.choice(
+                    list(fake.rule_sets.values())),
+                'blocker_flags': ['%s-%d.0' % (short_name.lower(), number)],
+                'ship_date': '2020-%02d-01' % number,
+            },
+        })
+
+
+def write_data(fake, directory):
+    """
+    Write every list endpoint's data to JSON files in a directory, eg.
+    "api_v1_variants.json", and the workflow rules to "workflow_rules.html".
+
+    Each JSON file has one page with every element, in the ET's JSON:API
+    format.
+    """
+    if not os.path.isdir(directory):
+        os.makedirs(directory)
+    for endpoint in ENDPOINTS:
+        query = {'page[size]': [str(2 ** 31)]}
+        status, data = fake.handle('GET', endpoint, query)
+        assert status == 200, (endpoint, status, data)
+        filename = endpoint.replace('/', '_') + '.json'
+        with open(os.path.join(directory, filename), 'w') as f:
+            json.dump(data, f, indent=2, sort_keys=True)
+    _, page = fake.handle('GET', 'workflow_rules')
+    with open(os.path.join(directory, 'workflow_rules.html'), 'w') as f:
+        f.write(page)
+
+
+def main():
+    # fake_errata_tool imports this module, so import it here.
+    from fake_errata_tool import FakeErrataTool
+    parser = argparse.ArgumentParser(
+        description='Write a large Errata Tool data set to JSON files.')
+    parser.add_argument('--scale', type=int, default=1,
+                        help='number of products to generate')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('directory')
+    args = parser.parse_args()
+    fake = FakeErrataTool()
+    generate(fake, args.scale, args.seed)
+    write_data(fake, args.directory)
+
+
+if __name__ == '__main__':
+    main()
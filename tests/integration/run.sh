@@ -12,6 +12,16 @@ export ANSIBLE_MODULE_UTILS=$(pwd)/module_utils
 # We're always going to use non-kerberos auth for testing
 export ERRATA_TOOL_AUTH=notkerberos
 
+# Set ERRATA_TOOL_FAKE=1 to run against our in-memory fake ET server instead
+# of a real ET dev server:
+if [ "${ERRATA_TOOL_FAKE:-}" = "1" ]; then
+  python tests/fake_errata_tool.py --port 3000 &
+  fake_pid=$!
+  trap 'kill $fake_pid' EXIT
+  export ERRATA_TOOL_URL=http://localhost:3000
+  sleep 1
+fi
+
 playbooks=($(ls tests/integration/*/main.yml))
 
 for playbook in "${playbooks[@]}"; do
@@ -0,0 +1,484 @@
+"""
+Benchmarks for every ensure_* function, against our fake ET server.
+
+These are slow, so pytest skips them unless you set ERRATA_TOOL_BENCHMARK:
+
+  ERRATA_TOOL_BENCHMARK=1 py.test -v tests/test_benchmark.py
+
+(or "tox -e benchmark").
+
+We run each ensure_* function twice at several scales: once to create the
+resource, and once more to verify that nothing changed. The scale sets the
+size of the fake ET's data, the size of the cdn_repo and release inputs, and
+the number of products, product versions, RHEL releases, users and variants
+that we ensure (one per ten). The fake ET runs in a separate process, so our
+memory numbers do not include the server. For each run we
+track the number of HTTP requests, the wall time, and the peak Python memory
+(Python 3 only). We compare these numbers to benchmark_baseline.json:
+
+* A run fails if it sends more HTTP requests than the baseline. The request
+  count does not depend on the speed of your computer, so this is our most
+  precise check.
+* A run also fails if it takes more than ERRATA_TOOL_BENCHMARK_TOLERANCE
+  (default: 3) times the baseline's time or memory.
+
+Set ERRATA_TOOL_BENCHMARK_SAVE=1 to write new baseline numbers after you
+make a change that intentionally alters these numbers.
+"""
+import json
+import multiprocessing
+import os
+import time
+import pytest
+from ansible.module_utils.common_errata_tool import Client
+from ansible.module_utils.common_errata_tool_cdn_repo import ensure_cdn_repo
+from ansible.module_utils.common_errata_tool_cdn_repo import \
+    ensure_package_tags
+from ansible.module_utils.common_errata_tool_cdn_repo import \
+    package_tag_records
+from ansible.module_utils.common_errata_tool_product import ensure_product
+from ansible.module_utils.common_errata_tool_product_version import \
+    ensure_product_version
+from ansible.module_utils.common_errata_tool_release import ensure_release
+from ansible.module_utils.common_errata_tool_rhel_release import \
+    ensure_rhel_release
+from ansible.module_utils.common_errata_tool_user import ensure_user
+from ansible.module_utils.common_errata_tool_variant import ensure_variant
+from fake_errata_tool import FakeErrataTool
+from fake_errata_tool import FakeServer
+try:
+    import tracemalloc
+except ImportError:
+    # Python 2
+    tracemalloc = None
+
+TESTS_DIR = os.path.dirname(os.path.abspath(__file__))
+BASELINE = os.path.join(TESTS_DIR, 'benchmark_baseline.json')
+
+# Multiples of the size of our single-object JSON fixtures.
+SCALES = [10, 100, 1000]
+
+# Number of synthetic tags for test_package_tags().
+PACKAGE_TAGS = 50000
+
+# Do not fail a timing check for runs that are faster than this many
+# seconds. Small numbers are too noisy to compare.
+MIN_SECONDS = 0.5
+
+pytestmark = pytest.mark.skipif(not os.getenv('ERRATA_TOOL_BENCHMARK'),
+                                reason='set ERRATA_TOOL_BENCHMARK=1')
+
+
+def populate(fake, scale):
+    """
+    Add "scale" users, RHEL releases, products, product versions and
+    variants to the fake ET, so the ET has a realistic amount of data to
+    search.
+    """
+    with fake.lock:
+        for number in range(scale):
+            fake.create_user(body={
+                'login_name': 'benchuser%d@redhat.com' % number,
+                'realname': 'Bench User %d' % number,
+            })
+            fake.create_rhel_release(body={
+                'name': 'RHEL-BENCH-%d' % number,
+                'description': 'Bench RHEL release %d' % number,
+            })
+            fake.create_product(body={'product': {
+                'short_name': 'BENCH%d' % number,
+                'name': 'Bench Product %d' % number,
+                'description': 'Bench Product %d' % number,
+                'default_solution': 'enterprise',
+                'state_machine_rule_set': 'Default',
+                'push_targets': ['cdn'],
+            }})
+            fake.create_product_version(product='RHEL', body={
+                'product_version': {
+                    'name': 'RHEL-BENCH-%d' % number,
+                    'description': 'Bench product version %d' % number,
+                    'default_brew_tag': 'bench-%d-candidate' % number,
+                    'brew_tags': ['bench-%d-candidate' % number],
+                    'rhel_release_name': 'RHEL-8',
+                    'push_targets': ['cdn'],
+                }})
+            fake.create_variant(body={'variant': {
+                'name': 'Bench-%d' % number,
+                'description': 'Bench variant %d' % number,
+                'product_version': 'RHEL-BENCH-%d' % number,
+                'push_targets': ['cdn'],
+            }})
+
+
+def cdn_repo_benchmark(client, scale):
+    params = {
+        'name': 'bench/container-bench',
+        'release_type': 'Primary',
+        'content_type': 'Docker',
+        'use_for_tps': False,
+        'variants': ['Bench-%d' % number for number in range(scale)],
+        'packages': {
+            'bench-%d-container' % number: ['latest', '{{version}}']
+            for number in range(scale)
+        },
+    }
+    return ensure_cdn_repo(client, False, params)
+
+
+def resources(scale):
+    """
+    :returns: the number of resources that each single-resource benchmark
+              ensures at this scale.
+    """
+    return max(scale // 10, 1)
+
+
+def ensure_each(ensure, params_list):
+    """
+    Ensure each resource in turn, like a playbook with one task per
+    resource.
+
+    :returns: a result dict that is "changed" if any resource changed.
+    """
+    changed = False
+    for params in params_list:
+        result = ensure(params)
+        changed = changed or result['changed']
+    return {'changed': changed}
+
+
+def product_benchmark(client, scale):
+    params_list = [{
+        'short_name': 'NEWBENCH%d' % number,
+        'name': 'New Bench Product %d' % number,
+        'description': 'New Bench Product %d' % number,
+        'bugzilla_product_name': '',
+        'valid_bug_states': ['MODIFIED', 'VERIFIED'],
+        'active': True,
+        'ftp_path': '',
+        'ftp_subdir': None,
+        'internal': False,
+        'default_docs_reviewer': 'docs-errata-list@redhat.com',
+        'push_targets': ['cdn', 'cdn_stage'],
+        'default_solution': 'enterprise',
+        'state_machine_rule_set': 'Default',
+        'move_bugs_on_qe': False,
+        'exd_org_group': None,
+        'show_bug_package_mismatch_warning': None,
+        'suppress_push_request_jira': None,
+    } for number in range(resources(scale))]
+    return ensure_each(lambda params: ensure_product(client, params, False),
+                       params_list)
+
+
+def product_version_benchmark(client, scale):
+    params_list = [{
+        'product': 'RHEL',
+        'name': 'RHEL-NEWBENCH-%d' % number,
+        'description': 'New bench product version %d' % number,
+        'rhel_release_name': 'RHEL-8',
+        'sig_key_name': 'redhatrelease2',
+        'container_sig_key_name': 'redhatrelease2',
+        'ima_sig_key_name': None,
+        'default_brew_tag': 'newbench-%d-candidate' % number,
+        'is_server_only': False,
+        'enabled': True,
+        'allow_rhn_debuginfo': False,
+        'allow_buildroot_push': False,
+        'is_oval_product': False,
+        'is_rhel_addon': False,
+        'push_targets': ['cdn'],
+        'brew_tags': ['newbench-%d-candidate' % number],
+        'suppress_push_request_jira': None,
+        'allow_unreleased_rpms': None,
+    } for number in range(resources(scale))]
+    return ensure_each(
+        lambda params: ensure_product_version(client, params, False),
+        params_list)
+
+
+def release_benchmark(client, scale):
+    params = {
+        'product': 'RHEL',
+        'name': 'RHEL-BENCH.GA',
+        'description': 'Bench release',
+        'type': 'QuarterlyUpdate',
+        'product_versions': ['RHEL-BENCH-%d' % number
+                             for number in range(scale)],
+        'enabled': True,
+        'active': True,
+        'enable_batching': True,
+        'program_manager': 'coolmanager@redhat.com',
+        'blocker_flags': ['rhel-8'],
+        'internal_target_release': None,
+        'zstream_target_release': None,
+        'ship_date': '2019-05-07',
+        'allow_shadow': False,
+        'allow_blocker': False,
+        'allow_exception': False,
+        'allow_pkg_dupes': False,
+        'supports_component_acl': False,
+        'limit_bugs_by_product': False,
+        'state_machine_rule_set': 'Default',
+        'pelc_product_version_name': None,
+        'brew_tags': [],
+    }
+    return ensure_release(client, params, False)
+
+
+def rhel_release_benchmark(client, scale):
+    params_list = [{
+        'name': 'RHEL-NEWBENCH-%d' % number,
+        'description': 'New bench RHEL release %d' % number,
+        'exclude_ftp_debuginfo': None,
+    } for number in range(resources(scale))]
+    return ensure_each(
+        lambda params: ensure_rhel_release(client, params, False),
+        params_list)
+
+
+def user_benchmark(client, scale):
+    params_list = [{
+        'login_name': 'newbench%d@redhat.com' % number,
+        'realname': 'New Bench User %d' % number,
+        'organization': None,
+        'receives_mail': True,
+        'roles': ['pm'],
+        'enabled': True,
+        'email_address': None,
+    } for number in range(resources(scale))]
+    return ensure_each(lambda params: ensure_user(client, params, False),
+                       params_list)
+
+
+def variant_benchmark(client, scale):
+    params_list = [{
+        'name': 'NewBench-%d' % number,
+        'description': 'New bench variant %d' % number,
+        'cpe': None,
+        'enabled': True,
+        'buildroot': False,
+        'product_version': 'RHEL-8.0.0',
+        'push_targets': ['cdn'],
+        'override_ftp_base_folder': None,
+    } for number in range(resources(scale))]
+    return ensure_each(lambda params: ensure_variant(client, params, False),
+                       params_list)
+
+
+BENCHMARKS = {
+    'ensure_cdn_repo': cdn_repo_benchmark,
+    'ensure_product': product_benchmark,
+    'ensure_product_version': product_version_benchmark,
+    'ensure_release': release_benchmark,
+    'ensure_rhel_release': rhel_release_benchmark,
+    'ensure_user': user_benchmark,
+    'ensure_variant': variant_benchmark,
+}
+
+
+def measure(client, func, *args):
+    """
+    Call func(*args) and measure it.
+
+    :param client: the Client that counts our requests, or None if func
+                   does not send any requests.
+    :returns: a two-element tuple: the func's return value, and a dict of
+              statistics.
+    """
+    requests = len(client.stats.requests) if client else 0
+    if tracemalloc:
+        tracemalloc.start()
+    start = time.time()
+    result = func(*args)
+    seconds = time.time() - start
+    peak_kb = None
+    if tracemalloc:
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        peak_kb = peak // 1024
+    stats = {
+        'requests': (len(client.stats.requests) if client else 0) - requests,
+        'seconds': round(seconds, 3),
+        'peak_kb': peak_kb,
+    }
+    return (result, stats)
+
+
+def check_baseline(baseline, key, stats):
+    expected = baseline.get(key)
+    if not expected:
+        return
+    tolerance = float(os.getenv('ERRATA_TOOL_BENCHMARK_TOLERANCE', 3))
+    assert stats['requests'] <= expected['requests'], key
+    seconds = max(expected['seconds'] * tolerance, MIN_SECONDS)
+    assert stats['seconds'] <= seconds, key
+    if stats['peak_kb'] is not None and expected['peak_kb'] is not None:
+        assert stats['peak_kb'] <= expected['peak_kb'] * tolerance, key
+
+
+@pytest.fixture(scope='module')
+def baseline():
+    """
+    Yield the baseline numbers, and record our new numbers into them.
+    """
+    try:
+        with open(BASELINE) as f:
+            data = json.load(f)
+    except IOError:
+        data = {}
+    results = {}
+    yield (data, results)
+    if os.getenv('ERRATA_TOOL_BENCHMARK_SAVE'):
+        data.update(results)
+        with open(BASELINE, 'w') as f:
+            json.dump(data, f, indent=2, sort_keys=True)
+            f.write('\n')
+
+
+def serve(scale, conn):
+    """
+    Populate a fake ET and serve it until our parent process terminates us.
+
+    :param int scale: see populate()
+    :param conn: multiprocessing Connection. We send the server's URL here.
+    """
+    server = FakeServer(('127.0.0.1', 0), FakeErrataTool())
+    populate(server.fake, scale)
+    conn.send(server.url)
+    server.serve_forever()
+
+
+@pytest.fixture
+def bench_client(scale, monkeypatch):
+    """
+    Run a fake ET server in a separate process, and yield a Client for it.
+
+    The conftest fake_server fixture runs in a thread of this process, so
+    tracemalloc would count the server's allocations in our peak memory.
+    """
+    try:
+        context = multiprocessing.get_context('fork')
+    except AttributeError:
+        # Python 2 always forks.
+        context = multiprocessing
+    parent_conn, child_conn = context.Pipe()
+    process = context.Process(target=serve, args=(scale, child_conn))
+    process.daemon = True
+    process.start()
+    try:
+        url = parent_conn.recv()
+        monkeypatch.setenv('ERRATA_TOOL_URL', url)
+        monkeypatch.setenv('ERRATA_TOOL_AUTH', 'notkerberos')
+        client = Client()
+        # Send one request before we measure, so the first benchmark in a
+        # session does not pay for one-time setup in requests (imports,
+        # connection pools) that later benchmarks skip.
+        client.get('api/v1/products/RHEL').raise_for_status()
+        yield client
+    finally:
+        process.terminate()
+        process.join()
+
+
+@pytest.mark.parametrize('scale', SCALES)
+@pytest.mark.parametrize('name', sorted(BENCHMARKS))
+def test_benchmark(name, scale, bench_client, baseline):
+    data, results = baseline
+    benchmark = BENCHMARKS[name]
+    for phase, changed in (('create', True), ('unchanged', False)):
+        key = '%s[%d] %s' % (name, scale, phase)
+        result, stats = measure(bench_client, benchmark, bench_client, scale)
+        assert result['changed'] is changed
+        results[key] = stats
+        check_baseline(data, key, stats)
+
+
+def package_tag_elements(count):
+    """
+    Build "count" api/v1/cdn_repo_package_tags elements for one CDN repo:
+    ten tags for each package, and every other tag restricted to a variant.
+    """
+    elements = []
+    for number in range(count):
+        relationships = {
+            'cdn_repo': {'id': 1, 'name': 'bench/container-bench'},
+            'package': {'id': number // 10,
+                        'name': 'bench-%d-container' % (number // 10)},
+        }
+        if number % 2:
+            relationships['variant'] = {'id': number % 4,
+                                        'name': 'Bench-%d' % (number % 4)}
+        elements.append({
+            'id': number,
+            'type': 'cdn_repo_package_tags',
+            'attributes': {
+                'tag_template': 'tag-%d' % (number % 10),
+                'for_hotfix': number % 3 == 0,
+                'for_prerelease': False,
+            },
+            'relationships': relationships,
+        })
+    return elements
+
+
+def package_tag_dicts(elements):
+    """
+    Simplify cdn_repo_package_tags API elements with a dict for each tag.
+
+    This is how errata_tool_cdn_repo stored tags before we added PackageTag.
+    We only keep it here to show that package_tag_records() saves memory.
+    """
+    packages = {}
+    for element in elements:
+        attributes = element['attributes']
+        relationships = element['relationships']
+        package = packages.setdefault(relationships['package']['name'], {})
+        tag = {
+            'id': element['id'],
+            'for_hotfix': attributes['for_hotfix'],
+            'for_prerelease': attributes['for_prerelease'],
+        }
+        if 'variant' in relationships:
+            tag['variant'] = relationships['variant']['name']
+        package[attributes['tag_template']] = tag
+    return packages
+
+
+def ensure_all_package_tags(current, desired):
+    """
+    Compare every package's tags in check mode (so we send no requests).
+    """
+    changes = []
+    for package_name, desired_tags in desired.items():
+        changes += ensure_package_tags(None, 'bench/container-bench',
+                                       package_name, True,
+                                       current[package_name], desired_tags)
+    return changes
+
+
+@pytest.mark.skipif(not tracemalloc, reason='requires Python 3')
+def test_package_tags(baseline):
+    """
+    Compare the memory for PACKAGE_TAGS tags as dicts and as PackageTags, and
+    time the diff of every tag.
+    """
+    data, results = baseline
+    elements = package_tag_elements(PACKAGE_TAGS)
+    peaks = {}
+    for func in (package_tag_dicts, package_tag_records):
+        key = '%s[%d]' % (func.__name__, PACKAGE_TAGS)
+        current, stats = measure(None, func, elements)
+        peaks[func] = stats['peak_kb']
+        results[key] = stats
+        check_baseline(data, key, stats)
+    assert peaks[package_tag_records] < peaks[package_tag_dicts]
+
+    desired = {package_name: {tag_template: tag._replace(id=None)
+                              for tag_template, tag in tags.items()}
+               for package_name, tags in current.items()}
+    key = 'ensure_package_tags[%d] unchanged' % PACKAGE_TAGS
+    changes, stats = measure(None, ensure_all_package_tags, current, desired)
+    assert changes == []
+    results[key] = stats
+    check_baseline(data, key, stats)
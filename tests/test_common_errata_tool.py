@@ -1,4 +1,10 @@
+import errno
+import json
+import os
+import pstats
+import re
 import pytest
+import requests
 from ansible.module_utils.common_errata_tool import RELEASE_TYPES
 from ansible.module_utils.common_errata_tool import WorkflowRulesScraper
 from ansible.module_utils.common_errata_tool import DefaultSolutions
@@ -7,7 +13,44 @@ from ansible.module_utils.common_errata_tool import describe_changes
 from ansible.module_utils.common_errata_tool import get_user
 from ansible.module_utils.common_errata_tool import user_id
 from ansible.module_utils.common_errata_tool import UserNotFoundError
+from ansible.module_utils.common_errata_tool import PAGE_SIZE
+from ansible.module_utils.common_errata_tool import Client
+from ansible.module_utils.common_errata_tool import get_all_pages
+from ansible.module_utils.common_errata_tool import get_named
+from ansible.module_utils.common_errata_tool import SEARCH_EACH_NAME_LIMIT
+from ansible.module_utils.common_errata_tool import get_concurrency
+from ansible.module_utils.common_errata_tool import parallel_map
+from ansible.module_utils.common_errata_tool import check_unique_names
+from ansible.module_utils.common_errata_tool import ensure_many
+from ansible.module_utils.common_errata_tool import Snapshot
+from ansible.module_utils.common_errata_tool import SnapshotError
+from ansible.module_utils.common_errata_tool import read_json_file
+from ansible.module_utils.common_errata_tool import makedirs
+from ansible.module_utils.common_errata_tool import start_plan
+from ansible.module_utils.common_errata_tool import Plan
+from ansible.module_utils.common_errata_tool import endpoint_resource
+from ansible.module_utils.common_errata_tool import planned_id
+from ansible.module_utils.common_errata_tool import parse_planned_id
+from ansible.module_utils.common_errata_tool import planned_name
+from ansible.module_utils.common_errata_tool import get_fingerprint_cache
+from ansible.module_utils.common_errata_tool import Profiler
+from ansible.module_utils.common_errata_tool import get_tracer
+from ansible.module_utils.common_errata_tool import RequestStats
+from ansible.module_utils.common_errata_tool import endpoint_template
+from ansible.module_utils.common_errata_tool import PrometheusTextfile
+from ansible.module_utils.common_errata_tool import report_stats
+from ansible.module_utils.common_errata_tool import SlowRequestLog
+from ansible.module_utils.common_errata_tool import start_slow_log
+from ansible.module_utils.common_errata_tool import start_module
+from ansible.module_utils.common_errata_tool import span
+from ansible.module_utils.common_errata_tool import traced
+import ansible.module_utils.common_errata_tool as common_errata_tool
+from utils import exit_json
+from utils import fail_json
 from utils import load_html
+from utils import Mock
+from utils import AnsibleExitJson
+from utils import AnsibleFailJson
 
 
 @pytest.mark.parametrize("name,expected", [
@@ -129,6 +172,201 @@ class TestUserID(object):
         assert str(e.value) == 'noexist@redhat.com'
 
 
+class TestParallelMap(object):
+
+    @pytest.mark.parametrize('concurrency', [1, 4])
+    def test_order(self, concurrency):
+        result = parallel_map(lambda x: x * 2, [1, 2, 3], concurrency)
+        assert result == [2, 4, 6]
+
+    def test_empty(self):
+        assert parallel_map(lambda x: x, [], 4) == []
+
+    def test_exception(self):
+        def boom(x):
+            raise ValueError(x)
+        with pytest.raises(ValueError):
+            parallel_map(boom, [1, 2, 3], 4)
+
+
+def test_check_unique_names():
+    check_unique_names('variant', ['foo', 'bar'])
+    with pytest.raises(ValueError) as e:
+        check_unique_names('variant', ['foo', 'bar', 'foo'])
+    assert str(e.value) == 'duplicate variant foo'
+
+
+class TestEnsureMany(object):
+
+    def ensure(self, params):
+        if params['name'] == 'boom':
+            raise ValueError('no such product')
+        if params['name'] == 'bad':
+            return {'changed': False, 'stdout_lines': [], 'failed': True,
+                    'msg': 'bad product version'}
+        if not params.get('changes'):
+            return {'changed': False, 'stdout_lines': []}
+        result = {'changed': True, 'stdout_lines': params['changes']}
+        if params.get('diff'):
+            result['diff'] = params['diff']
+        return result
+
+    def ensure_many(self, client, items):
+        names = [item['name'] for item in items]
+        return ensure_many(client, 'product versions', names, self.ensure,
+                           items)
+
+    def test_combined(self, client):
+        items = [
+            {'name': 'foo', 'changes': ['created foo']},
+            {'name': 'bar'},
+            {'name': 'baz', 'changes': ['changing a', 'changing b'],
+             'diff': {'before': 'a', 'after': 'b'}},
+        ]
+        result = self.ensure_many(client, items)
+        assert result == {
+            'changed': True,
+            'stdout_lines': [
+                'foo: created foo',
+                'baz: changing a',
+                'baz: changing b',
+            ],
+            'summary': {'changed': 2, 'unchanged': 1, 'failed': 0},
+            'diff': [{'before': 'a', 'after': 'b'}],
+        }
+
+    def test_unchanged(self, client):
+        result = self.ensure_many(client, [{'name': 'foo'}])
+        assert result['changed'] is False
+        assert 'diff' not in result
+        assert 'failed' not in result
+
+    def test_failures(self, client):
+        items = [
+            {'name': 'boom'},
+            {'name': 'foo', 'changes': ['created foo']},
+            {'name': 'bad'},
+        ]
+        result = self.ensure_many(client, items)
+        assert result['failed'] is True
+        # We still ensure the items that did not fail.
+        assert result['changed'] is True
+        assert result['summary'] == {'changed': 1, 'unchanged': 0,
+                                     'failed': 2}
+        assert result['msg'] == (
+            'could not ensure 2 product versions:\n'
+            'boom: ValueError: no such product\n'
+            'bad: bad product version')
+
+
+class TestGetAllPages(object):
+
+    def register_pages(self, client, total):
+        """ Serve "total" elements, PAGE_SIZE elements per page. """
+        def callback(request, context):
+            page_number = int(request.qs['page[number]'][0])
+            start = (page_number - 1) * PAGE_SIZE
+            stop = min(start + PAGE_SIZE, total)
+            return {'data': [{'id': i} for i in range(start, stop)]}
+        client.adapter.register_uri(
+            'GET',
+            'https://errata.devel.redhat.com/api/v1/foobar',
+            json=callback)
+
+    def test_one_page(self, client):
+        self.register_pages(client, 3)
+        result = get_all_pages(client, 'api/v1/foobar')
+        assert result == [{'id': 0}, {'id': 1}, {'id': 2}]
+        assert len(client.adapter.request_history) == 1
+
+    @pytest.mark.parametrize('total', [PAGE_SIZE, PAGE_SIZE * 7 + 5])
+    def test_many_pages(self, client, total):
+        self.register_pages(client, total)
+        result = get_all_pages(client, 'api/v1/foobar')
+        assert result == [{'id': i} for i in range(total)]
+
+    def test_filters(self, client):
+        self.register_pages(client, 1)
+        get_all_pages(client, 'api/v1/foobar', {'filter[name]': 'foo'})
+        history = client.adapter.request_history
+        assert history[0].qs['filter[name]'] == ['foo']
+        assert history[0].qs['page[size]'] == [str(PAGE_SIZE)]
+
+
+class TestGetNamed(object):
+
+    def register_list(self, client, total):
+        """ Serve "total" elements named "foo-0", "foo-1", etc. """
+        def callback(request, context):
+            elements = [{'attributes': {'name': 'foo-%d' % i}}
+                        for i in range(total)]
+            if 'filter[name]' in request.qs:
+                name = request.qs['filter[name]'][0]
+                elements = [e for e in elements
+                            if e['attributes']['name'] == name]
+            page_number = int(request.qs['page[number]'][0])
+            start = (page_number - 1) * PAGE_SIZE
+            return {'data': elements[start:start + PAGE_SIZE]}
+        client.adapter.register_uri(
+            'GET',
+            'https://errata.devel.redhat.com/api/v1/foobar',
+            json=callback)
+
+    def test_few_names(self, client):
+        self.register_list(client, PAGE_SIZE * 3)
+        result = get_named(client, 'api/v1/foobar', ['foo-7', 'foo-250',
+                                                     'noexist'])
+        names = sorted(e['attributes']['name'] for e in result)
+        assert names == ['foo-250', 'foo-7']
+        # One search for each name, instead of reading all three pages.
+        history = client.adapter.request_history
+        assert len(history) == 3
+        assert all('filter[name]' in request.qs for request in history)
+
+    def test_many_names(self, client):
+        self.register_list(client, PAGE_SIZE * 3)
+        names = ['foo-%d' % i for i in range(SEARCH_EACH_NAME_LIMIT)]
+        names.append('noexist')
+        result = get_named(client, 'api/v1/foobar', names)
+        assert len(result) == SEARCH_EACH_NAME_LIMIT
+        # One sweep of the whole list, instead of one search for each name.
+        history = client.adapter.request_history
+        assert not any('filter[name]' in request.qs for request in history)
+        assert len(history) < len(names)
+
+
+class TestGetConcurrency(object):
+
+    def test_default(self, monkeypatch):
+        monkeypatch.delenv('ERRATA_TOOL_CONCURRENCY', raising=False)
+        assert get_concurrency() == 4
+
+    @pytest.mark.parametrize('value,expected', [
+        ('8', 8),
+        ('1', 1),
+        ('0', 1),
+        ('-3', 1),
+    ])
+    def test_value(self, monkeypatch, value, expected):
+        monkeypatch.setenv('ERRATA_TOOL_CONCURRENCY', value)
+        assert get_concurrency() == expected
+
+    @pytest.mark.parametrize('value', ['four', '2.5', ''])
+    def test_invalid(self, monkeypatch, value):
+        monkeypatch.setenv('ERRATA_TOOL_CONCURRENCY', value)
+        with pytest.raises(ValueError) as e:
+            get_concurrency()
+        assert 'ERRATA_TOOL_CONCURRENCY must be an integer' in str(e.value)
+
+    def test_zero_get_all_pages(self, monkeypatch, client):
+        """ ERRATA_TOOL_CONCURRENCY=0 must not loop forever. """
+        monkeypatch.setenv('ERRATA_TOOL_CONCURRENCY', '0')
+        client.concurrency = get_concurrency()
+        TestGetAllPages().register_pages(client, PAGE_SIZE * 2 + 1)
+        result = get_all_pages(client, 'api/v1/foobar')
+        assert len(result) == PAGE_SIZE * 2 + 1
+
+
 class TestClient(object):
 
     @pytest.mark.parametrize('verb', ['get', 'post', 'put'])
@@ -157,3 +395,624 @@ class TestClient(object):
             status_code=204)
         response = client.delete('api/v1/foobar')
         assert response.request.method == 'DELETE'
+
+
+class TestSnapshot(object):
+
+    def test_record_and_replay(self, client, tmpdir):
+        client.adapter.register_uri(
+            'GET',
+            'https://errata.devel.redhat.com/api/v1/foobar',
+            json={'data': [{'id': 1}]})
+        path = str(tmpdir.join('snapshot'))
+        client.recorder = Snapshot(path)
+        client.get('api/v1/foobar', params={'filter[name]': 'foo'})
+        client.recorder = None
+        client.snapshot = Snapshot(path)
+        response = client.get('api/v1/foobar', params={'filter[name]': 'foo'})
+        assert response.status_code == 200
+        assert response.json() == {'data': [{'id': 1}]}
+        assert len(client.adapter.request_history) == 1
+
+    def test_not_found_status(self, client, tmpdir):
+        client.adapter.register_uri(
+            'GET',
+            'https://errata.devel.redhat.com/api/v1/foobar',
+            status_code=404,
+            json={'error': 'not found'})
+        path = str(tmpdir.join('snapshot'))
+        client.recorder = Snapshot(path)
+        client.get('api/v1/foobar')
+        client.recorder = None
+        client.snapshot = Snapshot(path)
+        response = client.get('api/v1/foobar')
+        assert response.status_code == 404
+
+    def test_missing(self, client, tmpdir):
+        client.snapshot = Snapshot(str(tmpdir))
+        with pytest.raises(SnapshotError):
+            client.get('api/v1/foobar', params={'filter[name]': 'foo'})
+        assert len(client.adapter.request_history) == 0
+
+    def test_key_quotes_params(self):
+        snapshot = Snapshot('/tmp/snapshot')
+        key = snapshot.key('https://et/api/v1/foobar',
+                           {'filter[name]': 'a&b=c', 'page[number]': 2})
+        assert key == ('https://et/api/v1/foobar?'
+                       'filter%5Bname%5D=a%26b%3Dc&page%5Bnumber%5D=2')
+        other = snapshot.key('https://et/api/v1/foobar',
+                             {'filter[name]': 'a', 'b': 'c',
+                              'page[number]': 2})
+        assert key != other
+
+    def test_larger_concurrency(self, client, tmpdir):
+        TestGetAllPages().register_pages(client, PAGE_SIZE * 2 + 1)
+        path = str(tmpdir.join('snapshot'))
+        client.recorder = Snapshot(path)
+        client.concurrency = 1
+        expected = get_all_pages(client, 'api/v1/foobar')
+        client.recorder = None
+        client.snapshot = Snapshot(path)
+        client.concurrency = 8
+        result = get_all_pages(client, 'api/v1/foobar')
+        assert result == expected
+        assert len(client.adapter.request_history) == 3
+
+    def test_missing_page(self, client, tmpdir):
+        # We recorded a full first page, so the second page is not past the
+        # end of the list.
+        TestGetAllPages().register_pages(client, PAGE_SIZE * 2)
+        path = str(tmpdir.join('snapshot'))
+        client.recorder = Snapshot(path)
+        client.get('api/v1/foobar', params={'page[size]': PAGE_SIZE,
+                                            'page[number]': 1})
+        client.recorder = None
+        client.snapshot = Snapshot(path)
+        with pytest.raises(SnapshotError):
+            client.get('api/v1/foobar', params={'page[size]': PAGE_SIZE,
+                                                'page[number]': 2})
+
+    @pytest.mark.parametrize('verb', ['post', 'put', 'delete'])
+    def test_no_writes(self, client, tmpdir, verb):
+        client.snapshot = Snapshot(str(tmpdir))
+        method = getattr(client, verb)
+        with pytest.raises(SnapshotError):
+            method('api/v1/foobar')
+        assert len(client.adapter.request_history) == 0
+
+
+class TestMakedirs(object):
+
+    def test_create(self, tmpdir):
+        path = str(tmpdir.join('a', 'b'))
+        makedirs(path)
+        assert os.path.isdir(path)
+
+    def test_exists(self, tmpdir):
+        makedirs(str(tmpdir))
+        assert os.path.isdir(str(tmpdir))
+
+    def test_created_by_another_fork(self, tmpdir, monkeypatch):
+        # Another process created the directory first.
+        def fake_makedirs(path):
+            raise OSError(errno.EEXIST, 'File exists')
+        monkeypatch.setattr(os, 'makedirs', fake_makedirs)
+        makedirs(str(tmpdir.join('a')))
+
+    def test_other_error(self, tmpdir, monkeypatch):
+        def fake_makedirs(path):
+            raise OSError(errno.EACCES, 'Permission denied')
+        monkeypatch.setattr(os, 'makedirs', fake_makedirs)
+        with pytest.raises(OSError):
+            makedirs(str(tmpdir.join('a')))
+
+
+class TestPlan(object):
+
+    def test_no_plan(self, client, monkeypatch):
+        monkeypatch.delenv('ERRATA_TOOL_PLAN', raising=False)
+        assert start_plan(client, True) is True
+        assert client.plan is None
+
+    def test_not_check_mode(self, client, monkeypatch, tmpdir):
+        monkeypatch.setenv('ERRATA_TOOL_PLAN', str(tmpdir))
+        assert start_plan(client, False) is False
+        assert client.plan is None
+
+    def test_record_writes(self, client, monkeypatch, tmpdir):
+        monkeypatch.setenv('ERRATA_TOOL_PLAN', str(tmpdir))
+        assert start_plan(client, True) is False
+        response = client.post('api/v1/foobar', json={'mykey': 'myval'})
+        assert response.status_code == 201
+        response = client.delete('api/v1/foobar/123')
+        assert response.status_code == 204
+        assert len(client.adapter.request_history) == 0
+        files = tmpdir.listdir()
+        assert len(files) == 1
+        operations = read_json_file(str(files[0]))
+        assert operations == [
+            {
+                'method': 'POST',
+                'endpoint': 'api/v1/foobar',
+                'json': {'mykey': 'myval'},
+                'status_code': 201,
+            },
+            {
+                'method': 'DELETE',
+                'endpoint': 'api/v1/foobar/123',
+                'json': None,
+                'status_code': 204,
+            },
+        ]
+
+    def test_planned_id_response(self, tmpdir):
+        plan = Plan(str(tmpdir))
+        response = plan.add('POST', 'api/v1/products',
+                            {'product': {'short_name': 'NEWP',
+                                         'name': 'New Product'}})
+        assert response.json() == {
+            'data': {'id': 'planned-id:products:NEWP'},
+        }
+        response = plan.add('PUT', 'api/v1/products/123', {'product': {}})
+        assert response.json() == {'data': None}
+
+    def test_created(self, tmpdir):
+        path = str(tmpdir)
+        Plan(path).add('POST', 'api/v1/products/NEWP/product_versions',
+                       {'product_version': {'name': 'NEWP-1'}})
+        plan = Plan(path)
+        plan.add('POST', 'api/v1/user', {'login_name': 'new@redhat.com'})
+        # We find the resources that this task or other tasks create.
+        assert plan.created('product_versions', 'NEWP-1') == \
+            'planned-id:product_versions:NEWP-1'
+        assert plan.created('user', 'new@redhat.com') == \
+            'planned-id:user:new@redhat.com'
+        assert plan.created('products', 'NEWP') is None
+
+
+@pytest.mark.parametrize('endpoint,expected', [
+    ('api/v1/products', 'products'),
+    ('api/v1/products/RHCEPH', 'products'),
+    ('api/v1/products/RHCEPH/product_versions/929', 'product_versions'),
+    ('api/v1/user/123', 'user'),
+])
+def test_endpoint_resource(endpoint, expected):
+    assert endpoint_resource(endpoint) == expected
+
+
+@pytest.mark.parametrize('data,expected', [
+    ({'product': {'short_name': 'RHCEPH', 'name': 'Red Hat Ceph'}},
+     'RHCEPH'),
+    ({'login_name': 'me@redhat.com', 'realname': 'Me'}, 'me@redhat.com'),
+    ({'name': 'RHEL-8', 'description': 'RHEL 8'}, 'RHEL-8'),
+    ({'cdn_repo_package_tag': {'tag_template': 'latest'}}, None),
+    (None, None),
+])
+def test_planned_name(data, expected):
+    assert planned_name(data) == expected
+
+
+def test_parse_planned_id():
+    placeholder = planned_id('cdn_repo_package_tags', 'a/b:c:latest')
+    assert parse_planned_id(placeholder) == \
+        ('cdn_repo_package_tags', 'a/b:c:latest')
+    assert parse_planned_id(123) is None
+    assert parse_planned_id('RHCEPH') is None
+
+
+class TestFingerprintCache(object):
+
+    @pytest.fixture
+    def cache(self, client, monkeypatch, tmpdir):
+        monkeypatch.setenv('ERRATA_TOOL_FINGERPRINT_CACHE', str(tmpdir))
+        monkeypatch.delenv('ERRATA_TOOL_FINGERPRINT_TTL', raising=False)
+
+        def cache(params):
+            return get_fingerprint_cache(client, 'errata_tool_foo', 'bar',
+                                         params)
+        return cache
+
+    def test_disabled(self, client, monkeypatch):
+        monkeypatch.delenv('ERRATA_TOOL_FINGERPRINT_CACHE', raising=False)
+        result = get_fingerprint_cache(client, 'errata_tool_foo', 'bar', {})
+        assert result is None
+
+    def test_empty(self, cache):
+        assert not cache({'name': 'bar'}).fresh()
+
+    def test_fresh(self, cache):
+        cache({'name': 'bar'}).update(False, {'changed': True})
+        assert cache({'name': 'bar'}).fresh()
+
+    def test_different_params(self, cache):
+        cache({'name': 'bar'}).update(False, {'changed': False})
+        assert not cache({'name': 'bar', 'enabled': False}).fresh()
+
+    def test_check_mode_changed(self, cache):
+        cache({'name': 'bar'}).update(True, {'changed': True})
+        assert not cache({'name': 'bar'}).fresh()
+
+    def test_check_mode_unchanged(self, cache):
+        cache({'name': 'bar'}).update(True, {'changed': False})
+        assert cache({'name': 'bar'}).fresh()
+
+    def test_plan(self, client, cache, tmpdir):
+        client.plan = Plan(str(tmpdir.join('plan')))
+        cache({'name': 'bar'}).update(False, {'changed': True})
+        assert not cache({'name': 'bar'}).fresh()
+
+    def test_expired(self, cache, monkeypatch):
+        monkeypatch.setenv('ERRATA_TOOL_FINGERPRINT_TTL', '0')
+        cache({'name': 'bar'}).update(False, {'changed': False})
+        assert not cache({'name': 'bar'}).fresh()
+
+    def test_invalid_ttl(self, cache, monkeypatch):
+        monkeypatch.setenv('ERRATA_TOOL_FINGERPRINT_TTL', '1d')
+        with pytest.raises(ValueError) as e:
+            cache({'name': 'bar'})
+        assert 'ERRATA_TOOL_FINGERPRINT_TTL' in str(e.value)
+
+
+class TestProfiler(object):
+
+    def test_cpu(self, tmpdir):
+        profiler = Profiler('cpu', str(tmpdir), 'errata_tool_foo', 'a/b')
+        profiler.start()
+        sorted(range(100))
+        path = profiler.stop()
+        assert path == str(tmpdir.join('errata_tool_foo-a_b-cpu.pstats'))
+        stats = pstats.Stats(path)
+        assert stats.total_calls > 0
+
+    def test_mem(self, tmpdir):
+        pytest.importorskip('tracemalloc')
+        profiler = Profiler('mem', str(tmpdir), 'errata_tool_foo', 'bar')
+        profiler.start()
+        data = [str(number) for number in range(1000)]
+        path = profiler.stop()
+        assert data
+        with open(path) as f:
+            assert f.readline().startswith('peak: ')
+
+    def test_invalid(self, tmpdir):
+        with pytest.raises(ValueError):
+            Profiler('disk', str(tmpdir), 'errata_tool_foo', 'bar')
+
+
+class TestTracer(object):
+
+    @pytest.fixture
+    def trace_file(self, monkeypatch, tmpdir):
+        path = tmpdir.join('trace.jsonl')
+        monkeypatch.setenv('ERRATA_TOOL_TRACE', str(path))
+        monkeypatch.setattr(common_errata_tool, '_tracer', None)
+        return path
+
+    def export(self, trace_file):
+        get_tracer().export()
+        lines = trace_file.readlines()
+        assert len(lines) == 1
+        data = json.loads(lines[0])
+        return data['resourceSpans'][0]['scopeSpans'][0]['spans']
+
+    def test_disabled(self, monkeypatch):
+        monkeypatch.delenv('ERRATA_TOOL_TRACE', raising=False)
+        monkeypatch.setattr(common_errata_tool, '_tracer', None)
+        with span('foo') as new_span:
+            assert new_span is None
+        assert get_tracer() is None
+
+    def test_nested(self, trace_file):
+        with span('outer'):
+            with span('inner', foo='bar'):
+                pass
+        root, inner, outer = self.export(trace_file)
+        assert root['name'] == 'errata_tool'
+        assert 'parentSpanId' not in root
+        assert outer['parentSpanId'] == root['spanId']
+        assert inner['parentSpanId'] == outer['spanId']
+        assert inner['attributes'] == [
+            {'key': 'foo', 'value': {'stringValue': 'bar'}},
+        ]
+        assert len(set(s['traceId'] for s in (root, inner, outer))) == 1
+
+    def test_error(self, trace_file):
+        with pytest.raises(ValueError):
+            with span('outer'):
+                raise ValueError('oops')
+        _, outer = self.export(trace_file)
+        assert outer['status'] == {'code': 2, 'message': 'ValueError: oops'}
+
+    def test_traced(self, trace_file):
+        @traced('read')
+        def get_foo():
+            return 'foo'
+        assert get_foo() == 'foo'
+        _, get_foo_span = self.export(trace_file)
+        assert get_foo_span['name'] == 'get_foo'
+        assert get_foo_span['attributes'] == [
+            {'key': 'phase', 'value': {'stringValue': 'read'}},
+        ]
+
+    def test_http(self, client, trace_file):
+        client.adapter.register_uri(
+            'GET',
+            'https://errata.devel.redhat.com/api/v1/foo',
+            json={})
+        client.get('api/v1/foo')
+        _, http_span = self.export(trace_file)
+        assert http_span['name'] == 'HTTP GET'
+        assert http_span['kind'] == 3
+        assert {'key': 'http.status_code',
+                'value': {'intValue': '200'}} in http_span['attributes']
+
+    def test_parallel_map(self, trace_file):
+        def child(number):
+            with span('child'):
+                return number
+        with span('parent'):
+            assert parallel_map(child, range(4), 4) == [0, 1, 2, 3]
+        spans = self.export(trace_file)
+        parent = [s for s in spans if s['name'] == 'parent'][0]
+        children = [s for s in spans if s['name'] == 'child']
+        assert len(children) == 4
+        for child_span in children:
+            assert child_span['parentSpanId'] == parent['spanId']
+
+    def test_unwritable_file(self, monkeypatch, tmpdir):
+        path = tmpdir.join('missing', 'trace.jsonl')
+        monkeypatch.setenv('ERRATA_TOOL_TRACE', str(path))
+        monkeypatch.setattr(common_errata_tool, '_tracer', None)
+        warnings = []
+        with span('outer'):
+            pass
+        get_tracer().export(warnings.append)
+        assert len(warnings) == 1
+        assert warnings[0].startswith('could not write %s: ' % path)
+
+    def test_unreachable_collector(self, monkeypatch):
+        def post(url, **kwargs):
+            raise requests.exceptions.ConnectionError('refused')
+        monkeypatch.setattr(requests, 'post', post)
+        monkeypatch.setenv('ERRATA_TOOL_TRACE', 'http://localhost:4318/')
+        monkeypatch.setattr(common_errata_tool, '_tracer', None)
+        warnings = []
+        get_tracer().export(warnings.append)
+        assert warnings == ['could not send trace to http://localhost:4318/:'
+                            ' refused']
+
+
+class TestRequestStats(object):
+
+    def test_request(self, client):
+        client.adapter.register_uri(
+            'GET',
+            'https://errata.devel.redhat.com/api/v1/cdn_repo_package_tags/1',
+            json={})
+        client.get('api/v1/cdn_repo_package_tags/1')
+        report = client.stats.report()
+        assert report['requests'] == 1
+        assert list(report['endpoints']) == [
+            'GET api/v1/cdn_repo_package_tags/:id',
+        ]
+
+    def test_cache_lookup(self):
+        stats = RequestStats()
+        stats.add_cache_lookup('fingerprint', True)
+        stats.add_cache_lookup('fingerprint', False)
+        report = stats.report()
+        assert report['caches'] == {'fingerprint': {'hits': 1, 'misses': 1}}
+
+    def test_fingerprint_cache(self, client, monkeypatch, tmpdir):
+        monkeypatch.setenv('ERRATA_TOOL_FINGERPRINT_CACHE', str(tmpdir))
+        cache = get_fingerprint_cache(client, 'errata_tool_foo', 'bar', {})
+        cache.fresh()
+        report = client.stats.report()
+        assert report['caches'] == {'fingerprint': {'hits': 0, 'misses': 1}}
+
+
+@pytest.mark.parametrize('endpoint,expected', [
+    ('api/v1/cdn_repo_package_tags/1234',
+     'api/v1/cdn_repo_package_tags/:id'),
+    ('/api/v1/products/RHCEPH/product_versions/RHCEPH-4.0-RHEL-8',
+     'api/v1/products/:id/product_versions/:id'),
+    ('api/v1/user/me@redhat.com', 'api/v1/user/:id'),
+    ('api/v1/releases', 'api/v1/releases'),
+    ('products/RHCEPH/product_versions/RHCEPH-4.0-RHEL-8.json',
+     'products/RHCEPH/product_versions/:id.json'),
+    ('workflow_rules', 'workflow_rules'),
+])
+def test_endpoint_template(endpoint, expected):
+    assert endpoint_template(endpoint) == expected
+
+
+class TestPrometheusTextfile(object):
+
+    @pytest.fixture
+    def stats(self):
+        stats = RequestStats()
+        stats.add_request('GET', 'api/v1/releases/1', 0.2, 200, 100)
+        stats.add_request('GET', 'api/v1/releases/2', 3.0, 200, 50)
+        stats.add_cache_lookup('fingerprint', True)
+        return stats
+
+    def test_write(self, stats, tmpdir):
+        path = str(tmpdir.join('errata_tool.prom'))
+        PrometheusTextfile(path).write(stats)
+        lines = open(path).read().splitlines()
+        endpoint = 'endpoint="api/v1/releases/:id"'
+        assert '# TYPE errata_tool_requests_total counter' in lines
+        assert ('errata_tool_requests_total{%s,method="GET",status="200"} 2'
+                % endpoint) in lines
+        assert ('errata_tool_request_duration_seconds_bucket'
+                '{%s,le="0.25",method="GET"} 1' % endpoint) in lines
+        assert ('errata_tool_request_duration_seconds_bucket'
+                '{%s,le="+Inf",method="GET"} 2' % endpoint) in lines
+        assert ('errata_tool_request_duration_seconds_sum'
+                '{%s,method="GET"} 3.2' % endpoint) in lines
+        assert ('errata_tool_response_bytes_total{%s,method="GET"} 150'
+                % endpoint) in lines
+        assert ('errata_tool_cache_lookups_total'
+                '{cache="fingerprint",result="hit"} 1') in lines
+
+    def test_buckets_sorted(self, stats, tmpdir):
+        path = str(tmpdir.join('errata_tool.prom'))
+        PrometheusTextfile(path).write(stats)
+        buckets = [line for line in open(path).read().splitlines()
+                   if line.startswith('errata_tool_request_duration_seconds'
+                                      '_bucket')]
+        les = [re.search(r'le="([^"]+)"', line).group(1) for line in buckets]
+        assert les == ['0.05', '0.1', '0.25', '0.5', '1', '2.5', '5', '10',
+                       '30', '60', '+Inf']
+
+    def test_write_adds(self, stats, tmpdir):
+        path = str(tmpdir.join('errata_tool.prom'))
+        textfile = PrometheusTextfile(path)
+        textfile.write(stats)
+        textfile.write(stats)
+        samples = textfile.read()
+        key = ('errata_tool_requests_total',
+               '{endpoint="api/v1/releases/:id",method="GET",status="200"}')
+        assert samples[key] == 4
+
+    def test_report_stats(self, client, monkeypatch, tmpdir):
+        path = str(tmpdir.join('errata_tool.prom'))
+        monkeypatch.setenv('ERRATA_TOOL_PROMETHEUS_TEXTFILE', path)
+        module = Mock()
+        report_stats(module, client)
+        module.exit_json(changed=False)
+        assert tmpdir.join('errata_tool.prom').check()
+
+
+class TestSlowRequestLog(object):
+
+    def test_add(self, tmpdir):
+        log = tmpdir.join('slow.log')
+        slow_log = SlowRequestLog(str(log), 500, 'errata_tool_cdn_repo',
+                                  'rhceph/rhceph-4-rhel8')
+        slow_log.add('GET', 'api/v1/cdn_repo_package_tags',
+                     {'filter[cdn_repo_name]': 'rhceph/rhceph-4-rhel8'},
+                     200, 0.75)
+        entry = json.loads(log.read())
+        assert entry['method'] == 'GET'
+        assert entry['endpoint'] == 'api/v1/cdn_repo_package_tags'
+        assert entry['params'] == {
+            'filter[cdn_repo_name]': 'rhceph/rhceph-4-rhel8'
+        }
+        assert entry['status_code'] == 200
+        assert entry['elapsed_ms'] == 750
+        assert entry['module'] == 'errata_tool_cdn_repo'
+        assert entry['resource'] == 'rhceph/rhceph-4-rhel8'
+
+    def test_fast(self, tmpdir):
+        log = tmpdir.join('slow.log')
+        slow_log = SlowRequestLog(str(log), 500, 'errata_tool_foo', 'bar')
+        slow_log.add('GET', 'api/v1/products/RHCEPH', None, 200, 0.1)
+        assert not log.check()
+
+    def test_client(self, client, monkeypatch, tmpdir):
+        log = tmpdir.join('slow.log')
+        monkeypatch.setenv('ERRATA_TOOL_SLOW_MS', '0')
+        monkeypatch.setenv('ERRATA_TOOL_SLOW_LOG', str(log))
+        client.adapter.register_uri(
+            'GET',
+            'https://errata.devel.redhat.com/api/v1/products/RHCEPH',
+            json={})
+        start_slow_log(Mock(), client, 'errata_tool_product', 'RHCEPH')
+        client.get('api/v1/products/RHCEPH')
+        client.get('api/v1/products/RHCEPH')
+        lines = log.read().splitlines()
+        assert len(lines) == 2
+        entry = json.loads(lines[0])
+        assert entry['endpoint'] == 'api/v1/products/:id'
+        assert entry['path'] == 'api/v1/products/RHCEPH'
+
+    def test_unwritable(self, client, monkeypatch, tmpdir):
+        log = tmpdir.join('missing', 'slow.log')
+        monkeypatch.setenv('ERRATA_TOOL_SLOW_MS', '0')
+        monkeypatch.setenv('ERRATA_TOOL_SLOW_LOG', str(log))
+        client.adapter.register_uri(
+            'GET',
+            'https://errata.devel.redhat.com/api/v1/products/RHCEPH',
+            json={})
+        module = Mock()
+        start_slow_log(module, client, 'errata_tool_product', 'RHCEPH')
+        response = client.get('api/v1/products/RHCEPH')
+        assert response.status_code == 200
+        client.get('api/v1/products/RHCEPH')
+        # We warn once, not for every request.
+        assert module.warn.call_count == 1
+        msg = module.warn.call_args[0][0]
+        assert msg.startswith('could not write %s: ' % log)
+
+    def test_disabled(self, client, monkeypatch):
+        monkeypatch.delenv('ERRATA_TOOL_SLOW_MS', raising=False)
+        assert start_slow_log(Mock(), client, 'errata_tool_foo', 'bar') \
+            is None
+        assert client.slow_log is None
+
+
+class TestStartModule(object):
+
+    @pytest.fixture
+    def module(self, client, monkeypatch):
+        for name in ('ERRATA_TOOL_PROFILE', 'ERRATA_TOOL_TRACE',
+                     'ERRATA_TOOL_SLOW_MS', 'ERRATA_TOOL_PLAN',
+                     'ERRATA_TOOL_FINGERPRINT_CACHE'):
+            monkeypatch.delenv(name, raising=False)
+        monkeypatch.setattr(common_errata_tool, 'Client', lambda: client)
+        return Mock(check_mode=False, exit_json=exit_json,
+                    fail_json=fail_json)
+
+    def test_client(self, client, module):
+        result = start_module(module, 'errata_tool_foo', 'bar')
+        assert result == (client, False)
+        # We report the stats when the module exits:
+        with pytest.raises(AnsibleExitJson) as exit:
+            module.exit_json(changed=False)
+        assert 'errata_tool_stats' in exit.value.args[0]
+
+    def test_plan(self, client, module, monkeypatch, tmpdir):
+        monkeypatch.setenv('ERRATA_TOOL_PLAN', str(tmpdir))
+        module.check_mode = True
+        _, check_mode = start_module(module, 'errata_tool_foo', 'bar')
+        assert check_mode is False
+        assert client.plan is not None
+
+    def test_no_plan(self, client, module, monkeypatch, tmpdir):
+        monkeypatch.setenv('ERRATA_TOOL_PLAN', str(tmpdir))
+        module.check_mode = True
+        _, check_mode = start_module(module, 'errata_tool_foo', 'bar',
+                                     plan=False)
+        assert check_mode is True
+        assert client.plan is None
+
+    def test_fingerprints(self, client, module, monkeypatch, tmpdir):
+        monkeypatch.setenv('ERRATA_TOOL_FINGERPRINT_CACHE', str(tmpdir))
+        params = {'name': 'bar'}
+        start_module(module, 'errata_tool_foo', 'bar', params)
+        client.fingerprints.update(False, {'changed': False})
+        with pytest.raises(AnsibleExitJson) as exit:
+            start_module(module, 'errata_tool_foo', 'bar', params)
+        assert exit.value.args[0]['changed'] is False
+
+    def test_slow_log(self, client, module, monkeypatch, tmpdir):
+        monkeypatch.setenv('ERRATA_TOOL_SLOW_MS', '0')
+        monkeypatch.setenv('ERRATA_TOOL_SLOW_LOG', str(tmpdir.join('slow')))
+        start_module(module, 'errata_tool_foo', 'bar')
+        assert client.slow_log.module_name == 'errata_tool_foo'
+        assert client.slow_log.identity == 'bar'
+
+    def test_invalid_concurrency(self, module, monkeypatch):
+        monkeypatch.setattr(common_errata_tool, 'Client', Client)
+        monkeypatch.setenv('ERRATA_TOOL_CONCURRENCY', 'four')
+        with pytest.raises(AnsibleFailJson) as fail:
+            start_module(module, 'errata_tool_foo', 'bar')
+        assert 'ERRATA_TOOL_CONCURRENCY' in fail.value.args[0]['msg']
+
+    def test_invalid_fingerprint_ttl(self, module, monkeypatch, tmpdir):
+        monkeypatch.setenv('ERRATA_TOOL_FINGERPRINT_CACHE', str(tmpdir))
+        monkeypatch.setenv('ERRATA_TOOL_FINGERPRINT_TTL', '1d')
+        with pytest.raises(AnsibleFailJson) as fail:
+            start_module(module, 'errata_tool_foo', 'bar', {'name': 'bar'})
+        assert 'ERRATA_TOOL_FINGERPRINT_TTL' in fail.value.args[0]['msg']
@@ -0,0 +1,159 @@
+import os
+import sys
+import pytest
+from ansible.module_utils import basic
+from ansible.module_utils.basic import AnsibleModule
+from ansible.plugins.action.normal import ActionModule as NormalActionModule
+from errata_tool_action import ErrataToolAction
+from errata_tool_action import run_module_in_process
+from utils import Mock
+
+
+class FakeModule(object):
+    """ Imitate an Ansible module's Python module for run_module_in_process.
+    """
+    def __init__(self, run):
+        self.run = run
+
+    def main(self):
+        module = AnsibleModule(
+            argument_spec=dict(name=dict(required=True)),
+            supports_check_mode=True
+        )
+        self.run(module)
+
+
+@pytest.fixture
+def module_args():
+    return {
+        'name': 'foo',
+        '_ansible_remote_tmp': '/tmp',
+        '_ansible_keep_remote_files': False,
+    }
+
+
+class TestRunModuleInProcess(object):
+
+    def test_exit_json(self, module_args):
+        def run(module):
+            module.exit_json(changed=True, name=module.params['name'])
+        result = run_module_in_process(FakeModule(run), module_args)
+        assert result['changed'] is True
+        assert result['name'] == 'foo'
+
+    def test_fail_json(self, module_args):
+        def run(module):
+            module.fail_json(msg='oh no')
+        result = run_module_in_process(FakeModule(run), module_args)
+        assert result['failed'] is True
+        assert result['msg'] == 'oh no'
+
+    def test_check_mode(self, module_args):
+        module_args['_ansible_check_mode'] = True
+
+        def run(module):
+            module.exit_json(check_mode=module.check_mode)
+        result = run_module_in_process(FakeModule(run), module_args)
+        assert result['check_mode'] is True
+
+    def test_exception(self, module_args):
+        def run(module):
+            raise ValueError('unexpected')
+        result = run_module_in_process(FakeModule(run), module_args)
+        assert result['failed'] is True
+        assert result['msg'] == 'MODULE FAILURE: unexpected'
+        assert 'ValueError' in result['exception']
+
+    def test_restore_after_exception(self, module_args):
+        stdout = sys.stdout
+
+        def run(module):
+            print('partial output')
+            raise ValueError('unexpected')
+        run_module_in_process(FakeModule(run), module_args)
+        assert sys.stdout is stdout
+        assert basic._ANSIBLE_ARGS is None
+
+    def test_restore_after_interrupt(self, module_args):
+        stdout = sys.stdout
+
+        def run(module):
+            raise KeyboardInterrupt()
+        with pytest.raises(KeyboardInterrupt):
+            run_module_in_process(FakeModule(run), module_args)
+        assert sys.stdout is stdout
+        assert basic._ANSIBLE_ARGS is None
+
+
+@pytest.fixture
+def action(monkeypatch):
+    """
+    An ErrataToolAction for a local task. Its module returns the
+    ERRATA_TOOL_URL that it sees, and Ansible's normal module execution
+    returns {"normal": True}.
+    """
+    monkeypatch.delenv('ERRATA_TOOL_IN_PROCESS', raising=False)
+    monkeypatch.setattr(NormalActionModule, '_execute_module',
+                        lambda self, **kwargs: {'normal': True})
+
+    def run(module):
+        module.exit_json(url=os.getenv('ERRATA_TOOL_URL'))
+    action = ErrataToolAction.__new__(ErrataToolAction)
+    action._connection = Mock(transport='local')
+    action._play_context = Mock(become=False)
+    action._task = Mock(action='errata_tool_foo', args={'name': 'foo'})
+    action.environment = {'ERRATA_TOOL_URL': 'https://errata.example.com'}
+    action._task_environment = lambda: action.environment
+    action._import_module = lambda: FakeModule(run)
+    action._update_module_args = lambda name, args, task_vars: None
+    return action
+
+
+class TestErrataToolAction(object):
+
+    def test_in_process(self, action):
+        result = action._execute_module()
+        assert result == {'url': 'https://errata.example.com',
+                          'invocation': {'module_args': {'name': 'foo'}}}
+
+    def test_remote(self, action):
+        action._connection.transport = 'ssh'
+        assert action._execute_module() == {'normal': True}
+
+    def test_become(self, action):
+        action._play_context.become = True
+        assert action._execute_module() == {'normal': True}
+
+    def test_async(self, action):
+        assert action._execute_module(wrap_async=True) == {'normal': True}
+
+    def test_disabled_in_task(self, action):
+        action.environment['ERRATA_TOOL_IN_PROCESS'] = 'false'
+        assert action._execute_module() == {'normal': True}
+
+    def test_disabled_in_controller(self, action, monkeypatch):
+        monkeypatch.setenv('ERRATA_TOOL_IN_PROCESS', 'false')
+        assert action._execute_module() == {'normal': True}
+
+    def test_import_error(self, action):
+        action._import_module = lambda: None
+        assert action._execute_module() == {'normal': True}
+
+    def test_not_in_collection(self):
+        action = ErrataToolAction.__new__(ErrataToolAction)
+        assert action._import_module() is None
+
+    def test_restore_environment(self, action, monkeypatch):
+        monkeypatch.delenv('ERRATA_TOOL_URL', raising=False)
+        action._execute_module()
+        assert 'ERRATA_TOOL_URL' not in os.environ
+
+    def test_restore_environment_after_interrupt(self, action, monkeypatch):
+        monkeypatch.delenv('ERRATA_TOOL_URL', raising=False)
+
+        def run(module):
+            raise KeyboardInterrupt()
+        action._import_module = lambda: FakeModule(run)
+        with pytest.raises(KeyboardInterrupt):
+            action._execute_module()
+        assert 'ERRATA_TOOL_URL' not in os.environ
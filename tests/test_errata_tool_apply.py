@@ -0,0 +1,364 @@
+import pytest
+import errata_tool_apply
+import errata_tool_cdn_repo
+import errata_tool_product
+import errata_tool_product_version
+import errata_tool_release
+from ansible.module_utils.common_errata_tool import Plan
+from errata_tool_apply import apply_plan
+from errata_tool_apply import get_level
+from errata_tool_apply import PlanFiles
+from errata_tool_apply import main
+from utils import exit_json
+from utils import fail_json
+from utils import set_module_args
+from utils import AnsibleExitJson
+from utils import AnsibleFailJson
+
+
+PROD = 'https://errata.devel.redhat.com'
+
+
+@pytest.mark.parametrize('endpoint,expected', [
+    ('api/v1/user', 0),
+    ('api/v1/products', 1),
+    ('api/v1/products/123', 1),
+    ('api/v1/products/RHCEPH/product_versions', 2),
+    ('api/v1/products/RHCEPH/product_versions/929', 2),
+    ('api/v1/releases/1017', 3),
+    ('api/v1/rhel_releases/87', 0),
+    ('api/v1/cdn_repo_package_tags/123', 5),
+])
+def test_get_level(endpoint, expected):
+    assert get_level(endpoint) == expected
+
+
+def test_get_level_unknown():
+    with pytest.raises(ValueError):
+        get_level('api/v1/foobars')
+
+
+class TestPlanFiles(object):
+
+    def test_operations(self, tmpdir):
+        path = str(tmpdir)
+        plan = Plan(path)
+        plan.add('PUT', 'api/v1/products/123', {'product': {'name': 'foo'}})
+        plan.add('DELETE', 'api/v1/cdn_repo_package_tags/456')
+        plan_files = PlanFiles(path)
+        assert len(plan_files.filenames) == 1
+        assert plan_files.operations == [
+            {
+                'method': 'PUT',
+                'endpoint': 'api/v1/products/123',
+                'json': {'product': {'name': 'foo'}},
+                'status_code': 200,
+            },
+            {
+                'method': 'DELETE',
+                'endpoint': 'api/v1/cdn_repo_package_tags/456',
+                'json': None,
+                'status_code': 204,
+            },
+        ]
+
+    def test_done(self, tmpdir):
+        path = str(tmpdir)
+        plan = Plan(path)
+        plan.add('PUT', 'api/v1/products/123', {})
+        plan.add('PUT', 'api/v1/products/123', {})
+        plan_files = PlanFiles(path)
+        first, second = plan_files.operations
+        plan_files.done(second)
+        # We removed only one of the two equal operations:
+        assert PlanFiles(path).operations == [first]
+        plan_files.done(first)
+        assert tmpdir.listdir() == []
+
+
+class TestApplyPlan(object):
+
+    @pytest.fixture
+    def operations(self):
+        return [
+            {
+                'method': 'POST',
+                'endpoint': 'api/v1/cdn_repo_package_tags',
+                'json': {'cdn_repo_package_tag': {}},
+                'status_code': 201,
+            },
+            {
+                'method': 'POST',
+                'endpoint': 'api/v1/products',
+                'json': {'product': {'short_name': 'RHCEPH'}},
+                'status_code': 201,
+            },
+        ]
+
+    def test_dependency_order(self, client, operations):
+        client.adapter.register_uri(
+            'POST',
+            PROD + '/api/v1/products',
+            status_code=201)
+        client.adapter.register_uri(
+            'POST',
+            PROD + '/api/v1/cdn_repo_package_tags',
+            status_code=201)
+        changes, errors = apply_plan(client, operations, False)
+        assert changes == [
+            'POST api/v1/products',
+            'POST api/v1/cdn_repo_package_tags',
+        ]
+        assert errors == []
+        history = client.adapter.request_history
+        assert history[0].url == PROD + '/api/v1/products'
+        assert history[0].json() == {'product': {'short_name': 'RHCEPH'}}
+        assert history[1].url == PROD + '/api/v1/cdn_repo_package_tags'
+
+    def test_check_mode(self, client, operations):
+        changes, errors = apply_plan(client, operations, True)
+        assert len(changes) == 2
+        assert errors == []
+        assert len(client.adapter.request_history) == 0
+
+    def test_stop_after_error(self, client, operations):
+        client.adapter.register_uri(
+            'POST',
+            PROD + '/api/v1/products',
+            status_code=400,
+            json={'error': 'Bad short_name'})
+        changes, errors = apply_plan(client, operations, False)
+        assert len(errors) == 1
+        assert 'Bad short_name' in errors[0]
+        # We did not send the package tag request:
+        assert len(client.adapter.request_history) == 1
+
+
+class TestPlannedIds(object):
+
+    @pytest.fixture
+    def operations(self):
+        return [
+            {
+                'method': 'POST',
+                'endpoint': 'api/v1/products',
+                'json': {'product': {'short_name': 'NEWP'}},
+                'status_code': 201,
+            },
+            {
+                'method': 'POST',
+                'endpoint': 'api/v1/releases',
+                'json': {'release': {
+                    'name': 'NEWP-1.0',
+                    'product_id': 'planned-id:products:NEWP',
+                }},
+                'status_code': 201,
+            },
+        ]
+
+    def test_resolve_after_create(self, client, operations):
+        client.adapter.register_uri(
+            'POST',
+            PROD + '/api/v1/products',
+            status_code=201)
+        client.adapter.register_uri(
+            'GET',
+            PROD + '/api/v1/products/NEWP',
+            json={'data': {'id': 123}})
+        client.adapter.register_uri(
+            'POST',
+            PROD + '/api/v1/releases',
+            status_code=201)
+        changes, errors = apply_plan(client, operations, False)
+        assert errors == []
+        history = client.adapter.request_history
+        assert [request.method for request in history] == \
+            ['POST', 'GET', 'POST']
+        assert history[2].json() == {'release': {
+            'name': 'NEWP-1.0',
+            'product_id': 123,
+        }}
+
+    def test_not_found(self, client, operations):
+        client.adapter.register_uri(
+            'POST',
+            PROD + '/api/v1/products',
+            status_code=201)
+        client.adapter.register_uri(
+            'GET',
+            PROD + '/api/v1/products/NEWP',
+            status_code=404)
+        changes, errors = apply_plan(client, operations, False)
+        assert len(errors) == 1
+        assert errors[0].startswith(
+            'could not find an ID for POST api/v1/releases: 404')
+
+
+class TestMain(object):
+
+    @pytest.fixture(autouse=True)
+    def fake_exits(self, monkeypatch):
+        monkeypatch.setattr(errata_tool_apply.AnsibleModule,
+                            'exit_json', exit_json)
+        monkeypatch.setattr(errata_tool_apply.AnsibleModule,
+                            'fail_json', fail_json)
+
+    @pytest.fixture(autouse=True)
+    def fake_client(self, client, monkeypatch):
+        monkeypatch.setattr(errata_tool_apply.common_errata_tool,
+                            'Client', lambda: client)
+
+    def test_apply(self, client, tmpdir):
+        client.adapter.register_uri(
+            'PUT',
+            PROD + '/api/v1/products/123',
+            status_code=200)
+        Plan(str(tmpdir)).add('PUT', 'api/v1/products/123', {})
+        set_module_args({'plan': str(tmpdir)})
+        with pytest.raises(AnsibleExitJson) as exit:
+            main()
+        result = exit.value.args[0]
+        assert result['changed'] is True
+        assert result['stdout_lines'] == ['PUT api/v1/products/123']
+        # We removed the plan:
+        assert tmpdir.listdir() == []
+
+    def test_empty(self, tmpdir):
+        set_module_args({'plan': str(tmpdir)})
+        with pytest.raises(AnsibleExitJson) as exit:
+            main()
+        result = exit.value.args[0]
+        assert result['changed'] is False
+
+    def test_error(self, client, tmpdir):
+        client.adapter.register_uri(
+            'PUT',
+            PROD + '/api/v1/products/123',
+            status_code=500)
+        Plan(str(tmpdir)).add('PUT', 'api/v1/products/123', {})
+        set_module_args({'plan': str(tmpdir)})
+        with pytest.raises(AnsibleFailJson) as fail:
+            main()
+        result = fail.value.args[0]
+        assert result['msg'].startswith('could not apply the plan')
+        # We kept the plan:
+        assert len(tmpdir.listdir()) == 1
+
+    def test_rerun_after_error(self, client, tmpdir):
+        client.adapter.register_uri(
+            'PUT',
+            PROD + '/api/v1/products/123',
+            status_code=200)
+        client.adapter.register_uri(
+            'PUT',
+            PROD + '/api/v1/variants/456',
+            status_code=500)
+        plan = Plan(str(tmpdir))
+        plan.add('PUT', 'api/v1/products/123', {})
+        plan.add('PUT', 'api/v1/variants/456', {})
+        set_module_args({'plan': str(tmpdir)})
+        with pytest.raises(AnsibleFailJson):
+            main()
+        # The plan only has the write that failed:
+        operations = PlanFiles(str(tmpdir)).operations
+        assert [op['endpoint'] for op in operations] == ['api/v1/variants/456']
+        # After we fix the problem, we only send the remaining write:
+        client.adapter.register_uri(
+            'PUT',
+            PROD + '/api/v1/variants/456',
+            status_code=200)
+        history = client.adapter.request_history
+        sent = len(history)
+        with pytest.raises(AnsibleExitJson) as exit:
+            main()
+        result = exit.value.args[0]
+        assert result['stdout_lines'] == ['PUT api/v1/variants/456']
+        assert [request.path for request in history[sent:]] == \
+            ['/api/v1/variants/456']
+        assert tmpdir.listdir() == []
+
+
+class TestPlanNewResources(object):
+    """
+    Plan tasks that depend on each other's new resources, then apply the
+    plan to a fake ET.
+    """
+
+    @pytest.fixture(autouse=True)
+    def fake_exits(self, monkeypatch):
+        # Every module shares the same AnsibleModule class.
+        monkeypatch.setattr(errata_tool_apply.AnsibleModule,
+                            'exit_json', exit_json)
+        monkeypatch.setattr(errata_tool_apply.AnsibleModule,
+                            'fail_json', fail_json)
+
+    def run_task(self, module, args, check_mode=True):
+        args = dict(args, _ansible_check_mode=check_mode)
+        set_module_args(args)
+        with pytest.raises(AnsibleExitJson) as exit:
+            module.main()
+        return exit.value.args[0]
+
+    def test_product_release_cdn_repo(self, fake_client, fake_server,
+                                      monkeypatch, tmpdir):
+        path = str(tmpdir.join('plan'))
+        monkeypatch.setenv('ERRATA_TOOL_PLAN', path)
+        self.run_task(errata_tool_product, {
+            'short_name': 'NEWP',
+            'name': 'New Product',
+            'description': 'New Product',
+            'default_solution': 'enterprise',
+            'state_machine_rule_set': 'Default',
+            'push_targets': ['cdn'],
+        })
+        self.run_task(errata_tool_product_version, {
+            'product': 'NEWP',
+            'name': 'NEWP-1',
+            'description': 'New Product 1',
+            'rhel_release_name': 'RHEL-8',
+            'default_brew_tag': 'newp-1-candidate',
+            'is_server_only': False,
+            'allow_rhn_debuginfo': False,
+            'allow_buildroot_push': False,
+            'is_oval_product': False,
+            'is_rhel_addon': False,
+            'push_targets': ['cdn'],
+            'brew_tags': ['newp-1-candidate'],
+        })
+        result = self.run_task(errata_tool_release, {
+            'product': 'NEWP',
+            'name': 'NEWP-1.0',
+            'description': 'New Product 1.0',
+            'type': 'QuarterlyUpdate',
+            'product_versions': ['NEWP-1'],
+            'program_manager': 'coolmanager@redhat.com',
+            'state_machine_rule_set': 'Default',
+            'blocker_flags': ['newp-1.0'],
+        })
+        assert result['changed'] is True
+        result = self.run_task(errata_tool_cdn_repo, {
+            'name': 'newp/newp-1',
+            'release_type': 'Primary',
+            'content_type': 'Docker',
+            'variants': ['AppStream-8.0.0'],
+            'packages': {'newp-container': ['latest']},
+        })
+        assert 'adding "latest" tag template to "newp-container"' \
+            in result['stdout_lines']
+        # We have not written anything yet.
+        fake = fake_server.fake
+        assert [p['short_name'] for p in fake.products.values()] == ['RHEL']
+
+        monkeypatch.delenv('ERRATA_TOOL_PLAN')
+        result = self.run_task(errata_tool_apply, {'plan': path},
+                               check_mode=False)
+        assert result['changed'] is True
+        product = fake.find(fake.products, 'NEWP', 'short_name')
+        product_version = fake.find(fake.product_versions, 'NEWP-1')
+        release = fake.find(fake.releases, 'NEWP-1.0')
+        assert release['product_id'] == product['id']
+        assert release['product_version_ids'] == [product_version['id']]
+        cdn_repo = fake.find(fake.cdn_repos, 'newp/newp-1')
+        tags = [tag for tag in fake.package_tags.values()
+                if tag['cdn_repo_id'] == cdn_repo['id']]
+        assert [tag['tag_template'] for tag in tags] == ['latest']
@@ -1,19 +1,29 @@
 from copy import deepcopy
 import re
+import threading
+import time
 import pytest
 import errata_tool_cdn_repo
-from errata_tool_cdn_repo import CDN_RELEASE_TYPES
-from errata_tool_cdn_repo import CDN_CONTENT_TYPES
-from errata_tool_cdn_repo import add_package_tag
-from errata_tool_cdn_repo import cdn_repo_api_data
-from errata_tool_cdn_repo import create_cdn_repo
-from errata_tool_cdn_repo import edit_cdn_repo
-from errata_tool_cdn_repo import ensure_cdn_repo
-from errata_tool_cdn_repo import ensure_packages_tags
-from errata_tool_cdn_repo import get_cdn_repo
-from errata_tool_cdn_repo import get_package_tags
-from errata_tool_cdn_repo import normalize_packages
+from ansible.module_utils.common_errata_tool_cdn_repo import (
+    CDN_RELEASE_TYPES,
+    CDN_CONTENT_TYPES,
+    add_package_tag,
+    cdn_repo_api_data,
+    create_cdn_repo,
+    edit_cdn_repo,
+    ensure_cdn_repo,
+    ensure_packages_tags,
+    get_cdn_repo,
+    get_package_tags,
+    normalize_packages,
+    prepare_diff_data,
+    prefetch_package_tags,
+    PackageTag,
+    PackageTagsCache,
+)
 from errata_tool_cdn_repo import main
+from ansible.module_utils import common_errata_tool
+from ansible.module_utils.common_errata_tool import Plan
 from ansible.module_utils.six import PY2
 from utils import exit_json
 from utils import fail_json
@@ -425,41 +435,179 @@ class TestGetPackageTags(object):
         cdn_repo = get_package_tags(client, name)
         expected = {
             'rhceph-container': {
-                '{{version}}-{{release}}': {
-                    'id': 13858,
-                    'for_hotfix': False,
-                    'for_prerelease': False
-                },
-                '{{version}}': {
-                    'id': 13859,
-                    'for_hotfix': False,
-                    'for_prerelease': False
-                },
-                'latest': {
-                    'id': 13860,
-                    'for_hotfix': False,
-                    'for_prerelease': False
-                },
-                'my-variant-restricted-tag': {
-                    'variant': '8Base-RHCEPH-4.0-Tools',
-                    'id': 99999,
-                    'for_hotfix': False,
-                    'for_prerelease': False
-                },
-                '{{version}}-prerelease-{{advisory}}': {
-                    'id': 13861,
-                    'for_hotfix': False,
-                    'for_prerelease': True
-                },
-                '{{version}}-{{hotfix}}-{{advisory}}': {
-                    'id': 13862,
-                    'for_hotfix': True,
-                    'for_prerelease': False
-                },
+                '{{version}}-{{release}}': PackageTag(
+                    id=13858,
+                    variant=None,
+                    for_hotfix=False,
+                    for_prerelease=False
+                ),
+                '{{version}}': PackageTag(
+                    id=13859,
+                    variant=None,
+                    for_hotfix=False,
+                    for_prerelease=False
+                ),
+                'latest': PackageTag(
+                    id=13860,
+                    variant=None,
+                    for_hotfix=False,
+                    for_prerelease=False
+                ),
+                'my-variant-restricted-tag': PackageTag(
+                    id=99999,
+                    variant='8Base-RHCEPH-4.0-Tools',
+                    for_hotfix=False,
+                    for_prerelease=False
+                ),
+                '{{version}}-prerelease-{{advisory}}': PackageTag(
+                    id=13861,
+                    variant=None,
+                    for_hotfix=False,
+                    for_prerelease=True
+                ),
+                '{{version}}-{{hotfix}}-{{advisory}}': PackageTag(
+                    id=13862,
+                    variant=None,
+                    for_hotfix=True,
+                    for_prerelease=False
+                ),
             },
         }
         assert cdn_repo == expected
 
+    def test_many_pages(self, client):
+        # 250 tags for one package, over three pages:
+        def callback(request, context):
+            page_number = int(request.qs['page[number]'][0])
+            start = (page_number - 1) * 100
+            stop = min(start + 100, 250)
+            tags = []
+            for i in range(start, stop):
+                tag = deepcopy(CDN_REPO_PACKAGE_TAGS[0])
+                tag['id'] = i
+                tag['attributes']['tag_template'] = 'tag-%d' % i
+                tags.append(tag)
+            return {'data': tags}
+        client.adapter.register_uri(
+            'GET',
+            PROD + '/api/v1/cdn_repo_package_tags',
+            json=callback)
+        name = 'rhceph/rhceph-4-rhel8'
+        packages = get_package_tags(client, name)
+        tags = packages['rhceph-container']
+        assert len(tags) == 250
+        assert tags['tag-249'].id == 249
+
+    def test_package_names(self, client):
+        client.adapter.register_uri(
+            'GET',
+            PROD + '/api/v1/cdn_repo_package_tags',
+            json={'data': CDN_REPO_PACKAGE_TAGS})
+        name = 'rhceph/rhceph-4-rhel8'
+        packages = get_package_tags(client, name, ['rhceph-container'])
+        assert len(packages['rhceph-container']) == 6
+        history = client.adapter.request_history
+        assert len(history) == 1
+        assert history[0].qs['filter[package_name]'] == ['rhceph-container']
+
+
+class TestPrefetchPackageTags(object):
+
+    def test_basic(self, client):
+        other_tag = deepcopy(CDN_REPO_PACKAGE_TAGS[0])
+        other_tag['id'] = 11111
+        other_tag['relationships']['cdn_repo']['name'] = 'other/repo'
+        client.adapter.register_uri(
+            'GET',
+            PROD + '/api/v1/cdn_repo_package_tags',
+            json={'data': CDN_REPO_PACKAGE_TAGS + [other_tag]})
+        repos = prefetch_package_tags(client)
+        assert set(repos) == set(['rhceph/rhceph-4-rhel8', 'other/repo'])
+        assert len(repos['rhceph/rhceph-4-rhel8']['rhceph-container']) == 6
+        assert repos['other/repo'] == {
+            'rhceph-container': {
+                'latest': PackageTag(
+                    id=11111,
+                    variant=None,
+                    for_hotfix=False,
+                    for_prerelease=False
+                ),
+            },
+        }
+        history = client.adapter.request_history
+        assert 'filter[cdn_repo_name]' not in history[0].qs
+
+
+class TestPackageTagsCache(object):
+
+    @pytest.fixture
+    def client(self, client):
+        client.adapter.register_uri(
+            'GET',
+            PROD + '/api/v1/cdn_repo_package_tags',
+            json={'data': CDN_REPO_PACKAGE_TAGS})
+        return client
+
+    @pytest.fixture
+    def path(self, tmpdir):
+        return str(tmpdir.join('package-tags.json'))
+
+    def test_get(self, client, path):
+        cache = PackageTagsCache(path)
+        packages = cache.get(client, 'rhceph/rhceph-4-rhel8')
+        assert len(packages['rhceph-container']) == 6
+        assert cache.get(client, 'noexist/repo') == {}
+        assert len(client.adapter.request_history) == 1
+
+    def test_shared(self, client, path):
+        PackageTagsCache(path).get(client, 'rhceph/rhceph-4-rhel8')
+        cache = PackageTagsCache(path)
+        packages = cache.get(client, 'rhceph/rhceph-4-rhel8')
+        assert len(packages['rhceph-container']) == 6
+        assert len(client.adapter.request_history) == 1
+        # The JSON file stores PackageTags as lists. We read them back as
+        # PackageTags.
+        tag = packages['rhceph-container']['my-variant-restricted-tag']
+        assert tag == PackageTag(99999, '8Base-RHCEPH-4.0-Tools', False,
+                                 False)
+
+    def test_refresh(self, client, path):
+        cache = PackageTagsCache(path)
+        cache.get(client, 'other/repo')
+        cache.refresh(client, 'other/repo')
+        history = client.adapter.request_history
+        assert len(history) == 2
+        assert history[1].qs['filter[cdn_repo_name]'] == ['other/repo']
+        packages = PackageTagsCache(path).get(client, 'other/repo')
+        assert len(packages['rhceph-container']) == 6
+
+    def test_parallel_refresh(self, client, path, monkeypatch):
+        PackageTagsCache(path).get(client, 'rhceph/rhceph-4-rhel8')
+        # Make every read slow, so that unlocked refreshes would overwrite
+        # each other's changes.
+        read_json_file = common_errata_tool.read_json_file
+
+        def slow_read_json_file(path):
+            data = read_json_file(path)
+            time.sleep(0.01)
+            return data
+        monkeypatch.setattr(common_errata_tool, 'read_json_file',
+                            slow_read_json_file)
+        names = ['parallel/repo-%d' % number for number in range(8)]
+        caches = [PackageTagsCache(path), PackageTagsCache(path)]
+
+        def refresh(number):
+            caches[number % 2].refresh(client, names[number])
+        threads = [threading.Thread(target=refresh, args=(number,))
+                   for number in range(len(names))]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        repos = read_json_file(path)
+        for name in names:
+            assert name in repos
+
 
 class TestAddPackageTag(object):
 
@@ -558,6 +706,10 @@ class TestAddPackageTag(object):
         assert '\n  Request body: {"cdn_repo_package_tag": {' in error
 
 
+# A desired tag with no variant restriction, hotfix or prerelease setting.
+UNRESTRICTED = PackageTag(None, None, False, False)
+
+
 class TestNormalize(object):
 
     def test_no_tags(self):
@@ -568,13 +720,14 @@ class TestNormalize(object):
 
     def test_one_tag(self):
         packages = {'rhceph-container': ['latest']}
-        expected = {'rhceph-container': {'latest': {}}}
+        expected = {'rhceph-container': {'latest': UNRESTRICTED}}
         results = normalize_packages(packages)
         assert results == expected
 
     def test_multiple_tags(self):
         packages = {'rhceph-container': ['latest', '{{version}}']}
-        expected = {'rhceph-container': {'latest': {}, '{{version}}': {}}}
+        expected = {'rhceph-container': {'latest': UNRESTRICTED,
+                                         '{{version}}': UNRESTRICTED}}
         results = normalize_packages(packages)
         assert results == expected
 
@@ -584,8 +737,21 @@ class TestNormalize(object):
             {'my-restricted-tag': {'variant': '8Base-RHCEPH-4.0-Tools'}},
         ]}
         expected = {'rhceph-container': {
-            'latest': {},
-            'my-restricted-tag': {'variant': '8Base-RHCEPH-4.0-Tools'},
+            'latest': UNRESTRICTED,
+            'my-restricted-tag': PackageTag(None, '8Base-RHCEPH-4.0-Tools',
+                                            False, False),
+        }}
+        results = normalize_packages(packages)
+        assert results == expected
+
+    def test_hotfix_prerelease(self):
+        packages = {'rhceph-container': [
+            {'hotfix-tag': {'for_hotfix': True}},
+            {'prerelease-tag': {'for_prerelease': True}},
+        ]}
+        expected = {'rhceph-container': {
+            'hotfix-tag': PackageTag(None, None, True, False),
+            'prerelease-tag': PackageTag(None, None, False, True),
         }}
         results = normalize_packages(packages)
         assert results == expected
@@ -593,8 +759,8 @@ class TestNormalize(object):
     def test_multiple_packages(self):
         packages = {'rhceph-container': ['latest'],
                     'rhceph-dashboard-container': ['latest']}
-        expected = {'rhceph-container': {'latest': {}},
-                    'rhceph-dashboard-container': {'latest': {}}}
+        expected = {'rhceph-container': {'latest': UNRESTRICTED},
+                    'rhceph-dashboard-container': {'latest': UNRESTRICTED}}
         results = normalize_packages(packages)
         assert results == expected
 
@@ -674,14 +840,15 @@ class TestEnsurePackageTags(EnsurePackageTagsBase):
         return False
 
     def test_unchanged(self, client, name, check_mode):
-        packages = {'rhceph-container': {'latest': {}}}
+        packages = normalize_packages({'rhceph-container': ['latest']})
         result, _ = ensure_packages_tags(client, name, check_mode, packages)
         assert result == []
         assert len(client.adapter.request_history) == 1
         assert client.adapter.request_history[0].method == 'GET'
 
     def test_add_one(self, client, name, check_mode):
-        packages = {'rhceph-container': {'latest': {}, 'new-tag': {}}}
+        packages = normalize_packages(
+            {'rhceph-container': ['latest', 'new-tag']})
         result, _ = ensure_packages_tags(client, name, check_mode, packages)
         expected = ['adding "new-tag" tag template to "rhceph-container"']
         assert result == expected
@@ -692,12 +859,12 @@ class TestEnsurePackageTags(EnsurePackageTagsBase):
         package_name = 'rhceph-container'
         hotfix_tag = 'hotfix-tag'
         cdn_repo_name = self.repo['relationships']['cdn_repo']['name']
-        packages = {
-            package_name: {
-                'latest': {},
-                hotfix_tag: {'for_hotfix': True}
-            }
-        }
+        packages = normalize_packages({
+            package_name: [
+                'latest',
+                {hotfix_tag: {'for_hotfix': True}}
+            ]
+        })
         result, _ = ensure_packages_tags(client, name, check_mode, packages)
         expected_changes = [f'adding "{hotfix_tag}" tag template'
                             f' to "rhceph-container"']
@@ -718,12 +885,12 @@ class TestEnsurePackageTags(EnsurePackageTagsBase):
         package_name = 'rhceph-container'
         prerelease_tag = 'prerelease-tag'
         cdn_repo_name = self.repo['relationships']['cdn_repo']['name']
-        packages = {
-            package_name: {
-                'latest': {},
-                prerelease_tag: {'for_prerelease': True}
-            }
-        }
+        packages = normalize_packages({
+            package_name: [
+                'latest',
+                {prerelease_tag: {'for_prerelease': True}}
+            ]
+        })
         result, _ = ensure_packages_tags(client, name, check_mode, packages)
         expected_changes = [f'adding "{prerelease_tag}" tag template'
                             f' to "rhceph-container"']
@@ -749,7 +916,7 @@ class TestEnsurePackageTags(EnsurePackageTagsBase):
         assert client.adapter.request_history[1].method == 'DELETE'
 
     def test_remove_and_add(self, client, name, check_mode):
-        packages = {'rhceph-container': {'new-tag': {}}}
+        packages = normalize_packages({'rhceph-container': ['new-tag']})
         result, _ = ensure_packages_tags(client, name, check_mode, packages)
         expected = ['removing "latest" tag template from "rhceph-container"',
                     'adding "new-tag" tag template to "rhceph-container"']
@@ -759,8 +926,8 @@ class TestEnsurePackageTags(EnsurePackageTagsBase):
         assert client.adapter.request_history[2].method == 'POST'
 
     def test_add_variant(self, client, name, check_mode):
-        packages = {'rhceph-container':
-                    {'latest': {'variant': '8Base-RHCEPH-4.0-Tools'}}}
+        packages = normalize_packages({'rhceph-container': [
+            {'latest': {'variant': '8Base-RHCEPH-4.0-Tools'}}]})
         result, _ = ensure_packages_tags(client, name, check_mode, packages)
         expected = ['adding "8Base-RHCEPH-4.0-Tools" variant to'
                     ' rhceph-container "latest" tag template']
@@ -773,7 +940,7 @@ class TestEnsurePackageTags(EnsurePackageTagsBase):
             'GET',
             PROD + '/api/v1/cdn_repo_package_tags',
             json={'data': [self.repo_with_variant]})
-        packages = {'rhceph-container': {'latest': {}}}
+        packages = normalize_packages({'rhceph-container': ['latest']})
         result, _ = ensure_packages_tags(client, name, check_mode, packages)
         expected = ['removing "8Base-RHCEPH-4.0-Tools" variant from'
                     ' rhceph-container "latest" tag template']
@@ -786,8 +953,8 @@ class TestEnsurePackageTags(EnsurePackageTagsBase):
             'GET',
             PROD + '/api/v1/cdn_repo_package_tags',
             json={'data': [self.repo_with_variant]})
-        packages = {'rhceph-container':
-                    {'latest': {'variant': '8Base-RHCEPH-4.1-Tools'}}}
+        packages = normalize_packages({'rhceph-container': [
+            {'latest': {'variant': '8Base-RHCEPH-4.1-Tools'}}]})
         result, _ = ensure_packages_tags(client, name, check_mode, packages)
         expected = ['changing rhceph-container "latest" variant from'
                     ' "8Base-RHCEPH-4.0-Tools" to "8Base-RHCEPH-4.1-Tools"']
@@ -796,11 +963,11 @@ class TestEnsurePackageTags(EnsurePackageTagsBase):
         assert client.adapter.request_history[1].method == 'PUT'
 
     def test_update_for_hotfix_to_true(self, client, name, check_mode):
-        packages = {
-            'rhceph-container': {
-                'latest': {'for_hotfix': True}
-            }
-        }
+        packages = normalize_packages({
+            'rhceph-container': [
+                {'latest': {'for_hotfix': True}}
+            ]
+        })
         result, _ = ensure_packages_tags(client, name, check_mode, packages)
         expected_changes = ['changing rhceph-container "latest" for_hotfix'
                             ' from "False" to "True"']
@@ -821,11 +988,11 @@ class TestEnsurePackageTags(EnsurePackageTagsBase):
             'GET',
             PROD + '/api/v1/cdn_repo_package_tags',
             json={'data': [self.repo_for_hotfix]})
-        packages = {
-            'rhceph-container': {
-                'latest': {}
-            }
-        }
+        packages = normalize_packages({
+            'rhceph-container': [
+                'latest'
+            ]
+        })
         result, _ = ensure_packages_tags(client, name, check_mode, packages)
         expected_changes = ['changing rhceph-container "latest" for_hotfix'
                             ' from "True" to "False"']
@@ -842,11 +1009,11 @@ class TestEnsurePackageTags(EnsurePackageTagsBase):
         assert client.adapter.request_history[1].json() == expected_settings
 
     def test_update_for_prerelease_to_true(self, client, name, check_mode):
-        packages = {
-            'rhceph-container': {
-                'latest': {'for_prerelease': True}
-            }
-        }
+        packages = normalize_packages({
+            'rhceph-container': [
+                {'latest': {'for_prerelease': True}}
+            ]
+        })
         result, _ = ensure_packages_tags(client, name, check_mode, packages)
         expected_changes = ['changing rhceph-container "latest" for_prerelease'
                             ' from "False" to "True"']
@@ -867,11 +1034,11 @@ class TestEnsurePackageTags(EnsurePackageTagsBase):
             'GET',
             PROD + '/api/v1/cdn_repo_package_tags',
             json={'data': [self.repo_for_prerelease]})
-        packages = {
-            'rhceph-container': {
-                'latest': {}
-            }
-        }
+        packages = normalize_packages({
+            'rhceph-container': [
+                'latest'
+            ]
+        })
         result, _ = ensure_packages_tags(client, name, check_mode, packages)
         expected_changes = ['changing rhceph-container "latest" for_prerelease'
                             ' from "True" to "False"']
@@ -892,7 +1059,7 @@ class TestEnsurePackageTags(EnsurePackageTagsBase):
             'GET',
             PROD + '/api/v1/cdn_repo_package_tags',
             json={'data': []})
-        packages = {'rhceph-container': {'latest': {}}}
+        packages = normalize_packages({'rhceph-container': ['latest']})
         result, _ = ensure_packages_tags(client, name, check_mode, packages)
         expected = ['adding "latest" tag template to "rhceph-container"']
         assert result == expected
@@ -922,7 +1089,8 @@ class TestEnsurePackageTagsCheckMode(EnsurePackageTagsBase):
             assert entry.method == 'GET'
 
     def test_add(self, client, name, check_mode):
-        packages = {'rhceph-container': {'latest': {}, 'new-tag': {}}}
+        packages = normalize_packages(
+            {'rhceph-container': ['latest', 'new-tag']})
         result, _ = ensure_packages_tags(client, name, check_mode, packages)
         expected = ['adding "new-tag" tag template to "rhceph-container"']
         assert result == expected
@@ -936,8 +1104,8 @@ class TestEnsurePackageTagsCheckMode(EnsurePackageTagsBase):
         self.assert_readonly_history(client)
 
     def test_edit(self, client, name, check_mode):
-        packages = {'rhceph-container':
-                    {'latest': {'variant': '8Base-RHCEPH-4.0-Tools'}}}
+        packages = normalize_packages({'rhceph-container': [
+            {'latest': {'variant': '8Base-RHCEPH-4.0-Tools'}}]})
         result, _ = ensure_packages_tags(client, name, check_mode, packages)
         expected = ['adding "8Base-RHCEPH-4.0-Tools" variant to'
                     ' rhceph-container "latest" tag template']
@@ -1024,6 +1192,70 @@ class TestEnsureCdnRepo(object):
 
         assert result == expected
 
+    def test_create_check_mode_no_diff(self, client, params):
+        client.adapter.register_uri(
+            'GET',
+            PROD + '/api/v1/cdn_repos',
+            json={'data': []})
+        result = ensure_cdn_repo(client, True, params, diff_mode=False)
+        assert result == {
+            'changed': True,
+            'stdout_lines': ['created rhceph/rhceph-4-rhel8'],
+        }
+
+    def test_create_plan(self, client, params, tmpdir):
+        client.adapter.register_uri(
+            'GET',
+            PROD + '/api/v1/cdn_repos',
+            json={'data': []})
+        client.plan = Plan(str(tmpdir))
+        result = ensure_cdn_repo(client, False, params, diff_mode=False)
+        assert result['changed'] is True
+        assert result['stdout_lines'][0] == 'created rhceph/rhceph-4-rhel8'
+        assert 'adding "latest" tag template to "rhceph-container"' \
+            in result['stdout_lines']
+        operations = client.plan.operations
+        assert operations[0]['method'] == 'POST'
+        assert operations[0]['endpoint'] == 'api/v1/cdn_repos'
+        # We also planned to add each tag that the ET will not create:
+        assert set(operation['method'] for operation in operations[1:]) == \
+            set(['POST'])
+        tags = [operation['json']['cdn_repo_package_tag']
+                for operation in operations[1:]]
+        assert sorted(tag['tag_template'] for tag in tags) == [
+            'latest',
+            'my-variant-restricted-tag',
+            '{{version}}',
+        ]
+        assert all(tag['cdn_repo_name'] == 'rhceph/rhceph-4-rhel8'
+                   for tag in tags)
+        # We only sent GET requests:
+        history = client.adapter.request_history
+        assert set(request.method for request in history) == set(['GET'])
+
+    def test_create_plan_default_tags(self, client, params, tmpdir):
+        client.adapter.register_uri(
+            'GET',
+            PROD + '/api/v1/cdn_repos',
+            json={'data': []})
+        client.plan = Plan(str(tmpdir))
+        params['packages'] = {'rhceph-container': [
+            {'{{version}}-{{release}}': {'for_hotfix': True}},
+        ]}
+        ensure_cdn_repo(client, False, params, diff_mode=False)
+        operations = client.plan.operations[1:]
+        # We edit and remove the tags that the ET will create, by their
+        # planned IDs.
+        planned = 'api/v1/cdn_repo_package_tags/planned-id:' \
+                  'cdn_repo_package_tags:rhceph/rhceph-4-rhel8:' \
+                  'rhceph-container:'
+        assert sorted((op['method'], op['endpoint']) for op in operations) \
+            == [
+                ('DELETE', planned + '{{version}}-prerelease-{{advisory}}'),
+                ('DELETE', planned + '{{version}}-{{hotfix}}-{{advisory}}'),
+                ('PUT', planned + '{{version}}-{{release}}'),
+            ]
+
     def test_create(self, client, params):
         client.adapter.register_uri(
             'GET',
@@ -1141,6 +1373,83 @@ class TestEnsureCdnRepo(object):
         assert result == expected
 
 
+class TestPrepareDiffData(object):
+
+    def test_does_not_modify_params(self):
+        before = {'name': 'myrepo', 'id': 1, 'package_names': ['foo'],
+                  'variants': ['b', 'a']}
+        after = {'name': 'myrepo', 'package_names': ['foo'],
+                 'variants': ['a', 'b', 'c']}
+        original_before = deepcopy(before)
+        original_after = deepcopy(after)
+        packages = normalize_packages({'foo': ['latest']})
+        diff = prepare_diff_data(before, after, packages, packages)
+        assert before == original_before
+        assert after == original_after
+        assert diff['before']['variants'] == ['a', 'b']
+        assert diff['after']['packages'] == {'foo': ['latest']}
+
+
+class TestEnsureCdnRepoMerge(object):
+    """
+    Assert ensure_cdn_repo() behavior with "packages_mode: merge".
+    """
+
+    @pytest.fixture
+    def params(self):
+        return {
+            'name': 'rhceph/rhceph-4-rhel8',
+            'external_name': 'rhceph/rhceph-4-rhel8',
+            'release_type': 'Primary',
+            'content_type': 'Docker',
+            'use_for_tps': False,
+            'arch': 'multi',
+            'variants': ['8Base-RHCEPH-4.0-Tools', '8Base-RHCEPH-4.1-Tools'],
+            'packages_mode': 'merge',
+            'packages': {'new-container': ['latest']},
+        }
+
+    @pytest.fixture
+    def client(self, client):
+        client.adapter.register_uri(
+            'GET',
+            PROD + '/api/v1/cdn_repos',
+            json={'data': [CDN_REPO]})
+        client.adapter.register_uri(
+            'GET',
+            PROD + '/api/v1/cdn_repo_package_tags',
+            json={'data': []})
+        client.adapter.register_uri(
+            'PUT',
+            PROD + '/api/v1/cdn_repos/11010',
+            status_code=200)
+        client.adapter.register_uri(
+            'POST',
+            PROD + '/api/v1/cdn_repo_package_tags',
+            status_code=201)
+        return client
+
+    def test_add_package(self, client, params):
+        result = ensure_cdn_repo(client, False, params)
+        assert result['changed'] is True
+        history = client.adapter.request_history
+        # We only read the tags for the package that we manage:
+        get_tags = history[2]
+        assert get_tags.method == 'GET'
+        assert get_tags.qs['filter[package_name]'] == ['new-container']
+        # We kept the other package in this repo:
+        put_repo = history[1]
+        assert put_repo.method == 'PUT'
+        package_names = put_repo.json()['cdn_repo']['package_names']
+        assert set(package_names) == set(['new-container',
+                                          'rhceph-container'])
+        # The diff only shows the packages that we manage:
+        assert result['diff']['before']['packages'] == {}
+        assert result['diff']['after']['packages'] == {
+            'new-container': ['latest'],
+        }
+
+
 class TestMain(object):
 
     @pytest.fixture(autouse=True)
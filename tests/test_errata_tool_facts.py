@@ -0,0 +1,169 @@
+from copy import deepcopy
+import pytest
+import errata_tool_facts
+from errata_tool_facts import ProductNotFoundError
+from errata_tool_facts import filter_cdn_repos
+from errata_tool_facts import filter_releases
+from errata_tool_facts import get_product_tree
+from errata_tool_facts import main
+from test_errata_tool_cdn_repo import CDN_REPO
+from test_errata_tool_cdn_repo import CDN_REPO_PACKAGE_TAGS
+from utils import exit_json
+from utils import fail_json
+from utils import load_json
+from utils import set_module_args
+from utils import AnsibleExitJson
+from utils import AnsibleFailJson
+
+
+PROD = 'https://errata.devel.redhat.com'
+
+
+@pytest.fixture
+def product_tree(client):
+    """ Mock the ET responses for a small RHCEPH product tree. """
+    client.adapter.register_uri(
+        'GET',
+        PROD + '/api/v1/products/RHCEPH',
+        json=load_json('RHCEPH.product.json'))
+    client.adapter.register_uri(
+        'GET',
+        PROD + '/api/v1/products/RHCEPH/product_versions',
+        json={'data': []})
+    variants = load_json('8Base-RHCEPH-4.0-Tools.variant.json')
+    variants['data'].extend(load_json('8Base.variant.json')['data'])
+    client.adapter.register_uri(
+        'GET',
+        PROD + '/api/v1/variants',
+        json=variants)
+    client.adapter.register_uri(
+        'GET',
+        PROD + '/api/v1/cdn_repos',
+        json={'data': [CDN_REPO]})
+    releases = load_json('rhceph-4.0.release.json')
+    releases['data'].extend(load_json('rhel-8.4.0.z+eus.release.json')['data'])
+    client.adapter.register_uri(
+        'GET',
+        PROD + '/api/v1/releases',
+        json=releases)
+    client.adapter.register_uri(
+        'GET',
+        PROD + '/api/v1/cdn_repo_package_tags',
+        json={'data': []})
+
+
+class TestFilterCdnRepos(object):
+
+    def test_match(self):
+        elements = [deepcopy(CDN_REPO)]
+        variants = {'8Base-RHCEPH-4.1-Tools': {}}
+        result = filter_cdn_repos(elements, variants)
+        assert list(result) == ['rhceph/rhceph-4-rhel8']
+
+    def test_no_match(self):
+        elements = [deepcopy(CDN_REPO)]
+        variants = {'8Base-RHCEPH-5.0-Tools': {}}
+        result = filter_cdn_repos(elements, variants)
+        assert result == {}
+
+
+class TestFilterReleases(object):
+
+    def test_product(self):
+        elements = load_json('rhceph-4.0.release.json')['data']
+        result = filter_releases(elements, 'RHCEPH', {})
+        assert list(result) == ['rhceph-4.0']
+
+    def test_async_product_version(self):
+        elements = load_json('rhceph-4.0.release.json')['data']
+        elements[0]['relationships']['product'] = None
+        product_versions = {'RHCEPH-4.0-RHEL-8': {}}
+        result = filter_releases(elements, 'RHCEPH', product_versions)
+        assert list(result) == ['rhceph-4.0']
+
+    def test_other_product(self):
+        elements = load_json('rhel-8.4.0.z+eus.release.json')['data']
+        result = filter_releases(elements, 'RHCEPH', {})
+        assert result == {}
+
+
+class TestGetProductTree(object):
+
+    def test_tree(self, client, product_tree):
+        tree = get_product_tree(client, 'RHCEPH')
+        assert tree['product']['short_name'] == 'RHCEPH'
+        assert tree['product_versions'] == {}
+        assert list(tree['variants']) == ['8Base-RHCEPH-4.0-Tools']
+        assert list(tree['cdn_repos']) == ['rhceph/rhceph-4-rhel8']
+        assert tree['cdn_repos']['rhceph/rhceph-4-rhel8']['packages'] == {}
+        assert list(tree['releases']) == ['rhceph-4.0']
+
+    def test_package_tags(self, client, product_tree):
+        client.adapter.register_uri(
+            'GET',
+            PROD + '/api/v1/cdn_repo_package_tags',
+            json={'data': CDN_REPO_PACKAGE_TAGS})
+        tree = get_product_tree(client, 'RHCEPH')
+        cdn_repo = tree['cdn_repos']['rhceph/rhceph-4-rhel8']
+        tags = cdn_repo['packages']['rhceph-container']
+        assert len(tags) == 6
+        assert tags['latest'] == {
+            'id': 13860,
+            'for_hotfix': False,
+            'for_prerelease': False,
+        }
+        assert tags['my-variant-restricted-tag'] == {
+            'id': 99999,
+            'variant': '8Base-RHCEPH-4.0-Tools',
+            'for_hotfix': False,
+            'for_prerelease': False,
+        }
+
+    def test_no_package_tags(self, client, product_tree):
+        tree = get_product_tree(client, 'RHCEPH', package_tags=False)
+        assert 'packages' not in tree['cdn_repos']['rhceph/rhceph-4-rhel8']
+        history = client.adapter.request_history
+        assert not [r for r in history if 'package_tags' in r.url]
+
+    def test_not_found(self, client):
+        client.adapter.register_uri(
+            'GET',
+            PROD + '/api/v1/products/RHCEPH',
+            status_code=404)
+        with pytest.raises(ProductNotFoundError):
+            get_product_tree(client, 'RHCEPH')
+
+
+class TestMain(object):
+
+    @pytest.fixture(autouse=True)
+    def fake_exits(self, monkeypatch):
+        monkeypatch.setattr(errata_tool_facts.AnsibleModule,
+                            'exit_json', exit_json)
+        monkeypatch.setattr(errata_tool_facts.AnsibleModule,
+                            'fail_json', fail_json)
+
+    @pytest.fixture(autouse=True)
+    def fake_client(self, client, monkeypatch):
+        monkeypatch.setattr(errata_tool_facts.common_errata_tool,
+                            'Client', lambda: client)
+
+    def test_facts(self, product_tree):
+        set_module_args({'product': 'RHCEPH'})
+        with pytest.raises(AnsibleExitJson) as exit:
+            main()
+        result = exit.value.args[0]
+        assert result['changed'] is False
+        tree = result['ansible_facts']['errata_tool']
+        assert tree['product']['short_name'] == 'RHCEPH'
+
+    def test_not_found(self, client):
+        client.adapter.register_uri(
+            'GET',
+            PROD + '/api/v1/products/RHCEPH',
+            status_code=404)
+        set_module_args({'product': 'RHCEPH'})
+        with pytest.raises(AnsibleFailJson) as fail:
+            main()
+        result = fail.value.args[0]
+        assert result['msg'] == 'product RHCEPH not found'
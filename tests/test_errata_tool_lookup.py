@@ -0,0 +1,75 @@
+import pytest
+from ansible.errors import AnsibleError
+from errata_tool import LookupModule
+from utils import load_json
+
+
+PROD = 'https://errata.devel.redhat.com'
+
+
+@pytest.fixture
+def lookup(client, monkeypatch):
+    monkeypatch.delenv('ERRATA_TOOL_LOOKUP_CACHE', raising=False)
+    monkeypatch.setattr(LookupModule, '_client', client)
+    monkeypatch.setattr(LookupModule, '_results', {})
+    return LookupModule()
+
+
+class TestLookup(object):
+
+    def test_variant(self, client, lookup):
+        client.adapter.register_uri(
+            'GET',
+            PROD + '/api/v1/variants?filter%5Bname%5D=8Base-RHCEPH-4.0-Tools',
+            json=load_json('8Base-RHCEPH-4.0-Tools.variant.json'))
+        result = lookup.run(['variants'], name='8Base-RHCEPH-4.0-Tools')
+        assert len(result) == 1
+        assert result[0]['name'] == '8Base-RHCEPH-4.0-Tools'
+        assert result[0]['product_version'] == 'RHCEPH-4.0-RHEL-8'
+
+    def test_not_found(self, client, lookup):
+        client.adapter.register_uri(
+            'GET',
+            PROD + '/api/v1/variants',
+            json={'data': []})
+        result = lookup.run(['variants'], name='noexist')
+        assert result == [None]
+
+    def test_several_names(self, client, lookup):
+        client.adapter.register_uri(
+            'GET',
+            PROD + '/api/v1/variants',
+            json={'data': []})
+        result = lookup.run(['variants'], name=['a', 'b', 'c'])
+        assert result == [None, None, None]
+        assert len(client.adapter.request_history) == 3
+
+    def test_memoize(self, client, lookup):
+        client.adapter.register_uri(
+            'GET',
+            PROD + '/api/v1/variants',
+            json={'data': []})
+        lookup.run(['variants'], name='noexist')
+        LookupModule().run(['variants'], name='noexist')
+        assert len(client.adapter.request_history) == 1
+
+    def test_cache_file(self, client, lookup, monkeypatch, tmpdir):
+        path = str(tmpdir.join('lookup.json'))
+        monkeypatch.setenv('ERRATA_TOOL_LOOKUP_CACHE', path)
+        client.adapter.register_uri(
+            'GET',
+            PROD + '/api/v1/variants',
+            json={'data': []})
+        lookup.run(['variants'], name='noexist')
+        # A brand new process would read the results from the file:
+        monkeypatch.setattr(LookupModule, '_results', {})
+        LookupModule().run(['variants'], name='noexist')
+        assert len(client.adapter.request_history) == 1
+
+    def test_product_version_requires_product(self, lookup):
+        with pytest.raises(AnsibleError):
+            lookup.run(['product_versions'], name='RHCEPH-4.0-RHEL-8')
+
+    def test_unknown_resource(self, lookup):
+        with pytest.raises(AnsibleError):
+            lookup.run(['foobars'], name='foo')
@@ -2,14 +2,14 @@ import pytest
 import errata_tool_product
 from ansible.module_utils import common_errata_tool
 from ansible.module_utils.common_errata_tool import UserNotFoundError
-from errata_tool_product import BUGZILLA_STATES
-from errata_tool_product import InvalidInputError
-from errata_tool_product import validate_params
-from errata_tool_product import get_product
-from errata_tool_product import create_product
-from errata_tool_product import edit_product
-from errata_tool_product import ensure_product
-from errata_tool_product import prepare_diff_data
+from ansible.module_utils.common_errata_tool_product import BUGZILLA_STATES
+from ansible.module_utils.common_errata_tool_product import InvalidInputError
+from ansible.module_utils.common_errata_tool_product import validate_params
+from ansible.module_utils.common_errata_tool_product import get_product
+from ansible.module_utils.common_errata_tool_product import create_product
+from ansible.module_utils.common_errata_tool_product import edit_product
+from ansible.module_utils.common_errata_tool_product import ensure_product
+from ansible.module_utils.common_errata_tool_product import prepare_diff_data
 from errata_tool_product import main
 from ansible.module_utils.six import PY2
 from ansible.module_utils.six.moves.urllib.parse import parse_qs
@@ -4,7 +4,7 @@ from requests.exceptions import HTTPError
 import pytest
 from ansible.module_utils.six import PY2
 
-from errata_tool_product_version import (
+from ansible.module_utils.common_errata_tool_product_version import (
     ensure_product_version,
     get_product_version,
     handle_form_errors,
@@ -0,0 +1,123 @@
+import pytest
+import errata_tool_product_versions
+from ansible.module_utils.common_errata_tool_product_version import \
+    prefetch_product_versions
+from errata_tool_product_versions import main
+from utils import exit_json
+from utils import fail_json
+from utils import set_module_args
+from utils import AnsibleExitJson
+from utils import AnsibleFailJson
+
+
+def product_versions():
+    return [
+        {
+            'product': 'RHEL',
+            'name': 'RHEL-8.0.0',
+            'description': 'RHEL-8.0.0',
+            'rhel_release_name': 'RHEL-8.0.0',
+            'default_brew_tag': 'rhel-8.0.0-candidate',
+            'is_server_only': False,
+            'allow_rhn_debuginfo': False,
+            'allow_buildroot_push': False,
+            'is_oval_product': False,
+            'is_rhel_addon': False,
+            'push_targets': ['cdn', 'cdn_stage'],
+            'brew_tags': ['rhel-8.0.0-candidate'],
+        },
+        {
+            'product': 'RHEL',
+            'name': 'RHEL-8.1.0',
+            'description': 'RHEL-8.1.0',
+            'rhel_release_name': 'RHEL-8',
+            'default_brew_tag': 'rhel-8.1.0-candidate',
+            'is_server_only': False,
+            'allow_rhn_debuginfo': False,
+            'allow_buildroot_push': False,
+            'is_oval_product': False,
+            'is_rhel_addon': False,
+            'push_targets': ['cdn', 'cdn_stage'],
+            'brew_tags': ['rhel-8.1.0-candidate'],
+        },
+    ]
+
+
+class TestPrefetchProductVersions(object):
+
+    def test_prefetch(self, fake_client):
+        found = prefetch_product_versions(fake_client, 'RHEL', False)
+        assert list(found) == ['RHEL-8.0.0']
+        assert found['RHEL-8.0.0']['product'] == 'RHEL'
+
+    def test_missing_product_check_mode(self, fake_client):
+        assert prefetch_product_versions(fake_client, 'NOEXIST', True) == {}
+
+
+class TestMain(object):
+
+    @pytest.fixture(autouse=True)
+    def fake_exits(self, monkeypatch):
+        monkeypatch.setattr(errata_tool_product_versions.AnsibleModule,
+                            'exit_json', exit_json)
+        monkeypatch.setattr(errata_tool_product_versions.AnsibleModule,
+                            'fail_json', fail_json)
+
+    def run_main(self, data, check_mode=False):
+        set_module_args({'product_versions': data,
+                         '_ansible_check_mode': check_mode})
+        with pytest.raises(AnsibleExitJson) as ex:
+            main()
+        return ex.value.args[0]
+
+    def test_create(self, fake_client, fake_server):
+        result = self.run_main(product_versions())
+        assert result['stdout_lines'] == [
+            'RHEL-8.1.0: created RHEL-8.1.0 product version',
+        ]
+        fake = fake_server.fake
+        product_version = fake.find(fake.product_versions, 'RHEL-8.1.0')
+        assert product_version['rhel_release_name'] == 'RHEL-8'
+        assert product_version['brew_tags'] == ['rhel-8.1.0-candidate']
+
+    def test_unchanged(self, fake_client, fake_server):
+        fake = fake_server.fake
+        fake.create_product(body={'product': {
+            'short_name': 'RHCEPH',
+            'name': 'Red Hat Ceph Storage',
+            'description': 'Red Hat Ceph Storage',
+            'default_solution': 'enterprise',
+            'state_machine_rule_set': 'Default',
+            'push_targets': ['cdn'],
+        }})
+        data = product_versions()
+        data[1]['product'] = 'RHCEPH'
+        self.run_main(data)
+        requests = fake.requests
+        result = self.run_main(data)
+        assert result['changed'] is False
+        # One page for each product, and no request for each product
+        # version.
+        assert fake.requests - requests == 2
+
+    def test_missing_product(self, fake_client):
+        data = product_versions()
+        data[1]['product'] = 'NOEXIST'
+        set_module_args({'product_versions': data})
+        with pytest.raises(AnsibleFailJson) as ex:
+            main()
+        result = ex.value.args[0]
+        # The other product's product versions do not fail.
+        assert result['summary'] == {'changed': 0, 'unchanged': 1,
+                                     'failed': 1}
+        assert result['msg'].startswith(
+            'could not ensure 1 product versions:\n'
+            'RHEL-8.1.0: HTTPError: 404')
+
+    def test_missing_product_check_mode(self, fake_client):
+        data = product_versions()
+        data[1]['product'] = 'NOEXIST'
+        result = self.run_main(data, check_mode=True)
+        assert result['stdout_lines'] == [
+            'RHEL-8.1.0: created RHEL-8.1.0 product version',
+        ]
@@ -4,13 +4,14 @@ import errata_tool_release
 from ansible.module_utils import common_errata_tool
 from ansible.module_utils.common_errata_tool import UserNotFoundError
 from ansible.module_utils.six import PY2
-from errata_tool_release import get_release
-from errata_tool_release import api_data
-from errata_tool_release import create_release
-from errata_tool_release import edit_release
-from errata_tool_release import ensure_release
+from ansible.module_utils.common_errata_tool_release import get_release
+from ansible.module_utils.common_errata_tool_release import api_data
+from ansible.module_utils.common_errata_tool_release import create_release
+from ansible.module_utils.common_errata_tool_release import edit_release
+from ansible.module_utils.common_errata_tool_release import ensure_release
+from ansible.module_utils.common_errata_tool_release import \
+    ProgramManagerNotFoundError
 from errata_tool_release import main
-from errata_tool_release import ProgramManagerNotFoundError
 from utils import load_json
 from utils import load_html
 from utils import exit_json
@@ -425,6 +426,14 @@ class TestEnsureRelease(object):
         expected = 'changing description from Red Hat Ceph Storage 4.0 ' \
                    'to Red Hat Ceph Storage 4.0 Is Cool'
         assert result['stdout_lines'] == [expected]
+        assert 'diff' in result
+
+    def test_edit_check_mode_no_diff(self, client, params):
+        params['description'] = 'Red Hat Ceph Storage 4.0 Is Cool'
+        result = ensure_release(client, params, check_mode=True,
+                                diff_mode=False)
+        assert result['changed'] is True
+        assert 'diff' not in result
 
     def test_edit_live(self, client, params):
         params['description'] = 'Red Hat Ceph Storage 4.0 Is Cool'
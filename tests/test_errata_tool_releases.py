@@ -0,0 +1,199 @@
+import pytest
+import errata_tool_releases
+from requests.exceptions import HTTPError
+from ansible.module_utils.common_errata_tool import Plan
+from ansible.module_utils.common_errata_tool import SEARCH_EACH_NAME_LIMIT
+from ansible.module_utils.common_errata_tool_release import IdResolver
+from ansible.module_utils.common_errata_tool_release import prefetch_releases
+from errata_tool_releases import main
+from utils import exit_json
+from utils import fail_json
+from utils import set_module_args
+from utils import AnsibleExitJson
+from utils import AnsibleFailJson
+
+
+def releases():
+    return [
+        {
+            'product': 'RHEL',
+            'name': 'RHEL-8.0.0.GA',
+            'description': 'RHEL 8.0.0 GA',
+            'type': 'QuarterlyUpdate',
+            'product_versions': ['RHEL-8.0.0'],
+            'program_manager': 'coolmanager@redhat.com',
+            'state_machine_rule_set': 'Default',
+            'blocker_flags': ['rhel-8.0.0'],
+        },
+        {
+            'product': 'RHEL',
+            'name': 'RHEL-8.0.0.Z',
+            'description': 'RHEL 8.0.0 z-stream',
+            'type': 'Zstream',
+            'product_versions': ['RHEL-8.0.0'],
+            'program_manager': 'coolmanager@redhat.com',
+            'state_machine_rule_set': 'Default',
+            'blocker_flags': ['rhel-8.0.0'],
+        },
+    ]
+
+
+class TestIdResolver(object):
+
+    def test_product_id(self, fake_client):
+        ids = IdResolver(fake_client)
+        assert ids.product_id('RHEL') == ids.product_id('RHEL')
+        stats = fake_client.stats.report()
+        assert stats['endpoints']['GET api/v1/products/:id']['requests'] == 1
+
+    def test_planned_product_id(self, fake_client, tmpdir):
+        fake_client.plan = Plan(str(tmpdir))
+        fake_client.plan.add('POST', 'api/v1/products',
+                             {'product': {'short_name': 'NEWP'}})
+        ids = IdResolver(fake_client)
+        assert ids.product_id('NEWP') == 'planned-id:products:NEWP'
+        with pytest.raises(HTTPError):
+            ids.product_id('NOEXIST')
+
+    def test_rule_set_id(self, fake_client):
+        ids = IdResolver(fake_client)
+        assert ids.rule_set_id('Default') == 1
+        ids.rule_set_id('Default')
+        stats = fake_client.stats.report()
+        assert stats['endpoints']['GET workflow_rules']['requests'] == 1
+
+
+class TestPrefetchReleases(object):
+
+    def test_few_names(self, fake_client, fake_server):
+        requests = fake_server.fake.requests
+        assert prefetch_releases(fake_client, ['NoExist', 'Other']) == {}
+        # One search for each name.
+        assert fake_server.fake.requests - requests == 2
+
+    def test_many_names(self, fake_client, fake_server):
+        names = ['NoExist-%d' % number
+                 for number in range(SEARCH_EACH_NAME_LIMIT)]
+        requests = fake_server.fake.requests
+        assert prefetch_releases(fake_client, names) == {}
+        # One page of every release, instead of one search for each name.
+        assert fake_server.fake.requests - requests == 1
+
+
+class TestMain(object):
+
+    @pytest.fixture(autouse=True)
+    def fake_exits(self, monkeypatch):
+        monkeypatch.setattr(errata_tool_releases.AnsibleModule,
+                            'exit_json', exit_json)
+        monkeypatch.setattr(errata_tool_releases.AnsibleModule,
+                            'fail_json', fail_json)
+
+    def test_create(self, fake_client, fake_server):
+        set_module_args({'releases': releases()})
+        with pytest.raises(AnsibleExitJson) as ex:
+            main()
+        result = ex.value.args[0]
+        fake = fake_server.fake
+        release = fake.find(fake.releases, 'RHEL-8.0.0.Z')
+        assert release['type'] == 'Zstream'
+        assert release['product_id'] == fake.find(fake.products, 'RHEL',
+                                                  'short_name')['id']
+        assert release['product_version_ids'] == [
+            fake.find(fake.product_versions, 'RHEL-8.0.0')['id'],
+        ]
+        assert release['program_manager_id'] == fake.find(
+            fake.users, 'coolmanager@redhat.com', 'login_name')['id']
+        # We resolve each shared name only once.
+        endpoints = result['errata_tool_stats']['endpoints']
+        assert endpoints['GET api/v1/products/:id']['requests'] == 1
+        assert endpoints['GET product_versions/:id.json']['requests'] == 1
+        assert endpoints['GET api/v1/user/:id']['requests'] == 1
+        assert endpoints['GET workflow_rules']['requests'] == 1
+
+    def test_unchanged(self, fake_client):
+        set_module_args({'releases': releases()})
+        with pytest.raises(AnsibleExitJson):
+            main()
+        set_module_args({'releases': releases()})
+        with pytest.raises(AnsibleExitJson) as ex:
+            main()
+        result = ex.value.args[0]
+        assert result['changed'] is False
+        assert result['summary']['unchanged'] == 2
+        # One search for each release, and no ID lookups.
+        assert result['errata_tool_stats']['requests'] == 2
+
+    def test_edit_sends_product_versions(self, fake_client, fake_server):
+        set_module_args({'releases': releases()})
+        with pytest.raises(AnsibleExitJson):
+            main()
+        data = releases()
+        data[0]['description'] = 'RHEL 8.0.0 General Availability'
+        set_module_args({'releases': data})
+        with pytest.raises(AnsibleExitJson) as ex:
+            main()
+        result = ex.value.args[0]
+        assert result['summary']['changed'] == 1
+        # CLOUDWF-6: the edit must keep the product versions.
+        release = fake_server.fake.find(fake_server.fake.releases,
+                                        'RHEL-8.0.0.GA')
+        assert release['product_version_ids']
+
+    def test_program_manager_not_found(self, fake_client):
+        data = releases()
+        data[1]['program_manager'] = 'noexist@redhat.com'
+        set_module_args({'releases': data})
+        with pytest.raises(AnsibleFailJson) as ex:
+            main()
+        result = ex.value.args[0]
+        assert result['msg'] == (
+            'could not ensure 1 releases:\n'
+            'RHEL-8.0.0.Z: program_manager noexist@redhat.com account not '
+            'found')
+
+    def run_check_mode(self, data):
+        set_module_args({'releases': data, '_ansible_check_mode': True})
+        with pytest.raises(AnsibleFailJson) as ex:
+            main()
+        return ex.value.args[0]
+
+    def test_program_manager_check_mode(self, fake_client):
+        data = releases()
+        data[1]['program_manager'] = 'noexist@redhat.com'
+        set_module_args({'releases': data, '_ansible_check_mode': True})
+        with pytest.raises(AnsibleExitJson) as ex:
+            main()
+        result = ex.value.args[0]
+        assert result['summary']['changed'] == 2
+
+    def test_strict_user_check_not_found(self, fake_client, monkeypatch):
+        monkeypatch.setenv('ANSIBLE_STRICT_USER_CHECK_MODE', 'True')
+        data = releases()
+        data[1]['program_manager'] = 'noexist@redhat.com'
+        result = self.run_check_mode(data)
+        assert result['summary'] == {'changed': 1, 'unchanged': 0,
+                                     'failed': 1}
+        assert result['msg'] == (
+            'could not ensure 1 releases:\n'
+            'RHEL-8.0.0.Z: program_manager noexist@redhat.com account not '
+            'found')
+
+    def test_strict_user_check_disabled(self, fake_client, fake_server,
+                                        monkeypatch):
+        monkeypatch.setenv('ANSIBLE_STRICT_USER_CHECK_MODE', 'True')
+        fake_server.fake.create_user(body={
+            'login_name': 'retired@redhat.com',
+            'realname': 'Retired Manager',
+            'enabled': False,
+        })
+        data = releases()
+        for release in data:
+            release['program_manager'] = 'retired@redhat.com'
+        result = self.run_check_mode(data)
+        assert result['summary']['failed'] == 2
+        assert 'RHEL-8.0.0.GA: program_manager retired@redhat.com is not ' \
+            'enabled' in result['msg']
+        # We look up each program manager only once.
+        endpoints = result['errata_tool_stats']['endpoints']
+        assert endpoints['GET api/v1/user/:id']['requests'] == 1
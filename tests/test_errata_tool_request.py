@@ -1,10 +1,12 @@
 import pytest
 import errata_tool_request
+from ansible.module_utils import common_errata_tool
 from errata_tool_request import main
 from utils import exit_json
 from utils import fail_json
 from utils import set_module_args
 from utils import AnsibleExitJson
+from utils import AnsibleFailJson
 
 
 class TestMain(object):
@@ -22,7 +24,7 @@ class TestMain(object):
         Monkeypatch the Client class with our requests-mock class so we can
         fake HTTP responses.
         """
-        monkeypatch.setattr(errata_tool_request, 'Client', lambda: client)
+        monkeypatch.setattr(common_errata_tool, 'Client', lambda: client)
         return client
 
     def test_get_json(self, client):
@@ -69,3 +71,61 @@ class TestMain(object):
             main()
         result = ex.value.args[0]
         assert result['content'] == '<html>new products form</html>'
+
+    def test_post_json(self, client):
+        url = 'https://errata.devel.redhat.com/api/v1/releases'
+        client.adapter.register_uri('POST', url, status_code=201, json={})
+        set_module_args({
+            'path': '/api/v1/releases',
+            'method': 'POST',
+            'json': {'release': {'name': 'rhceph-5.0'}},
+        })
+        with pytest.raises(AnsibleExitJson) as ex:
+            main()
+        result = ex.value.args[0]
+        assert result['status'] == 201
+        history = client.adapter.request_history
+        assert history[0].json() == {'release': {'name': 'rhceph-5.0'}}
+
+    def test_requests(self, client):
+        base = 'https://errata.devel.redhat.com/api/v1/user/'
+        for name in ('cooldeveloper', 'coolmanager'):
+            client.adapter.register_uri(
+                'GET',
+                base + name,
+                json={'login_name': '%s@redhat.com' % name})
+        client.adapter.register_uri(
+            'PUT',
+            base + 'coolmanager',
+            json={'receives_mail': False})
+        set_module_args({
+            'requests': [
+                {'path': '/api/v1/user/cooldeveloper'},
+                {'path': '/api/v1/user/coolmanager'},
+                {'path': '/api/v1/user/coolmanager', 'method': 'PUT',
+                 'json': {'user': {'receives_mail': False}}},
+            ],
+            'concurrency': 2,
+        })
+        with pytest.raises(AnsibleExitJson) as ex:
+            main()
+        result = ex.value.args[0]
+        assert result['changed'] is True
+        responses = result['responses']
+        assert [response['status'] for response in responses] == [200] * 3
+        assert responses[0]['json'] == {
+            'login_name': 'cooldeveloper@redhat.com'}
+        assert responses[1]['json'] == {
+            'login_name': 'coolmanager@redhat.com'}
+        assert responses[2]['json'] == {'receives_mail': False}
+        assert 'content' not in responses[0]
+
+    def test_path_and_requests(self, client):
+        set_module_args({
+            'path': '/api/v1/user/cooldeveloper',
+            'requests': [{'path': '/api/v1/user/coolmanager'}],
+        })
+        with pytest.raises(AnsibleFailJson) as ex:
+            main()
+        result = ex.value.args[0]
+        assert 'mutually exclusive' in result['msg']
@@ -1,9 +1,14 @@
+import json
 import pytest
 import errata_tool_rhel_release
-from errata_tool_rhel_release import get_rhel_release
-from errata_tool_rhel_release import create_rhel_release
-from errata_tool_rhel_release import edit_rhel_release
-from errata_tool_rhel_release import ensure_rhel_release
+from ansible.module_utils.common_errata_tool_rhel_release import \
+    get_rhel_release
+from ansible.module_utils.common_errata_tool_rhel_release import \
+    create_rhel_release
+from ansible.module_utils.common_errata_tool_rhel_release import \
+    edit_rhel_release
+from ansible.module_utils.common_errata_tool_rhel_release import \
+    ensure_rhel_release
 from errata_tool_rhel_release import main
 from utils import load_json
 from utils import exit_json
@@ -236,6 +241,67 @@ class TestMain(object):
             'exclude_ftp_debuginfo': True
         }
 
+    def test_profile(self, monkeypatch, tmpdir):
+        monkeypatch.setenv('ERRATA_TOOL_PROFILE', 'cpu')
+        monkeypatch.setenv('ERRATA_TOOL_PROFILE_DIR', str(tmpdir))
+        mock_ensure = Mock()
+        mock_ensure.return_value = {'changed': True}
+        monkeypatch.setattr(errata_tool_rhel_release,
+                            'ensure_rhel_release', mock_ensure)
+        set_module_args(self.module_args())
+        with pytest.raises(AnsibleExitJson) as ex:
+            main()
+        result = ex.value.args[0]
+        expected = 'errata_tool_rhel_release-Test_rhel_release-cpu.pstats'
+        assert result['profile'] == str(tmpdir.join(expected))
+        assert tmpdir.join(expected).check()
+
+    def test_trace(self, monkeypatch, tmpdir):
+        trace_file = tmpdir.join('trace.jsonl')
+        monkeypatch.setenv('ERRATA_TOOL_TRACE', str(trace_file))
+        mock_ensure = Mock()
+        mock_ensure.return_value = {'changed': True}
+        monkeypatch.setattr(errata_tool_rhel_release,
+                            'ensure_rhel_release', mock_ensure)
+        set_module_args(self.module_args())
+        with pytest.raises(AnsibleExitJson) as ex:
+            main()
+        result = ex.value.args[0]
+        data = json.loads(trace_file.read())
+        spans = data['resourceSpans'][0]['scopeSpans'][0]['spans']
+        root = spans[0]
+        assert root['traceId'] == result['trace_id']
+        assert root['name'] == 'errata_tool_rhel_release'
+        assert 'parse arguments' in [span['name'] for span in spans]
+
+    def test_stats(self, monkeypatch):
+        mock_ensure = Mock()
+        mock_ensure.return_value = {'changed': True}
+        monkeypatch.setattr(errata_tool_rhel_release,
+                            'ensure_rhel_release', mock_ensure)
+        set_module_args(self.module_args())
+        with pytest.raises(AnsibleExitJson) as ex:
+            main()
+        result = ex.value.args[0]
+        assert result['errata_tool_stats']['requests'] == 0
+
+    def test_slow_log(self, monkeypatch, tmpdir):
+        log = tmpdir.join('slow.log')
+        monkeypatch.setenv('ERRATA_TOOL_SLOW_MS', '0')
+        monkeypatch.setenv('ERRATA_TOOL_SLOW_LOG', str(log))
+
+        def ensure_rhel_release(client, params, check_mode, diff_mode):
+            client.slow_log.add('GET', 'api/v1/rhel_releases', None, 200, 1)
+            return {'changed': False}
+        monkeypatch.setattr(errata_tool_rhel_release,
+                            'ensure_rhel_release', ensure_rhel_release)
+        set_module_args(self.module_args())
+        with pytest.raises(AnsibleExitJson):
+            main()
+        entry = json.loads(log.read())
+        assert entry['module'] == 'errata_tool_rhel_release'
+        assert entry['resource'] == 'Test rhel release'
+
     def test_simple_async(self, monkeypatch):
         mock_ensure = Mock()
         mock_ensure.return_value = {'changed': True}
@@ -0,0 +1,94 @@
+import json
+import pytest
+from errata_tool_stats import CallbackModule
+from utils import Mock
+
+
+class FakeDisplay(object):
+    verbosity = 0
+
+    def __init__(self):
+        self.lines = []
+
+    def banner(self, msg):
+        self.lines.append(msg)
+
+    def display(self, msg):
+        self.lines.append(msg)
+
+
+def task_result(name, result):
+    task = Mock()
+    task.get_name.return_value = name
+    host = Mock()
+    host.get_name.return_value = 'localhost'
+    return Mock(_task=task, _host=host, _result=result)
+
+
+def stats(requests, seconds, endpoint='GET api/v1/releases', caches=None):
+    return {
+        'requests': requests,
+        'seconds': seconds,
+        'endpoints': {endpoint: {'requests': requests, 'seconds': seconds}},
+        'caches': caches or {},
+    }
+
+
+class TestCallbackModule(object):
+
+    @pytest.fixture
+    def callback(self, monkeypatch):
+        monkeypatch.delenv('ERRATA_TOOL_STATS_REPORT', raising=False)
+        monkeypatch.delenv('ERRATA_TOOL_STATS_SLOWEST', raising=False)
+        return CallbackModule(display=FakeDisplay())
+
+    def test_no_stats(self, callback):
+        callback.v2_runner_on_ok(task_result('debug', {'msg': 'hi'}))
+        callback.v2_playbook_on_stats(None)
+        assert callback._display.lines == []
+
+    def test_summary(self, callback):
+        fingerprint = {'fingerprint': {'hits': 1, 'misses': 0}}
+        callback.v2_runner_on_ok(task_result(
+            'fast', {'errata_tool_stats': stats(1, 0.5, caches=fingerprint)}))
+        callback.v2_runner_on_failed(task_result(
+            'slow', {'errata_tool_stats': stats(3, 2.0)}))
+        summary = callback.summary()
+        assert summary['requests'] == 4
+        assert summary['seconds'] == 2.5
+        assert summary['endpoints'] == {
+            'GET api/v1/releases': {'requests': 4, 'seconds': 2.5},
+        }
+        assert summary['caches'] == {
+            'fingerprint': {'hits': 1, 'misses': 0, 'hit_rate': 1.0},
+        }
+        assert [task['task'] for task in summary['tasks']] == \
+            ['slow', 'fast']
+
+    def test_loop(self, callback):
+        result = {'results': [
+            {'errata_tool_stats': stats(1, 0.1)},
+            {'errata_tool_stats': stats(2, 0.2)},
+        ]}
+        callback.v2_runner_on_ok(task_result('loop', result))
+        assert callback.summary()['requests'] == 3
+
+    def test_display(self, callback):
+        callback.v2_runner_on_ok(task_result(
+            'slow', {'errata_tool_stats': stats(3, 2.0)}))
+        callback.v2_playbook_on_stats(None)
+        lines = callback._display.lines
+        assert lines[0] == 'ERRATA TOOL API USAGE'
+        assert '3 requests, 2.0 seconds waiting for the ET' in lines
+        assert '       3       2.0s  GET api/v1/releases' in lines
+        assert '       3       2.0s  slow (localhost)' in lines
+
+    def test_report(self, callback, monkeypatch, tmpdir):
+        path = tmpdir.join('report.json')
+        monkeypatch.setenv('ERRATA_TOOL_STATS_REPORT', str(path))
+        callback.v2_runner_on_ok(task_result(
+            'slow', {'errata_tool_stats': stats(3, 2.0)}))
+        callback.v2_playbook_on_stats(None)
+        report = json.loads(path.read())
+        assert report['requests'] == 3
+        assert report['tasks'][0]['task'] == 'slow'
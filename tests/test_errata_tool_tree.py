@@ -0,0 +1,148 @@
+import re
+import pytest
+import errata_tool_tree
+from errata_tool_tree import get_levels
+from errata_tool_tree import main
+from utils import exit_json
+from utils import fail_json
+from utils import set_module_args
+from utils import AnsibleExitJson
+from utils import AnsibleFailJson
+
+
+def tree():
+    return {
+        'products': [{
+            'short_name': 'TREE',
+            'name': 'Tree Product',
+            'description': 'Tree Product',
+            'default_solution': 'enterprise',
+            'state_machine_rule_set': 'Default',
+            'push_targets': ['cdn'],
+        }],
+        'product_versions': [{
+            'product': 'TREE',
+            'name': 'TREE-1.0-RHEL-8',
+            'description': 'Tree 1.0',
+            'rhel_release_name': 'RHEL-8',
+            'default_brew_tag': 'tree-1.0-rhel-8-candidate',
+            'is_server_only': False,
+            'allow_rhn_debuginfo': False,
+            'allow_buildroot_push': False,
+            'is_oval_product': False,
+            'is_rhel_addon': False,
+            'push_targets': ['cdn'],
+            'brew_tags': ['tree-1.0-rhel-8-candidate'],
+        }],
+        'variants': [{
+            'name': '8Base-TREE-1.0',
+            'description': 'Tree 1.0',
+            'product_version': 'TREE-1.0-RHEL-8',
+            'push_targets': ['cdn'],
+        }],
+        'cdn_repos': [{
+            'name': 'tree/tree-container',
+            'release_type': 'Primary',
+            'content_type': 'Docker',
+            'variants': ['8Base-TREE-1.0', 'AppStream-8.0.0'],
+            'packages': {'tree-container': ['latest']},
+        }],
+        'releases': [{
+            'product': 'TREE',
+            'name': 'TREE-1.0',
+            'description': 'Tree 1.0',
+            'type': 'QuarterlyUpdate',
+            'product_versions': ['TREE-1.0-RHEL-8', 'RHEL-8.0.0'],
+            'program_manager': 'coolmanager@redhat.com',
+        }],
+    }
+
+
+def names(levels):
+    return [['%s/%s' % (kind, params.get('short_name', params.get('name')))
+             for kind, params in level] for level in levels]
+
+
+def test_no_module_imports():
+    # AnsiballZ only ships module_utils with a module, so errata_tool_tree
+    # (and the other errata_tool_* modules) must not import each other.
+    with open(errata_tool_tree.__file__) as f:
+        source = f.read()
+    assert not re.search(r'^\s*(from|import) errata_tool_', source, re.M)
+
+
+class TestGetLevels(object):
+
+    def test_tree(self):
+        levels = get_levels(tree())
+        assert names(levels) == [
+            ['products/TREE'],
+            ['product_versions/TREE-1.0-RHEL-8'],
+            ['variants/8Base-TREE-1.0', 'releases/TREE-1.0'],
+            ['cdn_repos/tree/tree-container'],
+        ]
+
+    def test_existing_dependencies(self):
+        data = tree()
+        data['products'] = []
+        data['variants'] = []
+        levels = get_levels(data)
+        assert names(levels) == [
+            ['product_versions/TREE-1.0-RHEL-8',
+             'cdn_repos/tree/tree-container'],
+            ['releases/TREE-1.0'],
+        ]
+
+    def test_duplicate(self):
+        data = tree()
+        data['variants'].append(data['variants'][0])
+        with pytest.raises(ValueError) as e:
+            get_levels(data)
+        assert str(e.value) == 'duplicate variants "8Base-TREE-1.0"'
+
+
+class TestMain(object):
+
+    @pytest.fixture(autouse=True)
+    def fake_exits(self, monkeypatch):
+        monkeypatch.setattr(errata_tool_tree.AnsibleModule,
+                            'exit_json', exit_json)
+        monkeypatch.setattr(errata_tool_tree.AnsibleModule,
+                            'fail_json', fail_json)
+
+    def test_create_and_unchanged(self, fake_client):
+        set_module_args(tree())
+        with pytest.raises(AnsibleExitJson) as ex:
+            main()
+        result = ex.value.args[0]
+        assert result['changed'] is True
+        assert 'products TREE: created TREE product' in result['stdout_lines']
+        assert len(result['levels']) == 4
+        assert [r['changed'] for r in result['results']] == [True] * 5
+
+        set_module_args(tree())
+        with pytest.raises(AnsibleExitJson) as ex:
+            main()
+        result = ex.value.args[0]
+        assert result['changed'] is False
+        assert result['stdout_lines'] == []
+
+    def test_failure_stops(self, fake_client):
+        data = tree()
+        data['product_versions'][0]['rhel_release_name'] = 'RHEL-NOEXIST'
+        set_module_args(data)
+        with pytest.raises(AnsibleFailJson) as ex:
+            main()
+        result = ex.value.args[0]
+        assert 'product_versions TREE-1.0-RHEL-8' in result['msg']
+        # We stop after the failed level.
+        assert len(result['levels']) == 2
+
+    def test_invalid_cdn_repo(self, fake_client):
+        data = tree()
+        data['cdn_repos'][0]['use_for_tps'] = True
+        set_module_args(data)
+        with pytest.raises(AnsibleFailJson) as ex:
+            main()
+        result = ex.value.args[0]
+        assert result['msg'] == 'do not set "use_for_tps" for Docker repos'
@@ -1,8 +1,8 @@
 import pytest
 import errata_tool_user
-from errata_tool_user import create_user
-from errata_tool_user import edit_user
-from errata_tool_user import ensure_user
+from ansible.module_utils.common_errata_tool_user import create_user
+from ansible.module_utils.common_errata_tool_user import edit_user
+from ansible.module_utils.common_errata_tool_user import ensure_user
 from errata_tool_user import main
 from utils import exit_json
 from utils import set_module_args
@@ -0,0 +1,137 @@
+import json
+import pytest
+import errata_tool_users
+from errata_tool_users import read_users
+from errata_tool_users import validate_users
+from errata_tool_users import InvalidUserError
+from errata_tool_users import main
+from utils import exit_json
+from utils import fail_json
+from utils import set_module_args
+from utils import AnsibleExitJson
+from utils import AnsibleFailJson
+
+
+USERS = [
+    {
+        'login_name': 'newuser@redhat.com',
+        'realname': 'New User',
+        'roles': ['devel'],
+    },
+    {
+        'login_name': 'coolmanager@redhat.com',
+        'realname': 'Cool Manager',
+        'roles': ['pm'],
+    },
+]
+
+
+class TestReadUsers(object):
+
+    def test_csv(self, tmpdir):
+        path = tmpdir.join('users.csv')
+        path.write('login_name,realname,roles,receives_mail\n'
+                   'newuser@redhat.com,New User,"devel,pm",false\n'
+                   'other@redhat.com,Other User,,\n')
+        users = validate_users(read_users(str(path)))
+        assert users[0]['roles'] == ['devel', 'pm']
+        assert users[0]['receives_mail'] is False
+        assert users[1]['roles'] is None
+        assert users[1]['receives_mail'] is True
+
+    def test_json(self, tmpdir):
+        path = tmpdir.join('users.json')
+        path.write(json.dumps(USERS))
+        assert read_users(str(path)) == USERS
+
+    def test_yaml(self, tmpdir):
+        path = tmpdir.join('users.yml')
+        path.write('- login_name: newuser@redhat.com\n'
+                   '  realname: New User\n')
+        assert read_users(str(path)) == [
+            {'login_name': 'newuser@redhat.com', 'realname': 'New User'},
+        ]
+
+    def test_unknown_format(self, tmpdir):
+        with pytest.raises(InvalidUserError):
+            read_users(str(tmpdir.join('users.txt')))
+
+
+class TestValidateUsers(object):
+
+    def test_defaults(self):
+        users = validate_users(USERS)
+        assert users[0]['enabled'] is True
+        assert users[0]['organization'] is None
+
+    def test_missing_realname(self):
+        with pytest.raises(InvalidUserError) as e:
+            validate_users([{'login_name': 'newuser@redhat.com'}])
+        assert 'user 1: missing required arguments: realname' \
+            in str(e.value)
+
+    def test_duplicate(self):
+        with pytest.raises(InvalidUserError) as e:
+            validate_users([USERS[0], USERS[0]])
+        assert str(e.value) == 'duplicate user newuser@redhat.com'
+
+
+class TestMain(object):
+
+    @pytest.fixture(autouse=True)
+    def fake_exits(self, monkeypatch):
+        monkeypatch.setattr(errata_tool_users.AnsibleModule,
+                            'exit_json', exit_json)
+        monkeypatch.setattr(errata_tool_users.AnsibleModule,
+                            'fail_json', fail_json)
+
+    def run_main(self, args):
+        set_module_args(args)
+        with pytest.raises(AnsibleExitJson) as ex:
+            main()
+        return ex.value.args[0]
+
+    def test_create(self, fake_client, fake_server):
+        result = self.run_main({'users': USERS})
+        user = fake_server.fake.find(fake_server.fake.users,
+                                     'newuser@redhat.com', 'login_name')
+        assert user['realname'] == 'New User'
+        assert user['roles'] == ['devel']
+        assert user['enabled'] is True
+        assert 'newuser@redhat.com: created newuser@redhat.com user' \
+            in result['stdout_lines']
+
+    def test_edit_roles(self, fake_client, fake_server):
+        data = [{
+            'login_name': 'coolmanager@redhat.com',
+            'realname': 'coolmanager',
+            'roles': ['pm', 'devel'],
+        }]
+        result = self.run_main({'users': data})
+        assert result['stdout_lines'] == [
+            'coolmanager@redhat.com: changing roles from [\'pm\'] to '
+            '[\'pm\', \'devel\']',
+        ]
+        user = fake_server.fake.find(fake_server.fake.users,
+                                     'coolmanager@redhat.com', 'login_name')
+        assert user['roles'] == ['pm', 'devel']
+
+    def test_csv_src(self, fake_client, fake_server, tmpdir):
+        path = tmpdir.join('users.csv')
+        path.write('login_name,realname,roles,receives_mail\n'
+                   'newuser@redhat.com,New User,"devel,pm",false\n')
+        self.run_main({'src': str(path)})
+        user = fake_server.fake.find(fake_server.fake.users,
+                                     'newuser@redhat.com', 'login_name')
+        assert user['roles'] == ['devel', 'pm']
+        assert user['receives_mail'] is False
+        # Run again to verify that the CSV values compare as unchanged.
+        result = self.run_main({'src': str(path)})
+        assert result['changed'] is False
+
+    def test_invalid(self, fake_client):
+        set_module_args({'users': [{'login_name': 'newuser@redhat.com'}]})
+        with pytest.raises(AnsibleFailJson) as ex:
+            main()
+        result = ex.value.args[0]
+        assert 'realname' in result['msg']
@@ -1,8 +1,8 @@
 import pytest
 import errata_tool_variant
-from errata_tool_variant import create_variant
-from errata_tool_variant import edit_variant
-from errata_tool_variant import ensure_variant
+from ansible.module_utils.common_errata_tool_variant import create_variant
+from ansible.module_utils.common_errata_tool_variant import edit_variant
+from ansible.module_utils.common_errata_tool_variant import ensure_variant
 from errata_tool_variant import main
 from utils import exit_json
 from utils import fail_json
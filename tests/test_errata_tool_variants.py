@@ -0,0 +1,145 @@
+import pytest
+import errata_tool_variants
+from ansible.module_utils.common_errata_tool import SEARCH_EACH_NAME_LIMIT
+from ansible.module_utils.common_errata_tool_variant import prefetch_variants
+from errata_tool_variants import main
+from utils import exit_json
+from utils import fail_json
+from utils import set_module_args
+from utils import AnsibleExitJson
+from utils import AnsibleFailJson
+
+
+def variants():
+    return [
+        {
+            'name': 'BaseOS-8.0.0',
+            'description': 'Red Hat Enterprise Linux BaseOS (v. 8)',
+            'product_version': 'RHEL-8.0.0',
+            'push_targets': ['cdn', 'cdn_stage'],
+        },
+        {
+            'name': 'AppStream-8.0.0',
+            'description': 'Red Hat Enterprise Linux AppStream (v. 8)',
+            'product_version': 'RHEL-8.0.0',
+            'push_targets': ['cdn', 'cdn_stage'],
+        },
+    ]
+
+
+def test_prefetch_variants(fake_client):
+    found = prefetch_variants(fake_client, ['AppStream-8.0.0', 'NoExist'])
+    assert list(found) == ['AppStream-8.0.0']
+    assert found['AppStream-8.0.0']['product_version'] == 'RHEL-8.0.0'
+
+
+def test_prefetch_many_variants(fake_client, fake_server):
+    names = ['NoExist-%d' % number for number in range(SEARCH_EACH_NAME_LIMIT)]
+    names.append('AppStream-8.0.0')
+    requests = fake_server.fake.requests
+    found = prefetch_variants(fake_client, names)
+    assert list(found) == ['AppStream-8.0.0']
+    # One page of every variant, instead of one search for each name.
+    assert fake_server.fake.requests - requests == 1
+
+
+class TestMain(object):
+
+    @pytest.fixture(autouse=True)
+    def fake_exits(self, monkeypatch):
+        monkeypatch.setattr(errata_tool_variants.AnsibleModule,
+                            'exit_json', exit_json)
+        monkeypatch.setattr(errata_tool_variants.AnsibleModule,
+                            'fail_json', fail_json)
+
+    def run_main(self, data):
+        set_module_args({'variants': data})
+        with pytest.raises(AnsibleExitJson) as ex:
+            main()
+        return ex.value.args[0]
+
+    def test_create(self, fake_client, fake_server):
+        result = self.run_main(variants())
+        assert result['stdout_lines'] == [
+            'BaseOS-8.0.0: created BaseOS-8.0.0 variant',
+        ]
+        variant = fake_server.fake.find(fake_server.fake.variants,
+                                        'BaseOS-8.0.0')
+        # A variant with no rhel_variant is its own RHEL variant.
+        assert variant['rhel_variant'] == 'BaseOS-8.0.0'
+
+    def test_unchanged(self, fake_client, fake_server):
+        self.run_main(variants())
+        requests = fake_server.fake.requests
+        result = self.run_main(variants())
+        assert result['changed'] is False
+        # One search for each variant, and no other request.
+        assert fake_server.fake.requests - requests == 2
+
+    def test_edit(self, fake_client, fake_server):
+        data = variants()
+        data[1]['description'] = 'Red Hat Enterprise Linux AppStream'
+        data[1]['push_targets'] = ['cdn']
+        set_module_args({'variants': data, '_ansible_diff': True})
+        with pytest.raises(AnsibleExitJson) as ex:
+            main()
+        result = ex.value.args[0]
+        assert result['stdout_lines'] == [
+            'BaseOS-8.0.0: created BaseOS-8.0.0 variant',
+            'AppStream-8.0.0: changing description from Red Hat Enterprise '
+            'Linux AppStream (v. 8) to Red Hat Enterprise Linux AppStream',
+            "AppStream-8.0.0: changing push_targets from ['cdn', "
+            "'cdn_stage'] to ['cdn']",
+        ]
+        diff = result['diff'][1]
+        assert diff['before_header'] == "Original variant 'AppStream-8.0.0'"
+        assert diff['after_header'] == "Modified variant 'AppStream-8.0.0'"
+        assert diff['before']['description'] == \
+            'Red Hat Enterprise Linux AppStream (v. 8)'
+        assert diff['before']['push_targets'] == ['cdn', 'cdn_stage']
+        assert diff['after']['description'] == \
+            'Red Hat Enterprise Linux AppStream'
+        assert diff['after']['push_targets'] == ['cdn']
+        variant = fake_server.fake.find(fake_server.fake.variants,
+                                        'AppStream-8.0.0')
+        assert variant['description'] == 'Red Hat Enterprise Linux AppStream'
+        assert variant['push_targets'] == ['cdn']
+
+    def test_layered_variant(self, fake_client, fake_server):
+        layered = {
+            'name': '8Base-RHCEPH-5.0-Tools',
+            'description': 'Red Hat Ceph Storage 5.0 Tools',
+            'product_version': 'RHEL-8.0.0',
+            'rhel_variant': 'AppStream-8.0.0',
+            'push_targets': ['cdn'],
+        }
+        self.run_main([layered])
+        variant = fake_server.fake.find(fake_server.fake.variants,
+                                        '8Base-RHCEPH-5.0-Tools')
+        assert variant['rhel_variant'] == 'AppStream-8.0.0'
+        result = self.run_main([layered])
+        assert result['changed'] is False
+
+    def test_ignore_tps_stream(self, fake_client, fake_server):
+        data = variants()
+        data[0]['tps_stream'] = 'RHEL-8-Main-Base'
+        self.run_main(data)
+        variant = fake_server.fake.find(fake_server.fake.variants,
+                                        'BaseOS-8.0.0')
+        assert variant['tps_stream'] is None
+        result = self.run_main(data)
+        assert result['changed'] is False
+
+    def test_missing_product_version(self, fake_client, fake_server):
+        data = variants()
+        data[0]['product_version'] = 'RHEL-NOEXIST'
+        set_module_args({'variants': data})
+        with pytest.raises(AnsibleFailJson) as ex:
+            main()
+        result = ex.value.args[0]
+        assert result['msg'].startswith(
+            'could not ensure 1 variants:\n'
+            'BaseOS-8.0.0: ErrataToolError: Unexpected response from Errata '
+            'Tool: RHEL-NOEXIST not found')
+        names = [v['name'] for v in fake_server.fake.variants.values()]
+        assert 'BaseOS-8.0.0' not in names
@@ -0,0 +1,61 @@
+from ansible.module_utils.common_errata_tool import WorkflowRulesScraper
+from ansible.module_utils.common_errata_tool import get_all_pages
+from ansible.module_utils.common_errata_tool import get_user
+from ansible.module_utils.common_errata_tool_cdn_repo import ensure_cdn_repo
+from fake_errata_tool import FakeErrataTool
+
+
+class TestFakeErrataTool(object):
+
+    def test_cdn_repo_idempotent(self, fake_client):
+        params = {
+            'name': 'testproduct/container-fake-1',
+            'release_type': 'Primary',
+            'content_type': 'Docker',
+            'use_for_tps': False,
+            'variants': ['AppStream-8.0.0'],
+            'packages': {'fake-container': ['latest']},
+        }
+        result = ensure_cdn_repo(fake_client, False, params.copy())
+        assert result['changed'] is True
+        result = ensure_cdn_repo(fake_client, False, params.copy())
+        assert result == {'changed': False, 'stdout_lines': []}
+
+    def test_pagination(self, fake_client, fake_server):
+        for number in range(5):
+            fake_server.fake.create_rhel_release(body={
+                'name': 'RHEL-FAKE-%d' % number,
+                'description': 'fake',
+            })
+        elements = get_all_pages(fake_client, 'api/v1/rhel_releases',
+                                 {'page[size]': 2})
+        names = [element['attributes']['name'] for element in elements]
+        assert len(names) == len(set(names))
+        assert 'RHEL-FAKE-4' in names
+
+    def test_user_not_found(self, fake_client):
+        assert get_user(fake_client, 'noexist@redhat.com') is None
+
+    def test_workflow_rules(self, fake_client):
+        scraper = WorkflowRulesScraper(fake_client)
+        assert scraper.enum['Default'] == 1
+
+    def test_reset(self, fake_client, fake_server):
+        fake_server.fake.create_rhel_release(body={'name': 'RHEL-FAKE',
+                                                   'description': 'fake'})
+        fake_server.fake.reset()
+        response = fake_client.get('api/v1/rhel_releases',
+                                   params={'filter[name]': 'RHEL-FAKE'})
+        assert response.json() == {'data': []}
+
+
+def test_error_rate():
+    fake = FakeErrataTool(error_rate=1.0)
+    status, _ = fake.handle('GET', '/api/v1/products/RHEL')
+    assert status == 500
+
+
+def test_unknown_route():
+    fake = FakeErrataTool()
+    status, _ = fake.handle('GET', '/api/v1/foobars')
+    assert status == 404
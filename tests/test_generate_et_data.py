@@ -0,0 +1,90 @@
+import json
+import pytest
+from ansible.module_utils.common_errata_tool import WorkflowRulesScraper
+from ansible.module_utils.common_errata_tool import get_all_pages
+from ansible.module_utils.common_errata_tool import normalize_cdn_repo
+from ansible.module_utils.common_errata_tool import normalize_release
+from ansible.module_utils.common_errata_tool import normalize_variant
+from ansible.module_utils.common_errata_tool_cdn_repo import \
+    package_tag_records
+from fake_errata_tool import FakeErrataTool
+from generate_et_data import generate
+from generate_et_data import product_name
+from generate_et_data import write_data
+
+
+def test_product_name():
+    assert product_name(0) == 'RHCEPH'
+    assert product_name(8) == 'RHCEPH2'
+
+
+class TestGenerate(object):
+
+    @pytest.fixture
+    def fake(self):
+        fake = FakeErrataTool()
+        generate(fake, scale=2)
+        return fake
+
+    def test_counts(self, fake):
+        # We generate two products on top of the fake's RHEL product.
+        assert len(fake.products) == 3
+        assert len(fake.variants) == 201
+        assert len(fake.releases) == 10
+        assert len(fake.package_tags) > 3000
+
+    def test_deterministic(self, fake):
+        other = FakeErrataTool()
+        generate(other, scale=2)
+        for endpoint in ('api/v1/releases', 'api/v1/cdn_repo_package_tags'):
+            query = {'page[size]': ['100000']}
+            assert fake.handle('GET', endpoint, query) == \
+                other.handle('GET', endpoint, query)
+
+    def test_write_data(self, fake, tmpdir):
+        write_data(fake, str(tmpdir))
+        with open(str(tmpdir.join('api_v1_variants.json'))) as f:
+            data = json.load(f)
+        assert len(data['data']) == 201
+        assert tmpdir.join('workflow_rules.html').check()
+
+
+class TestParse(object):
+    """
+    Verify that our modules can parse the generated data.
+    """
+
+    @pytest.fixture
+    def client(self, fake_client, fake_server):
+        generate(fake_server.fake, scale=1)
+        return fake_client
+
+    def test_variants(self, client):
+        elements = get_all_pages(client, 'api/v1/variants')
+        variants = [normalize_variant(element) for element in elements]
+        assert len(variants) == 101
+        names = [variant['name'] for variant in variants]
+        assert '8Base-RHCEPH-1.0-Tools' in names
+
+    def test_cdn_repos(self, client):
+        elements = get_all_pages(client, 'api/v1/cdn_repos')
+        cdn_repos = [normalize_cdn_repo(element) for element in elements]
+        assert len(cdn_repos) == 150
+
+    def test_package_tags(self, client):
+        params = {'filter[cdn_repo_name]': 'rhceph/rhceph-1-container-0'}
+        elements = get_all_pages(client, 'api/v1/cdn_repo_package_tags',
+                                 params)
+        packages = package_tag_records(elements)
+        assert len(packages) == 10
+
+    def test_releases(self, client):
+        elements = get_all_pages(client, 'api/v1/releases')
+        releases = [normalize_release(element) for element in elements]
+        assert len(releases) == 5
+        for release in releases:
+            assert len(release['product_versions']) >= 10
+
+    def test_workflow_rules(self, client):
+        scraper = WorkflowRulesScraper(client)
+        assert scraper.enum['Generated Rule Set 20'] > 0
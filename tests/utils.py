@@ -27,6 +27,9 @@ def set_module_args(args):
 
     args = json.dumps({'ANSIBLE_MODULE_ARGS': args})
     basic._ANSIBLE_ARGS = to_bytes(args)
+    if hasattr(basic, '_ANSIBLE_PROFILE'):
+        # ansible-core 2.19+
+        basic._ANSIBLE_PROFILE = 'legacy'
 
 
 class AnsibleExitJson(Exception):